@@ -0,0 +1,31 @@
+import argparse
+import pytesdaq.io.hdf5 as h5io
+
+
+if __name__ == "__main__":
+
+    # ------------------
+    # Input arguments
+    # ------------------
+    parser = argparse.ArgumentParser(
+        description='Build virtual dataset (VDS) file over raw data dumps')
+    parser.add_argument('--input_path', type=str,
+                        help='Raw data group directory or file')
+    parser.add_argument('--output_file', type=str,
+                        help='VDS file name (not in raw data directory)')
+    parser.add_argument('--series', type=str,
+                        help='Series name (optional, default: all series)')
+    parser.add_argument('--adc_name', type=str, default='adc1',
+                        help='ADC name (default: adc1)')
+    args = parser.parse_args()
+
+
+    # check arguments
+    if not args.input_path or not args.output_file:
+        print('ERROR: Input path and output file need to be provided')
+        exit(0)
+
+    # build
+    h5io.build_virtual_dataset(args.input_path, args.output_file,
+                               series=args.series,
+                               adc_name=args.adc_name)
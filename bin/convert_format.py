@@ -0,0 +1,32 @@
+import argparse
+import pytesdaq.io.hdf5 as h5io
+
+
+if __name__ == "__main__":
+
+    # ------------------
+    # Input arguments
+    # ------------------
+    parser = argparse.ArgumentParser(description='Convert raw data file format')
+    parser.add_argument('--input_path', type=str,
+                        help='Raw data group directory or file')
+    parser.add_argument('--output_path', type=str,
+                        help='Output directory')
+    parser.add_argument('--series', type=str,
+                        help='Series name (optional, default: all series)')
+    parser.add_argument('--format_version', type=int, default=2,
+                        help=('Output format version: 1 (one dataset per event) or '
+                              + '2 (chunked [events, channels, samples] dataset). '
+                              + 'Default: 2'))
+    args = parser.parse_args()
+
+    
+    # check arguments
+    if not args.input_path or not args.output_path:
+        print('ERROR: Input and output paths need to be provided')
+        exit(0)
+
+    # convert
+    h5io.convert_file_format(args.input_path, args.output_path,
+                             format_version=args.format_version,
+                             series=args.series)
@@ -13,6 +13,17 @@ if __name__ == "__main__":
     parser.add_argument('--fridge_run', type=int, help='Fridge run number (optional)')
     parser.add_argument('--display_only', action='store_true',
                         help='Display group info. No registration')
+    parser.add_argument('--nb_cores', type=int, default=1,
+                        help='Number of processes to scan files (Default: 1)')
+    parser.add_argument('--summary-only', dest='summary_only', action='store_true',
+                        help=('Read only file/group metadata and first/last event '
+                              + 'of each file (fast, no catalog)'))
+    parser.add_argument('--use-catalog', dest='use_catalog', action='store_true',
+                        help=('Use series catalog (SQLite file, only new/modified '
+                              + 'files scanned). Default: no catalog'))
+    parser.add_argument('--catalog-dir', dest='catalog_dir', type=str,
+                        help=('Catalog directory (Default: group directory, '
+                              + 'requires --use-catalog)'))
 
     args = parser.parse_args()
 
@@ -30,10 +41,18 @@ if __name__ == "__main__":
         display_only = args.display_only
         
 
+    nb_cores = 1
+    if args.nb_cores and args.nb_cores>1:
+        nb_cores = args.nb_cores
+        
     # register
     register = Register(args.raw_path,
                         group_name=group_name,
-                        display_only=display_only)
+                        display_only=display_only,
+                        use_catalog=args.use_catalog,
+                        catalog_dir=args.catalog_dir,
+                        nb_cores=nb_cores,
+                        summary_only=args.summary_only)
     register.run()
     
     
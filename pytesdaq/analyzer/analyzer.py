@@ -4,6 +4,7 @@ from astropy.stats import sigma_clip as clip
 import qetpy as qp
 from scipy import signal
 import copy
+from pytesdaq.utils import calibration
 
 class Analyzer:
     
@@ -103,7 +104,8 @@ class Analyzer:
         if self._analysis_config['unit']!='ADC' or self._analysis_config['norm_type']!='NoNorm':
             data_array = self.normalize(data_array, adc_config,
                                         self._analysis_config['unit'],
-                                        self._analysis_config['norm_list'])
+                                        self._analysis_config['norm_list'],
+                                        dtype=self._analysis_config['dtype'])
 
 
 
@@ -111,7 +113,8 @@ class Analyzer:
         # PSD
         # ---------------------        
         if self._analysis_config['calc_psd']:
-            data_array = self.calc_psd(data_array, adc_config['sample_rate'])
+            data_array = self.calc_psd(data_array, adc_config['sample_rate'],
+                                       dtype=self._analysis_config['dtype'])
         else:
             self._freq_array = None
     
@@ -183,7 +186,8 @@ class Analyzer:
 
 
     
-    def normalize(self, data_array, adc_config, unit, norm_list=None):
+    def normalize(self, data_array, adc_config, unit, norm_list=None,
+                  dtype=np.float64):
         """
         Normalize traces
 
@@ -194,12 +198,13 @@ class Analyzer:
         adc_config: dictionary
         unit: "ADC", "mVolts", "nVolts", "Amps", "uAmps",or "pAmps",  
         norm_list: normalization factor
+        dtype: output dtype, np.float64 (default) or np.float32
 
         Return:
         ------
 
         data_array: ndarray
-           2D numpy float64 array [nb channels, nb samples] with traces 
+           2D numpy float array [nb channels, nb samples] with traces 
            in requested unit
           
 
@@ -209,39 +214,53 @@ class Analyzer:
         if unit=='ADC':
             return data_array
         
-        
-        # intialize output
-        data_array_norm = np.zeros_like(data_array, dtype=np.float64)
-        
-        # loop and normalize
+        # unit scale
+        scale = 1
+        if unit=='mVolts':
+            scale = 1000
+        elif unit=='nVolts':
+            scale = 1e9
+        elif unit=='uAmps':
+            scale = 1e6
+        elif unit=='pAmps':
+            scale = 1e12
+
+        # normalization (fused with ADC calibration
+        # coefficients): output = volts/norm*scale 
         nb_channels = np.size(data_array,0)
-        for ichan in range(0,nb_channels):
-            chan_index = adc_config['selected_channel_index'][ichan]
-            cal_coeff = adc_config['adc_conversion_factor'][chan_index][::-1]
-            poly = np.poly1d(cal_coeff)
-            data_array_norm[ichan,:] = poly(data_array[ichan,:])
+        norm_array = np.ones(nb_channels, dtype=np.float64)
+        if norm_list is not None:
+            norm_array = np.asarray(norm_list[:nb_channels], dtype=np.float64)
+        norm_array = norm_array/scale
+        
+        # calibration (cached)
+        chan_indices = adc_config['selected_channel_index'][:nb_channels]
+        cal = calibration.get_adc_calibration(
+            np.asarray(adc_config['adc_conversion_factor'])[chan_indices],
+            close_loop_norm=norm_array)
+
+        # convert
+        data_array_norm = cal.apply(data_array, dtype=dtype)
             
-            # normalize
-            if norm_list is not None:
-                data_array_norm[ichan,:] /= norm_list[ichan]
-                
-            # unit
-            if unit=='mVolts':
-                data_array_norm[ichan,:] *= 1000
-            elif unit=='nVolts':
-                data_array_norm[ichan,:] *= 1e9
-            elif unit=='uAmps':
-                data_array_norm[ichan,:] *= 1e6
-            elif unit=='pAmps':
-                data_array_norm[ichan,:] *= 1e12
-            
-        
         return data_array_norm
      
     
-    def calc_psd(self, data_array, sample_rate):
+    def calc_psd(self, data_array, sample_rate, dtype=np.float64):
         """
         calculate PSD
+
+        Arguments:
+        ----------
+        
+        data_array: 2D ndarray [nb channels, nb samples]
+        sample_rate: sample rate [Hz]
+        dtype: PSD dtype, np.float64 (default) or np.float32
+
+        Return:
+        ------
+
+        psd_array: ndarray
+           2D numpy float array [nb channels, nb frequencies]
         """
         
         # initialize
@@ -257,7 +276,7 @@ class Analyzer:
                                             folded_over=True)
             if ichan==0:
                 psd_array = np.zeros((nb_channels,len(psd_fold)),
-                                     dtype=np.float64)
+                                     dtype=dtype)
                 psd_array[ichan,:] =  psd_fold
                 self._freq_array = f_fold
             else:
@@ -840,6 +859,7 @@ class Analyzer:
         self._analysis_config['didv_measurement'] = False
         self._analysis_config['enable_pileup_rejection'] = False
         self._analysis_config['pileup_cuts'] = None
+        self._analysis_config['dtype'] = np.float64
         
         
         
@@ -823,6 +823,54 @@ class Config:
 
       
     
+    def get_hdf5_compression(self, file_type='raw'):
+        """
+        Get HDF5 compression settings from "hdf5" section 
+        (daq.ini)
+
+        Args:
+    
+        * file_type (str): 'raw' (raw data, H5Writer) or
+                           'filter' (filter file, FilterH5IO)
+
+        Returns:
+             dict with "compression", "compression_level"  
+             and "shuffle" (raw data only), no compression 
+             if section/setting not available
+        """
+
+        if file_type not in ['raw', 'filter']:
+            raise ValueError('ERROR: Unknown file type "' + str(file_type)
+                             + '". Should be "raw" or "filter"!')
+
+        prefix = str()
+        if file_type=='filter':
+            prefix = 'filter_'
+            
+        config = {'compression': None,
+                  'compression_level': None}
+        if file_type=='raw':
+            config['shuffle'] = True
+            
+        if not self._has_section('hdf5'):
+            return config
+
+        if self._has_setting('hdf5', prefix + 'compression'):
+            compression = self._get_setting('hdf5', prefix + 'compression').strip()
+            if compression.lower() not in ['', 'none']:
+                config['compression'] = compression.lower()
+
+        if self._has_setting('hdf5', prefix + 'compression_level'):
+            config['compression_level'] = int(
+                self._get_setting('hdf5', prefix + 'compression_level'))
+
+        if (file_type=='raw'
+            and self._has_setting('hdf5', 'shuffle')):
+            config['shuffle'] = self._get_boolean_setting('hdf5', 'shuffle')
+            
+        return config
+
+      
     def _get_ini_path(self, ini_filename):
         """
         Get the path where the ini files live. ini files
@@ -5,6 +5,8 @@ import struct
 from pytesdaq.config import settings
 from pytesdaq.daq import polaris
 from pytesdaq.daq import nidaqtask
+from pytesdaq.utils import calibration
+from pytesdaq.io import shm
 
 
 class DAQ:
@@ -24,6 +26,12 @@ class DAQ:
         # Configuration
         self._config = settings.Config(setup_file=setup_file)
 
+        # shared memory output (live traces, same host)
+        self._shm_buffer_name = None
+        self._shm_nb_slots = 100
+        self._shm_writer = None
+        self._shm_event_num = 0
+
         # instantiate driver 
         self._instantiate_driver()
           
@@ -236,12 +244,72 @@ class DAQ:
         self._driver.read_single_event(data_array=data_array, 
                                        do_clear_task=do_clear_task)
 
+        # shared memory output
+        if self._shm_buffer_name is not None:
+            self._write_shm_event(data_array)
+
+
+
+    def enable_shm_output(self, buffer_name=shm.DEFAULT_BUFFER_NAME,
+                          nb_slots=100):
+        """
+        Publish events read with "read_single_event"/"read_many_events"
+        in a shared memory ring buffer (pytesdaq.io.shm), for live 
+        display or monitoring on same host (scope "shm" data source). 
+        Buffer created at first event.
+
+        Parameters
+        ----------
+        buffer_name : str, optional
+          shared memory buffer name
+          default: 'pytesdaq_traces'
+
+        nb_slots : int, optional
+          number of events in ring buffer (oldest overwritten)
+          default: 100
+        """
+
+        self.disable_shm_output()
+        self._shm_buffer_name = buffer_name
+        self._shm_nb_slots = nb_slots
+        self._shm_event_num = 0
+
+
+
+    def disable_shm_output(self):
+        """
+        Stop shared memory output, remove buffer
+        """
+
+        if self._shm_writer is not None:
+            self._shm_writer.close()
+        self._shm_writer = None
+        self._shm_buffer_name = None
+
 
 
     def read_many_events(self, nevents,
-                         adctovolt=False):
+                         adctovolt=False, dtype='float64'):
         """
         Read multiple events 
+
+        Parameters
+        ----------
+        nevents : int
+          number of events
+
+        adctovolt : bool, optional
+          convert from ADC to volts
+          default: False
+
+        dtype : str or numpy dtype, optional
+          dtype of converted traces ('float64' or 'float32')
+          default: 'float64'
+
+        Return
+        ------
+        output_array : 3D numpy array
+          traces [events, channels, samples]
         """
 
         # only for "pydaqmx"
@@ -256,12 +324,20 @@ class DAQ:
         nchannels = len(daq_config['adc1']['channel_list'])
 
         data_type = 'int16'
-        if adctovolt or adctoamp:
-            data_type = 'float64'
+        if adctovolt:
+            data_type = np.dtype(dtype)
+            if data_type not in [np.float64, np.float32]:
+                raise ValueError('ERROR: dtype should be float64 or float32!')
 
         output_array =  np.zeros((nevents, nchannels, nsamples),
                                  dtype=data_type)
 
+        # ADC calibration (coefficient matrix)
+        cal = None
+        if adctovolt:
+            cal = calibration.get_adc_calibration(
+                daq_config['adc1']['adc_conversion_factor'][:nchannels]
+            )
 
         # loop events
         
@@ -271,16 +347,9 @@ class DAQ:
             # read single events
             self.read_single_event(event_array)
 
-            # convert to volts/amps
+            # convert to volts
             if adctovolt:
-                
-                for ichan in range(nchannels):
-
-                    # convert to volts
-                    cal_coeff = daq_config['adc1']['adc_conversion_factor'][ichan][::-1]
-                    poly = np.poly1d(cal_coeff)
-                    output_array[ievent, ichan,:] = poly(event_array[ichan,:])
-                    
+                cal.apply(event_array, out=output_array[ievent])
             else:
                 output_array[ievent,:,:] = event_array
                 
@@ -292,4 +361,40 @@ class DAQ:
     def clear(self):
         if self._driver_name=='pydaqmx':
             self._driver.clear_task() 
+        self.disable_shm_output()
+
+
+
+    def _write_shm_event(self, data_array):
+        """
+        Write event in shared memory ring buffer (buffer created
+        or re-created if trace shape/type changed)
+        """
+
+        writer = self._shm_writer
+        if (writer is None or writer.shape!=data_array.shape
+            or writer.dtype!=data_array.dtype):
+
+            if writer is not None:
+                writer.close()
+
+            # ADC channel list
+            channel_list = None
+            if self._driver._adc_config:
+                adc_config = list(self._driver._adc_config.values())[0]
+                if ('channel_list' in adc_config
+                    and len(adc_config['channel_list'])==data_array.shape[0]):
+                    channel_list = [int(chan) for chan in adc_config['channel_list']]
+
+            self._shm_writer = shm.SharedMemoryWriter(
+                self._shm_buffer_name,
+                nb_channels=data_array.shape[0],
+                nb_samples=data_array.shape[1],
+                dtype=data_array.dtype,
+                nb_slots=self._shm_nb_slots,
+                channel_list=channel_list)
+            
+        self._shm_event_num += 1
+        self._shm_writer.write_event(data_array,
+                                     event_num=self._shm_event_num)
             
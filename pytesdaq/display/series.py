@@ -5,16 +5,26 @@ from glob import glob
 from pprint import pprint
 from pathlib import Path
 import json
+from concurrent.futures import ProcessPoolExecutor
 
 import pytesdaq.io.hdf5 as h5io
+from pytesdaq.io.catalog import SeriesCatalog
 from pytesdaq.utils import  arg_utils
 
 class SeriesGroup:
-    def __init__(self, group_name, group_path):
+    def __init__(self, group_name, group_path, use_catalog=False,
+                 catalog_dir=None):
 
         self._group_name = group_name
         self._group_path = group_path
 
+        # use series catalog (see pytesdaq.io.SeriesCatalog)
+        # instead of scanning all files (opt-in). Catalog file
+        # stored in "catalog_dir" if provided ([group_name].sqlite),
+        # otherwise in group directory
+        self._use_catalog = use_catalog
+        self._catalog_dir = catalog_dir
+
 
         # initialize group info
         self._is_data_filled = False
@@ -158,12 +168,20 @@ class SeriesGroup:
 
 
         
-    def fill_info_from_disk(self):
+    def fill_info_from_disk(self, nb_cores=1, summary_only=False):
         """
         Get series info from files
 
         Arguments:
         ---------
+        nb_cores: int (optional)
+           number of worker processes to read file metadata
+           (results merged in file order), default: 1
+
+        summary_only: bool (optional)
+           if True, read only file/group metadata and first/last 
+           event metadata of each file (no catalog)
+           default: False
         """
 
         # get list of file
@@ -177,15 +195,37 @@ class SeriesGroup:
             return
 
         
-        # h5 reader 
-        hdf5 = h5io.H5Reader()
-        
+        # read metadata (in file order)
+        metadata_list = list()
+        if self._use_catalog and not summary_only:
+
+            # catalog (updated with new/modified files only),
+            # first/last event metadata included
+            catalog_file = None
+            if self._catalog_dir is not None:
+                os.makedirs(self._catalog_dir, exist_ok=True)
+                catalog_file = os.path.join(self._catalog_dir,
+                                            self._group_name + '.sqlite')
+            catalog = SeriesCatalog(full_path, catalog_file=catalog_file,
+                                    nb_cores=nb_cores)
+            for file_path in catalog.get_file_list():
+                metadata_list.append(catalog.get_metadata(file_path))
+            catalog.close()
+
+        elif nb_cores>1 and len(file_list)>1:
+            with ProcessPoolExecutor(
+                    max_workers=min(nb_cores, len(file_list))) as executor:
+                metadata_list = list(executor.map(
+                    _read_file_metadata, file_list,
+                    [summary_only]*len(file_list)))
+        else:
+            for file_path in file_list:
+                metadata_list.append(
+                    _read_file_metadata(file_path, summary_only=summary_only)
+                )
+
         # loop files
-        for file_path in file_list:
-            
-            # read metadata
-            info =  hdf5.get_metadata(file_name=file_path,
-                                      include_dataset_metadata=True)
+        for info in metadata_list:
 
            
             # series name
@@ -227,6 +267,32 @@ class SeriesGroup:
         self._is_data_filled = True
 
 
+def _read_file_metadata(file_path, summary_only=False):
+    """
+    Read raw data file metadata (module function, can be used
+    by worker processes)
+
+    Arguments:
+    ---------
+    file_path: str
+       file name (full path)
+
+    summary_only: bool (optional)
+       if True, read only file/group metadata and first/last 
+       event metadata, otherwise all event metadata
+
+    Return:
+    -------
+    metadata: dict
+    """
+    
+    hdf5 = h5io.H5Reader()
+    if summary_only:
+        return hdf5.get_metadata_summary(file_path)
+    return hdf5.get_metadata(file_name=file_path,
+                             include_dataset_metadata=True)
+
+
 class Series:
     
     def __init__(self,
@@ -572,12 +638,42 @@ class Series:
         # update duration
         self._duration = (self._last_event_timestamp-self._first_event_timestamp)/60
         self._duration = round(self._duration *100)/100
+
+
+    def add_dumps_from_catalog(self, catalog):
+        """
+        Add all dumps of the series from a series catalog
+        (see pytesdaq.io.SeriesCatalog)
+        """
+
+        for file_name in catalog.get_file_list(series_nums=self._series_num):
+            metadata = catalog.get_metadata(file_name)
+            if metadata is not None:
+                self.add_dump_from_metadata(metadata)
+
+
+    def get_event_times(self, catalog):
+        """
+        Get event numbers and times of the series from a series 
+        catalog (see pytesdaq.io.SeriesCatalog)
+
+        Return:
+        -------
+        event_nums: numpy array
+        event_times: numpy array
+        """
+        
+        events = catalog.get_events(series_nums=self._series_num)
+        event_nums = events['dump_num']*100000 + events['event_index']
+        return event_nums, events['event_time']
         
         
 
 class Register:
     
-    def __init__(self, raw_path, group_name=None, display_only=False):
+    def __init__(self, raw_path, group_name=None, display_only=False,
+                 use_catalog=False, catalog_dir=None, nb_cores=1,
+                 summary_only=False):
         """
         TBD
         """
@@ -593,6 +689,16 @@ class Register:
             
         # display only
         self._display_only = display_only
+
+        # use series catalog (opt-in), catalog directory
+        # (default: group directory)
+        self._use_catalog = use_catalog
+        self._catalog_dir = catalog_dir
+
+        # metadata scan: number of worker processes,
+        # summary (file/group + first/last event metadata) only
+        self._nb_cores = nb_cores
+        self._summary_only = summary_only
             
 
 
@@ -609,8 +715,11 @@ class Register:
         for group_name in self._group_list:
 
             # instantiate group and fill info
-            group = SeriesGroup(group_name, self._raw_path)
-            group.fill_info_from_disk()
+            group = SeriesGroup(group_name, self._raw_path,
+                                use_catalog=self._use_catalog,
+                                catalog_dir=self._catalog_dir)
+            group.fill_info_from_disk(nb_cores=self._nb_cores,
+                                      summary_only=self._summary_only)
 
             if self._display_only:
                 group.print_info(True)
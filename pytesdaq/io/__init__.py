@@ -1,3 +1,5 @@
 from .hdf5 import *
 from .filter_hdf5 import *
 from .redis import *
+from .shm import *
+from .catalog import *
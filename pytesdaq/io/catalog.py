@@ -0,0 +1,555 @@
+import os
+import json
+import sqlite3
+from glob import glob
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+import pytesdaq.io.hdf5 as h5io
+os.environ["HDF5_USE_FILE_LOCKING"] = 'FALSE'
+
+__all__ = ['SeriesCatalog']
+
+
+class SeriesCatalog:
+    """
+    Persistent catalog of the raw data dumps of a group directory,
+    stored in a sidecar SQLite file:
+
+      - per dump (file) summary: series/dump numbers, number
+        of events, first/last event time and file/group metadata
+      - per event columns: event index ("dataset" number), event
+        number, event time
+
+    The catalog is updated incrementally: only new or modified
+    files (based on file modification time and size) are scanned,
+    entries of deleted files are removed.
+    """
+
+    # catalog format version
+    _version = 1
+
+    def __init__(self, group_path, catalog_file=None,
+                 update=True, nb_cores=1, verbose=True):
+        """
+        Initialize catalog (open/create sidecar file)
+
+        Parameters
+        ----------
+        group_path : str
+          group directory (raw data dumps)
+
+        catalog_file : str, optional
+          catalog file name (full path)
+          default: [group_path]/.pytesdaq_catalog.sqlite
+          If directory not writable, an in-memory catalog is used.
+          A corrupted catalog file (or a file that is not a
+          catalog) is re-created.
+
+        update : bool, optional
+          if True, update catalog (scan new/modified files)
+          default: True
+
+        nb_cores : int, optional
+          number of worker processes to scan files (update)
+          default: 1
+
+        verbose : bool, optional
+          if True, display messages
+          default: True
+
+        Return
+        ------
+        None
+        """
+
+        self._group_path = group_path
+        self._verbose = verbose
+
+        if not os.path.isdir(group_path):
+            raise ValueError('ERROR: Group directory ' + group_path
+                             + ' not found!')
+
+        # catalog file
+        if catalog_file is None:
+            catalog_file = os.path.join(group_path,
+                                        '.pytesdaq_catalog.sqlite')
+        if not os.access(os.path.dirname(os.path.abspath(catalog_file)),
+                         os.W_OK) and not os.path.isfile(catalog_file):
+            if self._verbose:
+                print('WARNING: Unable to write catalog in '
+                      + os.path.dirname(catalog_file)
+                      + '. Using in-memory catalog!')
+            catalog_file = ':memory:'
+        self._catalog_file = catalog_file
+
+        # connect and create tables (unreadable/corrupted catalog
+        # file is re-created)
+        self._connection = None
+        self._open_catalog()
+
+        # update
+        if update:
+            self.update(nb_cores=nb_cores)
+
+
+    @property
+    def catalog_file(self):
+        return self._catalog_file
+
+    @property
+    def group_path(self):
+        return self._group_path
+
+
+    def close(self):
+        """
+        Close catalog
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+    def update(self, nb_cores=1):
+        """
+        Update catalog: scan new or modified files, remove
+        deleted files
+
+        Parameters
+        ----------
+        nb_cores : int, optional
+          number of worker processes to scan files
+          default: 1
+
+        Return
+        ------
+        nb_files_updated : int
+          number of files (re)scanned
+        """
+
+        # files on disk
+        file_list = sorted(glob(os.path.join(self._group_path, '*.hdf5')))
+        file_stats = dict()
+        for file_name in file_list:
+            try:
+                stat = os.stat(file_name)
+            except OSError:
+                continue
+            file_stats[os.path.basename(file_name)] = (stat.st_mtime,
+                                                       stat.st_size)
+
+        # files in catalog
+        cursor = self._connection.execute(
+            'SELECT file_name, mtime, size FROM dumps')
+        catalog_stats = {row[0]: (row[1], row[2]) for row in cursor}
+
+        # removed files
+        removed_files = [name for name in catalog_stats
+                         if name not in file_stats]
+
+        # new/modified files
+        updated_files = [name for name, stats in file_stats.items()
+                         if catalog_stats.get(name)!=stats]
+
+        if not removed_files and not updated_files:
+            return 0
+
+        if self._verbose and updated_files:
+            print('INFO: Updating catalog with ' + str(len(updated_files))
+                  + ' file(s)')
+
+        # scan files (results in file order)
+        file_paths = [os.path.join(self._group_path, name)
+                      for name in updated_files]
+        if nb_cores>1 and len(file_paths)>1:
+            with ProcessPoolExecutor(
+                    max_workers=min(nb_cores, len(file_paths))) as executor:
+                scan_results = list(executor.map(_scan_file, file_paths))
+        else:
+            scan_results = [_scan_file(file_path) for file_path in file_paths]
+        
+        with self._connection:
+            for name in removed_files + updated_files:
+                self._connection.execute(
+                    'DELETE FROM dumps WHERE file_name=?', (name,))
+                self._connection.execute(
+                    'DELETE FROM events WHERE file_name=?', (name,))
+
+            for name, (dump_summary, event_columns) in zip(updated_files,
+                                                           scan_results):
+                if dump_summary is None:
+                    print('WARNING: Unable to scan file ' + name
+                          + ' (' + event_columns + ')')
+                    continue
+
+                mtime, size = file_stats[name]
+                self._connection.execute(
+                    'INSERT INTO dumps VALUES (?,?,?,?,?,?,?,?,?)',
+                    (name, mtime, size,
+                     dump_summary['series_num'], dump_summary['dump_num'],
+                     dump_summary['nb_events'],
+                     dump_summary['first_event_time'],
+                     dump_summary['last_event_time'],
+                     json.dumps(dump_summary['metadata'],
+                                default=_json_encode)))
+
+                nb_events = len(event_columns['event_index'])
+                self._connection.executemany(
+                    'INSERT INTO events VALUES (?,?,?,?,?,?)',
+                    zip([name]*nb_events,
+                        [dump_summary['series_num']]*nb_events,
+                        [dump_summary['dump_num']]*nb_events,
+                        event_columns['event_index'].tolist(),
+                        event_columns['event_num'].tolist(),
+                        event_columns['event_time'].tolist()))
+
+        return len(updated_files)
+
+
+    def get_file_list(self, series_nums=None):
+        """
+        Get list of files (full path), sorted by series/dump number
+
+        Parameters
+        ----------
+        series_nums : int or list of int, optional
+          series number(s) (default: all series)
+
+        Return
+        ------
+        file_list : list of str
+        """
+
+        dump_list = self.get_dump_list(series_nums=series_nums)
+        return [dump['file_name'] for dump in dump_list]
+
+
+    def get_dump_list(self, series_nums=None):
+        """
+        Get dump summaries, sorted by series/dump number
+
+        Parameters
+        ----------
+        series_nums : int or list of int, optional
+          series number(s) (default: all series)
+
+        Return
+        ------
+        dump_list : list of dict
+          "file_name" (full path), "series_num", "dump_num",
+          "nb_events", "first_event_time", "last_event_time"
+        """
+
+        query = ('SELECT file_name, series_num, dump_num, nb_events, '
+                 + 'first_event_time, last_event_time FROM dumps')
+        query, params = self._add_series_condition(query, series_nums)
+        query += ' ORDER BY series_num, dump_num, file_name'
+
+        dump_list = list()
+        for row in self._connection.execute(query, params):
+            dump_list.append(
+                {'file_name': os.path.join(self._group_path, row[0]),
+                 'series_num': row[1],
+                 'dump_num': row[2],
+                 'nb_events': row[3],
+                 'first_event_time': row[4],
+                 'last_event_time': row[5]})
+        return dump_list
+
+
+    def get_series_nums(self):
+        """
+        Get list of series numbers
+
+        Return
+        ------
+        series_nums : list of int
+        """
+        cursor = self._connection.execute(
+            'SELECT DISTINCT series_num FROM dumps ORDER BY series_num')
+        return [row[0] for row in cursor]
+
+
+    def get_metadata(self, file_name):
+        """
+        Get file/group metadata of a dump (same format as
+        H5Reader "get_metadata"). First and last event dataset
+        metadata ("event_time", "event_num") are included in
+        adc group "datasets".
+
+        Parameters
+        ----------
+        file_name : str
+          file name (full path or base name)
+
+        Return
+        ------
+        metadata : dict or None
+          None if file not in catalog
+        """
+
+        # check directory
+        if (os.path.dirname(file_name)
+            and (os.path.abspath(os.path.dirname(file_name))
+                 !=os.path.abspath(self._group_path))):
+            return None
+        
+        cursor = self._connection.execute(
+            'SELECT metadata FROM dumps WHERE file_name=?',
+            (os.path.basename(file_name),))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0], object_hook=_json_decode)
+
+
+    def get_events(self, series_nums=None, time_range=None):
+        """
+        Get event columns (sorted by series, dump, event index)
+
+        Parameters
+        ----------
+        series_nums : int or list of int, optional
+          series number(s) (default: all series)
+
+        time_range : tuple (float, float), optional
+          event time range [min, max)
+
+        Return
+        ------
+        events : dict of numpy arrays
+          "series_num", "dump_num", "event_index",
+          "event_num", "event_time"
+        """
+
+        query = ('SELECT series_num, dump_num, event_index, event_num, '
+                 + 'event_time FROM events')
+        query, params = self._add_series_condition(query, series_nums)
+        if time_range is not None:
+            query += ' AND' if params else ' WHERE'
+            query += ' event_time>=? AND event_time<?'
+            params += [float(time_range[0]), float(time_range[1])]
+        query += ' ORDER BY series_num, dump_num, event_index'
+
+        rows = self._connection.execute(query, params).fetchall()
+        columns = ['series_num', 'dump_num', 'event_index',
+                   'event_num', 'event_time']
+        dtypes = [np.int64, np.int64, np.int64, np.int64, np.float64]
+        events = dict()
+        for icol, (column, dtype) in enumerate(zip(columns, dtypes)):
+            events[column] = np.array([row[icol] for row in rows],
+                                      dtype=dtype)
+        return events
+
+
+    def get_event_list(self, series_nums=None, time_range=None):
+        """
+        Get list of event dictionaries that can be used with
+        H5Reader "set_files" or "read_many_events" ("event_list"
+        argument)
+
+        Parameters
+        ----------
+        series_nums : int or list of int, optional
+          series number(s) (default: all series)
+
+        time_range : tuple (float, float), optional
+          event time range [min, max)
+
+        Return
+        ------
+        event_list : list of dict
+          "series_number", "event_number", "event_time"
+        """
+
+        events = self.get_events(series_nums=series_nums,
+                                 time_range=time_range)
+
+        event_list = list()
+        for series_num, dump_num, event_index, event_time in zip(
+                events['series_num'].tolist(), events['dump_num'].tolist(),
+                events['event_index'].tolist(), events['event_time'].tolist()):
+            event_list.append(
+                {'series_number': series_num,
+                 'event_number': dump_num*100000 + event_index,
+                 'event_time': event_time})
+        return event_list
+
+
+    def _open_catalog(self):
+        """
+        Connect to catalog file and create tables. If file is
+        not a valid catalog (corrupted, not a sqlite file, wrong
+        table format), it is deleted and re-created (in-memory
+        catalog if it can't be deleted).
+        """
+
+        try:
+            self._connection = sqlite3.connect(self._catalog_file)
+            self._create_tables()
+            self._check_tables()
+            return
+        except sqlite3.DatabaseError as err:
+            self.close()
+            if self._verbose:
+                print('WARNING: Unable to use catalog file '
+                      + self._catalog_file + ' (' + str(err)
+                      + '). Re-creating catalog!')
+
+        try:
+            os.remove(self._catalog_file)
+        except OSError:
+            if self._verbose:
+                print('WARNING: Unable to delete catalog file '
+                      + self._catalog_file + '. Using in-memory catalog!')
+            self._catalog_file = ':memory:'
+
+        self._connection = sqlite3.connect(self._catalog_file)
+        self._create_tables()
+
+
+    def _check_tables(self):
+        """
+        Check catalog tables format (raise sqlite3.DatabaseError
+        if columns are missing)
+        """
+
+        self._connection.execute(
+            'SELECT file_name, mtime, size, series_num, dump_num, '
+            + 'nb_events, first_event_time, last_event_time, metadata '
+            + 'FROM dumps LIMIT 1').fetchall()
+        self._connection.execute(
+            'SELECT file_name, series_num, dump_num, event_index, '
+            + 'event_num, event_time FROM events LIMIT 1').fetchall()
+
+
+    def _create_tables(self):
+        """
+        Create catalog tables (if needed). Tables are re-created if
+        catalog format version changed.
+        """
+
+        version = self._connection.execute('PRAGMA user_version').fetchone()[0]
+        with self._connection:
+            if version!=self._version:
+                self._connection.execute('DROP TABLE IF EXISTS dumps')
+                self._connection.execute('DROP TABLE IF EXISTS events')
+                self._connection.execute('PRAGMA user_version='
+                                         + str(self._version))
+
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS dumps ('
+                + 'file_name TEXT PRIMARY KEY, mtime REAL, size INTEGER, '
+                + 'series_num INTEGER, dump_num INTEGER, nb_events INTEGER, '
+                + 'first_event_time REAL, last_event_time REAL, '
+                + 'metadata TEXT)')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS events ('
+                + 'file_name TEXT, series_num INTEGER, dump_num INTEGER, '
+                + 'event_index INTEGER, event_num INTEGER, event_time REAL)')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS events_series '
+                + 'ON events (series_num, dump_num, event_index)')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS events_time '
+                + 'ON events (event_time)')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS events_file '
+                + 'ON events (file_name)')
+
+
+    def _add_series_condition(self, query, series_nums):
+        """
+        Add series number condition to query
+        """
+        params = list()
+        if series_nums is not None:
+            if not isinstance(series_nums, (list, tuple, np.ndarray)):
+                series_nums = [series_nums]
+            series_nums = [int(series_num) for series_num in series_nums]
+            query += (' WHERE series_num IN ('
+                      + ','.join(['?']*len(series_nums)) + ')')
+            params += series_nums
+        return query, params
+
+
+
+def _scan_file(file_name):
+    """
+    Scan raw data file: file/group metadata (including first/last 
+    event dataset metadata) and event dataset "event_time" / 
+    "event_num" attributes (module function, can be used by 
+    worker processes)
+
+    Parameters
+    ----------
+    file_name : str
+      file name (full path)
+
+    Return
+    ------
+    dump_summary : dict or None
+      dump summary and metadata (None if file can't be scanned)
+
+    event_columns : dict of numpy arrays or str
+      "event_index", "event_num", "event_time" 
+      (error message if file can't be scanned)
+    """
+
+    try:
+
+        reader = h5io.H5Reader(verbose=False)
+        metadata = reader.get_metadata_summary(file_name)
+        if 'adc_list' not in metadata or not metadata['adc_list']:
+            raise ValueError('no ADC group')
+        adc_name = metadata['adc_list'][0]
+
+        # event index table (both formats)
+        index = reader.get_event_index(file_name, adc_name=adc_name)
+        event_index = index['event_index']
+        event_num = np.where(index['event_num']<0, 0, index['event_num'])
+        event_time = np.nan_to_num(index['event_time'], nan=0.)
+
+    except (OSError, KeyError, TypeError, ValueError) as err:
+        return None, str(err)
+    
+    # dump summary
+    dump_summary = dict()
+    dump_summary['series_num'] = int(metadata.get('series_num', 0))
+    dump_summary['dump_num'] = int(metadata.get('dump_num', 0))
+    dump_summary['nb_events'] = len(event_index)
+    dump_summary['first_event_time'] = None
+    dump_summary['last_event_time'] = None
+    if len(event_index)>0:
+        dump_summary['first_event_time'] = float(event_time[0])
+        dump_summary['last_event_time'] = float(event_time[-1])
+    dump_summary['metadata'] = metadata
+
+    event_columns = {'event_index': event_index,
+                     'event_num': event_num,
+                     'event_time': event_time}
+
+    return dump_summary, event_columns
+
+
+def _json_encode(value):
+    """
+    JSON encoder for numpy arrays/scalars
+    """
+    if isinstance(value, np.ndarray):
+        return {'__ndarray__': value.tolist(),
+                'dtype': value.dtype.str}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, bytes):
+        return value.decode()
+    raise TypeError('Type ' + type(value).__name__ + ' not serializable')
+
+
+def _json_decode(value):
+    """
+    JSON decoder for numpy arrays
+    """
+    if '__ndarray__' in value:
+        return np.array(value['__ndarray__'], dtype=value['dtype'])
+    return value
@@ -2,6 +2,12 @@ import os
 import pandas as pd
 import numpy as np
 from pprint import pprint
+import shutil
+import hashlib
+import copy
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 os.environ["HDF5_USE_FILE_LOCKING"] = 'FALSE'
 
 
@@ -22,10 +28,25 @@ class FilterH5IO:
     Note that parameter name with + (sum) and | (NxM) 
     are converted to natural naming with __plus__ and __and__ respectively
 
+    Session mode ("open"/"close" or context manager) keeps a single
+    file handle open. Parameters read with "get_param" are cached in
+    process (LRU cache shared by all instances, validated with file 
+    modification time/size). Copies of cached parameters are
+    returned.
     """
 
+    # parameter cache (least recently used parameter removed first)
+    # {(file, key): ((mtime, size), value, metadata)}
+    _param_cache = OrderedDict()
+    _param_cache_max_size = 128
+    _param_cache_lock = threading.Lock()
+
+    # optimal filter artifacts format version
+    _of_version = 1
     
-    def __init__(self, filter_file, verbose=True):
+    def __init__(self, filter_file, verbose=True,
+                 compression=None, compression_level=None,
+                 use_cache=True):
         """
         Initialize class
 
@@ -36,11 +57,36 @@ class FilterH5IO:
               filter file name (full path)
         verbose : Bool (optional)
               display informations (default = False)
+        compression : str (optional)
+              compression of saved parameters (byte-shuffle + codec):
+              None/'none' (default), 'gzip', 'zstd', 'lz4', 'blosc',
+              'blosc:<codec>', 'lzo', 'bzip2' (PyTables filters)
+        compression_level : int (optional)
+              compression level 1-9 (default = 5)
+        use_cache : Bool (optional)
+              cache parameters read with "get_param" (default = True).
+              Copies of cached values are returned (cache can't be
+              modified in place). Maximum number of cached parameters
+              (all files): FilterH5IO._param_cache_max_size
 
         """
 
         self._filter_file = filter_file
         self._verbose = verbose
+        self._use_cache = use_cache
+
+        # file handle (session mode: kept open until "close")
+        self._session = False
+        self._store = None
+        self._store_mode = None
+        self._store_keys = set()
+        self._store_file_id = None
+
+        # PyTables compression library/level
+        self._complib = None
+        self._complevel = None
+        self.set_compression(compression,
+                             compression_level=compression_level)
 
 
     @property
@@ -50,6 +96,74 @@ class FilterH5IO:
     @verbose.setter
     def verbose(self,value):
         self._verbose=value
+
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+        
+    def open(self):
+        """
+        Start session: a single file handle is kept open (and 
+        list of keys cached) until "close()" is called. File 
+        opened read-only, re-opened in append mode at first 
+        write. Context manager can be used instead:
+
+           with FilterH5IO(filter_file) as filter_io:
+               psd = filter_io.get_param(...)
+
+        Parameters:
+        ----------
+        None
+
+        Return:
+        ------
+        None
+        """
+
+        self._session = True
+
+
+    def close(self):
+        """
+        Stop session and close file
+ 
+        Parameters:
+        ----------
+        None
+
+        Return:
+        ------
+        None
+        """
+
+        self._session = False
+        self._close_store()
+
+
+    def clear_cache(self):
+        """
+        Remove cached parameters of filter file
+ 
+        Parameters:
+        ----------
+        None
+
+        Return:
+        ------
+        None
+        """
+
+        file_name = os.path.abspath(self._filter_file)
+        with FilterH5IO._param_cache_lock:
+            for cache_key in list(FilterH5IO._param_cache):
+                if cache_key[0]==file_name:
+                    del FilterH5IO._param_cache[cache_key]
         
        
     def set_filter_file(self, file_name):
@@ -68,9 +182,58 @@ class FilterH5IO:
 
         
         """
+        self._close_store()
         self._filter_file  = file_name
         
 
+    def set_compression(self, compression=None, compression_level=None):
+        """
+        Set compression of saved parameters (existing 
+        parameters unmodified)
+ 
+        Parameters:
+        ----------
+
+        compression : str (optional)
+              None/'none' (default), 'gzip', 'zstd', 'lz4', 'blosc',
+              'blosc:<codec>', 'lzo', 'bzip2'
+        compression_level : int (optional)
+              compression level 1-9 (default = 5)
+        
+        Return:
+        ------
+        None
+        """
+
+        # compression set when file opened
+        self._close_store()
+        
+        self._complib = None
+        self._complevel = None
+        if compression is None:
+            return
+        compression = str(compression).strip().lower()
+        if compression in ['', 'none', 'false']:
+            return
+
+        # PyTables library names
+        complib_dict = {'gzip': 'zlib', 'zlib': 'zlib',
+                        'zstd': 'blosc:zstd', 'lz4': 'blosc:lz4',
+                        'blosc': 'blosc', 'lzo': 'lzo',
+                        'bzip2': 'bzip2'}
+        if compression in complib_dict:
+            self._complib = complib_dict[compression]
+        elif compression.startswith('blosc:'):
+            self._complib = compression
+        else:
+            raise ValueError(f'ERROR: Unknown compression "{compression}" '
+                             f'for filter file!')
+
+        self._complevel = 5
+        if compression_level is not None:
+            self._complevel = int(compression_level)
+        
+
     def describe(self):
         """
         Display informations about the file content
@@ -86,7 +249,15 @@ class FilterH5IO:
 
         """
 
-        filter_file = pd.HDFStore(self._filter_file)
+        with self._open_store() as filter_file:
+            self._describe(filter_file)
+
+            
+    def _describe(self, filter_file):
+        """
+        Display informations about the file content
+        (see "describe")
+        """
 
         msg_title = 'Filter file: ' + self._filter_file + ':'
         print(msg_title)
@@ -119,8 +290,6 @@ class FilterH5IO:
                         + '\n')
                 
             print(msg)
-            
-        filter_file.close()
         
                
     
@@ -156,32 +325,45 @@ class FilterH5IO:
 
         # key name 
         key = '/' + channel + '/' + param_name
+
+        # cached value (copy)
+        cached = self._get_cached(key)
+        if cached is not None:
+            val, metadata = self._copy_param(*cached)
+            if add_metadata:
+                return val, metadata
+            else:
+                return val
         
-        # check if available
+        # check if available (single file handle)
         val = None
         metadata = None
-        if self._is_key(key):
-            val, medatata = self._get(key)
-            if (isinstance(val, pd.DataFrame)
-                and metadata and 'type' in metadata):
-                if metadata['type'] == '2darray':
-                    val = val.values
-
-        elif self._is_key(f'{key}_slice_0'):
-            _, medatata = self._get(f'{key}_slice_0')
-            dfs  = []
-            for i in range(medatata['nb_slices']):
-                df, _ =  self._get(f'{key}_slice_{i}')
-                dfs.append(df.values)
-            val =  np.stack(dfs, axis=0)
-
-        else:
-            raise ValueError(f'ERROR: parameter {param_name} for '
-                             f'channel {channel} not found in hdf5 '
-                             f'file {self._filter_file}')
+        with self._open_store():
+            
+            if self._is_key(key):
+                val, metadata = self._get(key)
+                if (isinstance(val, pd.DataFrame)
+                    and metadata and 'type' in metadata):
+                    if metadata['type'] == '2darray':
+                        val = val.to_numpy(copy=True)
+
+            elif self._is_key(f'{key}_slice_0'):
+                _, metadata = self._get(f'{key}_slice_0')
+                dfs  = []
+                for i in range(metadata['nb_slices']):
+                    df, _ =  self._get(f'{key}_slice_{i}')
+                    dfs.append(df.values)
+                val =  np.stack(dfs, axis=0)
+
+            else:
+                raise ValueError(f'ERROR: parameter {param_name} for '
+                                 f'channel {channel} not found in hdf5 '
+                                 f'file {self._filter_file}')
+
+            self._set_cached(key, val, metadata)
                 
         if add_metadata:
-            return val, medatata
+            return val, metadata
         else:
             return val
 
@@ -223,58 +405,25 @@ class FilterH5IO:
 
         """
 
-        # attributes
-        if attributes is None:
-            attributes = dict()
-        
-             
         # convert to series or dataframe(s)
-        param_value_sliced = dict()
-        if isinstance(param_value, np.ndarray):
-            
-            if param_value.ndim == 1:
-                param_value = pd.Series(param_value, param_index)
-                attributes['type'] = 'series'
-            elif param_value.ndim == 2:
-                param_value = pd.DataFrame(param_value)
-                attributes['type'] = '2darray'
-            elif param_value.ndim == 3:
-                attributes['type'] = '3darray'
-                attributes['nb_slices'] = param_value.shape[0]
-                for i in range(param_value.shape[0]):
-                    df = pd.DataFrame(param_value[i, :, :])
-                    slice_name = f'{param_name}_slice_{i}'
-                    param_value_sliced[slice_name] = df
-                    
-        elif isinstance(param_value, pd.Series):
-            attributes['type'] = 'series'
-        elif  isinstance(param_value, pd.DataFrame):
-            attributes['type'] = 'dataframe'
-        else:
-            raise ValueError(f'ERROR: Parameter "{param_name}" '
-                             f'should be eiter a numpy array'
-                             f'or pandas Series/dataFrame')
-        
+        param_values = self._convert_param(param_name, param_value,
+                                           param_index=param_index,
+                                           attributes=attributes)
 
-        if param_value_sliced:
-            for key_name, df in param_value_sliced.items():
+        # save (single file handle)
+        with self._open_store(write=True):
+            for key_name, (value, value_attributes) in param_values.items():
                 key = '/' + channel + '/' +  key_name
                 self._put(key,
-                          df,
-                          attributes=attributes,
+                          value,
+                          attributes=value_attributes,
                           overwrite=overwrite)
-        else:
-            # key name
-            key = '/' + channel + '/' + param_name
-            self._put(key,
-                      param_value,
-                      attributes=attributes,
-                      overwrite=overwrite)
 
             
     def save_fromdict(self, filter_dict, overwrite=False):
         """
-        Save parameter from dictionary 
+        Save parameter from dictionary (see also "save_bulk",
+        single transaction)
         
         Parameters:
         ----------
@@ -332,6 +481,137 @@ class FilterH5IO:
                     
 
         
+    def save_bulk(self, filter_dict, overwrite=False,
+                  replace_file=False):
+        """
+        Save parameters from dictionary (same format as 
+        "save_fromdict") in a single transaction: file opened 
+        once, keys checked once (before any write). The filter 
+        file is unmodified if an error occurs:
+
+          - new parameters only: written in existing file, 
+            parameters already written removed if an error occurs
+          - existing parameters overwritten ("overwrite=True") or
+            "replace_file=True": parameters written in a temporary 
+            file in same directory, renamed to filter file name 
+            when done (atomic replace). If parameters are 
+            overwritten, the whole filter file is copied first 
+            (cost proportional to file size).
+        
+        Parameters:
+        ----------
+        
+        filter_dict : dict (required)
+            dictionary with following format:
+              ['channel_name']
+                  ['parameter_name']: array or pandas Series/DataFrame
+                  ['parameter_name_metadata']: metadata dictionary
+                  ...
+              ['channel_name_2']
+               ...
+
+        overwrite : bool (optional, default=False)
+             overwrite existing parameter(s) in filter file 
+
+        replace_file : bool (optional, default=False)
+             if True, filter file replaced by a new file with 
+             parameters from dictionary only. If False, other 
+             parameters of existing file unmodified
+
+
+        Return:
+        ------
+
+        None
+        """
+
+        # convert all parameters first
+        params = dict()
+        for chan_name, chan_dict in filter_dict.items():
+            for param_name, val in chan_dict.items():
+                if '_metadata' in param_name:
+                    continue
+                metadata = chan_dict.get(param_name + '_metadata')
+                param_values = self._convert_param(param_name, val,
+                                                   attributes=metadata)
+                for key_name, param_value in param_values.items():
+                    key = self._convert_to_natural_naming(
+                        '/' + chan_name + '/' + key_name)
+                    params[key] = param_value
+
+        # close file handle (file replaced)
+        self._close_store()
+        file_name = os.path.abspath(self._filter_file)
+        
+        # check keys (file unmodified if already stored)
+        file_keys = set()
+        if os.path.isfile(file_name) and not replace_file:
+            with pd.HDFStore(file_name, mode='r') as filter_file:
+                file_keys = set(filter_file.keys())
+        stored_keys = [key for key in params if key in file_keys]
+        if stored_keys and not overwrite:
+            raise ValueError(
+                f'Key(s) {stored_keys} already stored in '
+                f'{self._filter_file}. Use "overwrite=True" '
+                f'to overwrite parameters or '
+                f'change file name')
+
+        try:
+
+            # new parameters only: written in existing file,
+            # removed if an error occurs
+            if file_keys and not stored_keys:
+                added_keys = list()
+                with pd.HDFStore(file_name, mode='a',
+                                 complevel=self._complevel,
+                                 complib=self._complib) as filter_file:
+                    try:
+                        for key, (value, attributes) in params.items():
+                            added_keys.append(key)
+                            self._put_bulk(filter_file, key, value,
+                                           attributes)
+                    except BaseException:
+                        for key in added_keys:
+                            if key in filter_file:
+                                filter_file.remove(key)
+                        raise
+                return
+
+            # temporary file (existing file copied if parameters
+            # overwritten), then replace
+            temp_file = f'{file_name}.{os.getpid()}.tmp'
+            mode = 'w'
+            try:
+                if file_keys:
+                    shutil.copyfile(file_name, temp_file)
+                    shutil.copymode(file_name, temp_file)
+                    mode = 'a'
+                with pd.HDFStore(temp_file, mode=mode,
+                                 complevel=self._complevel,
+                                 complib=self._complib) as filter_file:
+                    for key, (value, attributes) in params.items():
+                        self._put_bulk(filter_file, key, value, attributes)
+                os.replace(temp_file, file_name)
+            finally:
+                if os.path.isfile(temp_file):
+                    os.remove(temp_file)
+            
+        finally:
+            self.clear_cache()
+
+
+    def _put_bulk(self, filter_file, key, value, attributes):
+        """
+        Store converted parameter (see "save_bulk"), 
+        file already open
+        """
+
+        if self._verbose:
+            print(f'INFO: Storing {key} in {self._filter_file}')
+        filter_file.put(key, value, format='fixed')
+        filter_file.get_storer(key).attrs.metadata = attributes
+
+                    
     def load(self):
         """
         Load filter file into dictionary
@@ -364,10 +644,520 @@ class FilterH5IO:
 
         output_dict = dict()
 
-        # open file and key list of keys
-        filter_file = pd.HDFStore(self._filter_file)
-        file_keys = filter_file.keys()
-        filter_file.close()
+        # open file (kept open while loading) and get 
+        # list of keys
+        with self._open_store():
+            output_dict = self._load()
+
+        return output_dict
+
+
+    def load_arrays(self, channels=None, param_names=None,
+                    add_index=False):
+        """
+        Load filter file (or selected channels/parameters) 
+        into dictionary of numpy arrays (no pandas Series/DataFrame 
+        conversion). File opened once. 
+
+              
+        Parameters:
+        ----------
+        
+        channels : str or list (optional, default=None)
+             channel name(s), None = all channels
+
+        param_names : str or list (optional, default=None)
+             parameter name(s), None = all parameters
+
+        add_index : bool (optional, default=False)
+             if True, add parameter index (such as frequencies or 
+             time) as "[parameter_name]_index" 
+
+
+        Return:
+        -------
+
+        filter_dict : dict
+             dictionary with following format:
+              ['channel_name']
+                  ['parameter_name']: numpy array
+                  ['parameter_name_metadata']: metadata dictionary
+                  ['parameter_name_index']: numpy array (if add_index)
+                  ...
+              ['channel_name_2']
+               ...
+
+        """
+
+        if isinstance(channels, str):
+            channels = [channels]
+        if isinstance(param_names, str):
+            param_names = [param_names]
+
+        output_dict = dict()
+        slices = dict()
+        
+        with self._open_store() as filter_file:
+
+            for key in sorted(self._store_keys):
+
+                # split channel / parameter name
+                key_split = self._convert_from_natural_naming(key).split('/')
+                if len(key_split) != 3:
+                    continue
+                channel = key_split[1]
+                param_name = key_split[2]
+
+                # 3D arrays slices
+                slice_num = None
+                name, sep, num = param_name.rpartition('_slice_')
+                if sep and num.isdigit():
+                    param_name = name
+                    slice_num = int(num)
+                    
+                # selection
+                if channels is not None and channel not in channels:
+                    continue
+                if param_names is not None and param_name not in param_names:
+                    continue
+
+                # read
+                storer = filter_file.get_storer(key)
+                val = storer.read()
+                metadata = None
+                if 'metadata' in storer.attrs:
+                    metadata = storer.attrs.metadata
+
+                if channel not in output_dict:
+                    output_dict[channel] = dict()
+                    
+                if slice_num is not None:
+                    slices.setdefault((channel, param_name), dict())[
+                        slice_num] = val.to_numpy()
+                else:
+                    output_dict[channel][param_name] = val.to_numpy()
+                if (slice_num is None or slice_num==0):
+                    output_dict[channel][param_name + '_metadata'] = metadata
+                if add_index and slice_num is None:
+                    output_dict[channel][param_name + '_index'] = (
+                        val.index.to_numpy())
+
+        # stack slices
+        for (channel, param_name), arrays in slices.items():
+            output_dict[channel][param_name] = np.stack(
+                [arrays[i] for i in sorted(arrays)], axis=0)
+        
+        return output_dict
+
+    
+    def calc_of_artifacts(self, channel, tag='default',
+                          nb_samples=None, nb_pretrigger_samples=None,
+                          sample_rate=None, coupling='AC',
+                          psd_name=None, template_name=None,
+                          save=True, overwrite=True):
+        """
+        Compute optimal filter (OF) artifacts from stored noise PSD
+        and template (same conventions as qetpy "OptimumFilter") 
+        and save them in filter file:
+
+          "of_template_fft_[tag]_N[nb_samples]_P[nb_pretrigger_samples]":
+                template FFT s(f) = fft(template)/N/df
+          "of_psd_inv_[tag]_N..._P...": 
+                inverse two-sided PSD 1/J(f), folded frequencies 
+                (0 to fs/2), DC = 0 if AC coupling
+          "of_kernel_[tag]_N..._P...": 
+                time domain kernel k(t): OF amplitude (no delay) 
+                = sum(k*trace)
+        
+        OF normalization, lengths, sample rate and input PSD/template
+        fingerprint ("source_id") are stored as metadata of each 
+        artifact (see "get_of_artifacts").
+        
+        Parameters:
+        ----------
+        
+        channel : str (required)
+             channel name
+
+        tag : str (optional, default='default')
+             PSD/template tag
+
+        nb_samples : int (optional)
+             trace length (default: PSD length)
+
+        nb_pretrigger_samples : int (optional)
+             trace pretrigger length (default: template 
+             "nb_pretrigger_samples" metadata). Template is cropped 
+             based on trace length and pretrigger length.
+
+        sample_rate : float (optional)
+             sample rate (default: PSD/template "sample_rate" 
+             metadata or PSD frequencies)
+
+        coupling : str (optional, default='AC')
+             if 'AC', PSD zero frequency bin ignored
+
+        psd_name : str (optional)
+             PSD parameter name (default: "psd_[tag]", or 
+             folded PSD "psd_fold_[tag]")
+        
+        template_name : str (optional)
+             template parameter name (default: "template_[tag]")
+
+        save : bool (optional, default=True)
+             save artifacts in filter file
+
+        overwrite : bool (optional, default=True)
+             overwrite existing artifacts
+
+        Return:
+        ------
+
+        artifacts : dict
+             "template_fft", "psd_inv", "kernel" (numpy arrays), 
+             "norm" and "metadata"
+        """
+
+        # PSD (two-sided) and template cropped to trace length
+        (psd, template, sample_rate, nb_samples, nb_pretrigger_samples,
+         psd_name, template_name) = self._get_of_inputs(
+             channel, tag, nb_samples=nb_samples,
+             nb_pretrigger_samples=nb_pretrigger_samples,
+             sample_rate=sample_rate, psd_name=psd_name,
+             template_name=template_name)
+        
+        # OF quantities
+        df = sample_rate/nb_samples
+        template_fft = np.fft.fft(template)/nb_samples/df
+        psd_of = psd.copy()
+        if coupling=='AC':
+            psd_of[0] = np.inf
+        phi = template_fft.conjugate()/psd_of
+        norm = float(np.real(np.dot(phi, template_fft))*df)
+        kernel = np.real(np.fft.fft(phi))/nb_samples/norm
+        psd_inv = 1/psd_of[:nb_samples//2+1]
+
+        # metadata
+        metadata = {'version': self._of_version,
+                    'norm': norm,
+                    'sample_rate': sample_rate,
+                    'nb_samples': int(nb_samples),
+                    'nb_pretrigger_samples': nb_pretrigger_samples,
+                    'coupling': str(coupling),
+                    'psd_name': psd_name,
+                    'template_name': template_name,
+                    'source_id': self._get_of_source_id(
+                        psd, template, sample_rate, coupling)}
+        
+        artifacts = {'template_fft': template_fft,
+                     'psd_inv': psd_inv,
+                     'kernel': kernel,
+                     'norm': norm,
+                     'metadata': metadata}
+        
+        # save
+        if save:
+            indices = {
+                'template_fft': np.fft.fftfreq(nb_samples, d=1/sample_rate),
+                'psd_inv': np.fft.rfftfreq(nb_samples, d=1/sample_rate),
+                'kernel': (np.arange(nb_samples)-nb_pretrigger_samples)/sample_rate}
+            with self._open_store(write=True):
+                for name, index in indices.items():
+                    param_name = self._get_of_param_name(
+                        name, tag, nb_samples, nb_pretrigger_samples)
+                    self.save_param(channel, param_name, artifacts[name],
+                                    param_index=index,
+                                    attributes=dict(metadata),
+                                    overwrite=overwrite)
+                
+        return artifacts
+
+
+    def get_of_artifacts(self, channel, tag='default',
+                         nb_samples=None, nb_pretrigger_samples=None,
+                         names=None, check_source=False):
+        """
+        Load optimal filter artifacts (see "calc_of_artifacts"). 
+        Only requested artifacts are read (cached, see "get_param"). 
+        Arrays and metadata are copies: they can be modified
+        without changing cached artifacts.
+
+        Parameters:
+        ----------
+        
+        channel : str (required)
+             channel name
+
+        tag : str (optional, default='default')
+             PSD/template tag
+
+        nb_samples, nb_pretrigger_samples : int (optional)
+             trace and pretrigger lengths, not needed if single 
+             version stored for channel/tag (file not opened if
+             provided and artifacts cached)
+        
+        names : str or list (optional)
+             "template_fft", "psd_inv" and/or "kernel"
+             (default: all)
+
+        check_source : bool (optional, default=False)
+             if True, fingerprint of stored PSD/template compared 
+             with artifacts "source_id" (PSD and template read): 
+             artifacts re-calculated and saved if PSD or template
+             changed
+
+        Return:
+        ------
+
+        artifacts : dict
+             requested artifacts (numpy arrays), plus "norm"
+             and "metadata"
+        """
+
+        if names is None:
+            names = ['template_fft', 'psd_inv', 'kernel']
+        elif isinstance(names, str):
+            names = [names]
+            
+        # all artifacts cached: file not opened
+        is_cached = False
+        if nb_samples is not None and nb_pretrigger_samples is not None:
+            is_cached = all(
+                self._get_cached('/' + channel + '/' + self._get_of_param_name(
+                    name, tag, nb_samples, nb_pretrigger_samples)) is not None
+                for name in names)
+        
+        artifacts = dict()
+        with (nullcontext() if is_cached
+              else self._open_store()):
+
+            # trace/pretrigger lengths
+            if nb_samples is None or nb_pretrigger_samples is None:
+                nb_samples, nb_pretrigger_samples = self._find_of_lengths(
+                    channel, tag, names[0], nb_samples=nb_samples,
+                    nb_pretrigger_samples=nb_pretrigger_samples)
+
+            for name in names:
+                param_name = self._get_of_param_name(
+                    name, tag, nb_samples, nb_pretrigger_samples)
+                val, metadata = self.get_param(channel, param_name,
+                                               add_metadata=True)
+                artifacts[name] = np.array(val)
+
+        if metadata.get('version')!=self._of_version:
+            print(f'WARNING: OF artifacts for channel {channel} (tag '
+                  f'{tag}) stored with version {metadata.get("version")} '
+                  f'(current version {self._of_version}). Use '
+                  '"calc_of_artifacts" to update!')
+
+        # PSD/template changed: re-calculate
+        if check_source:
+            psd, template, sample_rate = self._get_of_inputs(
+                channel, tag, nb_samples=nb_samples,
+                nb_pretrigger_samples=nb_pretrigger_samples,
+                sample_rate=metadata['sample_rate'],
+                psd_name=metadata.get('psd_name'),
+                template_name=metadata.get('template_name'))[:3]
+            source_id = self._get_of_source_id(psd, template, sample_rate,
+                                               metadata['coupling'])
+            if source_id!=metadata.get('source_id'):
+                if self._verbose:
+                    print(f'INFO: PSD/template changed for channel {channel}'
+                          f' (tag {tag}). Re-calculating OF artifacts!')
+                new_artifacts = self.calc_of_artifacts(
+                    channel, tag=tag, nb_samples=nb_samples,
+                    nb_pretrigger_samples=nb_pretrigger_samples,
+                    sample_rate=metadata['sample_rate'],
+                    coupling=metadata['coupling'],
+                    psd_name=metadata.get('psd_name'),
+                    template_name=metadata.get('template_name'))
+                artifacts = {name: new_artifacts[name] for name in names}
+                metadata = new_artifacts['metadata']
+                
+        artifacts['norm'] = metadata['norm']
+        artifacts['metadata'] = metadata
+        
+        return artifacts
+
+    
+    def _get_of_inputs(self, channel, tag, nb_samples=None,
+                       nb_pretrigger_samples=None, sample_rate=None,
+                       psd_name=None, template_name=None):
+        """
+        Get OF inputs (see "calc_of_artifacts"): two-sided PSD, 
+        template cropped to trace length, sample rate, trace/
+        pretrigger lengths, PSD/template parameter names
+        """
+
+        with self._open_store():
+            psd, psd_metadata, psd_name, psd_df = self._get_of_psd(
+                channel, tag, psd_name=psd_name, nb_samples=nb_samples)
+            if template_name is None:
+                template_name = 'template_' + tag
+            template, template_metadata = self.get_param(
+                channel, template_name, add_metadata=True)
+        if psd_metadata is None:
+            psd_metadata = dict()
+        if template_metadata is None:
+            template_metadata = dict()
+
+        # sample rate
+        if sample_rate is None:
+            sample_rate = psd_metadata.get(
+                'sample_rate', template_metadata.get('sample_rate'))
+        if sample_rate is None and psd_df is not None:
+            sample_rate = len(psd)*psd_df
+        if sample_rate is None:
+            raise ValueError('ERROR: Sample rate not available for '
+                             f'channel {channel}. Use "sample_rate" '
+                             'argument!')
+        sample_rate = float(sample_rate)
+        
+        # PSD (two-sided)
+        psd = np.asarray(psd, dtype=np.float64)
+        if nb_samples is None:
+            nb_samples = len(psd)
+        elif nb_samples!=len(psd):
+            raise ValueError(f'ERROR: PSD length ({len(psd)}) different '
+                             f'from trace length ({nb_samples})!')
+
+        # template cropped to trace length/pretrigger
+        template = np.asarray(template, dtype=np.float64)
+        template_pretrigger = template_metadata.get('nb_pretrigger_samples')
+        if nb_pretrigger_samples is None:
+            nb_pretrigger_samples = template_pretrigger
+        if nb_pretrigger_samples is None:
+            raise ValueError('ERROR: Template pretrigger length not '
+                             f'available for channel {channel}. Use '
+                             '"nb_pretrigger_samples" argument!')
+        nb_pretrigger_samples = int(nb_pretrigger_samples)
+        start = 0
+        if template_pretrigger is not None:
+            start = int(template_pretrigger)-nb_pretrigger_samples
+        if start<0 or start+nb_samples>len(template):
+            raise ValueError('ERROR: Unable to crop template (length '
+                             f'{len(template)}) to trace length '
+                             f'{nb_samples} with pretrigger length '
+                             f'{nb_pretrigger_samples}!')
+        template = template[start:start+nb_samples]
+
+        return (psd, template, sample_rate, nb_samples,
+                nb_pretrigger_samples, psd_name, template_name)
+
+
+    def _get_of_source_id(self, psd, template, sample_rate, coupling):
+        """
+        Fingerprint of OF inputs (PSD, cropped template, 
+        sample rate, coupling)
+        """
+
+        source_id = hashlib.sha1()
+        for val in [psd, template, sample_rate, coupling]:
+            source_id.update(np.asarray(val).tobytes())
+        return source_id.hexdigest()[:16]
+
+    
+    def _get_of_param_name(self, name, tag, nb_samples,
+                           nb_pretrigger_samples):
+        """
+        OF artifact parameter name
+        """
+
+        return f'of_{name}_{tag}_N{int(nb_samples)}_P{int(nb_pretrigger_samples)}'
+
+
+    def _find_of_lengths(self, channel, tag, name, nb_samples=None,
+                         nb_pretrigger_samples=None):
+        """
+        Find trace/pretrigger lengths of stored OF artifacts 
+        (error if not unique)
+        """
+
+        prefix = self._convert_to_natural_naming(
+            f'/{channel}/of_{name}_{tag}_N')
+        lengths = list()
+        for key in self._store_keys:
+            if not key.startswith(prefix):
+                continue
+            try:
+                nb_samples_key, nb_pretrigger_key = (
+                    key[len(prefix):].split('_P'))
+                nb_samples_key = int(nb_samples_key)
+                nb_pretrigger_key = int(nb_pretrigger_key)
+            except ValueError:
+                continue
+            if ((nb_samples is None or nb_samples==nb_samples_key)
+                and (nb_pretrigger_samples is None
+                     or nb_pretrigger_samples==nb_pretrigger_key)):
+                lengths.append((nb_samples_key, nb_pretrigger_key))
+
+        if not lengths:
+            raise ValueError(f'ERROR: No OF artifacts found for channel '
+                             f'{channel} (tag {tag}). Use '
+                             f'"calc_of_artifacts" first!')
+        if len(lengths)>1:
+            raise ValueError(f'ERROR: Multiple OF artifacts found for '
+                             f'channel {channel} (tag {tag}). Use '
+                             f'"nb_samples"/"nb_pretrigger_samples" '
+                             f'arguments!')
+        return lengths[0]
+
+    
+    def _get_of_psd(self, channel, tag, psd_name=None, nb_samples=None):
+        """
+        Get two-sided PSD for OF calculation: "psd_[tag]" or 
+        folded PSD "psd_fold_[tag]" (unfolded), metadata, parameter
+        name and frequency resolution (None if not available)
+        """
+
+        # parameter name
+        psd_names = [psd_name]
+        if psd_name is None:
+            psd_names = ['psd_' + tag, 'psd_fold_' + tag]
+        for psd_name in psd_names:
+            key = self._convert_to_natural_naming(
+                '/' + channel + '/' + psd_name)
+            if key in self._store_keys or psd_name==psd_names[-1]:
+                break
+        psd, metadata = self.get_param(channel, psd_name,
+                                       add_metadata=True)
+
+        # frequency resolution
+        df = None
+        if isinstance(psd, pd.Series) and len(psd)>1:
+            df = float(psd.index[1]-psd.index[0])
+        
+        # unfold
+        is_folded = 'fold' in psd_name
+        if metadata is not None and 'fold' in metadata:
+            is_folded = bool(metadata['fold'])
+        if is_folded:
+            psd_fold = np.asarray(psd, dtype=np.float64)
+            if nb_samples is None:
+                nb_samples = 2*(len(psd_fold)-1)
+            if nb_samples//2+1!=len(psd_fold):
+                raise ValueError(f'ERROR: Folded PSD length '
+                                 f'({len(psd_fold)}) inconsistent with '
+                                 f'trace length ({nb_samples})!')
+            psd_two_sided = np.zeros(nb_samples)
+            psd_two_sided[:len(psd_fold)] = psd_fold
+            nb_doubled = (nb_samples-1)//2
+            psd_two_sided[1:nb_doubled+1] /= 2
+            psd_two_sided[nb_samples-nb_doubled:] = (
+                psd_two_sided[1:nb_doubled+1][::-1])
+            psd = psd_two_sided
+
+        return np.asarray(psd, dtype=np.float64), metadata, psd_name, df
+
+
+    def _load(self):
+        """
+        Load filter file into dictionary (see "load"),
+        file already open
+        """
+
+        output_dict = dict()
+        file_keys = sorted(self._store_keys)
                 
         # loop keys to deal with sliced data
         list_of_keys = [] 
@@ -411,6 +1201,58 @@ class FilterH5IO:
         return  output_dict
 
         
+    def _convert_param(self, param_name, param_value,
+                       param_index=None, attributes=None):
+        """
+        Convert parameter to pandas Series/DataFrame(s) 
+        (see "save_param"). 3D arrays are split into 
+        "[param_name]_slice_[i]" DataFrames.
+
+        Return:
+        ------
+
+        param_values : dict
+             {name: (pandas Series or DataFrame, attributes)}
+        """
+
+        # attributes (copy)
+        if attributes is None:
+            attributes = dict()
+        else:
+            attributes = dict(attributes)
+        
+        # convert to series or dataframe(s)
+        param_values = dict()
+        if isinstance(param_value, np.ndarray):
+            
+            if param_value.ndim == 1:
+                param_value = pd.Series(param_value, param_index)
+                attributes['type'] = 'series'
+            elif param_value.ndim == 2:
+                param_value = pd.DataFrame(param_value)
+                attributes['type'] = '2darray'
+            elif param_value.ndim == 3:
+                attributes['type'] = '3darray'
+                attributes['nb_slices'] = param_value.shape[0]
+                for i in range(param_value.shape[0]):
+                    df = pd.DataFrame(param_value[i, :, :])
+                    slice_name = f'{param_name}_slice_{i}'
+                    param_values[slice_name] = (df, attributes)
+                return param_values
+                    
+        elif isinstance(param_value, pd.Series):
+            attributes['type'] = 'series'
+        elif  isinstance(param_value, pd.DataFrame):
+            attributes['type'] = 'dataframe'
+        else:
+            raise ValueError(f'ERROR: Parameter "{param_name}" '
+                             f'should be eiter a numpy array'
+                             f'or pandas Series/dataFrame')
+
+        param_values[param_name] = (param_value, attributes)
+        return param_values
+    
+        
     def _put(self, key, value, attributes=None, overwrite=False):
         """
         Save parameter in hdf5 file
@@ -438,33 +1280,32 @@ class FilterH5IO:
       
         """
         
-        # open file
-        filter_file = pd.HDFStore(self._filter_file)
+        # open file (compression filters applied to arrays,
+        # including byte-shuffle)
+        with self._open_store(write=True) as filter_file:
 
-        # verbose
-        if self._verbose:
-            print(f'INFO: Storing {key} in {self._filter_file}')
+            # verbose
+            if self._verbose:
+                print(f'INFO: Storing {key} in {self._filter_file}')
 
-        # modify key to have  "natural naming"
-        key_natural = self._convert_to_natural_naming(key)
+            # modify key to have  "natural naming"
+            key_natural = self._convert_to_natural_naming(key)
                     
-        # check if key exist already
-        file_keys = filter_file.keys()
-        if (key_natural in file_keys and not overwrite):
-            raise ValueError(f'Key {key} already stored in '
-                             f'{self._filter_file}. Use "overwrite=True" '
-                             f'to overwrite parameter or '
-                             f'change file name')
+            # check if key exist already
+            if (key_natural in self._store_keys and not overwrite):
+                raise ValueError(f'Key {key} already stored in '
+                                 f'{self._filter_file}. Use "overwrite=True" '
+                                 f'to overwrite parameter or '
+                                 f'change file name')
 
-        # save
-        filter_file.put(key_natural, value, format='fixed')
+            # save
+            filter_file.put(key_natural, value, format='fixed')
+            self._store_keys.add(key_natural)
+            self.clear_cache()
 
-        # add attributes
-        if attributes is not None:
-            filter_file.get_storer(key_natural).attrs.metadata = attributes
-
-        # close
-        filter_file.close()
+            # add attributes
+            if attributes is not None:
+                filter_file.get_storer(key_natural).attrs.metadata = attributes
 
 
         
@@ -492,32 +1333,25 @@ class FilterH5IO:
 
         """
 
-        # open file
-        filter_file = pd.HDFStore(self._filter_file)
+        with self._open_store() as filter_file:
 
-        # modify key to have  "natural naming"
-        key_natural = self._convert_to_natural_naming(key)
-        
-        # check key
-        file_keys = filter_file.keys()
+            # modify key to have  "natural naming"
+            key_natural = self._convert_to_natural_naming(key)
         
-        if key_natural not in file_keys:
-            raise ValueError(f'Key {key} is not in  '
-                             f'{self._filter_file}. '
-                             f'Check file with "describe()"')
+            # check key
+            if key_natural not in self._store_keys:
+                raise ValueError(f'Key {key} is not in  '
+                                 f'{self._filter_file}. '
+                                 f'Check file with "describe()"')
 
-        # get
-        value = filter_file.get(key_natural)
+            # get
+            value = filter_file.get(key_natural)
 
-        # get attributes
-        metadata = None
-        attributes = filter_file.get_storer(key_natural).attrs
-        if 'metadata' in attributes:
-            metadata = filter_file.get_storer(key_natural).attrs.metadata 
-
-            
-        # close
-        filter_file.close()
+            # get attributes
+            metadata = None
+            attributes = filter_file.get_storer(key_natural).attrs
+            if 'metadata' in attributes:
+                metadata = attributes.metadata 
 
         return value, metadata
     
@@ -543,26 +1377,154 @@ class FilterH5IO:
 
         """
 
-        # open file
-        filter_file = pd.HDFStore(self._filter_file)
-
-
         # modify key to have  "natural naming"
         key_natural = self._convert_to_natural_naming(key)
-        
-        # check key
-        file_keys = filter_file.keys()
 
-        is_key = False
-        if key_natural in file_keys:
-            is_key = True
-
-
-        # close
-        filter_file.close()
+        # check key (list of keys cached when file opened)
+        with self._open_store():
+            is_key = key_natural in self._store_keys
             
         return is_key
 
+
+    @contextmanager
+    def _open_store(self, write=False):
+        """
+        Context manager: get file handle (pandas HDFStore). 
+        Handle closed on exit, unless session mode or already 
+        opened by caller.
+
+        Parameters:
+        ----------
+
+        write : bool (optional, default=False)
+             open file in append mode (created if needed)
+
+        Return:
+        ------
+
+        filter_file : pandas HDFStore
+        """
+
+        is_open = self._store is not None
+        filter_file = self._get_store(write=write)
+        try:
+            yield filter_file
+        finally:
+            if not self._session and not is_open:
+                self._close_store()
+
+                
+    def _get_store(self, write=False):
+        """
+        Get file handle, (re)open file if needed: not yet 
+        open, write needed for read-only handle, or file 
+        modified (read-only handle)
+        """
+
+        if self._store is not None:
+            if self._store_mode=='a':
+                return self._store
+            if (not write
+                and self._get_file_id()==self._store_file_id):
+                return self._store
+            self._close_store()
+
+        mode = 'a'
+        if not write and os.path.isfile(self._filter_file):
+            mode = 'r'
+        self._store = pd.HDFStore(self._filter_file, mode=mode,
+                                  complevel=self._complevel,
+                                  complib=self._complib)
+        self._store_mode = mode
+        self._store_keys = set(self._store.keys())
+        self._store_file_id = self._get_file_id()
+        return self._store
+
+    
+    def _close_store(self):
+        """
+        Close file handle
+        """
+
+        if self._store is not None:
+            self._store.close()
+        self._store = None
+        self._store_mode = None
+        self._store_keys = set()
+        self._store_file_id = None
+
+
+    def _get_file_id(self):
+        """
+        File modification time and size (None if
+        file doesn't exist)
+        """
+
+        try:
+            file_stat = os.stat(self._filter_file)
+        except OSError:
+            return None
+        return (file_stat.st_mtime_ns, file_stat.st_size)
+
+    
+    def _get_cached(self, key):
+        """
+        Get cached (value, metadata) of a parameter (not copied), 
+        None if not cached or file modified
+        """
+
+        if not self._use_cache:
+            return None
+
+        cache_key = (os.path.abspath(self._filter_file), key)
+        file_id = self._get_file_id()
+        with FilterH5IO._param_cache_lock:
+            cached = FilterH5IO._param_cache.get(cache_key)
+            if cached is None:
+                return None
+            if cached[0]!=file_id:
+                del FilterH5IO._param_cache[cache_key]
+                return None
+            FilterH5IO._param_cache.move_to_end(cache_key)
+        return cached[1], cached[2]
+
+    
+    def _set_cached(self, key, value, metadata):
+        """
+        Cache parameter (copy of value and metadata), least
+        recently used parameters removed if cache full
+        """
+
+        if not self._use_cache:
+            return
+
+        # file being written (session in append mode): 
+        # modification time/size not final
+        if self._store_mode=='a':
+            return
+        
+        cache_key = (os.path.abspath(self._filter_file), key)
+        value, metadata = self._copy_param(value, metadata)
+        file_id = self._get_file_id()
+        with FilterH5IO._param_cache_lock:
+            FilterH5IO._param_cache[cache_key] = (file_id, value, metadata)
+            FilterH5IO._param_cache.move_to_end(cache_key)
+            while (len(FilterH5IO._param_cache)
+                   >max(FilterH5IO._param_cache_max_size, 0)):
+                FilterH5IO._param_cache.popitem(last=False)
+
+
+    def _copy_param(self, value, metadata):
+        """
+        Copy of parameter value (numpy array, pandas Series/
+        DataFrame) and metadata
+        """
+
+        if isinstance(value, (np.ndarray, pd.Series, pd.DataFrame)):
+            value = value.copy()
+        return value, copy.deepcopy(metadata)
+
     
     def _convert_to_natural_naming(self, key):
         """
@@ -8,12 +8,28 @@ import stat
 import matplotlib.pyplot as plt
 import warnings
 import copy
+import time
+import weakref
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from pytesdaq.utils import connection_utils
+from pytesdaq.utils import calibration
 os.environ["HDF5_USE_FILE_LOCKING"] = 'FALSE'
 
-__all__ = ['H5Reader', 'H5Writer',
+# optional: HDF5 compression plugins (lz4, zstd, blosc, 
+# bitshuffle), registered when imported
+try:
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
+
+__all__ = ['H5Reader', 'H5Writer', 'AsyncH5Writer',
            'extract_series_num', 'extract_series_name',
-           'extract_dump_num',
+           'extract_dump_num', 'convert_file_format',
+           'build_virtual_dataset',
+           'get_compression_filter',
            'convert_length_msec_to_samples']
 
 def extract_series_num(series_name):
@@ -145,6 +161,99 @@ def convert_length_msec_to_samples(trace_length_msec, fs):
 
     nb_samples = int(round(fs*trace_length_msec/1000))
     return nb_samples
+
+
+def get_compression_filter(compression=None, compression_level=None,
+                           shuffle=True):
+    """
+    Get h5py dataset creation arguments for a compression 
+    filter
+
+    Parameters
+    ----------
+    compression : str, optional
+      compression filter:
+        None or 'none': no compression (default)
+        'gzip', 'lzf': built-in HDF5/h5py filters
+        'lz4', 'zstd', 'blosc', 'blosc:<codec>' (codec = lz4, 
+        lz4hc, zstd, zlib, blosclz), 'bitshuffle': plugin 
+        filters (require "hdf5plugin" package)
+
+    compression_level : int, optional
+      compression level (gzip: 0-9, default 4, zstd: 1-22, 
+      default 3, blosc: 0-9, default 5), not used for other
+      filters
+
+    shuffle : bool, optional
+      if True, apply byte-shuffle filter before compression 
+      (blosc: internal byte-shuffle, bitshuffle: always 
+      bit-shuffled)
+      default: True
+
+    Return
+    ------
+    filter_kwargs : dict
+      h5py "create_dataset" arguments (empty if no compression)
+    """
+
+    if compression is None:
+        return dict()
+    
+    compression = str(compression).strip().lower()
+    if compression in ['', 'none', 'false']:
+        return dict()
+
+    if compression_level is not None:
+        compression_level = int(compression_level)
+
+    # built-in filters
+    if compression=='gzip':
+        if compression_level is None:
+            compression_level = 4
+        return {'compression': 'gzip',
+                'compression_opts': compression_level,
+                'shuffle': bool(shuffle)}
+    
+    if compression=='lzf':
+        return {'compression': 'lzf',
+                'shuffle': bool(shuffle)}
+
+    # plugin filters
+    codec = None
+    if compression.startswith('blosc'):
+        codec = 'lz4'
+        if ':' in compression:
+            compression, codec = compression.split(':', 1)
+            
+    if compression not in ['lz4', 'zstd', 'blosc', 'bitshuffle']:
+        raise ValueError('ERROR: Unknown compression filter "'
+                         + compression + '"!')
+    if hdf5plugin is None:
+        raise ValueError('ERROR: Compression filter "' + compression
+                         + '" requires "hdf5plugin" package!')
+
+    filter_kwargs = dict()
+    if compression=='lz4':
+        filter_kwargs = dict(hdf5plugin.LZ4())
+        filter_kwargs['shuffle'] = bool(shuffle)
+    elif compression=='zstd':
+        if compression_level is None:
+            compression_level = 3
+        filter_kwargs = dict(hdf5plugin.Zstd(clevel=compression_level))
+        filter_kwargs['shuffle'] = bool(shuffle)
+    elif compression=='blosc':
+        if compression_level is None:
+            compression_level = 5
+        blosc_shuffle = hdf5plugin.Blosc.NOSHUFFLE
+        if shuffle:
+            blosc_shuffle = hdf5plugin.Blosc.SHUFFLE
+        filter_kwargs = dict(hdf5plugin.Blosc(cname=codec,
+                                              clevel=compression_level,
+                                              shuffle=blosc_shuffle))
+    else:
+        filter_kwargs = dict(hdf5plugin.Bitshuffle(cname='lz4'))
+
+    return filter_kwargs
     
 
 
@@ -155,7 +264,8 @@ class H5Reader:
     """
     
     
-    def __init__(self, raise_errors=True, verbose=True):
+    def __init__(self, raise_errors=True, verbose=True, use_memmap=False,
+                 read_strategy='auto'):
         """
         Initialize H5Reader
 
@@ -168,6 +278,21 @@ class H5Reader:
         verbose : boolean, optional
           if True, display messages (default)
         
+        use_memmap : boolean, optional
+          if True, raw data of contiguous (not chunked/compressed)
+          event datasets are accessed through a read-only memory
+          map of the file (see "read_event_view"), instead of 
+          HDF5 reads. 
+          default: False
+
+        read_strategy : str, optional
+          HDF5 channel read strategy:
+            'auto': choose based on channel selection (default)
+            'full': read all channels in a single call then
+                    select channels (fancy indexing)
+            'hyperslab': read selected channels in a single call
+                    (union of hyperslabs)
+            'rows': one read call per selected channel
         
         Return
         ------
@@ -177,6 +302,27 @@ class H5Reader:
 
         self._raise_errors = raise_errors
         self._verbose = verbose
+        self._use_memmap = use_memmap
+
+        # HDF5 read strategy
+        if read_strategy not in ['auto', 'full', 'hyperslab', 'rows']:
+            raise ValueError('ERROR: Unknown read strategy "'
+                             + str(read_strategy) + '"!')
+        self._read_strategy = read_strategy
+        
+        # "auto" strategy: full read if fraction of selected
+        # channels above threshold
+        self._full_read_fraction = 0.25
+
+        # buffer for full reads (reused)
+        self._read_buffer = None
+
+        # series catalog (see "set_catalog")
+        self._catalog = None
+
+        # event index tables 
+        # {(file, adc_name): (mtime, series_num, index)}
+        self._event_index_cache = dict()
         
         # file dictionary {file: list of event dict}
         self._file_dict = dict()
@@ -188,6 +334,17 @@ class H5Reader:
         self._current_file_nb_events = 0
         self._current_file_event_counter = 0
         self._current_file_event_list = None
+
+        # current file cache (metadata, connections, detector
+        # config, channel selections) {adc_name: dict}
+        self._current_file_cache = dict()
+
+        # current file memory map (if "use_memmap"=True)
+        self._current_file_memmap = None
+
+        # current file event layout {adc_name: dict}
+        # (see "_get_event_layout")
+        self._current_file_layout = dict()
              
         # global trigger counter (same as "event"
         # when entire trace used)
@@ -196,7 +353,35 @@ class H5Reader:
         # global file counter
         self._file_counter = 0
 
+        # read-ahead (prefetch) thread, disabled if
+        # number of prefetched events = 0
+        self._prefetch_nb_events = 0
+        self._prefetcher = None
+        self._prefetch_read_args = None
+        self._prefetch_stats = None
+        self._reset_prefetch_stats()
+
+        
+    def set_catalog(self, catalog):
+        """
+        Set series catalog (see pytesdaq.io.SeriesCatalog): 
+        file/group metadata of files in catalog are taken from 
+        the catalog instead of opening files ("get_metadata" 
+        without dataset metadata, "read_many_events" checks)
+
+        Parameters
+        ----------
+        catalog : SeriesCatalog or None
+          catalog of a group directory (None: no catalog)
+
+        Return
+        ------
+        None
+        """
         
+        self._catalog = catalog
+        
+
     def set_files(self, filepaths, series=None, event_list=None):
         """
 
@@ -225,7 +410,8 @@ class H5Reader:
         ------
         None
         """
-        
+
+        self._stop_prefetch()
         self._close_file()
 
 
@@ -245,7 +431,8 @@ class H5Reader:
 
         """
 
-        # close current file
+        # stop read-ahead thread and close current file
+        self._stop_prefetch()
         self._close_file()
 
         # initialize 
@@ -255,6 +442,9 @@ class H5Reader:
         self._current_file_nb_events = 0
         self._current_file_event_counter = 0
         self._current_file_event_list = None
+        self._current_file_cache = dict()
+        self._current_file_memmap = None
+        self._current_file_layout = dict()
         self._file_counter = 0
         self._global_events_counter = 0
 
@@ -274,11 +464,12 @@ class H5Reader:
         None
         """
                 
-        # if multiple files -> close current file then reopen first file
-        if len(self._file_dict)>1:
-            self._close_file()
-            file_list = list(self._file_dict.keys())
-            self._open_file(file_list[0])
+        # stop read-ahead thread
+        self._stop_prefetch()
+        
+        # close current file, first file re-opened
+        # when reading next event
+        self._close_file()
     
         # initialize counters
         self._file_counter = 0
@@ -296,6 +487,7 @@ class H5Reader:
                         detector_chans=None,
                         adctovolt=False, adctoamp=False,
                         baselinesub=False, baselineinds=None,
+                        dtype=np.float64,
                         include_metadata=False,
                         adc_name='adc1'):
         """
@@ -326,6 +518,12 @@ class H5Reader:
         baselineinds: tuple (int, int) or list [int, int]
           min/max index for  baseline calculation 
           default: (10, 0.8*pretrigger length))
+          (trigger window: window pretrigger length)
+
+        dtype : numpy dtype, optional
+          float dtype of converted and/or baseline subtracted
+          traces (np.float64 or np.float32)
+          default: np.float64
           
         include_metadata : bool, optional
           return file/event/detector metadata
@@ -345,6 +543,24 @@ class H5Reader:
            file/event/detector metadata (if "include_metadata" = True)
         """
 
+        # read-ahead mode
+        if self._prefetch_nb_events>0:
+            read_args = dict(
+                trace_length_msec=trace_length_msec,
+                trace_length_samples=trace_length_samples,
+                pretrigger_length_msec=pretrigger_length_msec,
+                pretrigger_length_samples=pretrigger_length_samples,
+                detector_chans=detector_chans,
+                adctovolt=adctovolt, adctoamp=adctoamp,
+                baselinesub=baselinesub,
+                baselineinds=baselineinds,
+                dtype=dtype,
+                adc_name=adc_name)
+            array, info = self._read_next_event_prefetch(read_args)
+            if include_metadata or info['read_status']!=0:
+                return array, info
+            else:
+                return array
         
         info = dict()
         array = np.array([])
@@ -402,7 +618,8 @@ class H5Reader:
                 self._current_file_event_list[self._current_file_event_counter]
             )
             
-            event_index = int(event_dict['event_number']%100000)
+            event_index = int(event_dict.get(
+                'event_index', event_dict['event_number']%100000))
             if 'trigger_index' in event_dict.keys():
                 trigger_index = event_dict['trigger_index']
             
@@ -418,6 +635,7 @@ class H5Reader:
             adctovolt=adctovolt, adctoamp=adctoamp,
             baselinesub=baselinesub,
             baselineinds=baselineinds,
+            dtype=dtype,
             adc_name=adc_name)
 
 
@@ -444,6 +662,7 @@ class H5Reader:
                           detector_chans=None,
                           adctovolt=False, adctoamp=False,
                           baselinesub=False, baselineinds=None,
+                          dtype=np.float64,
                           include_metadata=False, adc_name='adc1'):
         """
         Read a single event from a file based 
@@ -480,6 +699,12 @@ class H5Reader:
         baselineinds: tuple (int, int) or list [int, int]
           min/max index for  baseline calculation 
           default: (10, 0.8*pretrigger length))
+          (trigger window: window pretrigger length)
+
+        dtype : numpy dtype, optional
+          float dtype of converted and/or baseline subtracted
+          traces (np.float64 or np.float32)
+          default: np.float64
           
         include_metadata : bool, optional
           return file/event/detector metadata
@@ -535,6 +760,7 @@ class H5Reader:
             adctovolt=adctovolt, adctoamp=adctoamp,
             baselinesub=baselinesub,
             baselineinds=baselineinds,
+            dtype=dtype,
             adc_name=adc_name)
 
 
@@ -551,6 +777,76 @@ class H5Reader:
         
 
     
+    def read_event_view(self, event_index, file_name=None,
+                        include_metadata=False, adc_name='adc1'):
+        """
+        Get raw (ADC) traces of a single event as a read-only, 
+        zero-copy, memory mapped array. The OS page cache is shared
+        between processes reading the same file. Only available
+        for contiguous (not chunked/compressed) datasets, otherwise
+        data are read with HDF5 in a (read-only) numpy array.
+        
+        Note the array is valid even after file is closed.
+
+        Parameters
+        ----------
+        event_index : int
+          event (hdf5 "dataset")  number 
+        
+        file_name : str, optional
+          name of the file
+          if None: use current file
+
+        include_metadata : bool, optional
+          return file/event/detector metadata
+          default: False
+
+        adc_name : str, optional
+          name/ID of the adc
+          default: "adc1"
+
+        Return
+        ------
+        
+        array : 2D numpy array (numpy.memmap if contiguous)
+           read-only traces for all channels [nb channel, nb samples]
+
+        info : dict
+           file/event/detector metadata (if "include_metadata" = True)
+        """
+
+        # check if file needed
+        if (self._current_file is None and file_name is None):
+            raise ValueError(
+                'ERROR: No file currently open. '
+                + 'Use "file_name" argument!') 
+
+        # open file if needed (current file closed)
+        if (file_name is not None
+            and self._current_file_name!=file_name):
+            self._open_file(file_name, event_list=None)
+
+        # dataset
+        dataset = self._get_event_dataset(event_index, adc_name=adc_name)
+
+        # memory mapped view, otherwise read dataset 
+        array = self._get_dataset_view(dataset)
+        if array is None:
+            array = np.empty(dataset.shape, dtype=dataset.dtype)
+            dataset.read_direct(array)
+            array.flags.writeable = False
+
+        # return
+        if include_metadata:
+            selection = self._get_channel_selection(adc_name=adc_name)
+            info = self._get_event_info(dataset, selection,
+                                        adc_name=adc_name)
+            return array, info
+        else:
+            return array
+        
+
+    
     def read_many_events(self, filepath=None,
                          nevents=0,
                          output_format=1,
@@ -565,7 +861,9 @@ class H5Reader:
                          include_metadata=False,
                          adctovolt=False, adctoamp=False,
                          baselinesub=False, baselineinds=None,
-                         memory_limit=4, adc_name='adc1'):
+                         dtype=np.float64,
+                         memory_limit=4, adc_name='adc1',
+                         nb_cores=1):
         """
         Read multiple events (default read all events)
         
@@ -593,7 +891,18 @@ class H5Reader:
             Series numbers (format: xyyyymmddhhmmss)
             if event_nums argument provided, series_nums should have same length!)
 
-        include_metadata: bool 
+        trigger_indices: list or numpy array
+            Trigger index of each event (continuous data), requires
+            trace length argument. Windows are extracted per file in
+            a vectorized way (each dataset read once), windows
+            straddling two consecutive datasets are stitched
+            together (including last/first dataset of previous/next
+            dump of the series). One output trace per requested 
+            event (same order): windows that can't be extracted 
+            are NaN (0 if ADC integer output, None if list output) 
+            with "read_status"=1 in metadata.
+
+        include_metadata: bool
             include file/group/dataset metadata (default = False)
 
         adctovolt: Bool
@@ -607,6 +916,15 @@ class H5Reader:
 
         baselineinds: tuple (int, int) or list [int, int]
             start/stop baseline calculation (default: (10, 0.8*pretrigger length))
+            Traces extracted around trigger index (continuous data): 
+            pretrigger length of the extracted window (not file 
+            "nb_samples_pretrigger"), same default for
+            "read_next_event"/"read_single_event"
+
+        dtype: numpy dtype
+            Float dtype of converted and/or baseline subtracted traces,
+            np.float64 (default) or np.float32 (half memory, memory
+            limit check based on dtype size)
           
         memory_limit: Float
             Pulse data memory limit in GB [default: 2GB]
@@ -614,12 +932,28 @@ class H5Reader:
         adc_name: string
               ADC id (default: 'adc1')
           
+        nb_cores: int
+            Number of processes. If >1, events are read in 
+            parallel by worker processes into a shared memory 
+            array, then assembled in file order. Work is split by 
+            file and by event range within files (files with more 
+            than nb_events/nb_cores events, e.g. VDS files, see 
+            "build_virtual_dataset").
+            3D array output: the returned array is the shared 
+            memory block filled by the workers (no copy, memory 
+            released when the array is deleted), limited by the 
+            shared memory size (/dev/shm). Output_format=1 (list):
+            events pickled back from workers (twice the output 
+            size at peak).
+            (default: 1)
+        
 
         Return
         ------
  
         output_data : list or pandas dataframe
-           traces for each channels and events
+           traces for each channels and events 
+           (same order as "event_list"/"event_nums" if provided)
 
         info : list
            file/event/detector metadata 
@@ -755,6 +1089,7 @@ class H5Reader:
         nb_events_tot = 0
         nb_channels = 0
         nb_samples = 0
+        nb_events_files = list()
 
         
         # loop files and check number of channels/events/samples
@@ -811,6 +1146,7 @@ class H5Reader:
                 nb_events_file = len(file_list)
 
             nb_events_tot += nb_events_file
+            nb_events_files.append((file_name, nb_events_file))
             if nevents>0  and nb_events_tot>=nevents:
                 nb_events_tot = nevents
 
@@ -862,9 +1198,10 @@ class H5Reader:
         # Memory check
         # ===============================
                 
+        dtype = self._check_float_dtype(dtype)
         sample_bytes = 2
         if adctovolt or adctoamp or baselinesub:
-            sample_bytes = 8
+            sample_bytes = dtype.itemsize
             
         output_memory_per_event = sample_bytes*nb_samples*nb_channels/1e9
         output_memory = nb_events_tot*output_memory_per_event
@@ -883,55 +1220,61 @@ class H5Reader:
                    
         output_data = list()
         info_list = list()
-     
+
+        output_dtype = np.int16
+        if adctovolt or adctoamp or baselinesub:
+            output_dtype = dtype
+            
+        output_shape = None
         if output_format==2:
-            if adctovolt or adctoamp or baselinesub:
-                output_data = np.zeros((nb_events_tot, nb_channels, nb_samples),
-                                       dtype=np.float64)
-            else:
-                output_data = np.zeros((nb_events_tot, nb_channels, nb_samples),
-                                       dtype=np.int16)
-                
+            output_shape = (nb_events_tot, nb_channels, nb_samples)
+
+        # read arguments
+        read_args = dict(
+            detector_chans=detector_chans,
+            trace_length_msec=trace_length_msec,
+            trace_length_samples=trace_length_samples,
+            pretrigger_length_msec=pretrigger_length_msec,
+            pretrigger_length_samples=pretrigger_length_samples,
+            adctovolt=adctovolt, adctoamp=adctoamp,
+            baselinesub=baselinesub,
+            baselineinds=baselineinds,
+            dtype=dtype,
+            include_metadata=include_metadata,
+            adc_name=adc_name)
+        
         # ===============================
         #  Loop and read events
         # ===============================
-     
-        # loop events
-        for ievent in range(nb_events_tot):
-            
-            # read event
-            traces = []
-            info = dict()
-           
-            traces, info = self.read_next_event(
-                trace_length_msec=trace_length_msec,
-                trace_length_samples=trace_length_samples,
-                pretrigger_length_msec=pretrigger_length_msec,
-                pretrigger_length_samples=pretrigger_length_samples,
-                detector_chans=detector_chans,
-                adctovolt=adctovolt, adctoamp=adctoamp,
-                baselinesub=baselinesub,
-                baselineinds=baselineinds,
-                include_metadata=True)
-                
-            # check if reading error
-            if info['read_status']>0:
-                print('WARNING: Unable to read event #' + str(ievent) + '! Error message: ')
-                print('WARNING: "' + info['error_msg'] + '". Stopping event loop')
-                break
 
-            
-            # add to metadata list
-            if include_metadata:
-                info_list.append(info)
+        if nb_cores>1 and nb_events_tot>1:
+
+            # read files/event ranges in parallel
+            output_data, info_list = self._read_events_parallel(
+                nb_events_tot, nb_events_files,
+                nb_cores=nb_cores,
+                output_shape=output_shape,
+                output_dtype=output_dtype,
+                read_args=read_args)
 
+        else:
+
+            # read events file by file, directly into
+            # output array (3D) or per file blocks (list)
+            output_array = None
+            if output_format==2:
+                output_array = np.zeros(output_shape, dtype=output_dtype)
             
-            # store
-            if (output_format==1 or output_format==3):
-                output_data.append(traces)
-            else:
-                output_data[ievent,:,:] = traces
+            output_data, info_list = self._read_events_batch(
+                nb_events_tot,
+                output_array=output_array,
+                **read_args)
                 
+        # event list: events read file by file -> same order
+        # as event list
+        if event_list is not None and len(output_data)==len(event_list):
+            output_data, info_list = self._sort_events(
+                output_data, info_list, event_list)
 
         # reset file list to original list
         # if needed
@@ -946,1045 +1289,4872 @@ class H5Reader:
         
              
 
-    def get_current_file_name(self):
+    def read_virtual_events(self, file_name, events=None,
+                            detector_chans=None,
+                            adctovolt=False, adctoamp=False,
+                            baselinesub=False, baselineinds=None,
+                            dtype=np.float64,
+                            include_metadata=False, adc_name='adc1'):
         """
-        Get current file name
-        
+        Read events of a virtual dataset file (see 
+        "build_virtual_dataset") or of any format version 2 file
+        based on position in [events, channels, samples] array. 
+        Slices (strided access) and position lists (random access)
+        are read with a single HDF5 call.
+
         Parameters
         ----------
-        None
+        file_name : str
+          VDS (or format version 2) file name
 
+        events : slice, int or list/array of int, optional
+          event positions (start from 0), for example 
+          slice(0, None, 10) for every 10th event
+          default: None (all events)
+
+        other parameters : see "read_many_events"
 
         Return
         ------
-        
-        file_name : str
-          current file name
+        traces : 3D numpy array
+          [events, channels, samples]
 
+        info : list
+          file/event/detector metadata (if "include_metadata" = True)
         """
-        
-        return self._current_file_name
-        
 
+        dtype = self._check_float_dtype(dtype)
+        current_file_dict = copy.deepcopy(self._file_dict)
+        self.set_files(file_name)
+        
+        try:
 
-    
-    def get_metadata(self, file_name=None, group_name=None, dataset_name=None, 
-                     include_dataset_metadata=False):
+            if not self._open_file(file_name):
+                raise ValueError('ERROR: Unable to open file '
+                                 + file_name + '!')
+            layout = self._get_event_layout(adc_name)
+            events_dataset = layout['events']
+            nb_events = layout['nb_events']
+            if events_dataset is None:
+                raise ValueError('ERROR: VDS or format version 2 '
+                                 + 'file required!')
+            
+            # event positions
+            source_sel = None
+            if events is None:
+                events = slice(None)
+            if isinstance(events, slice):
+                positions = np.arange(nb_events)[events]
+                if events.step is None or events.step>0:
+                    source_sel = slice(*events.indices(nb_events))
+            else:
+                positions = np.atleast_1d(np.asarray(events, dtype=np.int64))
+                positions = np.where(positions<0, positions+nb_events,
+                                     positions)
+                if np.any(positions<0) or np.any(positions>=nb_events):
+                    raise ValueError('ERROR: Event position out of range!')
+
+            # read raw data
+            if source_sel is not None:
+                traces = events_dataset[source_sel]
+            elif len(positions)>0:
+                unique_positions, inverse = np.unique(positions,
+                                                      return_inverse=True)
+                traces = events_dataset[unique_positions]
+                if not np.array_equal(unique_positions, positions):
+                    traces = traces[inverse.reshape(-1)]
+            else:
+                traces = np.zeros((0,) + events_dataset.shape[1:],
+                                  dtype=events_dataset.dtype)
+
+            # channel selection
+            selection = self._get_channel_selection(detector_chans,
+                                                    adc_name=adc_name)
+            array_indices = np.asarray(selection['array_indices'])
+            if not np.array_equal(array_indices,
+                                  np.arange(events_dataset.shape[1])):
+                traces = traces[:, array_indices]
+
+            # convert/baseline subtract
+            if adctovolt or adctoamp:
+                traces = self._convert_traces(traces, selection,
+                                              adctoamp=adctoamp,
+                                              dtype=dtype)
+            if baselinesub:
+                if traces.dtype.kind!='f':
+                    traces = traces.astype(dtype)
+                traces = self._subtract_baseline(
+                    traces, self._get_file_cache(adc_name)['attrs'],
+                    baselineinds=baselineinds)
+                    
+            # metadata
+            info_list = list()
+            if include_metadata:
+                for position in positions:
+                    dataset = _EventDataset(events_dataset, int(position),
+                                            layout['columns'])
+                    info_list.append(self._get_event_info(
+                        dataset, selection, adc_name=adc_name))
+                    
+        finally:
+            self.clear()
+            self._file_dict = current_file_dict
 
+        if include_metadata:
+            return traces, info_list
+        else:
+            return traces
+
+
+    def iter_batches(self, batch_size=100, filepath=None, series=None,
+                     detector_chans=None,
+                     trace_length_msec=None,
+                     trace_length_samples=None,
+                     pretrigger_length_msec=None,
+                     pretrigger_length_samples=None,
+                     adctovolt=False, adctoamp=False,
+                     baselinesub=False, baselineinds=None,
+                     dtype=np.float64,
+                     include_metadata=True,
+                     cursor=None,
+                     adc_name='adc1'):
         """
-        Function to get metadata.
-       
+        Generator: iterate over events (file list, see "set_files"
+        or "filepath" argument) in fixed size batches with constant 
+        memory footprint. A single [batch, channels, samples] buffer 
+        is allocated and re-used: yielded arrays are overwritten at 
+        the next iteration (copy if needed).
+
+        Iteration starts from the current reader position (or 
+        "cursor") and moves the reader position forward. Use 
+        "get_cursor" to save position and resume later.
+
         Parameters
         ----------
-          
-        file_name: string, optional
-            if no file name provided: use current file
+        batch_size : int, optional
+          number of events per batch
+          default: 100
 
-        group_name:  string, optional
-            H5 "Group" name
-            Default: None, read all groups
-          
-        dataset_name: string, optional, 
-            H5 "Dataset" name
-            Default: all datasets
-         
-        include_dataset_metadata : bool, optional
-            If True, include dataset metadata
-            Default: False
-        
+        filepath : str or list, optional
+          file/path or list of files/paths 
+          (default: use current file list)
 
-        Return
-        ------
+        series : str/int or list, optional
+          filter files based on series number(s)/name(s) 
+          (used only with "filepath")
         
-        metadata: dict
-           dictionary with all metadata
+        cursor : tuple (str or int, int), optional
+          position of first event: (file name or file index, 
+          event counter in file), see "get_cursor"
+          default: current position
 
-        """
+        include_metadata : bool, optional
+          if True, yield event metadata
+          default: True
 
-        metadata = dict()
+        other parameters : see "read_many_events"
 
+        Yield
+        -----
+        array : 3D numpy array
+          traces [batch, channels, samples] (last batch may be
+          smaller, view of internal buffer)
 
-        # check input 
-        if file_name is None and self._current_file is None:
-            error_msg = 'No file currently open and no "file_name" argument not provided!'
-            if self._raise_errors:
-                    raise ValueError(error_msg)
-            else:
-                print('ERROR: ' + error_msg)
-                print('Please open a file or provide a file name!')
-                return metadata
+        info_batch : list
+          file/event/detector metadata of each event 
+          (empty list if "include_metadata" = False)
+        """
 
-        # open file if needed
-        if (file_name is not None
-            and self._current_file_name!=file_name):
-            
-            # check if a file already open
-            if self._current_file is not None:
-                self._close_file()
-            # open
-            self._open_file(file_name, event_list=None,
-                            load_metadata=False)
-            
+        if batch_size<1:
+            raise ValueError('ERROR: "batch_size" should be > 0!')
 
-        # load metadata (if "dataset" metadata requested -> reload)
-        if dataset_name is not None:
-            include_dataset_metadata = True
+        # stop read-ahead thread (reader position used)
+        self._stop_prefetch()
+        
+        # set files
+        if filepath is not None:
+            self.set_files(filepath, series=series)
+        if not self._file_dict:
+            raise ValueError('ERROR: No files selected!')
 
-        if self._current_file_metadata is None or include_dataset_metadata:
-            self._load_metadata(include_dataset_metadata)
-                
+        # go to cursor
+        if cursor is not None:
+            self._set_cursor(cursor)
             
-        # find specific metadata
-        metadata = dict()
-        if group_name is not None:
-            if group_name in self._current_file_metadata['group_list']:
-                group_metadata = self._current_file_metadata['groups'][group_name]
-                if dataset_name is not None:
-                    if dataset_name in group_metadata['dataset_list']:
-                        metadata = group_metadata['datasets'][dataset_name]
-                else:
-                    metadata = group_metadata
-        else:
-            metadata = self._current_file_metadata
+        # read arguments
+        read_args = dict(
+            detector_chans=detector_chans,
+            trace_length_msec=trace_length_msec,
+            trace_length_samples=trace_length_samples,
+            pretrigger_length_msec=pretrigger_length_msec,
+            pretrigger_length_samples=pretrigger_length_samples,
+            adctovolt=adctovolt, adctoamp=adctoamp,
+            baselinesub=baselinesub,
+            baselineinds=baselineinds,
+            dtype=dtype,
+            include_metadata=include_metadata,
+            adc_name=adc_name)
 
+        # loop batches
+        buffer = None
+        while True:
+
+            # first batch: buffer allocated based on
+            # first events read
+            if buffer is None:
+                data, info_batch = self._read_events_batch(
+                    batch_size, output_array=None, **read_args)
+                if len(data)==0:
+                    if self.get_cursor() is None:
+                        break
+                    continue
+                buffer = np.empty((batch_size,) + data[0].shape,
+                                  dtype=data[0].dtype)
+                nb_events_batch = len(data)
+                buffer[:nb_events_batch] = np.stack(data)
 
-        # close file
-        if file_name is not None:
-            self._close_file()
-        
-
-        return metadata
-            
+            else:
+                data, info_batch = self._read_events_batch(
+                    batch_size, output_array=buffer, **read_args)
+                nb_events_batch = len(data)
 
+            if nb_events_batch>0:
+                yield buffer[:nb_events_batch], info_batch
 
+            # end of file list
+            if self.get_cursor() is None:
+                break
 
-    def get_detector_config(self, file_name=None,
-                            adc_name='adc1',
-                            use_chan_dict=True):   
+            
+    def get_cursor(self):
         """
-        Get detector configuration
+        Get reader position (next event to be read by 
+        "read_next_event" or "iter_batches")
+
+        Parameters
+        ----------
+        None
+
+        Return
+        ------
+        cursor : tuple (str, int) or None
+          (file name, event counter in file), None if 
+          all events read
         """
+
+        file_list = list(self._file_dict.keys())
         
-        detector_config = dict()
-        
-        # get metadata
-        metadata = None
-        if file_name is not None:
-            metadata = self.get_metadata(file_name=file_name)
-        elif self._current_file_metadata is not None:
-            metadata = self._current_file_metadata
-        else:
-            raise ValueError('ERROR in get_detector_config: a file name needs to be provided!')
+        # current file
+        if (self._current_file is not None
+            and (self._current_file_event_counter
+                 <self._current_file_nb_events)):
+            return (self._current_file_name,
+                    self._current_file_event_counter)
+
+        # next file
+        if self._file_counter<len(file_list):
+            return (file_list[self._file_counter], 0)
+
+        return None
+
         
+    def _set_cursor(self, cursor):
+        """
+        Set reader position
+
+        Parameters
+        ----------
+        cursor : tuple (str or int, int)
+          (file name or file index, event counter in file)
+
+        Return
+        ------
+        None
+        """
         
+        file_list = list(self._file_dict.keys())
+        file_key, event_counter = cursor
+
+        # file index
+        file_index = file_key
+        if isinstance(file_key, str):
+            if file_key not in file_list:
+                raise ValueError('ERROR: Cursor file ' + file_key
+                                 + ' not in file list!')
+            file_index = file_list.index(file_key)
+        elif file_index<0 or file_index>=len(file_list):
+            raise ValueError('ERROR: Cursor file index out of range!')
+
+        # open file and set event counter
+        self._close_file()
+        self._file_counter = file_index
+        if event_counter>0:
+            file_name = file_list[file_index]
+            if not self._open_file(file_name,
+                                   event_list=self._file_dict[file_name]):
+                raise ValueError('ERROR: Unable to open file '
+                                 + file_name + '!')
+            self._current_file_event_counter = int(event_counter)
+
+
+    def follow(self, group_path, series=None,
+               poll_interval=0.5, settle_time=5.0,
+               idle_timeout=None, stop_event=None,
+               read_open_file=True, from_start=True,
+               detector_chans=None,
+               trace_length_msec=None,
+               trace_length_samples=None,
+               pretrigger_length_msec=None,
+               pretrigger_length_samples=None,
+               adctovolt=False, adctoamp=False,
+               baselinesub=False, baselineinds=None,
+               dtype=np.float64,
+               include_metadata=True,
+               adc_name='adc1'):
+        """
+        Generator: follow ("tail") a group directory while data are
+        being written and yield events as they become available.
+        The directory is polled every "poll_interval" seconds, events
+        are yielded within ~"poll_interval" once readable.
+
+        A dump is considered complete (read as a regular file) when
+        a later dump of the same series exists or when the file has
+        not been modified for "settle_time" seconds. Files modified
+        after being read (size/modification time) are re-checked
+        for new events.
+
+        Events in the dump currently being written are read only if
+        the writer opened the file in SWMR mode (single writer
+        multiple readers, see H5Writer "swmr"): the file is then opened
+        with swmr=True at each poll. Otherwise the file is skipped
+        until complete.
 
-        # config name
-        config_name = 'detconfig1'
-        if adc_name!='adc1':
-            config_name = 'detconfig' + adc_name[3:]
+        Parameters
+        ----------
+        group_path : str
+          group directory (hdf5 dump files)
 
-        # check if available
-        if config_name not in metadata['group_list']:
-            print('ERROR: unable to find detector config!')
-            return []
+        series : str/int or list, optional
+          follow only series number(s)/name(s)
+          default: all series
 
-        # group metadata
-        detector_config_dict = metadata['groups'][config_name]
-        #if 'adc_name' in detector_config_dict and adc_name!=detector_config_dict['adc_name']:
-        #    print('ERROR: Unexpected detector configuration format!')
-        #    return []
+        poll_interval : float, optional
+          directory polling interval [seconds]
+          default: 0.5
 
+        settle_time : float, optional
+          time without modification after which the last dump
+          is considered complete [seconds]
+          default: 5
 
-        # add detector/channel list from adc metadata, needs to match
-        # detector settings array order
-        tes_chans = list()
-        detector_chans = list()
-        controller_chans = list()
-        connection_dict = self.get_connection_dict(adc_name=adc_name,
-                                                   metadata=metadata)
+        idle_timeout : float, optional
+          stop if no new events for "idle_timeout" seconds
+          default: None (run until "stop_event" set or generator
+          closed)
 
-        if connection_dict:
-            chan_list = detector_config_dict['channel_list']
-            if (not isinstance(chan_list, np.ndarray)
-                and not isinstance(chan_list, list)):
-                chan_list  = [chan_list]
-            for chan in chan_list:
-                if chan in connection_dict['adc_chans']:
-                    ind = connection_dict['adc_chans'].index(int(chan))
-                    if connection_dict['controller_chans']:
-                        controller_chans.append(connection_dict['controller_chans'][ind])
-                    if connection_dict['tes_chans']:
-                        tes_chans.append(connection_dict['tes_chans'][ind])
-                    if connection_dict['detector_chans']:
-                        detector_chans.append(connection_dict['detector_chans'][ind])
-                         
-                                
-        detector_config_dict['tes_chans'] =  tes_chans
-        detector_config_dict['detector_chans'] =  detector_chans
-        detector_config_dict['controller_chans'] =  controller_chans   
+        stop_event : threading.Event, optional
+          stop when event is set (checked at each poll and
+          after each event)
 
-        # convert to list if needed (size of nb channels)
-        nb_chan = len(detector_config_dict['detector_chans'])
-        for config in detector_config_dict.keys():
-            param = detector_config_dict[config]
-            if not isinstance(param, list) and not isinstance(param, np.ndarray):
-                detector_config_dict[config] = [detector_config_dict[config]]*nb_chan
-    
-        # convert to dictionary
-        detector_config = dict()
-        if use_chan_dict:
-            chan_list = detector_config_dict['detector_chans']
-            for chan in chan_list:
-                chan_index = detector_config_dict['detector_chans'].index(chan)
-                detector_config[chan] = dict()
-                for config in detector_config_dict:
-                    if len(detector_config_dict[config])==nb_chan:
-                        detector_config[chan][config] = detector_config_dict[config][chan_index]
-        else:
-            detector_config = detector_config_dict
-            
-            
-                      
-        return detector_config
+        read_open_file : bool, optional
+          if True, read events from dump being written (SWMR)
+          default: True
 
+        from_start : bool, optional
+          if True, yield events already on disk, otherwise
+          only events written after the call
+          default: True
 
+        include_metadata : bool, optional
+          if True, yield event metadata
+          default: True
 
-    def get_file_info(self, file_name=None):
+        other parameters : see "read_next_event"
+
+        Yield
+        -----
+        array : 2D numpy array
+          traces [channels, samples]
+
+        info : dict
+          file/event/detector metadata (only if "include_metadata"
+          = True)
         """
-        Get file attributes
+
+        if not os.path.isdir(group_path):
+            raise ValueError('ERROR: Group directory ' + str(group_path)
+                             + ' not found!')
+
+        # series names
+        if series is not None:
+            if not isinstance(series, (list, set, np.ndarray)):
+                series = [series]
+            series = [extract_series_name(int(aseries))
+                      if isinstance(aseries, (int, np.integer))
+                      else str(aseries) for aseries in series]
+
+        # reader position not used
+        self.clear()
+
+        # read arguments
+        read_args = dict(
+            detector_chans=detector_chans,
+            trace_length_msec=trace_length_msec,
+            trace_length_samples=trace_length_samples,
+            pretrigger_length_msec=pretrigger_length_msec,
+            pretrigger_length_samples=pretrigger_length_samples,
+            adctovolt=adctovolt, adctoamp=adctoamp,
+            baselinesub=baselinesub,
+            baselineinds=baselineinds,
+            dtype=dtype,
+            adc_name=adc_name)
+
+        # files state {file: [(mtime, size), nb events read]}
+        file_states = dict()
+        skip_existing = not from_start
+
+        last_event_time = time.time()
+        try:
+
+            while stop_event is None or not stop_event.is_set():
+
+                nb_events_poll = 0
+
+                # list dumps
+                file_list = sorted(glob(os.path.join(group_path, '*.hdf5')))
+                if series is not None:
+                    file_list = [afile for afile in file_list
+                                 if any(aseries in afile for aseries in series)]
+                file_index = self._get_file_index(file_list)
+
+                for file_name in file_list:
+
+                    # modification check
+                    try:
+                        file_stat = os.stat(file_name)
+                    except OSError:
+                        continue
+                    stat_key = (file_stat.st_mtime_ns, file_stat.st_size)
+                    if file_name not in file_states:
+                        file_states[file_name] = [None, 0]
+                    if file_states[file_name][0]==stat_key:
+                        continue
+
+                    # dump complete?
+                    is_complete = self._is_dump_complete(
+                        file_name, file_index, file_stat.st_mtime,
+                        settle_time)
+                    if not is_complete and not read_open_file:
+                        continue
+
+                    # open (SWMR if dump being written). Dump being
+                    # written may not be readable yet (file creation,
+                    # SWMR not enabled): retry at next poll
+                    try:
+                        is_open = self._open_file(file_name,
+                                                  swmr=not is_complete)
+                        if is_open:
+                            nb_events_file = self._get_nb_events_written(
+                                adc_name, is_complete=is_complete)
+                    except (OSError, KeyError, ValueError):
+                        if is_complete:
+                            raise
+                        is_open = False
+                    if not is_open:
+                        self._close_file()
+                        continue
+
+                    # skip events already on disk
+                    if skip_existing:
+                        file_states[file_name][1] = nb_events_file
+
+                    # read new events
+                    event_counter = file_states[file_name][1]
+                    while event_counter<nb_events_file:
+                        try:
+                            array, info = self._load_event(event_counter+1,
+                                                           **read_args)
+                        except (OSError, KeyError):
+                            if is_complete:
+                                raise
+                            break
+                        event_counter += 1
+                        file_states[file_name][1] = event_counter
+                        nb_events_poll += 1
+                        if array is None:
+                            continue
+                        if include_metadata:
+                            yield array, info
+                        else:
+                            yield array
+                        if stop_event is not None and stop_event.is_set():
+                            return
+
+                    self._close_file()
+
+                    # done with file until modified
+                    if is_complete:
+                        file_states[file_name][0] = stat_key
+
+                skip_existing = False
+
+                # idle timeout
+                now = time.time()
+                if nb_events_poll>0:
+                    last_event_time = now
+                elif (idle_timeout is not None
+                      and now-last_event_time>=idle_timeout):
+                    break
+
+                if nb_events_poll==0:
+                    time.sleep(poll_interval)
+
+        finally:
+            self._close_file()
+
+
+    def _is_dump_complete(self, file_name, file_index, mtime,
+                          settle_time):
         """
+        Check if dump is complete (not being written): later dump
+        of same series available or file not modified for
+        "settle_time" seconds
 
-        # check input 
-        if file_name is None and self._current_file is None:
-            error_msg = 'No file currently open and no "file_name" argument not provided!'
-            if self._raise_errors:
-                    raise ValueError(error_msg)
-            else:
-                print('ERROR: ' + error_msg)
-                print('Please open a file or provide a file name!')
-                return metadata
+        Parameters
+        ----------
+        file_name : str
+          dump file name
 
-        # open file if needed
-        if (file_name is not None
-            and self._current_file_name!=file_name):
-            
-            # check if a file already open
-            if self._current_file is not None:
-                self._close_file()
+        file_index : dict
+          {(series_num, dump_num): file} (see "_get_file_index")
 
-            # open
-            self._open_file(file_name, event_list=None,
-                            load_metadata=False)
-            
+        mtime : float
+          file modification time
 
-        # get attibutes
-        metadata = self._extract_metadata(self._current_file.attrs)
-        return  metadata
+        settle_time : float
+          time without modification [seconds]
 
-    
-                                    
-    def get_connection_dict(self, file_name=None, adc_name='adc1', metadata=None):
+        Return
+        ------
+        is_complete : bool
         """
-        Get connection dictionary for specifid adc name
+
+        if time.time()-mtime>=settle_time:
+            return True
+
+        match = re.search(r'(I\d+_D\d{8}_T\d{6})_F(\d+)\.hdf5$', file_name)
+        if match is None:
+            return False
+        series_num = int(extract_series_num(match.group(1)))
+        dump_num = int(match.group(2))
+        for key in file_index:
+            if key[0]==series_num and key[1]>dump_num:
+                return True
+
+        return False
+
+
+    def _get_nb_events_written(self, adc_name='adc1', is_complete=True):
         """
+        Get number of events readable in current file: number of
+        datasets, bounded by "nb_events" attribute (updated by
+        writer after each event). For a dump being written, 
+        datasets may be preallocated (SWMR) and not yet filled: 
+        no events readable if "nb_events" not available.
 
-        # initialize
-        connection_dict=dict()
+        Parameters
+        ----------
+        adc_name : str, optional
+          name/ID of the adc
+          default: "adc1"
 
-        # metadata
-        adc_metadata = None
-        if metadata is None or 'group_list' not in metadata:
-            metadata = self.get_metadata(file_name=file_name)
+        is_complete : bool, optional
+          if False, dump being written
+          default: True
 
-        if 'group_list' in metadata and adc_name in metadata['group_list']:
-            adc_metadata  = metadata['groups'][adc_name]
+        Return
+        ------
+        nb_events : int
+        """
 
-        if adc_metadata is None:
-            error_msg = 'ADC metadata not found!'
-            if self._raise_errors:
-                    raise ValueError(error_msg)
-            else:
-                print('WARNING: ' + error_msg)
-                return conection_dict
+        if (self._current_file_metadata is None
+            or adc_name not in self._current_file_metadata['groups']):
+            return 0
 
+        group_metadata = self._current_file_metadata['groups'][adc_name]
+        nb_events = group_metadata['nb_datasets']
+        if 'nb_events' in group_metadata:
+            nb_events = min(nb_events, int(group_metadata['nb_events']))
+        elif not is_complete:
+            nb_events = 0
+
+        return nb_events
 
-        connection_dict['adc_chans'] = list()
-        connection_dict['controller_chans'] = list()
-        connection_dict['tes_chans'] = list()
-        connection_dict['detector_chans'] = list()
         
-        # loop metadata to find connections
-        for key,value in adc_metadata.items():
-            if key.find('connection')!=-1:
-                connection_dict['adc_chans'].append(int(key[10:]))
-                for connection_type in value:
-                    channel_name = connection_type[connection_type.find(':')+1:]
-                    if connection_type.find('tes:')!=-1:
-                        connection_dict['tes_chans'].append(channel_name)
-                    if connection_type.find('detector:')!=-1:
-                        connection_dict['detector_chans'].append(channel_name)
-                    if connection_type.find('controller:')!=-1:
-                        connection_dict['controller_chans'].append(channel_name)
+    def enable_prefetch(self, nb_events=10):
+        """
+        Enable read-ahead mode for "read_next_event": a worker 
+        thread reads and decodes the next events (opening next 
+        files as needed) and store them in a bounded queue. 
 
-        return connection_dict                              
-    
+        The worker thread is started at the next "read_next_event"
+        call (and re-started if read arguments change).
 
-    def get_connection_table(self, file_name=None, metadata=None):
+        Parameters
+        ----------
+        nb_events : int, optional
+          maximum number of events in queue (queue depth)
+          default: 10
+
+        Return
+        ------
+        None
         """
-        Get connection table
+
+        if nb_events<1:
+            raise ValueError('ERROR: Number of prefetched events '
+                             + 'should be > 0!')
+
+        self._stop_prefetch()
+        self._prefetch_nb_events = int(nb_events)
+        self._reset_prefetch_stats()
+
+        
+    def disable_prefetch(self):
+        """
+        Disable read-ahead mode (stop worker thread). Next events
+        are read from current position.
+
+        Parameters
+        ----------
+        None
+
+        Return
+        ------
+        None
         """
         
-        if metadata is None:
-            metadata = self.get_metadata(file_name=file_name)
+        self._stop_prefetch()
+        self._prefetch_nb_events = 0
         
-        # check adc list exist 
-        if 'adc_list' not in metadata:
-            print('ERROR: No ADC metadata found in the file!')
-            return
-
         
-        # loop adc and find connection
-        connection_list = list()
-        connection_name_list = list()
-        for adc_id in metadata['adc_list']:
-            adc_metadata = metadata['groups'][adc_id]
-            for key,val in adc_metadata.items():
-                if key[0:10]=='connection':
-                    adc_chan = re.sub(r'\s+','', str(key))[10:]
-                    name_val_list, name_list, val_list = (
-                        connection_utils.extract_adc_connection(list(val)))
-                    val_list  = [adc_id,adc_chan] + val_list
-                    name_list = ['adc_id','adc_channel'] + name_list
-                    connection_list.append(val_list)
-                    if not connection_name_list:
-                        connection_name_list = name_list
-                    elif connection_name_list!=name_list:
-                        print('ERROR: missing adc connection values!')
-                        
-                    
-        connection_table = pd.DataFrame(connection_list,
-                                        columns=connection_name_list )
-        return connection_table
+    def get_prefetch_stats(self):
+        """
+        Get read-ahead queue statistics, useful to tune
+        the number of prefetched events 
 
+        Parameters
+        ----------
+        None
 
+        Return
+        ------
+        stats : dict
+          - "queue_size": maximum number of events in queue
+          - "queue_depth": current number of events in queue
+          - "nb_events": number of events read from queue
+             (end of data/errors not included)
+          - "nb_stalls": number of times queue was empty 
+             (caller waiting for disk)
+          - "wait_msec_mean"/"wait_msec_max": caller waiting
+             time per event 
+          - "read_msec_mean": worker read/decode time per event
+        """
 
+        stats = dict()
+        stats['queue_size'] = self._prefetch_nb_events
+        stats['queue_depth'] = 0
+
+        # worker read time (stopped + current worker)
+        nb_events_read = self._prefetch_stats['nb_events_read']
+        read_msec_sum = self._prefetch_stats['read_msec_sum']
+        if self._prefetcher is not None:
+            stats['queue_depth'] = self._prefetcher.queue_depth
+            nb_events_read += self._prefetcher.nb_events_read
+            read_msec_sum += self._prefetcher.read_msec_sum
+
+        # caller wait time
+        nb_events = self._prefetch_stats['nb_events']
+        stats['nb_events'] = nb_events
+        stats['nb_stalls'] = self._prefetch_stats['nb_stalls']
+        stats['wait_msec_mean'] = 0
+        stats['wait_msec_max'] = self._prefetch_stats['wait_msec_max']
+        stats['read_msec_mean'] = 0
+        if nb_events>0:
+            stats['wait_msec_mean'] = (
+                self._prefetch_stats['wait_msec_sum']/nb_events
+            )
+        if nb_events_read>0:
+            stats['read_msec_mean'] = read_msec_sum/nb_events_read
+        return stats
+            
     
-    def _open_file(self, file_name, event_list=None,
-                   rw_string='r', load_metadata=True):
-        """
-        open file 
+    def get_current_file_name(self):
         """
-        if self._current_file is not None:
-            self._close_file()
-            
-        file = None
-        try:
-            file = h5py.File(file_name, rw_string)
-        except:
-            print('ERROR: unable to open file ' + file_name)
-            return
+        Get current file name
+        
+        Parameters
+        ----------
+        None
 
-        self._current_file = file
-        self._current_file_name = file_name
-        self._current_file_nb_events = 0
-        self._current_file_event_counter = 0
+
+        Return
+        ------
         
-        # load metadata
-        if load_metadata:
+        file_name : str
+          current file name
 
-            self._load_metadata()
-            
-            # check nb of events in file
-            if 'adc_list' not in self._current_file_metadata:
-                print('WARNING: No ADC information found in the file')
-                return
+        """
+        
+        return self._current_file_name
+        
 
-            for adc_name in self._current_file_metadata['adc_list']:
-                nb_events_adc = self._current_file_metadata['groups'][adc_name]['nb_datasets']
-                if self._current_file_nb_events==0:
-                    self._current_file_nb_events = nb_events_adc
-                elif self._current_file_nb_events != nb_events_adc:
-                    print('ERROR: Inconsistent number of events between ADC devices!')
-                    self._close_file()
-                    return False
 
-        self._file_counter += 1
+    
+    def get_metadata(self, file_name=None, group_name=None, dataset_name=None, 
+                     include_dataset_metadata=False):
 
+        """
+        Function to get metadata.
+       
+        Parameters
+        ----------
+          
+        file_name: string, optional
+            if no file name provided: use current file
 
-        # event list
-        self._current_file_event_list = event_list
-        if event_list is not None:
-            self._current_file_nb_events = len(event_list)
+        group_name:  string, optional
+            H5 "Group" name
+            Default: None, read all groups
+          
+        dataset_name: string, optional, 
+            H5 "Dataset" name
+            Default: all datasets
+         
+        include_dataset_metadata : bool, optional
+            If True, include dataset metadata
+            Default: False
         
-        return True
+
+        Return
+        ------
         
+        metadata: dict
+           dictionary with all metadata
+
+        """
+
+        metadata = dict()
+
+        # metadata from catalog
+        if (self._catalog is not None and file_name is not None
+            and dataset_name is None and not include_dataset_metadata
+            and self._current_file_name!=file_name):
+            metadata = self._catalog.get_metadata(file_name)
+            if metadata is not None:
+                if group_name is not None:
+                    return metadata['groups'].get(group_name, dict())
+                return metadata
+            metadata = dict()
+
+        # check input 
+        if file_name is None and self._current_file is None:
+            error_msg = 'No file currently open and no "file_name" argument not provided!'
+            if self._raise_errors:
+                    raise ValueError(error_msg)
+            else:
+                print('ERROR: ' + error_msg)
+                print('Please open a file or provide a file name!')
+                return metadata
+
+        # open file if needed
+        if (file_name is not None
+            and self._current_file_name!=file_name):
+            
+            # check if a file already open
+            if self._current_file is not None:
+                self._close_file()
+            # open
+            self._open_file(file_name, event_list=None,
+                            load_metadata=False)
+            
+
+        # load metadata (if "dataset" metadata requested -> reload)
+        if dataset_name is not None:
+            include_dataset_metadata = True
+
+        if self._current_file_metadata is None or include_dataset_metadata:
+            self._load_metadata(include_dataset_metadata)
+                
+            
+        # find specific metadata
+        metadata = dict()
+        if group_name is not None:
+            if group_name in self._current_file_metadata['group_list']:
+                group_metadata = self._current_file_metadata['groups'][group_name]
+                if dataset_name is not None:
+                    if dataset_name in group_metadata['dataset_list']:
+                        metadata = group_metadata['datasets'][dataset_name]
+                else:
+                    metadata = group_metadata
+        else:
+            metadata = self._current_file_metadata
+
+
+        # close file
+        if file_name is not None:
+            self._close_file()
         
+
+        return metadata
             
-    
 
-    def _close_file(self):
-        """
-        Close current file and reset
-        current file parameters
 
+
+    def get_metadata_summary(self, file_name):
+        """
+        Get file/group metadata plus first and last event 
+        dataset metadata only (fast alternative to 
+        "get_metadata" with include_dataset_metadata=True)
+       
         Parameters
         ----------
-        None
+        file_name: string
+            file name (full path)
 
         Return
         ------
-        None
-
+        metadata: dict
+           dictionary with file/group metadata, first/last event 
+           dataset metadata in adc groups "datasets"
         """
 
-        if self._current_file is not None:
-            self._current_file.close()
-  
-        # initialize
-        self._current_file = None
-        self._current_file_name = None
-        self._current_file_metadata = None
-        self._current_file_nb_events = 0
-        self._current_file_event_counter = 0
-        self._current_file_event_list = None
+        metadata = self.get_metadata(file_name=file_name)
+        if 'adc_list' not in metadata:
+            return metadata
         
+        with h5py.File(file_name, 'r') as h5:
+            for adc_name in metadata['adc_list']:
+                adc_metadata = metadata['groups'][adc_name]
+                event_indices = sorted(
+                    int(name[6:]) for name in adc_metadata['dataset_list']
+                    if name.startswith('event_'))
+                adc_metadata['datasets'] = dict()
+                if not event_indices:
+                    continue
+                events, nb_events = _get_event_array(h5[adc_name])
+                columns = None
+                if events is not None:
+                    columns = _read_event_columns(h5[adc_name], nb_events)
+                for event_index in [event_indices[0], event_indices[-1]]:
+                    dataset_name = 'event_' + str(event_index)
+                    if columns is not None:
+                        attrs = {name: column[event_index-1]
+                                 for name, column in columns.items()}
+                    else:
+                        attrs = h5[adc_name][dataset_name].attrs
+                    adc_metadata['datasets'][dataset_name] = (
+                        self._extract_metadata(attrs)
+                    )
+            
+        return metadata
 
-    def _load_metadata(self, include_dataset_metadata=False):
 
+    def get_event_metadata_columns(self, file_name, keys=None,
+                                   adc_name='adc1'):
         """
-        Function to load all metadata from current file. Store in 
-        an internal dictionary
-
+        Get event metadata of all events in a file as columns
+        (one array per metadata, sorted by event index)
+       
         Parameters
         ----------
+        file_name: string
+          file name (full path)
 
-        include_dataset_metadata : bool, optional
-           if True, read dataset metadata
-           Default: False
+        keys : list, optional
+          metadata names (default: all)
 
+        adc_name : str, optional
+          name/ID of the adc
+          default: "adc1"
 
         Return
         ------
-        
-        metadata_dict : dict
-          dictionary with metadata
-        
-
+        columns: dict
+          {name: numpy array} including "event_index"
         """
 
-        # check if file exist
-        if self._current_file is None:
-            return
-               
-        # initialize containner
-        metadata_dict = dict()
-      
+        with h5py.File(file_name, 'r') as h5:
+            columns = _get_event_metadata_columns(h5[adc_name], keys=keys)
+            
+        return columns
 
-        # file matadata
-        metadata_dict = self._extract_metadata(self._current_file.attrs)
-      
-    
-        # group/dataset metadata
-        metadata_dict['group_list'] = list()
-        metadata_dict['adc_list'] = list()
-        metadata_dict['groups'] = dict()
-           
-        # Loop groups
-        for key, group in self._current_file.items():
+
+    def get_event_index(self, file_name=None, adc_name='adc1'):
+        """
+        Get event index table of a file ("/event_index/[adc_name]"
+        dataset written by H5Writer when file closed, built from event metadata
+        if not available: file being written, older files). Tables
+        are cached (until file modified).
        
-            # update list
-            metadata_dict['group_list'].append(key)
-            if key[0:3]=='adc':
-                metadata_dict['adc_list'].append(key)
-                                
-            # save metadata
-            metadata_dict['groups'][key] = dict()
-            metadata_dict['groups'][key] =  self._extract_metadata(group.attrs)
-        
-            # datasets
-            dataset_list = list(group.keys())
-            metadata_dict['groups'][key]['dataset_list'] = dataset_list
-            metadata_dict['groups'][key]['nb_datasets'] = len(dataset_list)
-                
+        Parameters
+        ----------
+        file_name: string, optional
+          file name (full path)
+          if None: use current file
 
-            if include_dataset_metadata and len(dataset_list)>0:
-                    
-                # Loop datasets and add metadata
-                metadata_dict['groups'][key]['datasets'] = dict()
-                for dataset_key, dataset in group.items():
-                    metadata_dict['groups'][key]['datasets'][dataset_key] = (
-                        self._extract_metadata(dataset.attrs)
-                    )
+        adc_name : str, optional
+          name/ID of the adc
+          default: "adc1"
 
-                        
+        Return
+        ------
+        index : numpy structured array
+          one row per event, sorted by event index. Fields:
+          "event_index", "event_num", "event_time", 
+          "trigger_index", "trigger_type" (-1 or NaN if not 
+          available) and "byte_offset" (file offset of event data
+          or data chunk, -1 if not available)
+        """
 
-        # save
-        self._current_file_metadata = metadata_dict
+        if file_name is None:
+            file_name = self._current_file_name
+        if file_name is None:
+            raise ValueError('ERROR: No file available. '
+                             + 'Use "file_name" argument!')
 
-        
-    def _extract_metadata(self, attributes):
-        """
-        Extract metadata from attribute dictionary
-        """
-        
-        metadata_dict = dict()
-        for key, value in attributes.items():
-            if isinstance(value, bytes):
-                value = value.decode()
-            elif isinstance(value, np.ndarray):
-                if value.dtype == object:
-                    value = value.astype(str)
-                # a few particular cases
-                if key == 'run_purpose':
-                    value = ' '.join(list(value))                    
-            metadata_dict[key] = value
-        return metadata_dict
-        
-    
-    def _load_event(self, event_index,
-                    trigger_index=None,
-                    trace_length_msec=None,
-                    trace_length_samples=None,
-                    pretrigger_length_msec=None,
-                    pretrigger_length_samples=None,
-                    detector_chans=None,
-                    adctovolt=False, adctoamp=False,
-                    baselinesub=False, baselineinds=None,
-                    adc_name='adc1'):
-        
+        series_num, index = self._get_event_index(file_name, adc_name)
+        return index.copy()
+
+
+    def find_events(self, filepath=None, series=None, time_range=None,
+                    event_nums=None, adc_name='adc1'):
         """
-        Load traces and metadata from current file  based on
-        event index
- 
+        Find events based on event time range and/or event numbers
+        using event index tables (binary search, event datasets 
+        not read). Returned event list can be used with "set_files"
+        or "read_many_events" ("event_list" argument).
+
         Parameters
         ----------
-        event_index : int
-          event (hdf5 "dataset")  number 
-        
-        detector_chans : str or list, optional
-          detector/channel name or list of detectors/channels
-          if None, get all channels (default)
+        filepath : str or list, optional
+          file/directory and/or list of files/directories
+          if None: use files from "set_files"
 
-        adctovolt : bool, optional
-          convert from ADC to volts
-          default: False
+        series : str/int or list, optional
+          filter files based on series number(s)/name(s)
 
-        adctoamp : bool, optional
-          convert from ADC to current amps
-          default: False
-        
-              
-        baselinesub: bool, optional
-          if True, subtract pre-pulse baseline
-          default: False
+        time_range : tuple (float, float), optional
+          event time range [min, max), None for open ended
+
+        event_nums : int or list/array of int, optional
+          event numbers ("event_num" metadata)
 
-        baselineinds: tuple (int, int) or list [int, int]
-          min/max index for  baseline calculation 
-          default: (10, 0.8*pretrigger length))
-          
         adc_name : str, optional
           name/ID of the adc
           default: "adc1"
 
         Return
         ------
-        
-        array : 2D numpy array
-           traces for each channel [nb channel, nb samples]
-
-        info : dict
-           file/event/detector metadata (if "include_metadata" = True)
-
+        event_list : list of dict
+          "series_number", "event_number", "event_index", 
+          "event_time", "trigger_type", "file_name"
+          (sorted by file and event index)
+        """
 
+        # files
+        if filepath is not None:
+            file_list = list(self._get_file_dict(filepath,
+                                                 series=series).keys())
+        elif self._file_dict:
+            file_list = list(self._file_dict.keys())
+        else:
+            raise ValueError('ERROR: No file available. '
+                             + 'Use "filepath" argument!')
         
+        if event_nums is not None:
+            event_nums = np.atleast_1d(np.asarray(event_nums, dtype=np.int64))
+        
+        # search
+        event_list = list()
+        for file_name in file_list:
+
+            series_num, index = self._get_event_index(file_name, adc_name)
+            rows = np.arange(len(index))
+            if time_range is not None:
+                rows = _search_index_range(index['event_time'],
+                                           min_value=time_range[0],
+                                           max_value=time_range[1])
+            if event_nums is not None:
+                rows = np.intersect1d(
+                    rows, _search_index_values(index['event_num'], event_nums))
+
+            for row in index[rows]:
+                event_list.append(
+                    {'series_number': series_num,
+                     'event_number': int(row['event_num']),
+                     'event_index': int(row['event_index']),
+                     'event_time': float(row['event_time']),
+                     'trigger_type': int(row['trigger_type']),
+                     'file_name': file_name})
+
+        return event_list
+
+
+    def _get_event_index(self, file_name, adc_name='adc1'):
+        """
+        Get (cached) event index table and series number
+        of a file
         """
 
-        # ===================================
-        # Get HDF5 dataset
-        # ===================================
+        mtime = os.stat(file_name).st_mtime_ns
+        key = (file_name, adc_name)
+        if (key in self._event_index_cache
+            and self._event_index_cache[key][0]==mtime):
+            return self._event_index_cache[key][1:]
 
-        # check file open
-        if self._current_file is None:
-            raise ValueError('No file open!')
+        with h5py.File(file_name, 'r') as h5:
+            series_num = int(h5.attrs.get('series_num', 0))
+            index = _read_event_index(h5[adc_name])
 
-        # get dataset
-        dataset_name = 'event_' + str(event_index)
-        dataset = self._current_file[adc_name][dataset_name]
-        dataset_dims = dataset.shape
+        self._event_index_cache[key] = (mtime, series_num, index)
+        return series_num, index
 
-        # get dataset metadata
-        info = self._extract_metadata(dataset.attrs)
-        info.update(self._extract_metadata(self._current_file.attrs))
-        info.update(self._extract_metadata(self._current_file[adc_name].attrs))
-        info['read_status'] = 0
-        info['error_msg'] = ''
+            
+    def get_detector_config(self, file_name=None,
+                            adc_name='adc1',
+                            use_chan_dict=True):   
+        """
+        Get detector configuration
+        """
+        
+        detector_config = dict()
+        
+        # get metadata
+        metadata = None
+        if file_name is not None:
+            metadata = self.get_metadata(file_name=file_name)
+        elif self._current_file_metadata is not None:
+            metadata = self._current_file_metadata
+        else:
+            raise ValueError('ERROR in get_detector_config: a file name needs to be provided!')
         
         
-        # ===================================
-        # Channel indices
-        # ===================================
 
-        # extract list of adc channels, index correspond to array index!
-        adc_nums_file = info['adc_channel_indices']
-        if (not isinstance(adc_nums_file, list)
-            and not isinstance(adc_nums_file, np.ndarray)):
-            adc_nums_file = np.array([adc_nums_file])
-        nb_channels_file = len(adc_nums_file)
+        # config name
+        config_name = 'detconfig1'
+        if adc_name!='adc1':
+            config_name = 'detconfig' + adc_name[3:]
 
+        # check if available
+        if config_name not in metadata['group_list']:
+            print('ERROR: unable to find detector config!')
+            return []
 
-        # get connection map and convert to numpy array
-        connections = self.get_connection_dict(adc_name=adc_name, metadata=info)
-              
-        # Filter based on detector_chans argument
-        selected_array_indices = list()
-        selected_adc_nums = list()
-        selected_detector_chans = list()
-        selected_tes_chans = list()
-        selected_controller_chans = list()
-        
-        
-        if detector_chans is not None:
+        # group metadata
+        detector_config_dict = metadata['groups'][config_name]
+        #if 'adc_name' in detector_config_dict and adc_name!=detector_config_dict['adc_name']:
+        #    print('ERROR: Unexpected detector configuration format!')
+        #    return []
+
+
+        # add detector/channel list from adc metadata, needs to match
+        # detector settings array order
+        tes_chans = list()
+        detector_chans = list()
+        controller_chans = list()
+        connection_dict = self.get_connection_dict(adc_name=adc_name,
+                                                   metadata=metadata)
+
+        if connection_dict:
+            chan_list = detector_config_dict['channel_list']
+            if (not isinstance(chan_list, np.ndarray)
+                and not isinstance(chan_list, list)):
+                chan_list  = [chan_list]
+            for chan in chan_list:
+                if chan in connection_dict['adc_chans']:
+                    ind = connection_dict['adc_chans'].index(int(chan))
+                    if connection_dict['controller_chans']:
+                        controller_chans.append(connection_dict['controller_chans'][ind])
+                    if connection_dict['tes_chans']:
+                        tes_chans.append(connection_dict['tes_chans'][ind])
+                    if connection_dict['detector_chans']:
+                        detector_chans.append(connection_dict['detector_chans'][ind])
+                         
+                                
+        detector_config_dict['tes_chans'] =  tes_chans
+        detector_config_dict['detector_chans'] =  detector_chans
+        detector_config_dict['controller_chans'] =  controller_chans   
+
+        # convert to list if needed (size of nb channels)
+        nb_chan = len(detector_config_dict['detector_chans'])
+        for config in detector_config_dict.keys():
+            param = detector_config_dict[config]
+            if not isinstance(param, list) and not isinstance(param, np.ndarray):
+                detector_config_dict[config] = [detector_config_dict[config]]*nb_chan
+    
+        # convert to dictionary
+        detector_config = dict()
+        if use_chan_dict:
+            chan_list = detector_config_dict['detector_chans']
+            for chan in chan_list:
+                chan_index = detector_config_dict['detector_chans'].index(chan)
+                detector_config[chan] = dict()
+                for config in detector_config_dict:
+                    if len(detector_config_dict[config])==nb_chan:
+                        detector_config[chan][config] = detector_config_dict[config][chan_index]
+        else:
+            detector_config = detector_config_dict
             
-            # convert detector_chans to list if needed
-            if (not isinstance(detector_chans, list)
-                and not isinstance(detector_chans, np.ndarray)):
-                detector_chans = [detector_chans]
-                            
+            
+                      
+        return detector_config
 
-            # loop selected channels
-            for chan in detector_chans:
 
-                # check
-                if chan not in connections['detector_chans']:
-                    raise ValueError('Detector channel ' + chan
-                                     + ' not available in raw data.'
-                                     + ' Check connection map!')
-                
-                # find channel index in connection map
-                ind = connections['detector_chans'].index(chan)
 
-                # extract selected ADC number
-                selected_adc = int(connections['adc_chans'][ind])
-                if selected_adc not in adc_nums_file:
-                    raise ValueError('Problem with raw data. Unable to find ADC channel')
-                
-                # save connections
-                selected_adc_nums.append(selected_adc)
-                selected_detector_chans.append(connections['detector_chans'][ind])
-                if 'tes_chans' in connections:
-                    selected_tes_chans.append(connections['tes_chans'][ind])
-                if 'controller_chans' in connections:
-                    selected_controller_chans.append(connections['controller_chans'][ind])
+    def get_file_info(self, file_name=None):
+        """
+        Get file attributes
+        """
+
+        # check input 
+        if file_name is None and self._current_file is None:
+            error_msg = 'No file currently open and no "file_name" argument not provided!'
+            if self._raise_errors:
+                    raise ValueError(error_msg)
+            else:
+                print('ERROR: ' + error_msg)
+                print('Please open a file or provide a file name!')
+                return metadata
+
+        # open file if needed
+        if (file_name is not None
+            and self._current_file_name!=file_name):
+            
+            # check if a file already open
+            if self._current_file is not None:
+                self._close_file()
+
+            # open
+            self._open_file(file_name, event_list=None,
+                            load_metadata=False)
+            
+
+        # get attibutes
+        metadata = self._extract_metadata(self._current_file.attrs)
+        return  metadata
+
+    
+                                    
+    def get_connection_dict(self, file_name=None, adc_name='adc1', metadata=None):
+        """
+        Get connection dictionary for specifid adc name
+        """
+
+        # initialize
+        connection_dict=dict()
+
+        # metadata
+        adc_metadata = None
+        if metadata is None or 'group_list' not in metadata:
+            metadata = self.get_metadata(file_name=file_name)
+
+        if 'group_list' in metadata and adc_name in metadata['group_list']:
+            adc_metadata  = metadata['groups'][adc_name]
+
+        if adc_metadata is None:
+            error_msg = 'ADC metadata not found!'
+            if self._raise_errors:
+                    raise ValueError(error_msg)
+            else:
+                print('WARNING: ' + error_msg)
+                return conection_dict
+
+
+        connection_dict['adc_chans'] = list()
+        connection_dict['controller_chans'] = list()
+        connection_dict['tes_chans'] = list()
+        connection_dict['detector_chans'] = list()
+        
+        # loop metadata to find connections
+        for key,value in adc_metadata.items():
+            if key.find('connection')!=-1:
+                connection_dict['adc_chans'].append(int(key[10:]))
+                for connection_type in value:
+                    channel_name = connection_type[connection_type.find(':')+1:]
+                    if connection_type.find('tes:')!=-1:
+                        connection_dict['tes_chans'].append(channel_name)
+                    if connection_type.find('detector:')!=-1:
+                        connection_dict['detector_chans'].append(channel_name)
+                    if connection_type.find('controller:')!=-1:
+                        connection_dict['controller_chans'].append(channel_name)
+
+        return connection_dict                              
+    
+
+    def get_connection_table(self, file_name=None, metadata=None):
+        """
+        Get connection table
+        """
+        
+        if metadata is None:
+            metadata = self.get_metadata(file_name=file_name)
+        
+        # check adc list exist 
+        if 'adc_list' not in metadata:
+            print('ERROR: No ADC metadata found in the file!')
+            return
+
+        
+        # loop adc and find connection
+        connection_list = list()
+        connection_name_list = list()
+        for adc_id in metadata['adc_list']:
+            adc_metadata = metadata['groups'][adc_id]
+            for key,val in adc_metadata.items():
+                if key[0:10]=='connection':
+                    adc_chan = re.sub(r'\s+','', str(key))[10:]
+                    name_val_list, name_list, val_list = (
+                        connection_utils.extract_adc_connection(list(val)))
+                    val_list  = [adc_id,adc_chan] + val_list
+                    name_list = ['adc_id','adc_channel'] + name_list
+                    connection_list.append(val_list)
+                    if not connection_name_list:
+                        connection_name_list = name_list
+                    elif connection_name_list!=name_list:
+                        print('ERROR: missing adc connection values!')
+                        
+                    
+        connection_table = pd.DataFrame(connection_list,
+                                        columns=connection_name_list )
+        return connection_table
+
+
+
+    
+    def _open_file(self, file_name, event_list=None,
+                   rw_string='r', load_metadata=True,
+                   swmr=False):
+        """
+        open file (read SWMR mode if "swmr"=True, no error
+        message if file can't be opened)
+        """
+        if self._current_file is not None:
+            self._close_file()
+
+        file = None
+        try:
+            if swmr:
+                file = h5py.File(file_name, 'r', swmr=True)
+            else:
+                file = h5py.File(file_name, rw_string)
+        except:
+            if not swmr:
+                print('ERROR: unable to open file ' + file_name)
+            return
+
+        self._current_file = file
+        self._current_file_name = file_name
+        self._current_file_nb_events = 0
+        self._current_file_event_counter = 0
+        
+        # load metadata
+        if load_metadata:
+
+            self._load_metadata()
+            
+            # check nb of events in file
+            if 'adc_list' not in self._current_file_metadata:
+                print('WARNING: No ADC information found in the file')
+                return
+
+            for adc_name in self._current_file_metadata['adc_list']:
+                nb_events_adc = self._current_file_metadata['groups'][adc_name]['nb_datasets']
+                if self._current_file_nb_events==0:
+                    self._current_file_nb_events = nb_events_adc
+                elif self._current_file_nb_events != nb_events_adc:
+                    print('ERROR: Inconsistent number of events between ADC devices!')
+                    self._close_file()
+                    return False
+
+        self._file_counter += 1
+
+
+        # event list
+        self._current_file_event_list = event_list
+        if event_list is not None:
+            self._current_file_nb_events = len(event_list)
+        
+        return True
+        
+        
+            
+    
+
+    def _close_file(self):
+        """
+        Close current file and reset
+        current file parameters
+
+        Parameters
+        ----------
+        None
+
+        Return
+        ------
+        None
+
+        """
+
+        if self._current_file is not None:
+            self._current_file.close()
+  
+        # initialize
+        self._current_file = None
+        self._current_file_name = None
+        self._current_file_metadata = None
+        self._current_file_nb_events = 0
+        self._current_file_event_counter = 0
+        self._current_file_event_list = None
+        self._current_file_cache = dict()
+        self._current_file_memmap = None
+        self._current_file_layout = dict()
+        
+
+    def _read_next_event_prefetch(self, read_args):
+        """
+        Get next event from read-ahead queue (start worker
+        thread if needed)
+
+        Parameters
+        ----------
+        read_args : dict
+          "read_next_event" arguments
+
+        Return
+        ------
+        array : 2D numpy array
+           traces for each channel [nb channel, nb samples]
+
+        info : dict
+           file/event/detector metadata 
+        """
+
+        # check if files available
+        file_list = list(self._file_dict.keys())
+        if not file_list or len(file_list)==0:
+            info = {'read_status': 1,
+                    'error_msg': 'No file available!'}
+            return np.array([]), info
+        
+        # (re)start worker if needed
+        if (self._prefetcher is None
+            or self._prefetch_read_args != read_args
+            or (not self._prefetcher.is_alive()
+                and self._prefetcher.queue_depth==0)):
+            self._start_prefetch(read_args)
+
+        # get event
+        is_stalled = (self._prefetcher.queue_depth==0)
+        time_start = time.time()
+        array, info, file_index, event_counter = self._prefetcher.get()
+        wait_msec = (time.time()-time_start)*1000
+
+        # error (or end of data)
+        if info['read_status']!=0:
+            self._stop_prefetch()
+            return array, info
+        
+        # stats (events only)
+        self._prefetch_stats['nb_events'] += 1
+        self._prefetch_stats['wait_msec_sum'] += wait_msec
+        if wait_msec>self._prefetch_stats['wait_msec_max']:
+            self._prefetch_stats['wait_msec_max'] = wait_msec
+        if is_stalled:
+            self._prefetch_stats['nb_stalls'] += 1
+
+        # keep track of current file (metadata available
+        # with "get_metadata", "get_connection_dict", ...)
+        file_name = file_list[file_index]
+        if self._current_file_name != file_name:
+            self._open_file(file_name,
+                            event_list=self._file_dict[file_name])
+            self._file_counter = file_index+1
+        self._current_file_event_counter = event_counter+1
+            
+        return array, info
+        
+
+    def _start_prefetch(self, read_args):
+        """
+        Start worker thread from current position
+        
+        Parameters
+        ----------
+        read_args : dict
+          "read_next_event" arguments
+
+        Return
+        ------
+        None
+        """
+
+        # stop thread if needed
+        self._stop_prefetch()
+
+        # current position (next event)
+        file_list = list(self._file_dict.keys())
+        file_index = self._file_counter
+        event_counter = 0
+        if (self._current_file is not None
+            and self._current_file_name in self._file_dict):
+            file_index = file_list.index(self._current_file_name)
+            event_counter = self._current_file_event_counter
+            
+        # start thread
+        self._prefetch_read_args = read_args
+        self._prefetcher = _H5Prefetcher(
+            self._file_dict,
+            file_index=file_index,
+            event_counter=event_counter,
+            read_args=read_args,
+            nb_events=self._prefetch_nb_events,
+            raise_errors=self._raise_errors,
+            use_memmap=self._use_memmap,
+            read_strategy=self._read_strategy)
+        self._prefetcher.start()
+        
+        
+    def _stop_prefetch(self):
+        """
+        Stop worker thread (if running) and empty queue
+
+        Parameters
+        ----------
+        None
+
+        Return
+        ------
+        None
+        """
+
+        if self._prefetcher is not None:
+            self._prefetch_stats['read_msec_sum'] += (
+                self._prefetcher.read_msec_sum
+            )
+            self._prefetch_stats['nb_events_read'] += (
+                self._prefetcher.nb_events_read
+            )
+            self._prefetcher.stop()
+            
+        self._prefetcher = None
+        self._prefetch_read_args = None
+
+        
+    def _reset_prefetch_stats(self):
+        """
+        Reset read-ahead statistics
+        """
+
+        self._prefetch_stats = {'nb_events': 0,
+                                'nb_stalls': 0,
+                                'wait_msec_sum': 0,
+                                'wait_msec_max': 0,
+                                'nb_events_read': 0,
+                                'read_msec_sum': 0}
+
+        
+    def _load_metadata(self, include_dataset_metadata=False):
+
+        """
+        Function to load all metadata from current file. Store in 
+        an internal dictionary
+
+        Parameters
+        ----------
+
+        include_dataset_metadata : bool, optional
+           if True, read dataset metadata
+           Default: False
+
+
+        Return
+        ------
+        
+        metadata_dict : dict
+          dictionary with metadata
+        
+
+        """
+
+        # check if file exist
+        if self._current_file is None:
+            return
+               
+        # initialize containner
+        metadata_dict = dict()
+      
+
+        # file matadata
+        metadata_dict = self._extract_metadata(self._current_file.attrs)
+      
+    
+        # group/dataset metadata
+        metadata_dict['group_list'] = list()
+        metadata_dict['adc_list'] = list()
+        metadata_dict['groups'] = dict()
+           
+        # Loop groups
+        for key, group in self._current_file.items():
+       
+            # update list
+            metadata_dict['group_list'].append(key)
+            if key[0:3]=='adc':
+                metadata_dict['adc_list'].append(key)
+                                
+            # save metadata
+            metadata_dict['groups'][key] = dict()
+            metadata_dict['groups'][key] =  self._extract_metadata(group.attrs)
+        
+            # datasets (format version 2: events dataset
+            # rows -> "event_N")
+            events, nb_events = None, 0
+            if isinstance(group, h5py.Group):
+                events, nb_events = _get_event_array(group)
+            if events is not None:
+                dataset_list = ['event_' + str(ievent)
+                                for ievent in range(1, nb_events+1)]
+            elif isinstance(group, h5py.Group):
+                dataset_list = [name for name in group.keys()
+                                if name.startswith('event_')]
+            else:
+                dataset_list = list()
+            metadata_dict['groups'][key]['dataset_list'] = dataset_list
+            metadata_dict['groups'][key]['nb_datasets'] = len(dataset_list)
+                
+
+            if include_dataset_metadata and len(dataset_list)>0:
+                    
+                # Loop datasets and add metadata
+                metadata_dict['groups'][key]['datasets'] = dict()
+                if events is not None:
+                    columns = _read_event_columns(group, nb_events)
+                    for ievent, dataset_key in enumerate(dataset_list):
+                        metadata_dict['groups'][key]['datasets'][dataset_key] = (
+                            self._extract_metadata(
+                                {name: column[ievent]
+                                 for name, column in columns.items()})
+                        )
+                else:
+                    for dataset_key in dataset_list:
+                        metadata_dict['groups'][key]['datasets'][dataset_key] = (
+                            self._extract_metadata(group[dataset_key].attrs)
+                        )
+
+                        
+
+        # save
+        self._current_file_metadata = metadata_dict
+
+        
+    def _extract_metadata(self, attributes):
+        """
+        Extract metadata from attribute dictionary
+        """
+        
+        metadata_dict = dict()
+        for key, value in attributes.items():
+            if isinstance(value, bytes):
+                value = value.decode()
+            elif isinstance(value, np.ndarray):
+                if value.dtype == object:
+                    value = value.astype(str)
+                # a few particular cases
+                if key == 'run_purpose':
+                    value = ' '.join(list(value))                    
+            metadata_dict[key] = value
+        return metadata_dict
+        
+    
+    def _get_file_cache(self, adc_name='adc1'):
+        """
+        Get metadata cache for current file and specified adc: 
+        file + adc group attributes, connections and detector config. 
+        These are the same for all events of a file and are 
+        therefore extracted only once (cache cleared when file 
+        is closed)
+
+        Parameters
+        ----------
+        adc_name : str, optional
+          name/ID of the adc
+          default: "adc1"
+
+        Return
+        ------
+        
+        file_cache : dict
+          dictionary with "attrs", "connections", "detector_config"
+          and "selections" (channel selection, see 
+          "_get_channel_selection")
+        """
+
+        # check file open
+        if self._current_file is None:
+            raise ValueError('No file open!')
+        
+        # check if already cached
+        if adc_name in self._current_file_cache:
+            return self._current_file_cache[adc_name]
+
+        # load metadata if needed
+        if self._current_file_metadata is None:
+            self._load_metadata()
+            
+        # file and adc attributes (adc attributes
+        # take precedence)
+        attrs = self._extract_metadata(self._current_file.attrs)
+        attrs.update(self._extract_metadata(self._current_file[adc_name].attrs))
+                
+        # connections
+        connections = self.get_connection_dict(
+            adc_name=adc_name,
+            metadata=self._current_file_metadata
+        )
+        
+        # detector config
+        detector_config = self.get_detector_config(adc_name=adc_name)
+        
+        # save
+        file_cache = dict()
+        file_cache['attrs'] = attrs
+        file_cache['connections'] = connections
+        file_cache['detector_config'] = detector_config
+        file_cache['selections'] = dict()
+        self._current_file_cache[adc_name] = file_cache
+
+        return file_cache
+
+    
+    def _get_event_layout(self, adc_name='adc1'):
+        """
+        Get (cached) raw data layout of current file adc group:
+        format version 1 (one "event_N" dataset per event) or
+        format version 2 ([events, channels, samples] "events"
+        dataset and per-event metadata columns)
+
+        Parameters
+        ----------
+        adc_name : str, optional
+          name/ID of the adc
+          default: "adc1"
+
+        Return
+        ------
+        layout : dict
+          "events" (h5py dataset, None if format version 1), 
+          "nb_events" and "columns" (format version 2)
+        """
+
+        if adc_name in self._current_file_layout:
+            return self._current_file_layout[adc_name]
+
+        adc_group = self._current_file[adc_name]
+        events, nb_events = _get_event_array(adc_group)
+        columns = dict()
+        if events is not None:
+            columns = _read_event_columns(adc_group, nb_events)
+            
+        layout = {'events': events,
+                  'nb_events': nb_events,
+                  'columns': columns}
+        self._current_file_layout[adc_name] = layout
+        
+        return layout
+
+    
+    def _get_event_dataset(self, event_index, adc_name='adc1'):
+        """
+        Get event dataset from current file (both formats)
+
+        Parameters
+        ----------
+        event_index : int
+          event index (start from 1)
+
+        adc_name : str, optional
+          name/ID of the adc
+          default: "adc1"
+
+        Return
+        ------
+        dataset : h5py dataset or _EventDataset
+          event [channels, samples] dataset
+        """
+
+        layout = self._get_event_layout(adc_name)
+
+        # format version 1
+        if layout['events'] is None:
+            return self._current_file[adc_name]['event_' + str(event_index)]
+
+        # format version 2
+        if event_index<1 or event_index>layout['nb_events']:
+            raise KeyError('ERROR: Event ' + str(event_index)
+                           + ' not found!')
+        return _EventDataset(layout['events'], event_index-1,
+                             layout['columns'])
+
+    
+    def _get_event_length(self, event_index, adc_name='adc1'):
+        """
+        Get number of samples of an event in current file
+        (0 if event not available)
+        """
+        
+        layout = self._get_event_layout(adc_name)
+
+        # format version 1
+        if layout['events'] is None:
+            dataset_name = 'event_' + str(event_index)
+            adc_group = self._current_file[adc_name]
+            if dataset_name in adc_group:
+                return adc_group[dataset_name].shape[1]
+            return 0
+
+        # format version 2
+        if 1<=event_index<=layout['nb_events']:
+            return layout['events'].shape[2]
+        return 0
+
+        
+    def _get_channel_selection(self, detector_chans=None, adc_name='adc1'):
+        """
+        Get channel selection for current file: array indices, 
+        adc/detector/tes/controller channels and associated 
+        adc conversion factors, voltage ranges and detector config. 
+        Selection is cached for each "detector_chans" list.
+
+        Parameters
+        ----------
+        detector_chans : str or list, optional
+          detector/channel name or list of detectors/channels
+          if None, get all channels (default)
+
+        adc_name : str, optional
+          name/ID of the adc
+          default: "adc1"
+
+        Return
+        ------
+        
+        selection : dict
+          channel selection 
+        """
+
+        # file cache
+        file_cache = self._get_file_cache(adc_name)
+
+        # convert detector_chans to list if needed
+        if (detector_chans is not None
+            and not isinstance(detector_chans, list)
+            and not isinstance(detector_chans, np.ndarray)):
+            detector_chans = [detector_chans]
+            
+        # check if already cached
+        selection_key = None
+        if detector_chans is not None:
+            selection_key = tuple(detector_chans)
+
+        if selection_key in file_cache['selections']:
+            return file_cache['selections'][selection_key]
+        
+        # attributes and connections
+        attrs = file_cache['attrs']
+        connections = file_cache['connections']
+        detector_config = file_cache['detector_config']
+        
+        # extract list of adc channels, index correspond to array index!
+        adc_nums_file = attrs['adc_channel_indices']
+        if (not isinstance(adc_nums_file, list)
+            and not isinstance(adc_nums_file, np.ndarray)):
+            adc_nums_file = np.array([adc_nums_file])
+        adc_nums_file = np.asarray(adc_nums_file)
+        nb_channels_file = len(adc_nums_file)
+                      
+        # Filter based on detector_chans argument
+        selected_array_indices = list()
+        selected_adc_nums = list()
+        selected_detector_chans = list()
+        selected_tes_chans = list()
+        selected_controller_chans = list()
+        
+        if detector_chans is not None:
+            
+            # loop selected channels
+            for chan in detector_chans:
+
+                # check
+                if chan not in connections['detector_chans']:
+                    raise ValueError('Detector channel ' + chan
+                                     + ' not available in raw data.'
+                                     + ' Check connection map!')
+                
+                # find channel index in connection map
+                ind = connections['detector_chans'].index(chan)
+
+                # extract selected ADC number
+                selected_adc = int(connections['adc_chans'][ind])
+                if selected_adc not in adc_nums_file:
+                    raise ValueError('Problem with raw data. Unable to find ADC channel')
+                
+                # save connections
+                selected_adc_nums.append(selected_adc)
+                selected_detector_chans.append(connections['detector_chans'][ind])
+                if connections['tes_chans']:
+                    selected_tes_chans.append(connections['tes_chans'][ind])
+                if connections['controller_chans']:
+                    selected_controller_chans.append(connections['controller_chans'][ind])
+
+                # save array index
+                ind_adc = int(np.where(adc_nums_file==selected_adc)[0][0])
+                selected_array_indices.append(ind_adc)                
+                
+        else:
+            selected_array_indices = list(range(nb_channels_file))
+            selected_adc_nums = list(adc_nums_file)
+            for adc_chan in selected_adc_nums:
+                ind = connections['adc_chans'].index(adc_chan)
+                selected_detector_chans.append(connections['detector_chans'][ind])
+                if connections['tes_chans']:
+                    selected_tes_chans.append(connections['tes_chans'][ind])
+                if connections['controller_chans']:
+                    selected_controller_chans.append(
+                        connections['controller_chans'][ind]
+                    )
+
+        # check number channels
+        if not selected_array_indices or len(selected_array_indices)==0:
+            raise ValueError('Unable to find selected channel(s). Check connection table!')
+
+        # array indices
+        selected_array_indices = np.array(selected_array_indices, dtype=np.int64)
+        
+        # build selection
+        selection = dict()
+        selection['array_indices'] = selected_array_indices
+        selection['adc_nums'] = selected_adc_nums
+        selection['detector_chans'] = selected_detector_chans
+        selection['tes_chans'] = selected_tes_chans
+        selection['controller_chans'] = selected_controller_chans
+        selection['adc_conversion_factor'] = (
+            attrs['adc_conversion_factor'][selected_array_indices,:]
+        )
+        selection['voltage_range'] = (
+            attrs['voltage_range'][selected_array_indices,:]
+        )
+        selection['detector_config'] = dict()
+        for det in selected_detector_chans:
+            selection['detector_config'][det] = detector_config[det]
+
+        # save
+        file_cache['selections'][selection_key] = selection
+        
+        return selection
+    
+    
+    def _load_event(self, event_index,
+                    trigger_index=None,
+                    trace_length_msec=None,
+                    trace_length_samples=None,
+                    pretrigger_length_msec=None,
+                    pretrigger_length_samples=None,
+                    detector_chans=None,
+                    adctovolt=False, adctoamp=False,
+                    baselinesub=False, baselineinds=None,
+                    dtype=np.float64,
+                    adc_name='adc1'):
+        
+        """
+        Load traces and metadata from current file  based on
+        event index
+ 
+        Parameters
+        ----------
+        event_index : int
+          event (hdf5 "dataset")  number 
+        
+        detector_chans : str or list, optional
+          detector/channel name or list of detectors/channels
+          if None, get all channels (default)
+
+        adctovolt : bool, optional
+          convert from ADC to volts
+          default: False
+
+        adctoamp : bool, optional
+          convert from ADC to current amps
+          default: False
+        
+              
+        baselinesub: bool, optional
+          if True, subtract pre-pulse baseline
+          default: False
+
+        baselineinds: tuple (int, int) or list [int, int]
+          min/max index for  baseline calculation 
+          default: (10, 0.8*pretrigger length))
+
+        dtype : numpy dtype, optional
+          float dtype of converted and/or baseline subtracted
+          traces (np.float64 or np.float32)
+          default: np.float64
+          
+        adc_name : str, optional
+          name/ID of the adc
+          default: "adc1"
+
+        Return
+        ------
+        
+        array : 2D numpy array
+           traces for each channel [nb channel, nb samples]
+
+        info : dict
+           file/event/detector metadata (if "include_metadata" = True)
+
+
+        
+        """
+
+        # ===================================
+        # Get HDF5 dataset
+        # ===================================
+
+        # check file open
+        if self._current_file is None:
+            raise ValueError('No file open!')
+
+        # get dataset
+        dataset = self._get_event_dataset(event_index, adc_name=adc_name)
+                
+        # get (cached) channel selection and
+        # event metadata
+        selection = self._get_channel_selection(detector_chans,
+                                                adc_name=adc_name)
+        info = self._get_event_info(dataset, selection, adc_name=adc_name)
+      
+            
+        # ===================================
+        # Trigger indices
+        # ===================================
+        
+        is_valid, slice_samples = self._get_trace_slice(
+            info, dataset.shape[1],
+            trigger_index=trigger_index,
+            trace_length_msec=trace_length_msec,
+            trace_length_samples=trace_length_samples,
+            pretrigger_length_msec=pretrigger_length_msec,
+            pretrigger_length_samples=pretrigger_length_samples)
+
+        if not is_valid:
+            #print('WARNING: Unable to extract truncated trace '
+            #      'from continuous data. Not enough samples from/to trigger. ')
+            return None, info
+        
+
+        # ===================================
+        # Extract trace
+        # ===================================
+
+        # initialize empty trace
+        dim_0 = len(selection['array_indices'])
+        dim_1 = dataset.shape[1]
+        if slice_samples is not None:
+            dim_1 = slice_samples.stop-slice_samples.start
+            
+        traces_int = np.empty((dim_0, dim_1), dtype=dataset.dtype)
+        
+        # Read the portion of the array
+        self._read_traces(dataset, traces_int,
+                          selection['array_indices'],
+                          slice_samples=slice_samples)
+        
+        # convert to volt/amps
+        traces = []
+        dtype = self._check_float_dtype(dtype)
+        if adctovolt or adctoamp:
+            traces = self._convert_traces(traces_int, selection,
+                                          adctoamp=adctoamp,
+                                          dtype=dtype)
+        else:
+            traces = traces_int
+                    
+        # baseline subtract (trigger window: default based on
+        # window pretrigger length, same as "read_many_events")
+        if baselinesub:
+            if traces.dtype.kind!='f':
+                traces = traces.astype(dtype)
+            baseline_info = info
+            if slice_samples is not None:
+                baseline_info = dict(info)
+                baseline_info['nb_samples_pretrigger'] = (
+                    int(trigger_index)-slice_samples.start)
+            traces = self._subtract_baseline(traces, baseline_info,
+                                             baselineinds=baselineinds)
+        
+        return traces, info
+
+
+
+    def _read_events_batch(self, nb_events, output_array=None,
+                           detector_chans=None,
+                           trace_length_msec=None,
+                           trace_length_samples=None,
+                           pretrigger_length_msec=None,
+                           pretrigger_length_samples=None,
+                           adctovolt=False, adctoamp=False,
+                           baselinesub=False, baselineinds=None,
+                           dtype=np.float64,
+                           include_metadata=False,
+                           adc_name='adc1'):
+        """
+        Read events from file list (see "set_files"), file by file:
+        raw traces are read directly into a [events, channels, samples] 
+        block (slice of "output_array" or one block per file), then 
+        ADC->volt/amp conversion and baseline subtraction are applied 
+        on the whole block at once.
+        
+        Parameters
+        ----------
+        nb_events : int
+          maximum number of events to read
+
+        output_array : 3D numpy array, optional
+          preallocated array [events, channels, samples] filled 
+          in place. If None, one block is allocated per file and 
+          a list of 2D arrays is returned
+          
+        other parameters : see "read_many_events"
+
+        Return
+        ------
+        
+        output_data : 3D numpy array or list of 2D arrays
+           traces [events, channels, samples] (array truncated to
+           number of events read), one row per event: traces that
+           can't be extracted (trigger window) filled with NaN (0 
+           if integer array, None if list)
+
+        info_list : list
+           file/event/detector metadata, "read_status"=1 if trace
+           not extracted (empty list if "include_metadata" = False)
+        """
+
+        # convert to volt/amps or baseline subtraction
+        do_convert = (adctovolt or adctoamp)
+        is_float = (do_convert or baselinesub)
+        dtype = self._check_float_dtype(dtype)
+       
+        # initialize output
+        output_list = list()
+        info_list = list()
+        nb_events_read = 0
+        nb_events_skipped = 0
+        
+        # loop files, starting from current file/event position
+        # (file kept open if not all events read)
+        file_list = list(self._file_dict.keys())
+        while nb_events_read<nb_events:
+
+            # open next file if needed
+            if (self._current_file is None
+                or (self._current_file_event_counter
+                    >=self._current_file_nb_events)):
+
+                if self._file_counter>=len(file_list):
+                    break
+                
+                file_name = file_list[self._file_counter]
+                event_list = self._file_dict[file_name]
+                if not self._open_file(file_name, event_list=event_list):
+                    print('WARNING: Unable to read file ' + file_name
+                          + '! Stopping event loop')
+                    break
+                
+                if self._current_file_nb_events==0:
+                    continue
+
+            # number of events to read in file
+            event_start = self._current_file_event_counter
+            nb_events_file = min(self._current_file_nb_events-event_start,
+                                 nb_events-nb_events_read)
+            
+            # channel selection
+            selection = self._get_channel_selection(detector_chans,
+                                                    adc_name=adc_name)
+            nb_channels = len(selection['array_indices'])
+
+            # output block
+            block = None
+            if output_array is not None:
+                block = output_array[nb_events_read:nb_events_read+nb_events_file]
+            output_block = block
+            
+            # event index and trigger index (event_index start from 1)
+            event_indices = np.arange(event_start+1,
+                                      event_start+nb_events_file+1)
+            trigger_indices = None
+            if self._current_file_event_list is not None:
+                event_dicts = self._current_file_event_list[
+                    event_start:event_start+nb_events_file]
+                event_indices = np.array(
+                    [int(event_dict.get('event_index',
+                                        event_dict['event_number']%100000))
+                     for event_dict in event_dicts], dtype=np.int64)
+                if all('trigger_index' in event_dict
+                       for event_dict in event_dicts):
+                    trigger_indices = np.array(
+                        [int(event_dict['trigger_index'])
+                         for event_dict in event_dicts], dtype=np.int64)
+                elif any('trigger_index' in event_dict
+                         for event_dict in event_dicts):
+                    trigger_indices = [event_dict.get('trigger_index')
+                                       for event_dict in event_dicts]
+
+            # continuous data: extract all trigger windows at once
+            if (isinstance(trigger_indices, np.ndarray)
+                and (trace_length_msec is not None
+                     or trace_length_samples is not None)):
+
+                nb_samples, nb_pretrigger_samples = self._get_window_length(
+                    self._get_file_cache(adc_name)['attrs']['sample_rate'],
+                    trace_length_msec=trace_length_msec,
+                    trace_length_samples=trace_length_samples,
+                    pretrigger_length_msec=pretrigger_length_msec,
+                    pretrigger_length_samples=pretrigger_length_samples)
+
+                if (block is not None
+                    and block.shape[1:]!=(nb_channels, nb_samples)):
+                    raise ValueError('ERROR: Inconsistent number of '
+                                     + 'channels/samples between files!')
+                    
+                block, is_valid, block_info_list = (
+                    self._read_trigger_windows(
+                        event_indices, trigger_indices,
+                        selection, nb_samples, nb_pretrigger_samples,
+                        block=block,
+                        dtype=(dtype if is_float else None),
+                        include_metadata=include_metadata,
+                        adc_name=adc_name)
+                )
+
+                # baseline default based on window pretrigger length
+                baseline_info = dict(self._get_file_cache(adc_name)['attrs'])
+                baseline_info['nb_samples_pretrigger'] = nb_pretrigger_samples
+
+            else:
+                
+                # loop events and read raw data
+                is_valid = np.ones(nb_events_file, dtype=bool)
+                block_info_list = list()
+                for ievent in range(nb_events_file):
+
+                    # event index and trigger index
+                    event_index = int(event_indices[ievent])
+                    trigger_index = None
+                    if trigger_indices is not None:
+                        trigger_index = trigger_indices[ievent]
+
+                    # dataset
+                    dataset = self._get_event_dataset(event_index,
+                                                      adc_name=adc_name)
+                    info = self._get_event_info(dataset, selection,
+                                                adc_name=adc_name)
+                
+                    # trace window
+                    is_valid[ievent], slice_samples = self._get_trace_slice(
+                        info, dataset.shape[1],
+                        trigger_index=trigger_index,
+                        trace_length_msec=trace_length_msec,
+                        trace_length_samples=trace_length_samples,
+                        pretrigger_length_msec=pretrigger_length_msec,
+                        pretrigger_length_samples=pretrigger_length_samples)
+
+                    if not is_valid[ievent]:
+                        info['read_status'] = 1
+                        info['error_msg'] = (
+                            'Unable to extract trace from continuous data. '
+                            + 'Not enough samples from/to trigger!')
+                        if include_metadata:
+                            block_info_list.append(info)
+                        continue
+
+                    # baseline default (trigger window: based on
+                    # window pretrigger length)
+                    baseline_info = info
+                    if slice_samples is not None:
+                        baseline_info = dict(info)
+                        baseline_info['nb_samples_pretrigger'] = (
+                            int(trigger_index)-slice_samples.start)
+
+                    # allocate block (one per file) if needed
+                    nb_samples = dataset.shape[1]
+                    if slice_samples is not None:
+                        nb_samples = slice_samples.stop-slice_samples.start
+                    if block is None:
+                        block_dtype = dtype if is_float else dataset.dtype
+                        block = np.empty((nb_events_file, nb_channels, nb_samples),
+                                         dtype=block_dtype)
+                    elif block.shape[1:]!=(nb_channels, nb_samples):
+                        raise ValueError('ERROR: Inconsistent number of '
+                                         + 'channels/samples between files!')
+                    
+                    # read directly in block
+                    self._read_traces(dataset, block[ievent],
+                                      selection['array_indices'],
+                                      slice_samples=slice_samples)
+                
+                    if include_metadata:
+                        block_info_list.append(info)
+
+                # windows that can't be extracted: NaN (0 if integer)
+                if not np.all(is_valid):
+                    if block is None:
+                        nb_samples, _ = self._get_window_length(
+                            self._get_file_cache(adc_name)['attrs']['sample_rate'],
+                            trace_length_msec=trace_length_msec,
+                            trace_length_samples=trace_length_samples,
+                            pretrigger_length_msec=pretrigger_length_msec,
+                            pretrigger_length_samples=pretrigger_length_samples)
+                        block_dtype = dtype if is_float else np.int16
+                        block = np.empty((nb_events_file, nb_channels, nb_samples),
+                                         dtype=block_dtype)
+                    block[~is_valid] = np.nan if block.dtype.kind=='f' else 0
+                        
+            # next event, close file if all events read
+            self._current_file_event_counter += nb_events_file
+            if self._current_file_event_counter>=self._current_file_nb_events:
+                self._close_file()
+
+            # convert/baseline subtract full block (NaN rows
+            # unchanged)
+            nb_events_skipped += int(np.sum(~is_valid))
+            if np.any(is_valid):
+                if do_convert:
+                    self._convert_traces(block, selection, adctoamp=adctoamp)
+                if baselinesub:
+                    block = self._subtract_baseline(block, baseline_info,
+                                                    baselineinds=baselineinds)
+                
+            # store (output array already filled in place),
+            # one row per event (None if not extracted)
+            if output_array is None:
+                traces = list(block)
+                for ievent in np.where(~is_valid)[0]:
+                    traces[ievent] = None
+                output_list.extend(traces)
+            elif block is not output_block:
+                output_block[...] = block
+            info_list.extend(block_info_list)
+            nb_events_read += nb_events_file
+            
+        # skipped events
+        if nb_events_skipped>0:
+            print('WARNING: Unable to extract ' + str(nb_events_skipped)
+                  + ' trace(s) from continuous data. Not enough samples '
+                  + 'from/to trigger! (NaN traces, "read_status"=1)')
+            
+        # output
+        output_data = output_list
+        if output_array is not None:
+            output_data = output_array[:nb_events_read]
+            
+        return output_data, info_list
+
+        
+
+    def _sort_events(self, output_data, info_list, event_list):
+        """
+        Sort events read file by file (see "set_files") in
+        event list order
+
+        Parameters
+        ----------
+        output_data : 3D numpy array or list of 2D arrays
+          traces in file order
+
+        info_list : list
+          metadata in file order (can be empty)
+        
+        event_list : list
+          list of event dictionaries
+
+        Return
+        ------
+        output_data, info_list : sorted traces and metadata
+        """
+
+        # event list position of each event read
+        positions = dict()
+        for ievent, event_dict in enumerate(event_list):
+            positions.setdefault(id(event_dict), list()).append(ievent)
+        order = list()
+        for file_event_list in self._file_dict.values():
+            for event_dict in file_event_list:
+                order.append(positions[id(event_dict)].pop(0))
+        order = np.argsort(order, kind='stable')
+        if np.all(order==np.arange(len(order))):
+            return output_data, info_list
+
+        # sort
+        if isinstance(output_data, np.ndarray):
+            output_data = output_data[order]
+        else:
+            output_data = [output_data[ind] for ind in order]
+        if info_list:
+            info_list = [info_list[ind] for ind in order]
+        
+        return output_data, info_list
+
+
+    def _read_events_parallel(self, nb_events, nb_events_files,
+                              nb_cores=2, output_shape=None,
+                              output_dtype=np.int16,
+                              read_args=None):
+        """
+        Read events with a pool of worker processes, each worker
+        reading a file or an event range of a file (at most 
+        nb_events/nb_cores events, see "_read_events_batch") into
+        a shared memory array, returned without copy (shared
+        memory closed when array deleted). Events and metadata 
+        are assembled in file order.
+
+        Parameters
+        ----------
+        nb_events : int
+          maximum number of events to read
+
+        nb_events_files : list of tuple
+          list of (file name, number of events in file), in 
+          reading order
+
+        nb_cores : int, optional
+          number of worker processes
+
+        output_shape : tuple, optional
+          shape of output array [events, channels, samples]
+          if None, list of 2D arrays returned
+
+        output_dtype : numpy dtype, optional
+          output array dtype
+
+        read_args : dict, optional
+          "_read_events_batch" arguments
+
+        Return
+        ------
+        
+        output_data : 3D numpy array or list of 2D arrays
+           traces [events, channels, samples]
+
+        info_list : list
+           file/event/detector metadata (empty list if 
+           "include_metadata" = False)
+        """
+
+        if read_args is None:
+            read_args = dict()
+            
+        # files and event ranges
+        # (file name, event list, output index, number of events,
+        # file event counter)
+        nb_events_job_max = max(1, int(np.ceil(nb_events/nb_cores)))
+        jobs = list()
+        event_start = 0
+        for file_name, nb_events_file in nb_events_files:
+            event_list = self._file_dict[file_name]
+            file_event_start = 0
+            nb_events_file = min(nb_events_file, nb_events-event_start)
+            while file_event_start<nb_events_file:
+                nb_events_job = min(nb_events_job_max,
+                                    nb_events_file-file_event_start)
+                if event_list is None:
+                    jobs.append((file_name, None, event_start,
+                                 nb_events_job, file_event_start))
+                else:
+                    jobs.append((file_name,
+                                 event_list[file_event_start:
+                                            file_event_start+nb_events_job],
+                                 event_start, nb_events_job, 0))
+                event_start += nb_events_job
+                file_event_start += nb_events_job
+            if event_start>=nb_events:
+                break
+
+        # shared memory output array
+        shm = None
+        shm_name = None
+        if output_shape is not None:
+            nb_bytes = int(np.prod(output_shape))*np.dtype(output_dtype).itemsize
+            shm = shared_memory.SharedMemory(create=True, size=max(nb_bytes, 1))
+            shm_name = shm.name
+            
+        output_list = list()
+        info_list = list()
+        output_data = None
+        try:
+
+            # read files
+            nb_workers = min(nb_cores, len(jobs))
+            with ProcessPoolExecutor(max_workers=nb_workers) as executor:
+                futures = list()
+                for (file_name, event_list, event_start, nb_events_job,
+                     file_event_start) in jobs:
+                    futures.append(
+                        executor.submit(_read_file_events,
+                                        file_name, event_list,
+                                        event_start, nb_events_job,
+                                        file_event_start=file_event_start,
+                                        shm_name=shm_name,
+                                        output_shape=output_shape,
+                                        output_dtype=output_dtype,
+                                        raise_errors=self._raise_errors,
+                                        use_memmap=self._use_memmap,
+                                        read_strategy=self._read_strategy,
+                                        read_args=read_args)
+                    )
+                results = [future.result() for future in futures]
+
+            # output array: shared memory (name removed, memory 
+            # released when array deleted, no copy)
+            if shm is not None:
+                shm.unlink()
+                output_data = np.ndarray(output_shape, dtype=output_dtype,
+                                         buffer=shm.buf)
+                weakref.finalize(output_data, _close_shared_memory, shm)
+                shm = None
+
+            # assemble (in file order), events not read
+            # (file error) removed
+            job_slices = list()
+            for job, result in zip(jobs, results):
+                event_start = job[2]
+                data, job_info_list, nb_events_job = result
+                if output_data is not None:
+                    job_slices.append(slice(event_start,
+                                            event_start+nb_events_job))
+                else:
+                    output_list.extend(data)
+                info_list.extend(job_info_list)
+
+            if output_data is not None:
+                nb_events_read = sum(job_slice.stop-job_slice.start
+                                     for job_slice in job_slices)
+                if nb_events_read==output_shape[0]:
+                    output_data = output_data[:nb_events_read]
+                else:
+                    output_data = np.concatenate(
+                        [output_data[job_slice] for job_slice in job_slices])
+            else:
+                output_data = output_list
+                
+        finally:
+
+            # release shared memory (error)
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+        return output_data, info_list
+
+        
+    def _get_event_info(self, dataset, selection, adc_name='adc1'):
+        """
+        Get event metadata: dataset attributes, file/adc 
+        attributes (cached) and channel selection
+        
+        Parameters
+        ----------
+        dataset : h5py dataset
+          event dataset
+        
+        selection : dict
+          channel selection (see "_get_channel_selection")
+        
+        adc_name : str, optional
+          name/ID of the adc
+          default: "adc1"
+
+        Return
+        ------
+        
+        info : dict
+           file/event/detector metadata
+        """
+
+        # get dataset metadata, then file/adc metadata
+        # (same for all events in file -> cached)
+        file_cache = self._get_file_cache(adc_name)
+        info = self._extract_metadata(dataset.attrs)
+        info.update(file_cache['attrs'])
+        info['read_status'] = 0
+        info['error_msg'] = ''
+        
+        # store channel info
+        info['adc_channel_indices'] = list(selection['adc_nums'])
+        info['adc_chans'] = list(selection['adc_nums'])
+        info['detector_chans'] = list(selection['detector_chans'])
+        info['tes_chans'] = list(selection['tes_chans'])
+        info['controller_chans'] = list(selection['controller_chans'])
+        info['adc_conversion_factor'] = selection['adc_conversion_factor']
+        info['voltage_range'] = selection['voltage_range']
+        info['detector_config'] = dict(selection['detector_config'])
+        
+        return info
+
+    
+    def _get_trace_slice(self, info, nb_samples_dataset,
+                         trigger_index=None,
+                         trace_length_msec=None,
+                         trace_length_samples=None,
+                         pretrigger_length_msec=None,
+                         pretrigger_length_samples=None):
+        """
+        Get samples slice of trace to extract based on 
+        trigger index (continuous data)
+
+        Parameters
+        ----------
+        info : dict
+          event metadata (requires "sample_rate")
+        
+        nb_samples_dataset : int
+          number of samples in dataset
+
+        other parameters : see "read_many_events"
+
+        Return
+        ------
+        
+        is_valid : bool
+          False if trace can't be extracted (not enough 
+          samples from/to trigger)
+
+        slice_samples : slice or None
+          samples slice (None if full trace)
+        """
+
+        # check trigger index
+        if trigger_index is not None:
+            if (trace_length_msec is None 
+                and trace_length_samples is None):
+                print('WARNING: Unable to extract trace based on '
+                      + 'trigger index without trace length. '
+                      + 'Returning full trace!')
+                trigger_index = None
+        else:
+            if (trace_length_msec is not None 
+                or  trace_length_samples is not None):
+                  print('WARNING: Unable to use trace lenght argument'
+                        + ' without trigger info. '
+                        + 'Returning full trace!')
+
+        # full trace
+        if trigger_index is None:
+            return True, None
+        
+        # extract trigger
+        trigger_index = int(trigger_index)
+    
+        # number samples and pre-trigger samples
+        nb_samples, nb_pretrigger_samples = self._get_window_length(
+            info['sample_rate'],
+            trace_length_msec=trace_length_msec,
+            trace_length_samples=trace_length_samples,
+            pretrigger_length_msec=pretrigger_length_msec,
+            pretrigger_length_samples=pretrigger_length_samples)
+
+        # min/max index
+        trace_min_index = int(trigger_index - nb_pretrigger_samples)
+        trace_max_index = int(trace_min_index + nb_samples)
+
+        if (trace_min_index<0
+            or trace_max_index>nb_samples_dataset):
+            return False, None
+
+        return True, slice(trace_min_index, trace_max_index)
+
+    
+    def _get_window_length(self, sample_rate,
+                           trace_length_msec=None,
+                           trace_length_samples=None,
+                           pretrigger_length_msec=None,
+                           pretrigger_length_samples=None):
+        """
+        Get trace and pretrigger length in samples
+        (pretrigger length default: half trace length)
+
+        Parameters
+        ----------
+        sample_rate : float
+          sample rate [Hz]
+
+        other parameters : see "read_many_events"
+
+        Return
+        ------
+        nb_samples : int
+          number of samples
+
+        nb_pretrigger_samples : int
+          number of pretrigger samples
+        """
+
+        # number samples
+        nb_samples = None
+        fs = sample_rate
+        if trace_length_samples is not None:
+            nb_samples = trace_length_samples
+        elif trace_length_msec is not None:
+            nb_samples = int(
+                fs*trace_length_msec/1000
+            )
+        else:
+            raise ValueError(
+                'ERROR: Number of samples required to '
+                + 'extract trace'
+            )
+
+        # pre-trigger
+        nb_pretrigger_samples = int(nb_samples/2)
+        if pretrigger_length_samples is not None:
+            nb_pretrigger_samples = pretrigger_length_samples
+        elif pretrigger_length_msec is not None:
+            nb_pretrigger_samples = int(
+                fs*pretrigger_length_msec/1000
+            )
+
+        return int(nb_samples), int(nb_pretrigger_samples)
+
+    
+    def _read_trigger_windows(self, event_indices, trigger_indices,
+                              selection, nb_samples, nb_pretrigger_samples,
+                              block=None, dtype=None,
+                              include_metadata=False,
+                              adc_name='adc1'):
+        """
+        Extract trigger windows from continuous data (current file):
+        windows are grouped by event ("dataset"), a minimal set of
+        covering segments is read once per event, then all windows
+        are sliced from the segments. Windows straddling two 
+        consecutive events are stitched with previous/next event 
+        data, including last/first event of previous/next dump 
+        of the series (see "_get_neighbour_event").
+
+        Parameters
+        ----------
+        event_indices : 1D numpy array
+          event (hdf5 "dataset") number of each window
+        
+        trigger_indices : 1D numpy array
+          trigger index of each window
+
+        selection : dict
+          channel selection (see "_get_channel_selection")
+
+        nb_samples : int
+          window length [samples]
+        
+        nb_pretrigger_samples : int
+          pretrigger length [samples]
+
+        block : 3D numpy array, optional
+          output array [windows, channels, samples]
+          (allocated if None)
+        
+        dtype : numpy dtype, optional
+          output dtype if block allocated
+          (default: dataset dtype)
+        
+        include_metadata : bool, optional
+          if True, return metadata of each window
+        
+        adc_name : str, optional
+          name/ID of the adc
+          default: "adc1"
+
+        Return
+        ------
+        block : 3D numpy array
+          output array, one row per window (same order as 
+          input). Windows that can't be extracted are filled
+          with NaN (0 if integer array)
+
+        is_valid : 1D numpy array
+          False if window can't be extracted (not enough
+          samples from/to trigger)
+
+        info_list : list
+          event metadata of each window, "read_status"=1 if 
+          window can't be extracted (empty if 
+          include_metadata=False)
+        """
+
+        array_indices = selection['array_indices']
+        nb_channels = len(array_indices)
+        nb_windows = len(event_indices)
+        
+        # window min/max index (relative to event)
+        event_indices = np.asarray(event_indices, dtype=np.int64)
+        starts = np.asarray(trigger_indices).astype(np.int64) - nb_pretrigger_samples
+        stops = starts + nb_samples
+        
+        # number of samples of each event (0 if not available),
+        # events before first/after last event of the file:
+        # previous/next dump
+        nb_events_file = self._get_nb_events_written(adc_name)
+        event_lengths = dict()
+        neighbours = dict()
+        unique_events = np.unique(event_indices)
+        for event_index in np.unique(np.concatenate([unique_events-1,
+                                                     unique_events,
+                                                     unique_events+1])):
+            event_lengths[event_index] = self._get_event_length(
+                event_index, adc_name=adc_name)
+            if (event_lengths[event_index]==0
+                and event_index in [0, nb_events_file+1]):
+                neighbour = self._get_neighbour_event(
+                    -1 if event_index==0 else 1, adc_name=adc_name)
+                if neighbour is not None:
+                    neighbours[event_index] = neighbour
+                    event_lengths[event_index] = neighbour['nb_samples']
+                
+        # valid windows (stitching only with previous/next event)
+        is_valid = np.zeros(nb_windows, dtype=bool)
+        for event_index in unique_events:
+            length = event_lengths[event_index]
+            if length==0 or event_index in neighbours:
+                continue
+            cut = (event_indices==event_index)
+            is_valid[cut] = (
+                (starts[cut] >= -event_lengths[event_index-1])
+                & (stops[cut] <= length+event_lengths[event_index+1])
+            )
+
+        # allocate output
+        if block is None:
+            if dtype is None:
+                dtype = self._get_event_dataset(unique_events[0],
+                                                adc_name=adc_name).dtype
+            block = np.empty((nb_windows, nb_channels, nb_samples),
+                             dtype=dtype)
+        block[~is_valid] = np.nan if block.dtype.kind=='f' else 0
+            
+        # loop events
+        info_list = [None]*nb_windows
+        for event_index in unique_events:
+
+            window_indices = np.where(event_indices==event_index)[0]
+
+            # metadata
+            info = None
+            if include_metadata:
+                if (event_lengths[event_index]>0
+                    and event_index not in neighbours):
+                    dataset = self._get_event_dataset(event_index,
+                                                      adc_name=adc_name)
+                    info = self._get_event_info(dataset, selection,
+                                                adc_name=adc_name)
+                else:
+                    info = dict(self._get_file_cache(adc_name)['attrs'])
+                    info['read_status'] = 0
+                    info['error_msg'] = ''
+                for ind in window_indices[~is_valid[window_indices]]:
+                    info_list[ind] = dict(info)
+                    info_list[ind]['read_status'] = 1
+                    info_list[ind]['error_msg'] = (
+                        'Unable to extract trace from continuous data. '
+                        + 'Not enough samples from/to trigger!')
+                        
+            window_indices = window_indices[is_valid[window_indices]]
+            if len(window_indices)==0:
+                continue
+                
+            # windows sorted by start index
+            window_indices = window_indices[
+                np.argsort(starts[window_indices], kind='stable')
+            ]
+
+            # group overlapping/close windows in segments
+            # (gap < window length)
+            segment_first = 0
+            segment_stop = stops[window_indices[0]]
+            for iwindow in range(1, len(window_indices)+1):
+
+                if (iwindow<len(window_indices)
+                    and starts[window_indices[iwindow]]<=segment_stop+nb_samples):
+                    segment_stop = max(segment_stop,
+                                       stops[window_indices[iwindow]])
+                    continue
+
+                # read segment once 
+                segment_indices = window_indices[segment_first:iwindow]
+                segment_start = starts[segment_indices[0]]
+                segment = self._read_segment(adc_name, event_index,
+                                             segment_start, segment_stop,
+                                             array_indices, event_lengths,
+                                             neighbours=neighbours)
+
+                # slice windows [channels, windows, samples]
+                windows = np.lib.stride_tricks.sliding_window_view(
+                    segment, nb_samples, axis=-1
+                )
+                windows = windows[:, starts[segment_indices]-segment_start, :]
+                block[segment_indices] = np.moveaxis(windows, 1, 0)
+
+                if include_metadata:
+                    for ind in segment_indices:
+                        info_list[ind] = dict(info)
+                        
+                # next segment
+                if iwindow<len(window_indices):
+                    segment_first = iwindow
+                    segment_stop = stops[window_indices[iwindow]]
+
+        if not include_metadata:
+            info_list = list()
+            
+        return block, is_valid, info_list
+
+
+    def _get_neighbour_event(self, direction, adc_name='adc1'):
+        """
+        Get last event of previous dump (direction=-1) or first
+        event of next dump (direction=1) of current file series
+        (file in same directory with same prefix, see 
+        "_get_file_index")
+
+        Parameters
+        ----------
+        direction : int
+          -1 (previous dump) or 1 (next dump)
+
+        adc_name : str, optional
+          name/ID of the adc
+          default: "adc1"
+
+        Return
+        ------
+        neighbour : dict or None
+          "file_name", "event_index" and "nb_samples" 
+          (None if dump or event not available)
+        """
+
+        # current file series/dump
+        match = re.search(r'^(.*)(I\d+_D\d{8}_T\d{6})_F(\d+)\.hdf5$',
+                          os.path.basename(self._current_file_name))
+        if match is None:
+            return None
+        prefix, series_name, dump_num = match.groups()
+
+        # neighbour file
+        file_list = sorted(glob(os.path.join(
+            os.path.dirname(self._current_file_name),
+            prefix + series_name + '_F*.hdf5')))
+        file_index = self._get_file_index(file_list)
+        file_name = file_index.get((int(extract_series_num(series_name)),
+                                    int(dump_num)+direction))
+        if file_name is None:
+            return None
+
+        # first/last event
+        try:
+            with h5py.File(file_name, 'r') as h5:
+                adc_group = h5[adc_name]
+                events, nb_events = _get_event_array(adc_group)
+                if events is None:
+                    nb_events = len([name for name in adc_group.keys()
+                                     if name.startswith('event_')])
+                    if 'nb_events' in adc_group.attrs:
+                        nb_events = min(nb_events,
+                                        int(adc_group.attrs['nb_events']))
+                if nb_events==0:
+                    return None
+                event_index = 1 if direction>0 else nb_events
+                if events is None:
+                    nb_samples = adc_group['event_'
+                                           + str(event_index)].shape[1]
+                else:
+                    nb_samples = events.shape[2]
+        except (OSError, KeyError):
+            return None
+
+        return {'file_name': file_name,
+                'event_index': event_index,
+                'nb_samples': nb_samples}
+
+    
+    def _read_segment(self, adc_name, event_index, start, stop,
+                      array_indices, event_lengths, neighbours=None):
+        """
+        Read continuous data segment [start, stop) of an event, 
+        using previous event data if start<0 and next event data
+        if stop>event length
+
+        Parameters
+        ----------
+        adc_name : str
+          name/ID of the adc
+
+        event_index : int
+          event (hdf5 "dataset") number
+
+        start, stop : int
+          segment min/max index (relative to event)
+
+        array_indices : array
+          dataset channel indices
+
+        event_lengths : dict
+          number of samples of previous/current/next events
+
+        neighbours : dict, optional
+          events of previous/next dump {event index in current
+          file numbering: neighbour event, see "_get_neighbour_event"}
+
+        Return
+        ------
+        segment : 2D numpy array
+          raw data [channels, stop-start]
+        """
+
+        if neighbours is None:
+            neighbours = dict()
+            
+        # parts [(event, min index, max index)]
+        length = event_lengths[event_index]
+        parts = list()
+        if start<0:
+            length_prev = event_lengths[event_index-1]
+            parts.append((event_index-1, length_prev+start,
+                          length_prev+min(stop, 0)))
+        if start<length and stop>0:
+            parts.append((event_index, max(start, 0), min(stop, length)))
+        if stop>length:
+            parts.append((event_index+1, max(start-length, 0), stop-length))
+
+        # read
+        dtype = self._get_event_dataset(event_index, adc_name=adc_name).dtype
+        segment = np.empty((len(array_indices), stop-start), dtype=dtype)
+        segment_index = 0
+        for part_event, part_start, part_stop in parts:
+            part_slice = slice(int(part_start), int(part_stop))
+            part = segment
+            if len(parts)>1:
+                part = np.empty((len(array_indices), part_stop-part_start),
+                                dtype=dtype)
+            if part_event in neighbours:
+                self._read_neighbour_traces(neighbours[part_event], part,
+                                            array_indices, part_slice,
+                                            adc_name=adc_name)
+            else:
+                dataset = self._get_event_dataset(part_event,
+                                                  adc_name=adc_name)
+                self._read_traces(dataset, part, array_indices,
+                                  slice_samples=part_slice)
+            if len(parts)>1:
+                segment[:, segment_index:segment_index+part.shape[1]] = part
+                segment_index += part.shape[1]
+
+        return segment
+
+
+    def _read_neighbour_traces(self, neighbour, dest, array_indices,
+                               slice_samples, adc_name='adc1'):
+        """
+        Read selected channels of an event of another dump 
+        (see "_get_neighbour_event"), same channel layout
+        as current file assumed
+
+        Parameters
+        ----------
+        neighbour : dict
+          "file_name" and "event_index"
+
+        dest : 2D numpy array
+          destination array [selected channels, samples] 
+
+        array_indices : array
+          dataset channel indices
+
+        slice_samples : slice
+          samples slice
+
+        adc_name : str, optional
+          name/ID of the adc
+          default: "adc1"
+
+        Return
+        ------
+        None
+        """
+        
+        with h5py.File(neighbour['file_name'], 'r') as h5:
+            adc_group = h5[adc_name]
+            events, _ = _get_event_array(adc_group)
+            if events is None:
+                dataset = adc_group['event_' + str(neighbour['event_index'])]
+                data = dataset[:, slice_samples]
+            else:
+                data = events[neighbour['event_index']-1, :, slice_samples]
+        dest[...] = data[array_indices]
+        
+    
+    def _read_traces(self, dataset, dest, array_indices,
+                     slice_samples=None):
+        """
+        Read selected channels from dataset directly into 
+        destination array (HDF5 converts to destination dtype)
+
+        Parameters
+        ----------
+        dataset : h5py dataset
+          event dataset [channels, samples]
+
+        dest : 2D numpy array
+          destination array [selected channels, samples] 
+
+        array_indices : array
+          dataset channel indices
+
+        slice_samples : slice, optional
+          samples slice (default: full trace)
+
+        Return
+        ------
+        None
+        """
+
+        # memory mapped raw data
+        if self._use_memmap:
+            view = self._get_dataset_view(dataset)
+            if view is not None:
+                if  slice_samples is not None:
+                    dest[...] = view[array_indices, slice_samples]
+                else:
+                    dest[...] = view[array_indices]
+                return
+        
+        # read strategy (format version 2: event is a single
+        # chunk -> full read instead of hyperslabs)
+        strategy = self._get_read_strategy(array_indices,
+                                           dataset.shape[0])
+        if strategy=='hyperslab' and isinstance(dataset, _EventDataset):
+            strategy = 'full'
+        if slice_samples is None:
+            slice_samples = slice(0, dataset.shape[1])
+
+        # one read per channel
+        if strategy=='rows':
+            for i, index in enumerate(array_indices):
+                dataset.read_direct(dest, np.s_[index, slice_samples],
+                                    np.s_[i])
+
+        # single contiguous block of channels (read in place)
+        elif strategy=='block':
+            slice_chans = slice(int(array_indices[0]),
+                                int(array_indices[-1])+1)
+            dataset.read_direct(dest, np.s_[slice_chans, slice_samples])
+
+        # full read then fancy index
+        elif strategy=='full':
+            shape = (dataset.shape[0],
+                     slice_samples.stop-slice_samples.start)
+            if (self._read_buffer is None
+                or self._read_buffer.shape!=shape
+                or self._read_buffer.dtype!=dataset.dtype):
+                self._read_buffer = np.empty(shape, dtype=dataset.dtype)
+            dataset.read_direct(self._read_buffer,
+                                np.s_[:, slice_samples])
+            dest[...] = self._read_buffer[array_indices]
+
+        # union of hyperslabs, single read
+        else:
+            self._read_hyperslab(dataset, dest, array_indices,
+                                 slice_samples)
+
+               
+    def _get_read_strategy(self, array_indices, nb_channels_dataset):
+        """
+        Get HDF5 read strategy based on channel selection
+        ("auto" strategy)
+
+        Parameters
+        ----------
+        array_indices : array
+          dataset channel indices
+
+        nb_channels_dataset : int
+          number of channels in dataset
+
+        Return
+        ------
+        strategy : str
+          'rows', 'block', 'full', or 'hyperslab'
+        """
+
+        nb_channels = len(array_indices)
+        if nb_channels==0:
+            return 'rows'
+        
+        # contiguous increasing channels (including all channels):
+        # always single read in place
+        is_block = (array_indices[-1]-array_indices[0]==nb_channels-1
+                    and np.all(np.diff(array_indices)==1))
+        if self._read_strategy=='rows':
+            return 'rows'
+        if is_block:
+            return 'block'
+        if self._read_strategy!='auto':
+            return self._read_strategy
+
+        # auto
+        if nb_channels>=self._full_read_fraction*nb_channels_dataset:
+            return 'full'
+        return 'hyperslab'
+
+    
+    def _read_hyperslab(self, dataset, dest, array_indices,
+                        slice_samples):
+        """
+        Read selected channels in a single HDF5 read using 
+        a union of hyperslabs (file order), then reorder 
+        if channels not sorted
+
+        Parameters
+        ----------
+        dataset : h5py dataset
+          event dataset [channels, samples]
+
+        dest : 2D numpy array
+          destination array [selected channels, samples] 
+
+        array_indices : array
+          dataset channel indices
+
+        slice_samples : slice
+          samples slice
+
+        Return
+        ------
+        None
+        """
+
+        # sorted channels (HDF5 reads selection in file order)
+        order = np.argsort(array_indices, kind='stable')
+        sorted_indices = np.asarray(array_indices)[order]
+        is_sorted = np.all(order==np.arange(len(order)))
+        if (len(np.unique(sorted_indices))!=len(sorted_indices)
+            or not dest.flags['C_CONTIGUOUS']):
+            # duplicates or non-contiguous output: per channel
+            for i, index in enumerate(array_indices):
+                dataset.read_direct(dest, np.s_[index, slice_samples],
+                                    np.s_[i])
+            return
+
+        # file selection
+        nb_samples = slice_samples.stop-slice_samples.start
+        file_space = dataset.id.get_space()
+        file_space.select_none()
+        for index in sorted_indices:
+            file_space.select_hyperslab((int(index), slice_samples.start),
+                                        (1, nb_samples),
+                                        op=h5py.h5s.SELECT_OR)
+
+        # read
+        output = dest
+        if not is_sorted:
+            output = np.empty_like(dest)
+        mem_space = h5py.h5s.create_simple(output.shape)
+        dataset.id.read(mem_space, file_space, output)
+        if not is_sorted:
+            dest[order] = output
+
+                
+    def _get_dataset_view(self, dataset):
+        """
+        Get read-only memory mapped view of dataset raw data
+        using dataset file offset. Return None if dataset is not
+        contiguous (chunked, compressed, not allocated,...)
+
+        Parameters
+        ----------
+        dataset : h5py dataset
+          event dataset
+
+        Return
+        ------
+        view : numpy.memmap or None
+          read-only view of dataset
+        """
+
+        # check layout
+        if (dataset.chunks is not None
+            or dataset.compression is not None
+            or dataset.size==0):
+            return None
+
+        # offset in file
+        try:
+            offset = dataset.id.get_offset()
+        except Exception:
+            offset = None
+        if offset is None:
+            return None
+        
+        # map file (once per file)
+        if self._current_file_memmap is None:
+            self._current_file_memmap = np.memmap(self._current_file_name,
+                                                  dtype=np.uint8, mode='r')
+        # view
+        nb_bytes = dataset.size*dataset.dtype.itemsize
+        if offset+nb_bytes>self._current_file_memmap.size:
+            return None
+        
+        view = self._current_file_memmap[offset:offset+nb_bytes]
+        view = view.view(dataset.dtype).reshape(dataset.shape)
+
+        return view
+        
+    
+    def _convert_traces(self, traces, selection, adctoamp=False,
+                        dtype=np.float64):
+        """
+        Convert traces from ADC to volts, and optionally to 
+        amps (in place if float traces)
+
+        Parameters
+        ----------
+        traces : numpy array
+          array [channels, samples] or 
+          [events, channels, samples]
+
+        selection : dict
+          channel selection (see "_get_channel_selection")
+
+        adctoamp : bool, optional
+          convert to close loop amps
+          default: False
+
+        dtype : numpy dtype, optional
+          output dtype if traces not float
+          default: np.float64
+
+        Return
+        ------
+        traces : numpy float array
+          converted traces
+        """
+
+        cal = self._get_calibration(selection, adctoamp=adctoamp)
+
+        out = None
+        if np.issubdtype(traces.dtype, np.floating):
+            out = traces
+        return cal.apply(traces, out=out, dtype=dtype)
+
+    
+    def _check_float_dtype(self, dtype):
+        """
+        Check output float dtype (np.float64 or np.float32)
+
+        Parameters
+        ----------
+        dtype : numpy dtype or str
+          float dtype
+
+        Return
+        ------
+        dtype : numpy dtype
+        """
+
+        dtype = np.dtype(dtype)
+        if dtype not in [np.dtype(np.float64), np.dtype(np.float32)]:
+            raise ValueError('ERROR: dtype should be np.float64 '
+                             + 'or np.float32!')
+        return dtype
+
+    
+    def _get_calibration(self, selection, adctoamp=False):
+        """
+        Get (cached) ADC calibration of channel selection
+        (polynomial coefficient matrix, with fused close loop 
+        normalization if "adctoamp")
+
+        Parameters
+        ----------
+        selection : dict
+          channel selection (see "_get_channel_selection")
+
+        adctoamp : bool, optional
+          convert to close loop amps
+          default: False
+
+        Return
+        ------
+        cal : pytesdaq.utils.calibration.ADCCalibration
+        """
+
+        key = 'calibration_amp' if adctoamp else 'calibration'
+        if key in selection:
+            return selection[key]
+
+        # close loop normalization
+        close_loop_norm = None
+        if adctoamp:
+            detector_config = selection['detector_config']
+            close_loop_norm = list()
+            for det in selection['detector_chans']:
+                if 'close_loop_norm' not in detector_config[det]:
+                    raise ValueError('ERROR: Unable to convert to amps. '
+                                     + 'No normalization available for ' + det)
+                close_loop_norm.append(detector_config[det]['close_loop_norm'])
+                
+        selection[key] = calibration.get_adc_calibration(
+            selection['adc_conversion_factor'],
+            close_loop_norm=close_loop_norm)
+        
+        return selection[key]
+
+                
+    def _subtract_baseline(self, traces, info, baselineinds=None):
+        """
+        Subtract pre-pulse baseline (in place if float array)
+
+        Parameters
+        ----------
+        traces : numpy array
+          array [channels, samples] or 
+          [events, channels, samples]
+
+        info : dict
+          event metadata
+
+        baselineinds: tuple (int, int) or list [int, int]
+          min/max index for  baseline calculation 
+          default: (10, 0.8*pretrigger length))
+          
+        Return
+        ------
+        traces : numpy array
+          baseline subtracted traces
+        """
+
+        # find baseline start/stop
+        baseline_start = None
+        baseline_stop = None
+        if baselineinds is not None:
+            if len(baselineinds)!=2:
+                raise ValueError('ERROR: baselineinds should be list/tuple of length 2')
+            baseline_start = baselineinds[0]
+            baseline_stop =  baselineinds[1]
+                
+        elif 'nb_samples_pretrigger' in info:
+            baseline_start = 10
+            baseline_stop = int(round(info['nb_samples_pretrigger']*0.8))
+
+        if (baseline_start is None or baseline_stop is None or
+            baseline_stop<=baseline_start or baseline_stop>=traces.shape[-1]):
+            raise ValueError('ERROR: Unable to find baseline start/stop. '
+                             + 'Add argument "baselineinds"')
+
+        baseline = np.mean(traces[..., baseline_start:baseline_stop],
+                           axis=-1, keepdims=True)
+        
+        if traces.dtype.kind == 'f':
+            traces -= baseline
+        else:
+            traces = traces - baseline
+            
+        return traces
+        
+
+
+    def _get_file_dict(self, filepaths, series=None, event_list=None):
+        """
+        Get a list of files (full path)  from directories/files
+        and filter based on event_list
+
+        Parameters
+        ----------
+        filepaths : str or list
+         file/directory and/or list of files/directories
+
+        series : str/int or list/array of str/int
+         filter file list based on series number(s) or series name(s)
+
+        event_list : list, optional
+          list containing dictionary with events metadata
+          such as 
+             - "series_number"
+             - "event_number"
+             - "group_name" 
+           
+           File list is filtered based on requested events        
+          
+
+        Return
+        ------
+        
+        file_list : list 
+          list of files (full path)
+
+        """
+
+        # =======================
+        # Get list of files
+        # =======================
+
+        # check if group name
+        # available in event_list
+        group_names = list()
+        if event_list is not None:
+            for event_dict in event_list:
+                if 'group_name' in event_dict.keys():
+                    group_names.append(str(event_dict['group_name']))
+        
+        # make unique
+        group_names = list(set(group_names))
+     
+        # loop file/path list to get list of files
+        file_list  = list()
+        if isinstance(filepaths, str):
+            filepaths = [filepaths]
+
+        for filepath in filepaths:
+            
+            # case directory
+            if os.path.isdir(filepath):
+                
+                search_list = list()
+                for group_name in group_names:
+                    # add group name to path if not
+                    # already in path
+                    if group_name not in filepath:
+                        filepath =  (filepath + '/'
+                                     + group_name)
+                        
+                    # add to search list
+                    search_str = filepath + '/*.hdf5'
+                    if search_str not in search_list:
+                        search_list.append(search_str)
+
+                if not search_list:
+                    search_list = [filepath + '/*.hdf5']
+
+                # get files
+                for search_str in search_list:
+                    file_list.extend(glob(search_str))
+
+            # case a file
+            else:
+                if filepath[-4:]!='hdf5':
+                    filepath += '.hdf5'
+                if os.path.isfile(filepath):
+                    file_list.append(filepath)
+
+        if not file_list:
+            if self._raise_errors:
+                raise ValueError('No files found!')
+            else:
+                print('ERROR: No files found!')
+                return
+
+        # make unique and sort
+        file_list = list(set(file_list))
+        file_list = sorted(file_list)
+
+
+        # =======================
+        # Filter files based on
+        # series
+        # =======================
+
+        # series
+        if series is not None:
+
+            # convert to array
+            if (not isinstance(series, list)
+                and not isinstance(series, set)
+                and not isinstance(series, np.ndarray)):
+                series = [series]
+
+
+            # unique
+            series = list(set(series))
+
+            # loop and convert to series name if needed
+            for it in range(len(series)):
+                if isinstance(series[it], (int, np.integer)):
+                    series[it] = extract_series_name(series[it])
+
+
+            # filter list
+            file_list_temp = list()
+            for afile in file_list:
+                for aseries in series:
+                    if aseries in afile:
+                        file_list_temp.append(afile)
+                        break
+            # replace
+            file_list = file_list_temp
+                
+                
+        # =======================
+        # Filter files based on
+        # event_list
+        # build dictionary
+        # =======================
+
+        # initialize
+        output_dict = dict()
+
+        # case no event list
+        if event_list is None:
+            for afile in file_list:
+                output_dict[afile] = None
+            return output_dict
+
+
+        # case event list
+
+        # series/dump numbers of requested events
+        nb_events = len(event_list)
+        series_nums = np.zeros(nb_events, dtype=np.uint64)
+        dump_nums = np.zeros(nb_events, dtype=np.int64)
+        for ievent, event_dict in enumerate(event_list):
+            
+            # checks
+            if 'series_number' not in event_dict:
+                raise ValueError(
+                    'ERROR: "series_number" required in event dictionary!'
+                )
+            
+            if 'event_number' not in event_dict:
+                raise ValueError(
+                    'ERROR: "event_number" required in event dictionary!'
+                )
+
+            series_nums[ievent] = int(event_dict['series_number'])
+            dump_nums[ievent] = int(event_dict['event_number'])//100000
+
+        # file index {(series_num, dump_num): file}
+        file_index = self._get_file_index(file_list)
+        
+        # group events by (series, dump), ordered by first
+        # appearance in event list
+        event_keys = np.stack([series_nums, dump_nums.astype(np.uint64)], axis=1)
+        unique_keys, first_indices, inverse = np.unique(
+            event_keys, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        event_indices = np.argsort(inverse, kind='stable')
+        group_bounds = np.cumsum(np.bincount(inverse,
+                                             minlength=len(unique_keys)))
+        
+        for igroup in np.argsort(first_indices):
+
+            # find file 
+            series_num = int(unique_keys[igroup][0])
+            dump_num = int(unique_keys[igroup][1])
+            full_file_name = file_index.get((series_num, dump_num))
+
+            if full_file_name is None:
+                full_file_name = self._find_file(file_list, series_num, dump_num)
+                
+            if not full_file_name:
+                raise ValueError(
+                    'ERROR: Unable to find file for a requested event.'
+                    + ' Check path!' )
+
+            # events in group
+            group_start = 0
+            if igroup>0:
+                group_start = group_bounds[igroup-1]
+            group_indices = event_indices[group_start:group_bounds[igroup]]
+            group_events = [event_list[ind] for ind in group_indices]
+            
+            # double check group if available
+            for event_dict in group_events:
+                if 'group_name' in event_dict:
+                    group_name = str(event_dict['group_name'])
+                    if group_name not in full_file_name:
+                        raise ValueError(
+                            'ERROR: Inconsistent group name. Unable to '
+                            ' find proper data!'
+                        )
+
+            # save
+            if full_file_name in output_dict:
+                output_dict[full_file_name].extend(group_events)
+            else:
+                output_dict[full_file_name] = group_events
+            
+        return output_dict
+            
+
+
+    def _get_file_index(self, file_list):
+        """
+        Build file index based on file names 
+        (format: [prefix_]Ix_Dyyyymmdd_Thhmmss_Fxxxx.hdf5)
+
+        Parameters
+        ----------
+        file_list : list
+          list of files (full path), sorted
+
+        Return
+        ------
+        file_index : dict
+          {(series_num, dump_num): file}
+          (first file in list if multiple prefixes)
+        """
+
+        file_index = dict()
+        for afile in file_list:
+            match = re.search(r'(I\d+_D\d{8}_T\d{6})_F(\d+)\.hdf5$', afile)
+            if match is None:
+                continue
+            key = (int(extract_series_num(match.group(1))),
+                   int(match.group(2)))
+            if key not in file_index:
+                file_index[key] = afile
+
+        return file_index
+
+    
+    def _find_file(self, file_list, series_num, dump_num):
+        """
+        Find file for a series/dump number based 
+        on file name (slow search, file name not 
+        indexed) 
+        
+        Parameters
+        ----------
+        file_list : list
+          list of files (full path)
+
+        series_num : int
+          series number
+
+        dump_num : int
+          dump number
+
+        Return
+        ------
+        file_name : str
+          full file name (empty string if not found)
+        """
+
+        # build file name (without prefix)
+        series_name = extract_series_name(series_num)
+        dump_name = str(dump_num)
+        for x in range(1,5-len(dump_name)):
+            dump_name = '0' + dump_name
+
+        file_name = (series_name
+                     + '_F'
+                     + dump_name
+                     + '.hdf5')
+
+        # find file in file_list
+        for afile in file_list:
+            if file_name in afile:
+                return afile
+
+        return str()
+    
+        
+
+
+
+
+
+
+
+                              
+
+
+    
+def convert_file_format(filepath, output_path, format_version=2,
+                        series=None, compression=None,
+                        compression_level=None, shuffle=True,
+                        verbose=True):
+    """
+    Rewrite raw data files in another format version 
+    (see H5Writer "format_version"), same file names
+
+    Parameters
+    ----------
+    filepath : str or list
+      file/directory or list of files/directories
+
+    output_path : str
+      output directory (different from input directory)
+
+    format_version : int, optional
+      output format version (1 or 2)
+      default: 2
+
+    series : str/int or list, optional
+      filter files based on series number(s)/name(s)
+
+    compression, compression_level, shuffle : optional
+      output raw data compression (see "get_compression_filter")
+      default: no compression
+
+    verbose : bool, optional
+      display messages
+      default: True
+
+    Return
+    ------
+    output_files : list
+      list of files written
+    """
+
+    if format_version not in [1, 2]:
+        raise ValueError('ERROR: Format version should be 1 or 2!')
+    filter_kwargs = get_compression_filter(
+        compression, compression_level=compression_level,
+        shuffle=shuffle)
+
+    # files
+    reader = H5Reader(verbose=False)
+    file_list = list(reader._get_file_dict(filepath, series=series).keys())
+
+    if not os.path.isdir(output_path):
+        os.makedirs(output_path)
+    
+    # convert
+    output_files = list()
+    for file_name in file_list:
+        
+        output_file = os.path.join(output_path, os.path.basename(file_name))
+        if os.path.abspath(output_file)==os.path.abspath(file_name):
+            raise ValueError('ERROR: Output file ' + output_file
+                             + ' same as input file!')
+        _convert_file(file_name, output_file, format_version,
+                      filter_kwargs=filter_kwargs)
+        output_files.append(output_file)
+
+        if verbose:
+            print('INFO: File ' + output_file + ' written (format version '
+                  + str(format_version) + ')')
+
+    return output_files
+
+
+def _convert_file(file_name, output_file, format_version,
+                  filter_kwargs=None):
+    """
+    Rewrite single raw data file (see "convert_file_format")
+    """
+
+    if filter_kwargs is None:
+        filter_kwargs = dict()
+
+    with h5py.File(file_name, 'r') as h5_input, \
+         h5py.File(output_file, 'w') as h5_output:
+
+        # file attributes
+        for key, val in h5_input.attrs.items():
+            h5_output.attrs[key] = val
+        if format_version==1:
+            if 'format_version' in h5_output.attrs:
+                del h5_output.attrs['format_version']
+        else:
+            h5_output.attrs['format_version'] = format_version
+
+        for group_name, group in h5_input.items():
+
+            # event index tables: re-written
+            if group_name==_EVENT_INDEX_GROUP:
+                continue
+            
+            # non adc groups: copy
+            if not group_name.startswith('adc'):
+                h5_input.copy(group, h5_output, name=group_name)
+                continue
+
+            output_group = h5_output.create_group(group_name)
+            for key, val in group.attrs.items():
+                output_group.attrs[key] = val
+            
+            # format version 1
+            nb_events = 0
+            if format_version==1:
+                for event_index, data, attrs in _iter_group_events(group):
+                    dataset_kwargs = dict(filter_kwargs)
+                    if filter_kwargs:
+                        dataset_kwargs['chunks'] = data.shape
+                    dataset = output_group.create_dataset(
+                        'event_' + str(event_index), data=data,
+                        **dataset_kwargs)
+                    for key, val in attrs.items():
+                        dataset.attrs[key] = val
+                    nb_events += 1
+                output_group.attrs['nb_events'] = nb_events
+                _convert_event_index(h5_output, output_group)
+                continue
+
+            # format version 2
+            events = None
+            columns = dict()
+            for event_index, data, attrs in _iter_group_events(group):
+
+                if event_index!=nb_events+1:
+                    raise ValueError('ERROR: Format version 2 requires '
+                                     + 'consecutive event indices! ('
+                                     + file_name + ')')
+
+                # create events dataset based on first event
+                if events is None:
+                    nb_events_file = _get_nb_events_group(group)
+                    events = output_group.create_dataset(
+                        'events', shape=(nb_events_file,) + data.shape,
+                        maxshape=(None,) + data.shape,
+                        chunks=(1,) + data.shape,
+                        dtype=data.dtype,
+                        **filter_kwargs)
+                    columns = {key: list() for key in attrs.keys()}
+                    
+                if data.shape!=events.shape[1:]:
+                    raise ValueError('ERROR: Format version 2 requires '
+                                     + 'same event shape for all events! ('
+                                     + file_name + ')')
+                events[nb_events] = data
+                for key in columns.keys():
+                    columns[key].append(attrs.get(key, 0))
+                nb_events += 1
+
+            if events is not None and events.shape[0]!=nb_events:
+                events.resize(nb_events, axis=0)
+                
+            # metadata columns
+            if events is not None:
+                metadata_group = output_group.create_group('event_metadata')
+                for key, values in columns.items():
+                    values = np.array(values)
+                    dtype = values.dtype
+                    if dtype.kind in ['U', 'S', 'O']:
+                        dtype = h5py.string_dtype()
+                    metadata_group.create_dataset(
+                        key, data=values.astype(dtype),
+                        maxshape=(None,) + values.shape[1:],
+                        chunks=(max(1, min(1024, nb_events)),) + values.shape[1:])
+                
+            output_group.attrs['nb_events'] = nb_events
+            _convert_event_index(h5_output, output_group)
+
+
+def build_virtual_dataset(filepath, output_file, series=None,
+                          adc_name='adc1', verbose=True):
+    """
+    Build a virtual dataset (VDS) file over all dumps of a series
+    or group: single [events, channels, samples] "events" dataset
+    mapped to the dump files (raw data not copied), per-event
+    metadata columns ("series_num" and "dump_num" added, 
+    "event_index" = index in dump) and event index table. The 
+    VDS file has the format version 2 layout and can be read 
+    with H5Reader like a single dump (see also H5Reader 
+    "read_virtual_events").
+
+    Dumps are referenced with paths relative to the VDS file
+    (VDS file and dumps can be moved together). Format version 1 
+    dumps require one mapping per event (format version 2: one 
+    mapping per dump).
+
+    Parameters
+    ----------
+    filepath : str or list
+      group directory, file or list of files/directories
+
+    output_file : str
+      VDS file name (full path), should not be in a raw data 
+      directory (would be listed as a dump)
+
+    series : str/int or list, optional
+      filter files based on series number(s)/name(s)
+
+    adc_name : str, optional
+      name/ID of the adc
+      default: "adc1"
+
+    verbose : bool, optional
+      display messages
+      default: True
+
+    Return
+    ------
+    nb_events : int
+      number of events in VDS
+    """
+
+    # files
+    reader = H5Reader(verbose=False)
+    file_list = list(reader._get_file_dict(filepath, series=series).keys())
+
+    output_file = os.path.abspath(output_file)
+    output_dir = os.path.dirname(output_file)
+    if output_dir in [os.path.dirname(os.path.abspath(afile))
+                      for afile in file_list]:
+        raise ValueError('ERROR: VDS file should not be in a raw '
+                         + 'data directory!')
+    
+    # scan dumps: event shape/dtype, event indices, metadata
+    sources = list()
+    event_shape = None
+    event_dtype = None
+    for file_name in file_list:
+
+        with h5py.File(file_name, 'r') as h5:
+
+            if adc_name not in h5:
+                continue
+            adc_group = h5[adc_name]
+            source = {'file_name': file_name,
+                      'series_num': int(h5.attrs.get('series_num', 0)),
+                      'dump_num': int(h5.attrs.get('dump_num', 0))}
+
+            # events
+            events, nb_events = _get_event_array(adc_group)
+            if events is not None:
+                source['nb_rows'] = events.shape[0]
+                event_indices = np.arange(1, nb_events+1, dtype=np.int64)
+                shapes = [(events.shape[1:], events.dtype)]
+            else:
+                event_indices = np.array(
+                    sorted(int(name[6:]) for name in adc_group.keys()
+                           if name.startswith('event_')), dtype=np.int64)
+                shapes = set()
+                for event_index in event_indices:
+                    dataset = adc_group['event_' + str(event_index)]
+                    shapes.add((dataset.shape, dataset.dtype))
+            if len(event_indices)==0:
+                continue
+
+            for shape, dtype in shapes:
+                if event_shape is None:
+                    event_shape, event_dtype = shape, dtype
+                if shape!=event_shape or dtype!=event_dtype:
+                    raise ValueError('ERROR: Inconsistent event shape/dtype '
+                                     + 'between events! (' + file_name + ')')
+
+            source['is_events_array'] = events is not None
+            source['event_indices'] = event_indices
+            source['columns'] = _get_event_metadata_columns(adc_group)
+            source['index'] = _read_event_index(adc_group)
+            sources.append(source)
+
+    if not sources:
+        raise ValueError('ERROR: No events found!')
+    nb_events_tot = sum(len(source['event_indices']) for source in sources)
+    
+    # virtual layout
+    layout = h5py.VirtualLayout(shape=(nb_events_tot,) + event_shape,
+                                dtype=event_dtype)
+    row = 0
+    for source in sources:
+        source_name = os.path.relpath(source['file_name'], output_dir)
+        nb_events = len(source['event_indices'])
+        if source['is_events_array']:
+            vsource = h5py.VirtualSource(
+                source_name, adc_name + '/events',
+                shape=(source['nb_rows'],) + event_shape)
+            layout[row:row+nb_events] = vsource[:nb_events]
+        else:
+            for ievent, event_index in enumerate(source['event_indices']):
+                layout[row+ievent] = h5py.VirtualSource(
+                    source_name, adc_name + '/event_' + str(event_index),
+                    shape=event_shape)
+        row += nb_events
+
+    # metadata columns (missing values: 0) 
+    columns = dict()
+    for source in sources:
+        source['columns']['series_num'] = np.full(
+            len(source['event_indices']), source['series_num'], dtype=np.int64)
+        source['columns']['dump_num'] = np.full(
+            len(source['event_indices']), source['dump_num'], dtype=np.int64)
+        for key, column in source['columns'].items():
+            if key not in columns:
+                columns[key] = column
+    for key in list(columns.keys()):
+        values = list()
+        for source in sources:
+            column = source['columns'].get(key)
+            if column is None:
+                column = np.zeros((len(source['event_indices']),)
+                                  + columns[key].shape[1:],
+                                  dtype=columns[key].dtype)
+            values.append(column)
+        try:
+            columns[key] = np.concatenate(values)
+        except ValueError:
+            print('WARNING: Inconsistent event metadata "' + key 
+                  + '" between dumps. Skipping!')
+            del columns[key]
+
+    # event index table (VDS event index, no byte offset)
+    index = np.concatenate([source['index'] for source in sources])
+    index['event_index'] = np.arange(1, nb_events_tot+1)
+    index['byte_offset'] = -1
+    
+    # write
+    with h5py.File(sources[0]['file_name'], 'r') as h5_input, \
+         h5py.File(output_file, 'w') as h5_output:
+
+        # file attributes and non adc groups (first dump)
+        for key, val in h5_input.attrs.items():
+            h5_output.attrs[key] = val
+        h5_output.attrs['format_version'] = 2
+        h5_output.attrs['nb_dumps'] = len(sources)
+
+        # series/dump numbers: event metadata columns
+        # (series number file attribute if single series)
+        if 'dump_num' in h5_output.attrs:
+            del h5_output.attrs['dump_num']
+        if (len(set(source['series_num'] for source in sources))>1
+            and 'series_num' in h5_output.attrs):
+            del h5_output.attrs['series_num']
+        for group_name, group in h5_input.items():
+            if (not group_name.startswith('adc')
+                and group_name!=_EVENT_INDEX_GROUP):
+                h5_input.copy(group, h5_output, name=group_name)
+
+        # adc group
+        adc_group = h5_output.create_group(adc_name)
+        for key, val in h5_input[adc_name].attrs.items():
+            adc_group.attrs[key] = val
+        adc_group.attrs['nb_events'] = nb_events_tot
+        adc_group.create_virtual_dataset('events', layout, fillvalue=0)
+        metadata_group = adc_group.create_group('event_metadata')
+        for key, values in columns.items():
+            dtype = values.dtype
+            if dtype.kind in ['U', 'S', 'O']:
+                dtype = h5py.string_dtype()
+            metadata_group.create_dataset(key, data=values.astype(dtype))
+        _write_event_index(adc_group, index=index)
+        adc_group.create_dataset(
+            'source_files', dtype=h5py.string_dtype(),
+            data=[os.path.relpath(source['file_name'], output_dir)
+                  for source in sources])
+
+    if verbose:
+        print('INFO: VDS file ' + output_file + ' written ('
+              + str(nb_events_tot) + ' events, ' + str(len(sources))
+              + ' dumps)')
+
+    return nb_events_tot
+
+
+def _convert_event_index(h5_output, output_group):
+    """
+    Write event index table of converted adc group (see 
+    "_convert_file")
+    """
+
+    h5_output.flush()
+    columns = _get_event_metadata_columns(
+        output_group, keys=list(_EVENT_INDEX_FIELDS.keys()))
+    _write_event_index(output_group, columns)
+
+            
+def _get_nb_events_group(adc_group):
+    """
+    Number of events in adc group (both formats)
+    """
+
+    events, nb_events = _get_event_array(adc_group)
+    if events is not None:
+        return nb_events
+    return sum(1 for name in adc_group.keys() if name.startswith('event_'))
+
+    
+def _iter_group_events(adc_group):
+    """
+    Generator: iterate over events of adc group (both formats), 
+    sorted by event index
+
+    Yield
+    -----
+    event_index : int
+    data : 2D numpy array
+    attrs : dict
+    """
+
+    events, nb_events = _get_event_array(adc_group)
+
+    # format version 2
+    if events is not None:
+        columns = _read_event_columns(adc_group, nb_events)
+        for row in range(nb_events):
+            attrs = {key: column[row] for key, column in columns.items()}
+            yield row+1, events[row], attrs
+        return
+
+    # format version 1
+    event_indices = sorted(int(name[6:]) for name in adc_group.keys()
+                           if name.startswith('event_'))
+    for event_index in event_indices:
+        dataset = adc_group['event_' + str(event_index)]
+        yield event_index, dataset[()], dict(dataset.attrs)
+
+
+def _get_event_array(adc_group):
+    """
+    Get events dataset of format version 2 adc group 
+    ([events, channels, samples] dataset)
+
+    Parameters
+    ----------
+    adc_group : h5py group
+      adc group
+
+    Return
+    ------
+    events : h5py dataset or None
+      events dataset (None if format version 1: one
+      dataset per event)
+
+    nb_events : int
+      number of events (0 if format version 1)
+    """
+
+    events = adc_group.get('events')
+    if not isinstance(events, h5py.Dataset):
+        return None, 0
+
+    # number of events written (dataset resized by blocks
+    # while writing)
+    nb_events = events.shape[0]
+    if 'nb_events' in adc_group.attrs:
+        nb_events = min(nb_events, int(adc_group.attrs['nb_events']))
+
+    return events, nb_events
+
+
+def _read_event_columns(adc_group, nb_events, keys=None):
+    """
+    Read per-event metadata columns of format version 2 
+    adc group ("event_metadata" group)
+
+    Parameters
+    ----------
+    adc_group : h5py group
+      adc group
+
+    nb_events : int
+      number of events
+
+    keys : list, optional
+      metadata names (default: all)
+
+    Return
+    ------
+    columns : dict
+      {name: numpy array [events, ...]}
+    """
+
+    columns = dict()
+    metadata_group = adc_group.get('event_metadata')
+    if metadata_group is None:
+        return columns
+
+    for key, column in metadata_group.items():
+        if keys is not None and key not in keys:
+            continue
+        columns[key] = column[:nb_events]
+
+    return columns
+
+
+def _get_event_metadata_columns(adc_group, keys=None):
+    """
+    Read per-event metadata of adc group as columns (both
+    formats), sorted by event index
+
+    Parameters
+    ----------
+    adc_group : h5py group
+      adc group
+
+    keys : list, optional
+      metadata names (default: all)
+
+    Return
+    ------
+    columns : dict
+      {name: numpy array} including "event_index"
+    """
+
+    columns = dict()
+    events, nb_events = _get_event_array(adc_group)
+
+    # format version 2: metadata columns
+    if events is not None:
+        columns = _read_event_columns(adc_group, nb_events, keys=keys)
+        columns['event_index'] = np.arange(1, nb_events+1, dtype=np.int64)
+        return columns
+
+    # format version 1: dataset attributes
+    event_indices = np.array(
+        sorted(int(name[6:]) for name in adc_group.keys()
+               if name.startswith('event_')), dtype=np.int64)
+    values = dict()
+    for ievent, event_index in enumerate(event_indices):
+        attrs = adc_group['event_' + str(event_index)].attrs
+        for key, val in attrs.items():
+            if keys is not None and key not in keys:
+                continue
+            if key not in values:
+                values[key] = [0]*len(event_indices)
+            values[key][ievent] = val
+    for key, val in values.items():
+        columns[key] = np.array(val)
+    columns['event_index'] = event_indices
+
+    return columns
+
+
+def _get_event_offsets(adc_group, event_indices):
+    """
+    File byte offset of event data: contiguous dataset offset
+    or (compressed) data chunk offset (format version 2: one
+    chunk per event). -1 if not available (e.g. storage not
+    allocated)
+
+    Parameters
+    ----------
+    adc_group : h5py group
+      adc group
+
+    event_indices : array-like
+      event indices
+
+    Return
+    ------
+    offsets : numpy array (int64)
+    """
+
+    offsets = np.full(len(event_indices), -1, dtype=np.int64)
+    events, nb_events = _get_event_array(adc_group)
+    for ievent, event_index in enumerate(event_indices):
+        try:
+            if events is not None:
+                coord = (int(event_index)-1,) + (0,)*(events.ndim-1)
+                offset = events.id.get_chunk_info_by_coord(coord).byte_offset
+            else:
+                dataset = adc_group['event_' + str(event_index)]
+                if dataset.chunks is None:
+                    offset = dataset.id.get_offset()
+                else:
+                    offset = dataset.id.get_chunk_info(0).byte_offset
+        except (KeyError, ValueError, RuntimeError):
+            continue
+        if offset is not None:
+            offsets[ievent] = offset
+
+    return offsets
+
+
+# event index table ("/event_index/[adc_name]" dataset, one row
+# per event, outside adc group so that adc group only contains
+# event data): field name -> fill value if metadata not available
+_EVENT_INDEX_GROUP = 'event_index'
+_EVENT_INDEX_FIELDS = {'event_num': -1, 'event_time': np.nan,
+                       'trigger_index': -1, 'trigger_type': -1}
+_EVENT_INDEX_DTYPE = np.dtype([('event_index', np.int64),
+                               ('event_num', np.int64),
+                               ('event_time', np.float64),
+                               ('trigger_index', np.int64),
+                               ('trigger_type', np.int32),
+                               ('byte_offset', np.int64)])
+
+
+def _make_event_index(adc_group, columns):
+    """
+    Build event index table from per-event metadata columns
+    (see "_EVENT_INDEX_DTYPE")
+
+    Parameters
+    ----------
+    adc_group : h5py group
+      adc group (event data byte offsets)
+
+    columns : dict
+      {name: array-like} including "event_index"
+
+    Return
+    ------
+    index : numpy structured array
+    """
+
+    event_indices = np.asarray(columns['event_index'], dtype=np.int64)
+    index = np.zeros(len(event_indices), dtype=_EVENT_INDEX_DTYPE)
+    index['event_index'] = event_indices
+    for key, fill_value in _EVENT_INDEX_FIELDS.items():
+        index[key] = fill_value
+        if key not in columns:
+            continue
+        try:
+            index[key] = np.asarray(columns[key])
+        except (TypeError, ValueError):
+            pass
+    index['byte_offset'] = _get_event_offsets(adc_group, event_indices)
+
+    return index
+
+
+def _write_event_index(adc_group, columns=None, index=None):
+    """
+    Write event index table of adc group in "/event_index/[adc_name]"
+    dataset (table built from metadata columns if not provided, 
+    see "_make_event_index")
+    """
+
+    if index is None:
+        index = _make_event_index(adc_group, columns)
+    adc_name = adc_group.name.split('/')[-1]
+    index_group = adc_group.file.require_group(_EVENT_INDEX_GROUP)
+    if adc_name in index_group:
+        del index_group[adc_name]
+    index_group.create_dataset(adc_name, data=index)
+
+
+def _read_event_index(adc_group):
+    """
+    Read event index table of adc group ("/event_index/[adc_name]"
+    dataset), built from event metadata if not available (file 
+    being written, older files)
+    """
+
+    adc_name = adc_group.name.split('/')[-1]
+    index = adc_group.file.get(_EVENT_INDEX_GROUP + '/' + adc_name)
+    if (isinstance(index, h5py.Dataset)
+        and index.dtype.names is not None
+        and 'event_index' in index.dtype.names):
+        nb_events = _get_nb_events_group(adc_group)
+        if index.shape[0]==nb_events:
+            return index[()]
+
+    columns = _get_event_metadata_columns(
+        adc_group, keys=list(_EVENT_INDEX_FIELDS.keys()))
+    return _make_event_index(adc_group, columns)
+
+
+def _search_index_range(values, min_value=None, max_value=None):
+    """
+    Binary search of rows with min_value <= value < max_value
+    (values sorted if not already)
 
-                # save array index
-                ind_adc = int(np.where(adc_nums_file==selected_adc)[0])
-                selected_array_indices.append(ind_adc)                
-                
-        else:
-            selected_array_indices = list(range(nb_channels_file))
-            selected_adc_nums = list(adc_nums_file)
-            for adc_chan in selected_adc_nums:
-                ind = connections['adc_chans'].index(adc_chan)
-                selected_detector_chans.append(connections['detector_chans'][ind])
-                if 'tes_chans' in connections:
-                    selected_tes_chans.append(connections['tes_chans'][ind])
-                if 'controller_chans' in connections:
-                    selected_controller_chans.append(
-                        connections['controller_chans'][ind]
-                    )
+    Return
+    ------
+    rows : numpy array (int)
+      row indices, sorted
+    """
 
-        # check number channels
-        if not selected_array_indices or len(selected_array_indices)==0:
-            raise ValueError('Unable to find selected channel(s). Check connection table!')
+    order = None
+    if len(values)>1 and np.any(np.diff(values)<0):
+        order = np.argsort(values, kind='stable')
+        values = values[order]
 
-        # store info
-        info['adc_channel_indices'] = selected_adc_nums
-        info['adc_chans'] = selected_adc_nums
-        info['detector_chans'] = selected_detector_chans
-        info['tes_chans'] = selected_tes_chans
-        info['controller_chans'] = selected_controller_chans
-        info['adc_conversion_factor'] =  info['adc_conversion_factor'][selected_array_indices,:]
-        info['voltage_range'] = info['voltage_range'][selected_array_indices,:]
+    start = 0
+    stop = len(values)
+    if min_value is not None:
+        start = np.searchsorted(values, min_value, side='left')
+    if max_value is not None:
+        stop = np.searchsorted(values, max_value, side='left')
+    rows = np.arange(start, max(start, stop))
 
-        # get detector config
-        detector_config = self.get_detector_config()
-        info['detector_config'] = dict()
-        for det in info['detector_chans']:
-            info['detector_config'][det] = detector_config[det]
+    if order is not None:
+        rows = np.sort(order[rows])
+    return rows
 
 
-            
-        # ===================================
-        # Trigger indices
-        # ===================================
-        
-        trace_min_index = None
-        trace_max_index = None
+def _search_index_values(values, requested):
+    """
+    Binary search of rows with value in requested values
+    (values sorted if not already)
 
-        # check trigger index
-        if trigger_index is not None:
-            if (trace_length_msec is None 
-                and trace_length_samples is None):
-                print('WARNING: Unable to extract trace based on '
-                      + 'trigger index without trace length. '
-                      + 'Returning full trace!')
-                trigger_index = None
-        else:
-            if (trace_length_msec is not None 
-                or  trace_length_samples is not None):
-                  print('WARNING: Unable to use trace lenght argument'
-                        + ' without trigger info. '
-                        + 'Returning full trace!')
+    Return
+    ------
+    rows : numpy array (int)
+      row indices, sorted
+    """
 
-        # extract trigger
-        if trigger_index is not None:
+    order = None
+    if len(values)>1 and np.any(np.diff(values)<0):
+        order = np.argsort(values, kind='stable')
+        values = values[order]
 
-            trigger_index = int(trigger_index)
-    
-            # number samples
-            nb_samples = None
-            fs = info['sample_rate']
-            if trace_length_samples is not None:
-                nb_samples = trace_length_samples
-            elif trace_length_msec is not None:
-                nb_samples = int(
-                    fs*trace_length_msec/1000
-                )
-            else:
-                raise ValueError(
-                    'ERROR: Number of samples required to '
-                    + 'extract trace'
-                )
+    requested = np.unique(np.asarray(requested))
+    positions = np.searchsorted(values, requested)
+    found = positions<len(values)
+    found[found] = values[positions[found]]==requested[found]
+    rows = positions[found]
 
-            # pre-trigger
-            nb_pretrigger_samples = int(nb_samples/2)
-            if pretrigger_length_samples is not None:
-                nb_pretrigger_samples = pretrigger_length_samples
-            elif pretrigger_length_msec is not None:
-                nb_pretrigger_samples = int(
-                    fs*pretrigger_length_msec/1000
-                )
+    if order is not None:
+        rows = order[rows]
+    return np.sort(rows)
 
-            # min/max index
-            trace_min_index = int(trigger_index - nb_pretrigger_samples)
-            trace_max_index = int(trace_min_index + nb_samples)
 
-            if (trace_min_index<0
-                or trace_max_index>dataset_dims[1]):
-                #print('WARNING: Unable to extract truncated trace '
-                #      'from continuous data. Not enough samples from/to trigger. ')
-                return None, info
-        
+class _EventDataset:
+    """
+    Single event of a format version 2 file (row of 
+    [events, channels, samples] dataset) with the h5py 
+    dataset interface used by H5Reader (shape, dtype, attrs, 
+    read_direct)
+    """
 
-        # ===================================
-        # Extract trace
-        # ===================================
+    def __init__(self, events, row, columns):
+        """
+        Parameters
+        ----------
+        events : h5py dataset
+          [events, channels, samples] dataset
 
+        row : int
+          event row (event index - 1)
 
-        # initialize empty trace
-        slice_samples = None
-        dim_0 = len(selected_array_indices)
-        dim_1 = dataset_dims[1]
-        
-        if (trace_min_index is not None
-            and trace_max_index is not None):
-            dim_1 = trace_max_index-trace_min_index
-            slice_samples = slice(trace_min_index, trace_max_index)
-            
-        traces_int = np.empty((dim_0, dim_1), dtype=dataset.dtype)
+        columns : dict
+          per-event metadata {name: numpy array}
+        """
         
-        # Read the portion of the array using read_direct
-        for i, index in enumerate(selected_array_indices):
-            if  slice_samples is not None:
-                dataset.read_direct(traces_int[i],
-                                    np.s_[index, slice_samples])
-            else:
-                dataset.read_direct(traces_int[i], np.s_[index])
+        self._events = events
+        self._row = row
+        self._columns = columns
         
+        self.shape = events.shape[1:]
+        self.dtype = events.dtype
+        self.size = int(np.prod(self.shape))
+        self.chunks = events.chunks
+        self.compression = events.compression
+
+
+    @property
+    def attrs(self):
+        return {key: column[self._row]
+                for key, column in self._columns.items()}
+
+    
+    def read_direct(self, dest, source_sel=None, dest_sel=None):
+        if source_sel is None:
+            source_sel = ()
+        elif not isinstance(source_sel, tuple):
+            source_sel = (source_sel,)
+        self._events.read_direct(dest, (self._row,) + source_sel,
+                                 dest_sel)
+
         
-        # convert to volt/amps
-        traces = []
-        if adctovolt or adctoamp:
+    def __getitem__(self, selection):
+        if not isinstance(selection, tuple):
+            selection = (selection,)
+        return self._events[(self._row,) + selection]
 
-            # initialize
-            traces = np.zeros_like(traces_int, dtype=np.float64)
 
-            # convert to volts
-            for ichan in range(traces_int.shape[0]):
-                cal_coeff = info['adc_conversion_factor'][ichan][::-1]
-                poly = np.poly1d(cal_coeff)
-                traces[ichan,:] = poly(traces_int[ichan,:])
+def _close_shared_memory(shm):
+    """
+    Close shared memory block (output array finalizer, see
+    H5Reader "_read_events_parallel")
+    """
 
-            # convert to amps
-            if adctoamp:
-                if detector_config is None:
-                    raise ValueError('ERROR: Unable to convert to amps. '
-                                     + 'No detector config available!')
-                for ichan in range(traces.shape[0]):
-                    det = info['detector_chans'][ichan]
-                    if 'close_loop_norm' in detector_config[det]:
-                        traces[ichan,:] = traces[ichan,:]/detector_config[det]['close_loop_norm']
-                    else:
-                        raise ValueError('ERROR: Unable to convert to amps. '
-                                         + 'No normalization available for ' + det)      
-        else:
-            traces = traces_int
-                    
-            
-        # baseline subtract
-        if baselinesub:
-            
-            # find baseline start/stop
-            baseline_start = None
-            baseline_stop = None
-            if baselineinds is not None:
-                if len(baselineinds)!=2:
-                    raise ValueError('ERROR: baselineinds should be list/tuple of length 2')
-                baseline_start = baselineinds[0]
-                baseline_stop =  baselineinds[1]
-                
-            elif 'nb_samples_pretrigger' in info:
-                baseline_start = 10
-                baseline_stop = int(round(info['nb_samples_pretrigger']*0.8))
+    try:
+        shm.close()
+    except BufferError:
+        pass
 
-            if (baseline_start is None or baseline_stop is None or
-                baseline_stop<=baseline_start or baseline_stop>=traces.shape[1]):
-                raise ValueError('ERROR: Unable to find baseline start/stop. '
-                                 + 'Add argument "baselineinds"')
 
-            traces = traces - np.mean(traces[:,baseline_start:baseline_stop],
-                                      axis=-1, keepdims=True)
-            
-        
-        return traces, info
-        
+def _read_file_events(file_name, event_list, event_start, nb_events,
+                      file_event_start=0, shm_name=None, output_shape=None,
+                      output_dtype=np.int16, raise_errors=True,
+                      use_memmap=False, read_strategy='auto',
+                      read_args=None):
+    """
+    Worker process function: read events from a single file,
+    starting from event "file_event_start" (see H5Reader 
+    "read_many_events" with nb_cores>1)
+    
+    Parameters
+    ----------
+    file_name : str
+      file name (full path)
 
+    event_list : list or None
+      list of event dictionaries (None = all events)
 
-    def _get_file_dict(self, filepaths, series=None, event_list=None):
-        """
-        Get a list of files (full path)  from directories/files
-        and filter based on event_list
+    event_start : int
+      output array index of first event
+    
+    nb_events : int
+      number of events to read
 
-        Parameters
-        ----------
-        filepaths : str or list
-         file/directory and/or list of files/directories
+    file_event_start : int, optional
+      first event (event counter) in file
+      default: 0
 
-        series : str/int or list/array of str/int
-         filter file list based on series number(s) or series name(s)
+    shm_name : str, optional
+      shared memory name of output array
+      if None, events returned as list of 2D arrays
 
-        event_list : list, optional
-          list containing dictionary with events metadata
-          such as 
-             - "series_number"
-             - "event_number"
-             - "group_name" 
-           
-           File list is filtered based on requested events        
-          
+    output_shape : tuple, optional
+      shape of shared output array 
 
-        Return
-        ------
-        
-        file_list : list 
-          list of files (full path)
+    output_dtype : numpy dtype, optional
+      dtype of shared output array
 
-        """
+    raise_errors, use_memmap : bool, optional
+      see H5Reader
 
-        # =======================
-        # Get list of files
-        # =======================
+    read_strategy : str, optional
+      see H5Reader
 
-        # check if group name
-        # available in event_list
-        group_names = list()
-        if event_list is not None:
-            for event_dict in event_list:
-                if 'group_name' in event_dict.keys():
-                    group_names.append(str(event_dict['group_name']))
-        
-        # make unique
-        group_names = list(set(group_names))
-     
-        # loop file/path list to get list of files
-        file_list  = list()
-        if isinstance(filepaths, str):
-            filepaths = [filepaths]
+    read_args : dict, optional
+      H5Reader "_read_events_batch" arguments
 
-        for filepath in filepaths:
+    Return
+    ------
+    data : list or None
+      list of 2D arrays (None if shared array)
+
+    info_list : list
+      file/event/detector metadata
+    
+    nb_events_read : int
+      number of events read 
+    """
+
+    if read_args is None:
+        read_args = dict()
+        
+    # attach to shared output array
+    shm = None
+    output_array = None
+    if shm_name is not None:
+        shm = shared_memory.SharedMemory(name=shm_name)
+        output_array = np.ndarray(output_shape, dtype=output_dtype,
+                                  buffer=shm.buf)
+        output_array = output_array[event_start:event_start+nb_events]
+
+    try:
+        reader = H5Reader(raise_errors=raise_errors, verbose=False,
+                          use_memmap=use_memmap,
+                          read_strategy=read_strategy)
+        reader._file_dict = {file_name: event_list}
+        if file_event_start>0:
+            reader._set_cursor((0, file_event_start))
+        data, info_list = reader._read_events_batch(
+            nb_events, output_array=output_array,
+            **read_args)
+        reader.clear()
+        nb_events_read = len(data)
+        if shm is not None:
+            data = None
             
-            # case directory
-            if os.path.isdir(filepath):
-                
-                search_list = list()
-                for group_name in group_names:
-                    # add group name to path if not
-                    # already in path
-                    if group_name not in filepath:
-                        filepath =  (filepath + '/'
-                                     + group_name)
-                        
-                    # add to search list
-                    search_str = filepath + '/*.hdf5'
-                    if search_str not in search_list:
-                        search_list.append(search_str)
+    finally:
+        if shm is not None:
+            output_array = None
+            shm.close()
+        
+    return data, info_list, nb_events_read
 
-                if not search_list:
-                    search_list = [filepath + '/*.hdf5']
 
-                # get files
-                for search_str in search_list:
-                    file_list.extend(glob(search_str))
 
-            # case a file
-            else:
-                if filepath[-4:]!='hdf5':
-                    filepath += '.hdf5'
-                if os.path.isfile(filepath):
-                    file_list.append(filepath)
+class _H5Prefetcher:
+    """
+    Worker thread reading events ahead with its own
+    H5Reader instance and storing them in a bounded queue 
+    (see H5Reader "enable_prefetch")
+    """
 
-        if not file_list:
-            if self._raise_errors:
-                raise ValueError('No files found!')
-            else:
-                print('ERROR: No files found!')
-                return
+    def __init__(self, file_dict, file_index=0, event_counter=0,
+                 read_args=None, nb_events=10, raise_errors=True,
+                 use_memmap=False, read_strategy='auto'):
+        """
+        Initialize worker
 
-        # make unique and sort
-        file_list = list(set(file_list))
-        file_list = sorted(file_list)
+        Parameters
+        ----------
+        file_dict : dict
+          file dictionary {file: list of event dict}
 
+        file_index : int, optional
+          index of first file to read
 
-        # =======================
-        # Filter files based on
-        # series
-        # =======================
+        event_counter : int, optional
+          index of first event to read in first file
 
-        # series
-        if series is not None:
+        read_args : dict, optional
+          "read_next_event" arguments
 
-            # convert to array
-            if (not isinstance(series, list)
-                and not isinstance(series, set)
-                and not isinstance(series, np.ndarray)):
-                series = [series]
+        nb_events : int, optional
+          maximum number of events in queue
 
+        raise_errors : bool, optional
+          see H5Reader
 
-            # unique
-            series = list(set(series))
+        use_memmap : bool, optional
+          see H5Reader
 
-            # loop and convert to series name if needed
-            for it in range(len(series)):
-                if isinstance(series[it], int):
-                    series[it] = extract_series_name(series[it])
+        read_strategy : str, optional
+          see H5Reader
+        """
 
+        self._file_dict = dict(file_dict)
+        self._file_index = file_index
+        self._event_counter = event_counter
+        self._read_args = dict()
+        if read_args is not None:
+            self._read_args = read_args
+        self._raise_errors = raise_errors
+        self._use_memmap = use_memmap
+        self._read_strategy = read_strategy
+        
+        self._queue = queue.Queue(maxsize=nb_events)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
 
-            # filter list
-            file_list_temp = list()
-            for afile in file_list:
-                for aseries in series:
-                    if aseries in afile:
-                        file_list_temp.append(afile)
-                        break
-            # replace
-            file_list = file_list_temp
-                
-                
-        # =======================
-        # Filter files based on
-        # event_list
-        # build dictionary
-        # =======================
+        # worker stats
+        self.nb_events_read = 0
+        self.read_msec_sum = 0
 
-        # initialize
-        output_dict = dict()
 
-        # case no event list
-        if event_list is None:
-            for afile in file_list:
-                output_dict[afile] = None
-            return output_dict
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
 
+    
+    def start(self):
+        self._thread.start()
 
-        # case event list
         
-        for event_dict in event_list:
+    def is_alive(self):
+        return self._thread.is_alive()
 
-            # checks
-            if 'series_number' not in event_dict.keys():
-                raise ValueError(
-                    'ERROR: "series_number" required in event dictionary!'
-                )
-            
-            if 'event_number' not in event_dict.keys():
-                raise ValueError(
-                    'ERROR: "event_number" required in event dictionary!'
-                )
+        
+    def get(self):
+        """
+        Get next event (blocking)
+        
+        Return
+        ------
+        (array, info, file_index, event_counter) tuple
+        """
 
+        while True:
+            try:
+                return self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if not self._thread.is_alive() and self._queue.empty():
+                    info = {'read_status': 1,
+                            'error_msg': 'Read-ahead thread stopped!'}
+                    return np.array([]), info, None, None
+    
             
-            # build file name (without prefix)
-            series_num =  int(event_dict['series_number'])
-            series_name = extract_series_name(series_num)
-            
-            dump_num = int(event_dict['event_number']/100000)
-            dump_name = str(dump_num)
-            for x in range(1,5-len(dump_name)):
-                dump_name = '0' + dump_name
-
-            file_name = (series_name
-                         + '_F'
-                         + dump_name
-                         + '.hdf5')
-
-            # find file in file_list
-            full_file_name = str()
-            for afile in file_list:
-                if file_name in afile:
-                    full_file_name = afile
-                    break
-
-            if not full_file_name:
-                raise ValueError(
-                    'ERROR: Unable to find file for a requested event.'
-                    + ' Check path!' )
+    def stop(self):
+        """
+        Stop thread and empty queue
+        """
 
-            # double check group if available
-            if 'group_name' in event_dict.keys():
-                group_name = str(event_dict['group_name'])
-                if group_name not in full_file_name:
-                    raise ValueError(
-                        'ERROR: Inconsistent group name. Unable to '
-                        ' find proper data!'
-                    )
+        self._stop_event.set()
 
-            # save
-            if full_file_name in output_dict.keys():
-                output_dict[full_file_name].append(event_dict)
-            else:
-                output_dict[full_file_name] = [event_dict]
+        # empty queue so thread is not blocked
+        while self._thread.is_alive():
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._thread.join(timeout=0.01)
             
-        return output_dict
             
-    
+    def _put(self, item):
+        """
+        Put item in queue (blocking until space 
+        available or thread stopped)
+        """
+
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+            
         
+    def _run(self):
+        """
+        Thread loop: read events and store in queue
+        """
+        
+        reader = H5Reader(raise_errors=self._raise_errors, verbose=False,
+                          use_memmap=self._use_memmap,
+                          read_strategy=self._read_strategy)
+        reader._file_dict = self._file_dict
 
+        # go to first event
+        file_list = list(self._file_dict.keys())
+        reader._file_counter = self._file_index
+        if self._file_index<len(file_list):
+            file_name = file_list[self._file_index]
+            reader._open_file(file_name,
+                              event_list=self._file_dict[file_name])
+            reader._current_file_event_counter = self._event_counter
+        
+        # loop events
+        while not self._stop_event.is_set():
+
+            time_start = time.time()
+            try:
+                array, info = reader.read_next_event(
+                    include_metadata=True,
+                    **self._read_args)
+            except Exception as e:
+                array = np.array([])
+                info = {'read_status': 1,
+                        'error_msg': str(e)}
+                
+            # position of event read
+            file_index = reader._file_counter-1
+            event_counter = reader._current_file_event_counter-1
+            
+            if info['read_status']==0:
+                self.read_msec_sum += (time.time()-time_start)*1000
+                self.nb_events_read += 1
 
+            # store
+            if not self._put((array, info, file_index, event_counter)):
+                break
 
+            # stop if error
+            if info['read_status']!=0:
+                break
 
+        reader.clear()
 
 
+        
+class H5Writer:
+    """
+    Class to write raw data hdf5 files (one dataset per event,
+    dumps of "nb_events_per_dump_max" events). An event index 
+    table ("/event_index/[adc_name]" dataset) is written when a 
+    file is closed (see H5Reader "get_event_index")
+    """
+    
+    def __init__(self, raise_errors=True, verbose=True,
+                 flush_nb_events=1, flush_interval=None, swmr=False,
+                 format_version=1, compression=None,
+                 compression_level=None, shuffle=True,
+                 swmr_close_timeout=10):
+        """
+        Initialize H5Writer
 
-                              
+        Parameters
+        ----------
+        raise_errors : boolean, optional
+          if True raise ValueError (default)
 
+        verbose : boolean, optional
+          if True, display messages (default)
 
-    
-class H5Writer:
-    
-    def __init__(self, raise_errors=True, verbose=True):
+        flush_nb_events : int, optional
+          flush file (and update group "nb_events" attribute)
+          every "flush_nb_events" events (None: no event based
+          flush). "nb_events" is always finalized when file is
+          closed.
+          default: 1 (every event)
+
+        flush_interval : float, optional
+          flush file if last flush older than "flush_interval"
+          seconds (checked when writing events)
+          default: None
+
+        swmr : boolean, optional
+          if True, write files in HDF5 SWMR mode (single writer 
+          multiple readers, libver="latest") so concurrent readers 
+          (see H5Reader "follow") see consistent data. Format version
+          1: event datasets and attributes of a dump are created at 
+          the first event (storage allocated when written), unused 
+          datasets removed when the file is closed. Format version 2: 
+          events dataset and metadata columns resized. All events in 
+          a dump should have same shape and metadata keys.
+          default: False
 
+        swmr_close_timeout : float, optional
+          SWMR only: maximum time [seconds] waiting for readers 
+          to release a dump when it is finalized (unused datasets 
+          removed, event index written), if HDF5 file locking 
+          enabled ("HDF5_USE_FILE_LOCKING", disabled when module
+          imported). ValueError raised if readers still lock the 
+          file after this time (dump data and "nb_events" already 
+          written). 
+          default: 10
+
+        format_version : int, optional
+          raw data layout:
+            1: one "event_N" dataset per event, event metadata
+               stored as dataset attributes (default)
+            2: single chunked, resizable [events, channels, samples]
+               "events" dataset per adc group, event metadata stored
+               as columns ("event_metadata" group datasets). All 
+               events in a dump should have same shape and 
+               metadata keys (from first event).
+
+        compression : str, optional
+          raw data compression filter, one chunk per event
+          (see "get_compression_filter")
+          default: None (no compression)
+
+        compression_level : int, optional
+          compression level (see "get_compression_filter")
+
+        shuffle : bool, optional
+          byte-shuffle before compression
+          default: True
+        
+        Return
+        ------
+        None
+        """
 
         self._raise_errors = raise_errors
         self._verbose = verbose
+
+        # write policy
+        if flush_nb_events is not None and flush_nb_events<1:
+            raise ValueError('ERROR: "flush_nb_events" should be > 0!')
+        self._flush_nb_events = flush_nb_events
+        self._flush_interval = flush_interval
+        self._swmr = swmr
+
+        # SWMR: maximum time waiting for readers to release
+        # file when finalizing dump [seconds]
+        if swmr_close_timeout is None or swmr_close_timeout<0:
+            raise ValueError('ERROR: "swmr_close_timeout" should be >= 0!')
+        self._swmr_close_timeout = swmr_close_timeout
+
+        # raw data layout
+        if format_version not in [1, 2]:
+            raise ValueError('ERROR: Format version should be 1 or 2!')
+        self._format_version = format_version
+
+        # compression (h5py dataset creation arguments)
+        self._filter_kwargs = get_compression_filter(
+            compression, compression_level=compression_level,
+            shuffle=shuffle)
         
         # file path
         self._series_path = None
@@ -2017,6 +6187,23 @@ class H5Writer:
         self._nb_events_per_dump_max = 1000
         self._adc_name = 'adc1'
 
+        # flush state
+        self._current_file_nb_events_flushed = 0
+        self._current_file_flush_time = None
+        self._current_file_data_mode = None
+
+        # SWMR: event datasets created at first event
+        self._current_file_nb_datasets = 0
+
+        # format version 2: events dataset and metadata
+        # columns (resized by blocks of events)
+        self._current_file_events = None
+        self._current_file_columns = dict()
+        self._nb_events_resize = 100
+
+        # event index table columns (written when file closed)
+        self._current_file_index = dict()
+
 
     def initialize(self, series_name, data_path='./'):
         """
@@ -2117,35 +6304,250 @@ class H5Writer:
         self._current_file_event_counter += 1
         self._global_event_counter += 1
         
-        # create dataset
-        dataset_name = 'event_' + str(self._current_file_event_counter)
-        dataset = self._current_file_adc_group.create_dataset(dataset_name, data=data_array)
-      
-        # add metadata
+        # event metadata
+        event_metadata = dict()
         if dataset_metadata is not None:
             for key,val in dataset_metadata.items():
                 if (isinstance(val, np.ndarray) and val.dtype.type is np.str_):
                     dt = h5py.string_dtype()
                     val = val.astype(dt)
-                dataset.attrs[key] = val
+                event_metadata[key] = val
 
-        dataset.attrs['event_id'] = self._global_event_counter 
-        dataset.attrs['event_index'] = self._current_file_event_counter
-        dataset.attrs['event_num'] = self._file_counter *100000 + self._current_file_event_counter
+        event_metadata['event_id'] = self._global_event_counter 
+        event_metadata['event_index'] = self._current_file_event_counter
+        event_metadata['event_num'] = (self._file_counter *100000
+                                       + self._current_file_event_counter)
+
+        # event index
+        for key, values in self._current_file_index.items():
+            values.append(event_metadata.get(key, _EVENT_INDEX_FIELDS.get(key)))
+
+        # format version 2: events dataset row
+        if self._format_version==2:
+            self._write_event_row(data_array, event_metadata)
+            
+        # format version 1: create dataset (SWMR: datasets
+        # created at first event)
+        else:
+            dataset_name = 'event_' + str(self._current_file_event_counter)
+            if self._swmr:
+                if self._current_file_nb_datasets==0:
+                    self._create_swmr_datasets(data_array, dataset_metadata)
+                dataset = self._current_file_adc_group[dataset_name]
+                if dataset.shape!=np.shape(data_array):
+                    raise ValueError('ERROR: SWMR mode requires same event '
+                                     + 'shape for all events in a dump!')
+                dataset[...] = data_array
+            else:
+                dataset = self._current_file_adc_group.create_dataset(
+                    dataset_name, data=data_array,
+                    **self._get_dataset_kwargs(np.shape(data_array)))
+      
+            # add metadata
+            self._write_attributes(dataset, event_metadata)
                 
-        # update number of events
-        self._current_file_adc_group.attrs['nb_events'] = self._current_file_event_counter
-        if data_mode is not None:
-            self._current_file_adc_group.attrs['data_mode'] = str(data_mode)
+        # data mode
+        if data_mode is not None and str(data_mode)!=self._current_file_data_mode:
+            self._current_file_data_mode = str(data_mode)
+            self._write_attributes(self._current_file_adc_group,
+                                   {'data_mode': self._current_file_data_mode})
+
+        # flush (and update number of events)
+        nb_events_unflushed = (self._current_file_event_counter
+                               - self._current_file_nb_events_flushed)
+        if ((self._flush_nb_events is not None
+             and nb_events_unflushed>=self._flush_nb_events)
+            or (self._flush_interval is not None
+                and (time.time()-self._current_file_flush_time
+                     >=self._flush_interval))):
+            self._flush_file()
+        
+
+    def flush(self):
+        """
+        Update number of events and flush current file
+
+        Parameters
+        ----------
+        None
+
+        Return
+        ------
+        None
+        """
+
+        if self._current_file is not None:
+            self._flush_file()
+            
 
+    def _flush_file(self):
+        """
+        Update group "nb_events" attribute and flush
+        current file
+        """
 
-        # flush
+        self._write_attributes(self._current_file_adc_group,
+                               {'nb_events': self._current_file_event_counter})
         self._current_file.flush()
+        self._current_file_nb_events_flushed = self._current_file_event_counter
+        self._current_file_flush_time = time.time()
+
+
+    def _write_attributes(self, h5obj, attributes):
+        """
+        Write attributes. SWMR mode: existing attributes modified in
+        place (no new attributes once SWMR mode enabled)
+        """
+
+        for key, val in attributes.items():
+            if not self._swmr or not self._current_file.swmr_mode:
+                h5obj.attrs[key] = val
+            elif key in h5obj.attrs:
+                h5obj.attrs.modify(key, val)
+            elif self._verbose:
+                print('WARNING: Unable to add attribute "' + key
+                      + '" in SWMR mode. Skipping!')
+                    
+
+    def _get_dataset_kwargs(self, shape):
+        """
+        Format version 1: event dataset creation arguments 
+        (compression: single chunk)
+        """
+
+        if not self._filter_kwargs:
+            return dict()
+        dataset_kwargs = dict(self._filter_kwargs)
+        dataset_kwargs['chunks'] = tuple(shape)
+        return dataset_kwargs
+
+        
+    def _write_event_row(self, data_array, event_metadata):
+        """
+        Format version 2: write event data and metadata in
+        events dataset and metadata columns (created at first
+        event)
+        """
+
+        data_array = np.asarray(data_array)
+        if self._current_file_events is None:
+            self._create_event_arrays(data_array, event_metadata)
+        events = self._current_file_events
+        if events.shape[1:]!=data_array.shape:
+            raise ValueError('ERROR: Format version 2 requires same event '
+                             + 'shape for all events in a dump!')
         
+        # resize by block of events
+        row = self._current_file_event_counter-1
+        if row>=events.shape[0]:
+            self._resize_event_arrays(
+                max(row+1, min(row+self._nb_events_resize,
+                               self._nb_events_per_dump_max)))
+
+        # write
+        events[row] = data_array
+        for key, val in event_metadata.items():
+            if key in self._current_file_columns:
+                self._current_file_columns[key][row] = val
+            elif self._verbose:
+                print('WARNING: Event metadata "' + key + '" not '
+                      + 'available in first event of dump. Skipping!')
+
+                
+    def _create_event_arrays(self, data_array, event_metadata):
+        """
+        Format version 2: create events dataset [events, channels, 
+        samples] (one chunk per event) and metadata columns based
+        on first event (then enable SWMR mode if needed)
+        """
+
+        adc_group = self._current_file_adc_group
+
+        # group attributes ("nb_events"=0, "data_mode") on disk
+        # before datasets are created
+        self._write_attributes(adc_group, {'nb_events': 0})
+        if 'data_mode' not in adc_group.attrs:
+            adc_group.attrs['data_mode'] = str()
+        self._current_file.flush()
+
+        # events
+        self._current_file_events = adc_group.create_dataset(
+            'events', shape=(0,) + data_array.shape,
+            maxshape=(None,) + data_array.shape,
+            chunks=(1,) + data_array.shape,
+            dtype=data_array.dtype,
+            **self._filter_kwargs)
+
+        # metadata columns
+        metadata_group = adc_group.create_group('event_metadata')
+        nb_events_chunk = max(1, min(1024, self._nb_events_per_dump_max))
+        self._current_file_columns = dict()
+        for key, val in event_metadata.items():
+            val = np.asarray(val)
+            dtype = val.dtype
+            if dtype.kind in ['U', 'S', 'O']:
+                dtype = h5py.string_dtype()
+            self._current_file_columns[key] = metadata_group.create_dataset(
+                key, shape=(0,) + val.shape,
+                maxshape=(None,) + val.shape,
+                chunks=(nb_events_chunk,) + val.shape,
+                dtype=dtype)
+            
+        # enable SWMR
+        if self._swmr:
+            self._current_file.swmr_mode = True
+            
 
+    def _resize_event_arrays(self, nb_events):
+        """
+        Format version 2: resize events dataset and
+        metadata columns
+        """
+
+        self._current_file_events.resize(nb_events, axis=0)
+        for column in self._current_file_columns.values():
+            column.resize(nb_events, axis=0)
+
+            
+    def _create_swmr_datasets(self, data_array, dataset_metadata=None):
+        """
+        SWMR mode: create all event datasets (and attributes) of the
+        dump based on first event, then enable SWMR mode 
+        """
 
+        data_array = np.asarray(data_array)
+        adc_group = self._current_file_adc_group
 
+        # group attributes ("nb_events"=0, "data_mode") on disk
+        # before datasets are created
+        self._write_attributes(adc_group, {'nb_events': 0})
+        if 'data_mode' not in adc_group.attrs:
+            adc_group.attrs['data_mode'] = str()
+        self._current_file.flush()
 
+        # attributes (values replaced when writing events)
+        attributes = dict()
+        if dataset_metadata is not None:
+            for key,val in dataset_metadata.items():
+                if (isinstance(val, np.ndarray) and val.dtype.type is np.str_):
+                    dt = h5py.string_dtype()
+                    val = val.astype(dt)
+                attributes[key] = val
+        for key in ['event_id', 'event_index', 'event_num']:
+            attributes[key] = 0
+
+        # create datasets, storage allocated when written
+        for ievent in range(1, self._nb_events_per_dump_max+1):
+            dataset = self._current_file_adc_group.create_dataset(
+                'event_' + str(ievent), shape=data_array.shape,
+                dtype=data_array.dtype,
+                **self._get_dataset_kwargs(data_array.shape))
+            for key, val in attributes.items():
+                dataset.attrs[key] = val
+        self._current_file_nb_datasets = self._nb_events_per_dump_max
+        
+        # enable SWMR
+        self._current_file.swmr_mode = True
 
                     
     def _open_file(self, prefix=None):
@@ -2171,12 +6573,16 @@ class H5Writer:
         if prefix is not None:
             file_name += prefix + '_'
         file_name += self._series_name + '_F' + dump + '.hdf5'
-        print('INFO: Opening file name "' + file_name + '"')
+        if self._verbose:
+            print('INFO: Opening file name "' + file_name + '"')
         
         
         file = None
         try:
-            file = h5py.File(file_name, 'w')
+            if self._swmr:
+                file = h5py.File(file_name, 'w', libver='latest')
+            else:
+                file = h5py.File(file_name, 'w')
         except:
             print('ERROR: Unable to open file ' + file_name)
             return
@@ -2185,6 +6591,14 @@ class H5Writer:
         self._current_file_name = file_name
         self._current_file_nb_events = 0
         self._current_file_event_counter = 0
+        self._current_file_nb_events_flushed = 0
+        self._current_file_flush_time = time.time()
+        self._current_file_data_mode = None
+        self._current_file_nb_datasets = 0
+        self._current_file_events = None
+        self._current_file_columns = dict()
+        self._current_file_index = {key: list() for key in
+                                    ['event_index'] + list(_EVENT_INDEX_FIELDS)}
 
 
         # file metadata
@@ -2197,6 +6611,8 @@ class H5Writer:
         self._current_file.attrs['prefix'] = prefix
         self._current_file.attrs['series_num'] = self._series_num
         self._current_file.attrs['dump_num'] = int(dump)
+        if self._format_version!=1:
+            self._current_file.attrs['format_version'] = self._format_version
         
         # detector config
         if self._detector_config is not None:
@@ -2219,14 +6635,76 @@ class H5Writer:
                             dt = h5py.string_dtype()
                             val = val.astype(dt)
                         self._current_file_adc_group.attrs[key] = val
+
+                    # number of events / data mode (set before any
+                    # event dataset is created, so that readers of a
+                    # file being written never see datasets without
+                    # "nb_events")
+                    self._current_file_adc_group.attrs['nb_events'] = 0
+                    if 'data_mode' not in self._current_file_adc_group.attrs:
+                        self._current_file_adc_group.attrs['data_mode'] = str()
                                 
         
                    
     def _close_file(self):
 
         if self._current_file is not None:
+
+            # finalize number of events
+            # format version 2: remove unused rows
+            if (self._current_file_events is not None
+                and self._current_file_events.shape[0]
+                >self._current_file_event_counter):
+                self._resize_event_arrays(self._current_file_event_counter)
+                
+            # event index table (SWMR: no new dataset, written
+            # after file closed)
+            adc_group_name = None
+            if self._current_file_adc_group is not None:
+                adc_group_name = self._current_file_adc_group.name
+                self._flush_file()
+                if not self._swmr:
+                    _write_event_index(self._current_file_adc_group,
+                                       self._current_file_index)
             self._current_file.close()
-  
+
+            # SWMR: remove unused event datasets, write
+            # event index table
+            nb_events = self._current_file_event_counter
+            # (file locked by readers if HDF5 file locking enabled:
+            # retry until released or "swmr_close_timeout" reached)
+            if self._swmr and adc_group_name is not None:
+                file_name = self._current_file_name
+                nb_datasets = self._current_file_nb_datasets
+                index = self._current_file_index
+                self._reset_file()
+                start_time = time.time()
+                while True:
+                    try:
+                        file = h5py.File(file_name, 'r+')
+                        break
+                    except BlockingIOError as err:
+                        if time.time()-start_time>=self._swmr_close_timeout:
+                            raise ValueError(
+                                'ERROR: Unable to finalize SWMR file '
+                                + file_name + ': readers still open after '
+                                + str(self._swmr_close_timeout) + ' s!'
+                            ) from err
+                        time.sleep(0.05)
+                with file:
+                    adc_group = file[adc_group_name]
+                    for ievent in range(nb_events+1, nb_datasets+1):
+                        del adc_group['event_' + str(ievent)]
+                    _write_event_index(adc_group, index)
+
+        self._reset_file()
+
+
+    def _reset_file(self):
+        """
+        Initialize current file parameters
+        """
+        
         # initialize
         self._current_file = None
         self._current_file_name = None
@@ -2234,7 +6712,320 @@ class H5Writer:
         self._current_file_adc_group = None
         self._current_file_detconfig_group = None
         self._current_file_event_counter = 0
+        self._current_file_nb_events_flushed = 0
+        self._current_file_flush_time = None
+        self._current_file_data_mode = None
+        self._current_file_nb_datasets = 0
+        self._current_file_events = None
+        self._current_file_columns = dict()
+        self._current_file_index = dict()
 
 
         
              
+
+
+
+class AsyncH5Writer:
+    """
+    Asynchronous H5Writer: events are copied into a bounded ring of
+    preallocated buffers and written to disk by a background thread,
+    so that the acquisition thread is not blocked by HDF5 writes 
+    (up to "nb_buffers" events).
+    """
+
+    def __init__(self, nb_buffers=32, overflow='block',
+                 block_timeout=None, **writer_kwargs):
+        """
+        Initialize writer
+
+        Parameters
+        ----------
+        nb_buffers : int, optional
+          number of event buffers (maximum number of events
+          waiting to be written)
+          default: 32
+
+        overflow : str, optional
+          behavior of "write_event" if all buffers are used:
+            'block': wait for a free buffer (default)
+            'drop': drop event
+        
+        block_timeout : float, optional
+          'block' overflow: maximum waiting time [seconds], event 
+          dropped if no buffer available after timeout
+          default: None (wait)
+
+        writer_kwargs : dict, optional
+          H5Writer arguments (flush policy, SWMR...)
+
+        Return
+        ------
+        None
+        """
+
+        if nb_buffers<1:
+            raise ValueError('ERROR: "nb_buffers" should be > 0!')
+        if overflow not in ['block', 'drop']:
+            raise ValueError('ERROR: Unknown overflow mode "'
+                             + str(overflow) + '"!')
+        
+        self._writer = H5Writer(**writer_kwargs)
+        self._nb_buffers = nb_buffers
+        self._overflow = overflow
+        self._block_timeout = block_timeout
+
+        # ring buffers (allocated at first event)
+        self._buffers = None
+        
+        # free buffer indices / events to be written
+        self._free_queue = queue.Queue()
+        self._write_queue = queue.Queue()
+
+        # writer thread
+        self._thread = None
+        self._error = None
+        
+        # back-pressure stats
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+        
+
+    def initialize(self, series_name, data_path='./'):
+        """
+        Initialize new writing (see H5Writer), previous
+        events written first
+        """
+
+        self._wait_written()
+        self._writer.initialize(series_name, data_path=data_path)
+        self._reset_stats()
+
+        
+    def set_metadata(self, file_metadata=None, adc_config=None,
+                     detector_config=None):
+        """
+        Set metadata which will be written in each files (see
+        H5Writer). Applied to events written after call.
+        """
+
+        self._wait_written()
+        self._writer.set_metadata(file_metadata=file_metadata,
+                                  adc_config=adc_config,
+                                  detector_config=detector_config)
+
+        
+    def write_event(self, data_array, prefix=None, dataset_metadata=None,
+                    data_mode=None, adc_name='adc1'):
+        """
+        Copy event into a free buffer and queue it for writing
+        (see H5Writer "write_event")
+
+        Parameters
+        ----------
+        data_array : numpy array
+          event traces [channels, samples] (int16)
+
+        prefix, dataset_metadata, data_mode, adc_name :
+          see H5Writer "write_event"
+
+        Return
+        ------
+        is_queued : bool
+          False if event dropped (no buffer available)
+        """
+
+        self._check_error()
+        data_array = np.asarray(data_array)
+        
+        # allocate buffers (re-allocated if event shape/type
+        # changes, after pending events written)
+        if (self._buffers is None
+            or self._buffers.shape[1:]!=data_array.shape
+            or self._buffers.dtype!=data_array.dtype):
+            self._wait_written()
+            self._buffers = np.empty((self._nb_buffers,) + data_array.shape,
+                                     dtype=data_array.dtype)
+            self._free_queue = queue.Queue()
+            for ibuffer in range(self._nb_buffers):
+                self._free_queue.put(ibuffer)
+
+        # start thread
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+        # get free buffer
+        ibuffer = None
+        try:
+            ibuffer = self._free_queue.get_nowait()
+        except queue.Empty:
+            if self._overflow=='block':
+                time_start = time.time()
+                try:
+                    ibuffer = self._free_queue.get(timeout=self._block_timeout)
+                except queue.Empty:
+                    pass
+                with self._stats_lock:
+                    self._stats['nb_blocked'] += 1
+                    self._stats['blocked_msec_sum'] += (time.time()-time_start)*1000
+                    
+        if ibuffer is None:
+            with self._stats_lock:
+                self._stats['nb_dropped'] += 1
+            return False
+
+        # copy and queue
+        self._buffers[ibuffer] = data_array
+        if dataset_metadata is not None:
+            dataset_metadata = dict(dataset_metadata)
+        self._write_queue.put((ibuffer, prefix, dataset_metadata,
+                               data_mode, adc_name))
+        with self._stats_lock:
+            self._stats['nb_events_queued'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'],
+                                                 self._write_queue.qsize())
+        return True
+
+    
+    def flush(self):
+        """
+        Wait until queued events are written then flush
+        current file
+
+        Parameters
+        ----------
+        None
+
+        Return
+        ------
+        None
+        """
+
+        self._wait_written()
+        self._writer.flush()
+
+        
+    def close(self):
+        """
+        Write queued events, stop thread and close file. 
+        A writer thread error (first error since last call) is
+        raised after file is closed.
+
+        Parameters
+        ----------
+        None
+
+        Return
+        ------
+        None
+        """
+
+        try:
+            self._wait_written()
+        finally:
+            if self._thread is not None and self._thread.is_alive():
+                self._write_queue.put(None)
+                self._thread.join()
+            self._thread = None
+            self._writer.close()
+
+        
+    def get_stats(self):
+        """
+        Get back-pressure statistics
+
+        Parameters
+        ----------
+        None
+
+        Return
+        ------
+        stats : dict
+          'queue_depth': number of events waiting to be written
+          'max_queue_depth': maximum queue depth
+          'nb_events_queued', 'nb_events_written': number of events
+          'nb_dropped': number of events dropped (no buffer)
+          'nb_blocked': number of "write_event" calls blocked
+          'blocked_msec_sum': total blocking time [msec]
+          'write_msec_mean': mean disk write time per event [msec]
+        """
+
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._write_queue.qsize()
+        stats['write_msec_mean'] = 0
+        if stats['nb_events_written']>0:
+            stats['write_msec_mean'] = (stats['write_msec_sum']
+                                        /stats['nb_events_written'])
+        return stats
+    
+        
+    def _reset_stats(self):
+        """
+        Reset back-pressure statistics
+        """
+
+        with self._stats_lock:
+            self._stats = {'max_queue_depth': 0,
+                           'nb_events_queued': 0,
+                           'nb_events_written': 0,
+                           'nb_dropped': 0,
+                           'nb_blocked': 0,
+                           'blocked_msec_sum': 0,
+                           'write_msec_sum': 0}
+
+        
+    def _wait_written(self):
+        """
+        Wait until queued events are written (writer thread
+        calls "task_done" for each event, including failed
+        writes), then raise writer thread error if any
+        """
+
+        if self._thread is not None and self._thread.is_alive():
+            self._write_queue.join()
+        self._check_error()
+
+
+    def _check_error(self):
+        """
+        Raise error from writer thread
+        """
+
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
+        
+        
+    def _run(self):
+        """
+        Thread loop: write queued events
+        """
+
+        while True:
+
+            item = self._write_queue.get()
+            if item is None:
+                self._write_queue.task_done()
+                break
+            ibuffer, prefix, dataset_metadata, data_mode, adc_name = item
+            
+            time_start = time.time()
+            try:
+                self._writer.write_event(self._buffers[ibuffer], prefix=prefix,
+                                         dataset_metadata=dataset_metadata,
+                                         data_mode=data_mode,
+                                         adc_name=adc_name)
+            except Exception as e:
+                if self._error is None:
+                    self._error = e
+            else:
+                with self._stats_lock:
+                    self._stats['nb_events_written'] += 1
+                    self._stats['write_msec_sum'] += (time.time()-time_start)*1000
+            
+            # free buffer
+            self._free_queue.put(ibuffer)
+            self._write_queue.task_done()
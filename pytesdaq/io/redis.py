@@ -1,45 +1,225 @@
 """
-TBD
+Redis database: hash tables (instrument values) and trace
+streaming (redis streams)
+
+Trace stream entry format (one entry per event):
+   b'header': binary header (see "encode_header"): dtype, shape,
+              channel list, event number and timestamp
+   b'data':   raw traces (C order)
+   other fields: optional metadata (str)
 """
+import time
 import numpy as np
 import walrus as wsredis
 import struct
 
 import pytesdaq.config.settings as config
 
+
+__all__ = ['RedisCore', 'RedisStreamWriter', 'RedisStreamReader',
+           'encode_header', 'decode_header', 'decode_event']
+
+
+# binary header: version, ndim, dtype (numpy str), event number,
+# timestamp, number of channels, followed by shape (uint32)
+# and channel list (int32)
+_HEADER_VERSION = 1
+_HEADER_STRUCT = struct.Struct('<BB8sqdI')
+
+
+def encode_header(data, event_num=-1, timestamp=None, channel_list=None):
+    """
+    Encode trace binary header
+
+    Parameters
+    ----------
+    data : numpy array (required)
+       traces [channels, samples] (any shape)
+    event_num : int (optional, default=-1)
+       event number
+    timestamp : float (optional)
+       event time (default: current time)
+    channel_list : list (optional)
+       ADC channel list (default: empty)
+
+    Return
+    ------
+    header : bytes
+    """
+
+    if timestamp is None:
+        timestamp = time.time()
+    if channel_list is None:
+        channel_list = []
+    channel_array = np.asarray(channel_list, dtype='<i4').ravel()
+    dtype_str = np.dtype(data.dtype).str.encode()
+    if len(dtype_str)>8:
+        raise ValueError('ERROR: Unsupported data type '
+                         + str(data.dtype) + '!')
+
+    header = _HEADER_STRUCT.pack(_HEADER_VERSION, data.ndim, dtype_str,
+                                 int(event_num), float(timestamp),
+                                 len(channel_array))
+    return (header + np.asarray(data.shape, dtype='<u4').tobytes()
+            + channel_array.tobytes())
+
+
+def decode_header(header):
+    """
+    Decode trace binary header (see "encode_header")
+
+    Parameters
+    ----------
+    header : bytes (required)
+
+    Return
+    ------
+    header_dict : dict
+       'dtype', 'shape', 'channel_list', 'event_num', 'timestamp'
+    """
+
+    try:
+        (version, ndim, dtype_str, event_num,
+         timestamp, nb_channels) = _HEADER_STRUCT.unpack_from(header)
+    except struct.error:
+        raise ValueError('ERROR: Unable to decode trace header!')
+    if version!=_HEADER_VERSION:
+        raise ValueError('ERROR: Unknown trace header version '
+                         + str(version) + '!')
+
+    offset = _HEADER_STRUCT.size
+    shape = np.frombuffer(header, dtype='<u4', count=ndim, offset=offset)
+    offset += 4*ndim
+    channel_list = np.frombuffer(header, dtype='<i4', count=nb_channels,
+                                 offset=offset)
+
+    return {'dtype': np.dtype(dtype_str.rstrip(b'\x00').decode()),
+            'shape': tuple(int(val) for val in shape),
+            'channel_list': [int(val) for val in channel_list],
+            'event_num': event_num,
+            'timestamp': timestamp}
+
+
+def decode_event(fields, include_metadata=False):
+    """
+    Decode trace stream entry fields. Data array is a read-only view
+    of redis reply buffer (no copy).
+
+    Parameters
+    ----------
+    fields : dict (required)
+       stream entry fields {b'header': ..., b'data': ..., ...}
+    include_metadata : bool (optional, default=False)
+       add other fields to header dictionary (decoded str)
+
+    Return
+    ------
+    data_array : numpy array
+    header_dict : dict
+    """
+
+    if b'header' not in fields or b'data' not in fields:
+        raise ValueError('ERROR: Stream entry is not a trace entry!')
+
+    header_dict = decode_header(fields[b'header'])
+    data_array = np.frombuffer(fields[b'data'], dtype=header_dict['dtype'])
+    data_array = data_array.reshape(header_dict['shape'])
+
+    if include_metadata:
+        for key, val in fields.items():
+            if key not in (b'header', b'data'):
+                header_dict[key.decode()] = val.decode()
+
+    return data_array, header_dict
+
+
+def _get_stream_entries(reply, stream_name):
+    """
+    Stream entries [(id, fields)] from XREAD reply (RESP2 list
+    or RESP3 dict)
+    """
+
+    if not reply:
+        return []
+    if isinstance(reply, dict):
+        reply = reply.items()
+    for name, entries in reply:
+        if isinstance(name, bytes):
+            name = name.decode()
+        if name==stream_name:
+            return entries
+    return []
+
+
+
 class RedisCore:
     """
-    TBD
+    Redis database connection: hash tables and trace streams
     """
 
-    def __init__(self):
+    def __init__(self, setup_file=None):
         """
         Args:
+           setup_file: setup file (redis host/port/password
+                       and data stream name)
         """
+        self._setup_file = setup_file
         self._cnx = None
         self._host = None
         self._port = None
         self._password = None
- 
+        self._data_stream = None
 
 
-    def connect(self, use_config=True, 
-                host=str(), port=0, password=str()):
+
+    def connect(self, use_config=True,
+                host=str(), port=0, password=str(), db=0,
+                connection=None):
         """
-        TDB
+        Connect to redis database
+
+        Parameters
+        ----------
+        use_config : bool (optional, default=True)
+           use host/port/password from setup file
+        host, port, password : (optional)
+           used if use_config=False
+        db : int (optional, default=0)
+           database number
+        connection : redis client (optional)
+           already connected client (redis.Redis compatible,
+           such as fakeredis), host/port ignored
         """
 
+        if connection is not None:
+            self._cnx = connection
+            return
+
         if use_config:
             self._extract_redis_info()
+        else:
+            self._host = host
+            self._port = port
+            self._password = password
 
         if self._cnx is None:
             self._cnx = wsredis.Database(host=self._host,
-                                        port=self._port,
-                                        db=0)
-        
-   
-            
-    
+                                         port=self._port,
+                                         password=self._password or None,
+                                         db=db)
+
+
+    @property
+    def connection(self):
+        if self._cnx is None:
+            self.connect()
+        return self._cnx
+
+    @property
+    def data_stream(self):
+        return self._data_stream
+
+
     def add_hash(self,hash_name, key=str(), val=str(), key_val_dict=dict()):
         """
         TDB
@@ -114,70 +294,321 @@ class RedisCore:
 
 
 
-    def add_stream(self,stream_name, data, metadata=dict()):
+    def add_stream(self, stream_name, data, metadata=dict(),
+                   event_num=-1, timestamp=None, channel_list=None,
+                   maxlen=1000):
         """
-        TBD
+        Add single event to trace stream (see "RedisStreamWriter"
+        for pipelined writes)
+
+        Parameters
+        ----------
+        stream_name : str (required)
+        data : numpy array (required)
+           traces [channels, samples]
+        metadata : dict (optional)
+           additional fields (stored as str)
+        event_num, timestamp, channel_list : (optional)
+           binary header content (see "encode_header")
+        maxlen : int (optional, default=1000)
+           approximate maximum number of entries in stream
+
+        Return
+        ------
+        entry_id : bytes
         """
-        if self._cnx is None:
-            self.connect()
-        
 
-        # encode data
-        encoded_data = data.tobytes()
-        fields = {'data': encoded_data}
-        
-        # metadata
-        h,w = data.shape
-        fields.update({"num_channels": h,
-                       "num_samples": w})
-        if metadata and isinstance(metadata,dict):
-            fields.update(metadata)
-        try:
-            stream = db.Stream(stream_name)
-            stream.add(fields,maxlen=200)
-        except:
-            pass
+        writer = RedisStreamWriter(self, stream_name, maxlen=maxlen,
+                                   batch_size=1)
+        entry_ids = writer.write_event(data, event_num=event_num,
+                                       timestamp=timestamp,
+                                       channel_list=channel_list,
+                                       metadata=metadata)
+        return entry_ids[0]
 
 
-            
-    def get_stream(self,stream_name):
+
+    def get_stream(self, stream_name, block=2000, include_metadata=True):
         """
-        TBD
+        Get latest event from trace stream, wait for a new event
+        (up to "block" ms) if stream empty
+
+        Parameters
+        ----------
+        stream_name : str (required)
+        block : int (optional, default=2000)
+           blocking time [ms] (None: no wait)
+        include_metadata : bool (optional, default=True)
+           add additional fields to metadata
+
+        Return
+        ------
+        data_array : numpy array (empty list if no event)
+        metadata : dict
+           header content and additional fields
         """
-        if self._cnx is None:
-            self.connect()
-        
-        data_array = []
-        metadata = dict()
-        try:
-            stream = db.Stream(stream_name)
-            data_stream = stream.read(count=1,block=2000,last_id='$')[0][1]
-            
-            # nd array
-            #data_stream = data_stream[0][1]
-            h = int(data_stream[b'num_channels'])
-            w = int(data_stream[b'num_samples'])
-            data_encoded = data_stream[b'data']
-            data_array = np.frombuffer(data_encoded,dtype=np.int16).reshape(h,w)
-            
-            # metadata
-
-
-        except:
-            pass
 
-        return (data_array,metadata)
-    
+        reader = RedisStreamReader(self, stream_name, last_id='0')
+        events = reader.read_latest(nb_events=1, block=block,
+                                    include_metadata=include_metadata)
+        if not events:
+            return ([], dict())
+        return events[0]
 
 
 
     def _extract_redis_info(self):
 
-        info = config.get_redis_info()
+        info = config.Config(setup_file=self._setup_file).get_redis_info()
         self._host = info["host"]
         self._port = info["port"]
         self._password = info["password"]
-      
-    
+        self._data_stream = info.get("data_stream")
 
-        
+
+
+
+class RedisStreamWriter:
+    """
+    Trace stream producer: events buffered and sent
+    with a single pipelined round trip (XADD with approximate
+    MAXLEN trimming) every "batch_size" events
+    """
+
+    def __init__(self, redis_core, stream_name, maxlen=1000,
+                 batch_size=100, approximate=True):
+        """
+        Parameters
+        ----------
+        redis_core : RedisCore or redis client (required)
+        stream_name : str (required)
+        maxlen : int (optional, default=1000)
+           maximum number of entries kept in stream (None: no limit)
+        batch_size : int (optional, default=100)
+           number of events per pipeline (flushed automatically)
+        approximate : bool (optional, default=True)
+           approximate trimming (MAXLEN ~), much faster
+        """
+
+        if isinstance(redis_core, RedisCore):
+            redis_core = redis_core.connection
+        self._cnx = redis_core
+        self._stream_name = stream_name
+        self._maxlen = maxlen
+        self._batch_size = max(int(batch_size), 1)
+        self._approximate = approximate
+        self._events = list()
+
+
+    @property
+    def nb_buffered_events(self):
+        return len(self._events)
+
+
+    def write_event(self, data, event_num=-1, timestamp=None,
+                    channel_list=None, metadata=None):
+        """
+        Buffer event (data copied), send if "batch_size" reached
+
+        Parameters
+        ----------
+        data : numpy array (required)
+           traces [channels, samples]
+        event_num, timestamp, channel_list : (optional)
+           binary header content (see "encode_header")
+        metadata : dict (optional)
+           additional fields (stored as str)
+
+        Return
+        ------
+        entry_ids : list
+           stream entry ids if events sent, empty list otherwise
+        """
+
+        data = np.ascontiguousarray(data)
+        fields = {b'header': encode_header(data, event_num=event_num,
+                                           timestamp=timestamp,
+                                           channel_list=channel_list),
+                  b'data': data.tobytes()}
+        if metadata:
+            for key, val in metadata.items():
+                fields[str(key)] = str(val)
+        self._events.append(fields)
+
+        if len(self._events)>=self._batch_size:
+            return self.flush()
+        return []
+
+
+    def write_events(self, data, event_nums=None, timestamps=None,
+                     channel_list=None):
+        """
+        Buffer/send multiple events
+
+        Parameters
+        ----------
+        data : numpy array or list (required)
+           traces [events, channels, samples]
+        event_nums, timestamps : list (optional)
+        channel_list : list (optional)
+           ADC channel list (same for all events)
+
+        Return
+        ------
+        entry_ids : list
+           stream entry ids of events sent
+        """
+
+        entry_ids = list()
+        for ievent in range(len(data)):
+            entry_ids.extend(self.write_event(
+                data[ievent],
+                event_num=(-1 if event_nums is None
+                           else event_nums[ievent]),
+                timestamp=(None if timestamps is None
+                           else timestamps[ievent]),
+                channel_list=channel_list))
+        return entry_ids
+
+
+    def flush(self):
+        """
+        Send buffered events (single round trip)
+
+        Return
+        ------
+        entry_ids : list
+        """
+
+        if not self._events:
+            return []
+        pipe = self._cnx.pipeline(transaction=False)
+        for fields in self._events:
+            pipe.xadd(self._stream_name, fields, maxlen=self._maxlen,
+                      approximate=self._approximate)
+        self._events = list()
+        return pipe.execute()
+
+
+
+class RedisStreamReader:
+    """
+    Trace stream consumer: multiple entries per XREAD round trip,
+    traces decoded without copy (read-only arrays)
+    """
+
+    def __init__(self, redis_core, stream_name, last_id='$'):
+        """
+        Parameters
+        ----------
+        redis_core : RedisCore or redis client (required)
+        stream_name : str (required)
+        last_id : str (optional, default='$')
+           read entries after this id ('$': new entries only,
+           '0': from beginning of stream)
+        """
+
+        if isinstance(redis_core, RedisCore):
+            redis_core = redis_core.connection
+        self._cnx = redis_core
+        self._stream_name = stream_name
+        self._last_id = last_id
+
+        # '$' replaced by current last entry (so entries added
+        # between calls are not lost)
+        if self._last_id=='$':
+            entries = self._cnx.xrevrange(self._stream_name, count=1)
+            self._last_id = entries[0][0] if entries else '0'
+
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+
+    def read_events(self, count=100, block=None, include_metadata=False):
+        """
+        Read next events (up to "count" per round trip)
+
+        Parameters
+        ----------
+        count : int (optional, default=100)
+           maximum number of events
+        block : int (optional, default=None)
+           wait for new events up to "block" ms (None: no wait)
+        include_metadata : bool (optional, default=False)
+           add additional fields to header dictionaries
+
+        Return
+        ------
+        events : list
+           [(data_array, header_dict)], header_dict includes
+           stream 'entry_id'
+        """
+
+        reply = self._cnx.xread({self._stream_name: self._last_id},
+                                count=count, block=block)
+        return self._decode_entries(
+            _get_stream_entries(reply, self._stream_name),
+            include_metadata=include_metadata)
+
+
+    def read_latest(self, nb_events=1, block=None, include_metadata=False):
+        """
+        Read latest events, skipping older unread events (live
+        display). Wait for new events up to "block" ms if no
+        new events.
+
+        Parameters
+        ----------
+        nb_events : int (optional, default=1)
+        block : int (optional, default=None)
+           (None: no wait)
+        include_metadata : bool (optional, default=False)
+
+        Return
+        ------
+        events : list
+           [(data_array, header_dict)], oldest first
+        """
+
+        entries = self._cnx.xrevrange(self._stream_name, count=nb_events)
+        entries = [entry for entry in entries
+                   if self._is_new(entry[0])]
+        if entries:
+            return self._decode_entries(entries[::-1],
+                                        include_metadata=include_metadata)
+        if block is None:
+            return []
+        return self.read_events(count=nb_events, block=block,
+                                include_metadata=include_metadata)
+
+
+    def _decode_entries(self, entries, include_metadata=False):
+        """
+        Decode entries and update last id
+        """
+
+        events = list()
+        for entry_id, fields in entries:
+            data_array, header_dict = decode_event(
+                fields, include_metadata=include_metadata)
+            header_dict['entry_id'] = entry_id
+            events.append((data_array, header_dict))
+        if entries:
+            self._last_id = entries[-1][0]
+        return events
+
+
+    def _is_new(self, entry_id):
+        """
+        Check if entry id after last id
+        """
+
+        def _split(val):
+            if isinstance(val, bytes):
+                val = val.decode()
+            ms, _, seq = val.partition('-')
+            return (int(ms), int(seq or 0))
+
+        return _split(entry_id)>_split(self._last_id)
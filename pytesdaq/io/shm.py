@@ -0,0 +1,484 @@
+"""
+Shared memory ring buffer for live traces on the same host
+(DAQ -> scope/monitoring), no socket copy.
+
+A single producer ("SharedMemoryWriter") writes events in a fixed
+number of slots, overwriting the oldest event when the buffer is
+full. Consumers ("SharedMemoryReader") never block the producer:
+reads are lock-free, each slot is protected by begin/end sequence
+numbers (seqlock), events overwritten during a read are dropped.
+
+Memory layout (64 bytes aligned blocks):
+   header: magic, version, nb_slots, nb_channels, nb_samples, dtype
+   state: write sequence number (= number of events written), status
+   channel list: int32 [nb_channels]
+   slot table: seq_begin, seq_end, event_num, timestamp [nb_slots]
+   data: [nb_slots, nb_channels, nb_samples]
+"""
+import time
+import struct
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+
+__all__ = ['SharedMemoryWriter', 'SharedMemoryReader']
+
+
+# default buffer name
+DEFAULT_BUFFER_NAME = 'pytesdaq_traces'
+
+# header
+_MAGIC = b'PTDQRING'
+_VERSION = 1
+_HEADER_STRUCT = struct.Struct('<8sIIII8s')
+
+# writer status
+_STATUS_ACTIVE = 1
+_STATUS_CLOSED = 2
+
+# buffers created in this process (resource tracker registration)
+_writer_buffer_names = set()
+
+# slot table
+_SLOT_DTYPE = np.dtype([('seq_begin', '<u8'),
+                        ('seq_end', '<u8'),
+                        ('event_num', '<i8'),
+                        ('timestamp', '<f8')])
+
+
+def _align(nb_bytes, alignment=64):
+    return (nb_bytes+alignment-1)//alignment*alignment
+
+
+def _get_layout(nb_slots, nb_channels, nb_samples, dtype):
+    """
+    Offsets of each block and total size
+    """
+
+    layout = dict()
+    layout['state'] = _align(_HEADER_STRUCT.size)
+    layout['channels'] = layout['state'] + 64
+    layout['slots'] = layout['channels'] + _align(4*nb_channels)
+    layout['data'] = layout['slots'] + _align(_SLOT_DTYPE.itemsize*nb_slots)
+    layout['size'] = (layout['data']
+                      + nb_slots*nb_channels*nb_samples*np.dtype(dtype).itemsize)
+    return layout
+
+
+
+class _SharedMemoryBuffer:
+    """
+    Numpy views of ring buffer shared memory (see module docstring)
+    """
+
+    def __init__(self, shm, nb_slots, nb_channels, nb_samples, dtype):
+
+        self._shm = shm
+        self._nb_slots = nb_slots
+        self._nb_channels = nb_channels
+        self._nb_samples = nb_samples
+        self._dtype = np.dtype(dtype)
+
+        layout = _get_layout(nb_slots, nb_channels, nb_samples, dtype)
+        buf = shm.buf
+        self._state = np.ndarray((2,), dtype='<u8', buffer=buf,
+                                 offset=layout['state'])
+        self._channels = np.ndarray((nb_channels,), dtype='<i4', buffer=buf,
+                                    offset=layout['channels'])
+        self._slots = np.ndarray((nb_slots,), dtype=_SLOT_DTYPE, buffer=buf,
+                                 offset=layout['slots'])
+        self._data = np.ndarray((nb_slots, nb_channels, nb_samples),
+                                dtype=self._dtype, buffer=buf,
+                                offset=layout['data'])
+        self._seq_begin = self._slots['seq_begin']
+        self._seq_end = self._slots['seq_end']
+        self._event_num = self._slots['event_num']
+        self._timestamp = self._slots['timestamp']
+
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def nb_slots(self):
+        return self._nb_slots
+
+    @property
+    def shape(self):
+        return (self._nb_channels, self._nb_samples)
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def channel_list(self):
+        return [int(val) for val in self._channels]
+
+    @property
+    def write_seq(self):
+        """
+        Sequence number of last event written (0 if empty)
+        """
+        return int(self._state[0])
+
+
+    def _release(self):
+        """
+        Release numpy views (required before closing shared memory)
+        """
+
+        self._state = None
+        self._channels = None
+        self._slots = None
+        self._data = None
+        self._seq_begin = None
+        self._seq_end = None
+        self._event_num = None
+        self._timestamp = None
+
+
+
+class SharedMemoryWriter(_SharedMemoryBuffer):
+    """
+    Ring buffer producer (single producer per buffer)
+    """
+
+    def __init__(self, name=DEFAULT_BUFFER_NAME, nb_channels=None,
+                 nb_samples=None, dtype='int16', nb_slots=100,
+                 channel_list=None):
+        """
+        Create shared memory ring buffer (stale buffer with same
+        name replaced)
+
+        Parameters
+        ----------
+        name : str (optional)
+           buffer name (default: 'pytesdaq_traces')
+        nb_channels : int (required)
+        nb_samples : int (required)
+        dtype : str or numpy dtype (optional, default='int16')
+        nb_slots : int (optional, default=100)
+           number of events in buffer
+        channel_list : list (optional)
+           ADC channel list (default: 0 to nb_channels-1)
+        """
+
+        if nb_channels is None or nb_samples is None:
+            raise ValueError('ERROR: Number of channels and samples '
+                             'required!')
+        nb_slots = int(nb_slots)
+        if nb_slots<1:
+            raise ValueError('ERROR: Number of slots should be > 0!')
+        if channel_list is None:
+            channel_list = list(range(nb_channels))
+        if len(channel_list)!=nb_channels:
+            raise ValueError('ERROR: Channel list length different '
+                             'from number of channels!')
+        dtype = np.dtype(dtype)
+        dtype_str = dtype.str.encode()
+        if len(dtype_str)>8:
+            raise ValueError('ERROR: Unsupported data type '
+                             + str(dtype) + '!')
+
+        # create shared memory
+        layout = _get_layout(nb_slots, nb_channels, nb_samples, dtype)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True,
+                                             size=layout['size'])
+        except FileExistsError:
+            print('WARNING: Replacing existing shared memory buffer "'
+                  + name + '"!')
+            stale_shm = shared_memory.SharedMemory(name=name)
+            stale_shm.close()
+            stale_shm.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True,
+                                             size=layout['size'])
+
+        _writer_buffer_names.add(shm._name)
+        super().__init__(shm, nb_slots, nb_channels, nb_samples, dtype)
+
+        # fill header (magic last: buffer ready)
+        self._state[:] = [0, _STATUS_ACTIVE]
+        self._channels[:] = channel_list
+        self._slots[:] = 0
+        shm.buf[:_HEADER_STRUCT.size] = _HEADER_STRUCT.pack(
+            b'\x00'*8, _VERSION, nb_slots, nb_channels, nb_samples, dtype_str)
+        shm.buf[:8] = _MAGIC
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def write_event(self, data, event_num=-1, timestamp=None):
+        """
+        Write event in next slot (oldest event overwritten)
+
+        Parameters
+        ----------
+        data : numpy array (required)
+           traces [channels, samples] (converted to buffer dtype)
+        event_num : int (optional, default=-1)
+        timestamp : float (optional)
+           event time (default: current time)
+
+        Return
+        ------
+        seq : int
+           event sequence number (starts at 1)
+        """
+
+        if self._data is None:
+            raise ValueError('ERROR: Shared memory buffer closed!')
+        if timestamp is None:
+            timestamp = time.time()
+
+        seq = int(self._state[0]) + 1
+        slot_index = (seq-1) % self._nb_slots
+
+        # seqlock: begin, data, end
+        self._seq_begin[slot_index] = seq
+        self._data[slot_index] = data
+        self._event_num[slot_index] = event_num
+        self._timestamp[slot_index] = timestamp
+        self._seq_end[slot_index] = seq
+        self._state[0] = seq
+
+        return seq
+
+
+    def close(self, unlink=True):
+        """
+        Close (and remove) buffer
+
+        Parameters
+        ----------
+        unlink : bool (optional, default=True)
+           remove shared memory (consumers already attached
+           can still read last events)
+        """
+
+        if self._data is None:
+            return
+        self._state[1] = _STATUS_CLOSED
+        self._release()
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+            _writer_buffer_names.discard(self._shm._name)
+
+
+
+class SharedMemoryReader(_SharedMemoryBuffer):
+    """
+    Ring buffer consumer (lock-free, any number of consumers)
+    """
+
+    def __init__(self, name=DEFAULT_BUFFER_NAME, start='latest'):
+        """
+        Attach to existing ring buffer
+
+        Parameters
+        ----------
+        name : str (optional)
+           buffer name (default: 'pytesdaq_traces')
+        start : str (optional, default='latest')
+           'latest': new events only
+           'oldest': from oldest event in buffer
+        """
+
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            raise ValueError('ERROR: Shared memory buffer "' + name
+                             + '" not found. Is the producer running?')
+
+        # not owner: avoid removal by resource tracker at exit
+        if shm._name not in _writer_buffer_names:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+
+        # header
+        (magic, version, nb_slots, nb_channels, nb_samples,
+         dtype_str) = _HEADER_STRUCT.unpack_from(shm.buf)
+        if magic!=_MAGIC or version!=_VERSION:
+            shm.close()
+            raise ValueError('ERROR: Shared memory "' + name
+                             + '" is not a trace ring buffer '
+                             '(or unknown version)!')
+        dtype = np.dtype(dtype_str.rstrip(b'\x00').decode())
+
+        super().__init__(shm, nb_slots, nb_channels, nb_samples, dtype)
+
+        self._channel_list = self.channel_list
+
+        # last sequence number read
+        self._last_seq = 0
+        if start=='latest':
+            self._last_seq = self.write_seq
+        self._nb_lost_events = 0
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    @property
+    def is_active(self):
+        """
+        False if producer closed buffer
+        """
+        return self._state is not None and int(self._state[1])==_STATUS_ACTIVE
+
+    @property
+    def last_seq(self):
+        return self._last_seq
+
+    @property
+    def nb_lost_events(self):
+        """
+        Number of events overwritten before being read
+        (with "read_events")
+        """
+        return self._nb_lost_events
+
+
+    def read_events(self, count=100, block=None, copy=True):
+        """
+        Read next unread events (in order). Events overwritten
+        before being read are skipped (see "nb_lost_events").
+
+        Parameters
+        ----------
+        count : int (optional, default=100)
+           maximum number of events
+        block : int (optional, default=None)
+           wait for new events up to "block" ms (None: no wait)
+        copy : bool (optional, default=True)
+           if False, return views of buffer (no copy): valid until
+           overwritten by producer, use "is_valid(seq)" after
+           processing
+
+        Return
+        ------
+        events : list
+           [(data_array, header_dict)], header_dict: 'seq',
+           'event_num', 'timestamp', 'channel_list'
+        """
+
+        write_seq = self._wait(block)
+        first_seq = max(self._last_seq+1, write_seq-self._nb_slots+1)
+        self._nb_lost_events += first_seq-(self._last_seq+1)
+        last_seq = min(write_seq, first_seq+count-1)
+
+        events = self._read(range(first_seq, last_seq+1), copy=copy)
+        self._nb_lost_events += (last_seq-first_seq+1)-len(events)
+        if last_seq>=first_seq:
+            self._last_seq = last_seq
+        return events
+
+
+    def read_latest(self, nb_events=1, block=None, copy=True):
+        """
+        Read latest unread events (older unread events skipped),
+        for live display
+
+        Parameters
+        ----------
+        nb_events : int (optional, default=1)
+        block : int (optional, default=None)
+           wait for new events up to "block" ms (None: no wait)
+        copy : bool (optional, default=True)
+           if False, return views of buffer (see "read_events")
+
+        Return
+        ------
+        events : list
+           [(data_array, header_dict)], oldest first
+        """
+
+        write_seq = self._wait(block)
+        first_seq = max(self._last_seq+1, write_seq-nb_events+1,
+                        write_seq-self._nb_slots+1)
+        events = self._read(range(first_seq, write_seq+1), copy=copy)
+        if write_seq>=first_seq:
+            self._last_seq = write_seq
+        return events
+
+
+    def is_valid(self, seq):
+        """
+        Check event "seq" not (being) overwritten (for views
+        returned with copy=False)
+        """
+
+        slot_index = (seq-1) % self._nb_slots
+        return (int(self._seq_begin[slot_index])==seq
+                and int(self._seq_end[slot_index])==seq)
+
+
+    def close(self):
+        """
+        Detach from buffer
+        """
+
+        if self._data is None:
+            return
+        self._release()
+        try:
+            self._shm.close()
+        except BufferError:
+            print('WARNING: Shared memory buffer "' + self.name
+                  + '" still used (arrays read with copy=False)!')
+
+
+    def _wait(self, block=None):
+        """
+        Wait for new event (up to "block" ms), return
+        last sequence number written
+        """
+
+        if self._data is None:
+            raise ValueError('ERROR: Shared memory buffer closed!')
+
+        write_seq = self.write_seq
+        if block is None or write_seq>self._last_seq:
+            return write_seq
+
+        time_end = time.monotonic() + block/1000
+        while write_seq<=self._last_seq and time.monotonic()<time_end:
+            time.sleep(0.0005)
+            write_seq = self.write_seq
+        return write_seq
+
+
+    def _read(self, seqs, copy=True):
+        """
+        Read events (seqlock), skip events overwritten
+        """
+
+        events = list()
+        for seq in seqs:
+            slot_index = (seq-1) % self._nb_slots
+            if int(self._seq_end[slot_index])!=seq:
+                continue
+            event_num = int(self._event_num[slot_index])
+            timestamp = float(self._timestamp[slot_index])
+            data_array = self._data[slot_index]
+            if copy:
+                data_array = data_array.copy()
+            if int(self._seq_begin[slot_index])!=seq:
+                continue
+            events.append((data_array,
+                           {'seq': seq,
+                            'event_num': event_num,
+                            'timestamp': timestamp,
+                            'channel_list': list(self._channel_list)}))
+        return events
@@ -9,6 +9,7 @@ import pytesdaq.daq as daq
 import pytesdaq.instruments.control as instrument
 import pytesdaq.config.settings as settings
 import pytesdaq.io.redis as redis
+import pytesdaq.io.shm as shm
 import pytesdaq.io.hdf5 as hdf5
 from pytesdaq.utils import  arg_utils
 from pytesdaq.analyzer import analyzer
@@ -36,6 +37,8 @@ class Readout:
         # initialize db/adc
         self._daq = None
         self._redis = None
+        self._redis_reader = None
+        self._shm_reader = None
         self._hdf5 = None
 
         # Is running flag
@@ -130,7 +133,8 @@ class Readout:
     def configure(self, data_source, adc_name = 'adc1', channel_list=[],
                   sample_rate=[], trace_length=[],
                   voltage_min=[], voltage_max=[],trigger_type=4,
-                  file_list=[]):
+                  file_list=[], prefetch_events=0,
+                  stream_name=None, buffer_name=shm.DEFAULT_BUFFER_NAME):
         
 
         
@@ -153,6 +157,10 @@ class Readout:
         # initialize
         self._daq = None
         self._redis = None
+        self._redis_reader = None
+        if self._shm_reader is not None:
+            self._shm_reader.close()
+        self._shm_reader = None
         self._hdf5 = None
     
 
@@ -179,20 +187,7 @@ class Readout:
                 return error_msg
 
             # ADC setup
-            self._adc_config = self._config.get_adc_setup(adc_name).copy()
-
-            # convert connection dataframe to dict 
-            connections = self._adc_config['connection_table'].to_dict(orient='list')
-            self._adc_config['connection_map'] = dict()
-            self._adc_config['connection_map']['adc_chans'] = [int(x) for x in connections['adc_channel']]
-            self._adc_config['connection_map']['detector_chans'] = connections['detector_channel']
-            self._adc_config['connection_map']['tes_chans'] = connections['tes_channel']
-            self._adc_config['connection_map']['controller_chans'] = list()
-            for ichan in range(len(connections['controller_channel'])):
-                self._adc_config['connection_map']['controller_chans'].append(
-                    connections['controller_id'][ichan]+'_'+ connections['controller_channel'][ichan]
-                )
-                
+            self._adc_config = self._get_setup_adc_config(adc_name)
             
             self._adc_config['channel_list'] = channel_list
             if sample_rate:
@@ -215,10 +210,49 @@ class Readout:
         # Redis
         elif self._data_source == 'redis':
 
-            self._redis = redis.RedisCore()
+            self._redis = redis.RedisCore(setup_file=self._setup_file)
             self._redis.connect()
+
+            # stream name
+            if stream_name is None:
+                stream_name = self._redis.data_stream
+            if not stream_name:
+                error_msg = 'ERROR: No redis data stream name provided!'
+                return error_msg
+
+            # reader (new events only)
+            try:
+                self._redis_reader = redis.RedisStreamReader(self._redis,
+                                                             stream_name)
+            except Exception as err:
+                error_msg = 'ERROR: Unable to read redis stream: ' + str(err)
+                return error_msg
+
+            # ADC setup (channel list from stream)
+            adc_list = self._config.get_adc_list()
+            if adc_name not in adc_list:
+                error_msg = 'ERROR: ADC name "' + adc_name + '" unrecognized!'
+                return error_msg
+            self._adc_config = self._get_setup_adc_config(adc_name)
         
         
+        # shared memory
+        elif self._data_source == 'shm':
+
+            # reader (new events only)
+            try:
+                self._shm_reader = shm.SharedMemoryReader(buffer_name)
+            except ValueError as err:
+                error_msg = str(err)
+                return error_msg
+
+            # ADC setup (channel list from buffer)
+            adc_list = self._config.get_adc_list()
+            if adc_name not in adc_list:
+                error_msg = 'ERROR: ADC name "' + adc_name + '" unrecognized!'
+                return error_msg
+            self._adc_config = self._get_setup_adc_config(adc_name)
+            
         # hdf5
         elif self._data_source == 'hdf5':
 
@@ -228,6 +262,10 @@ class Readout:
 
             self._hdf5 = hdf5.H5Reader()
             self._hdf5.set_files(file_list)
+
+            # read-ahead thread (optional)
+            if prefetch_events>0:
+                self._hdf5.enable_prefetch(nb_events=prefetch_events)
             
                 
     
@@ -462,6 +500,23 @@ class Readout:
                     self._do_get_sg = True
                     self._do_get_fit_param = True
             
+            elif self._data_source in ['redis', 'shm']:
+
+                # latest event (older events skipped)
+                if self._data_source == 'redis':
+                    events = self._redis_reader.read_latest(nb_events=1,
+                                                            block=100)
+                else:
+                    events = self._shm_reader.read_latest(nb_events=1,
+                                                          block=100)
+                if not events:
+                    continue
+                data_array, header = events[-1]
+                self._adc_config['channel_list'] = header['channel_list']
+                if not header['channel_list']:
+                    self._adc_config['channel_list'] = list(range(data_array.shape[0]))
+                self._adc_config['event_num'] = header['event_num']
+                
             else:
                 print('Not implemented')
 
@@ -948,6 +1003,30 @@ class Readout:
             
 
         
+    def _get_setup_adc_config(self, adc_name):
+        """
+        ADC setup from setup file, including 
+        connection map
+        """
+
+        # ADC setup
+        adc_config = self._config.get_adc_setup(adc_name).copy()
+
+        # convert connection dataframe to dict 
+        connections = adc_config['connection_table'].to_dict(orient='list')
+        adc_config['connection_map'] = dict()
+        adc_config['connection_map']['adc_chans'] = [int(x) for x in connections['adc_channel']]
+        adc_config['connection_map']['detector_chans'] = connections['detector_channel']
+        adc_config['connection_map']['tes_chans'] = connections['tes_channel']
+        adc_config['connection_map']['controller_chans'] = list()
+        for ichan in range(len(connections['controller_channel'])):
+            adc_config['connection_map']['controller_chans'].append(
+                connections['controller_id'][ichan]+'_'+ connections['controller_channel'][ichan]
+            )
+
+        return adc_config
+
+    
     def _fill_norm(self):
         """
         Fill normalization list and store in analysis dictionary
@@ -960,7 +1039,7 @@ class Readout:
         # case open/closed loop -> read from board
         if norm_type.find('OpenLoop')!=-1 or norm_type.find('CloseLoop')!=-1:
 
-            if self._data_source == 'niadc':
+            if self._data_source in ['niadc', 'redis', 'shm']:
                 self.read_from_board(read_norm=True)
                 
             elif self._data_source == 'hdf5':
@@ -1000,7 +1079,7 @@ class Readout:
         Signal generator information
         """
               
-        if self._data_source == 'niadc':
+        if self._data_source in ['niadc', 'redis', 'shm']:
             self.read_from_board(read_sg=True)
             
         elif self._data_source == 'hdf5':
@@ -1021,7 +1100,7 @@ class Readout:
         TES bias
         """
               
-        if self._data_source == 'niadc':
+        if self._data_source in ['niadc', 'redis', 'shm']:
             self.read_from_board(read_bias=True)
             
         elif self._data_source == 'hdf5':
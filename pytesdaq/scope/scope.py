@@ -218,9 +218,17 @@ class MainWindow(QtWidgets.QMainWindow):
                     self.statusBar().showMessage(status)
                     return
             
-            else:
-                self.statusBar().showMessage('WARNING: Redis not implemented')  
-                return
+            elif self._data_source in ['redis', 'shm']:
+
+                # redis data stream from setup file,
+                # default shared memory buffer
+                status = self._readout.configure(self._data_source,
+                                                 adc_name=adc_name)
+
+                # error
+                if isinstance(status,str):
+                    self.statusBar().showMessage(status)
+                    return
 
 
             # reset running avg
@@ -272,6 +280,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self._data_source_tabs.setTabVisible(0,False)
             self._data_source_tabs.setTabVisible(1,False)
             self._data_source_tabs.setTabVisible(2,True)
+            self._data_source_tabs.setTabVisible(3,False)
 
             # set current
             self._data_source_tabs.setCurrentWidget(self._redis_tab)
@@ -281,6 +290,24 @@ class MainWindow(QtWidgets.QMainWindow):
             self._read_board_button.setEnabled(False)
             
             
+        elif data_source== 'Shared Memory':
+
+            self._data_source  = 'shm'
+
+            # visibility
+            self._data_source_tabs.setTabVisible(0,False)
+            self._data_source_tabs.setTabVisible(1,False)
+            self._data_source_tabs.setTabVisible(2,False)
+            self._data_source_tabs.setTabVisible(3,True)
+
+            # set current
+            self._data_source_tabs.setCurrentWidget(self._shm_tab)
+
+
+            # disable read from board
+            self._read_board_button.setEnabled(False)
+            
+            
         elif data_source== 'HDF5':
             
             self._data_source  = 'hdf5'
@@ -289,6 +316,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self._data_source_tabs.setTabVisible(0,False)
             self._data_source_tabs.setTabVisible(1,True)
             self._data_source_tabs.setTabVisible(2,False)
+            self._data_source_tabs.setTabVisible(3,False)
 
             # set current
             self._data_source_tabs.setCurrentWidget(self._hdf5_tab)
@@ -307,6 +335,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self._data_source_tabs.setTabVisible(0,True)
             self._data_source_tabs.setTabVisible(1,False)
             self._data_source_tabs.setTabVisible(2,False)
+            self._data_source_tabs.setTabVisible(3,False)
 
             # set current
             self._data_source_tabs.setCurrentWidget(self._niadc_tab)
@@ -820,6 +849,21 @@ class MainWindow(QtWidgets.QMainWindow):
         self._redis_tab.setStyleSheet('background-color: rgb(243, 255, 242);')
         self._redis_tab.setObjectName('redisTab')
         self._data_source_tabs.addTab(self._redis_tab, 'Redis')
+
+
+        # -----------------
+        # Shared memory tab
+        # -----------------
+        self._shm_tab = QtWidgets.QWidget()
+        font = QtGui.QFont()
+        font.setStrikeOut(False)
+        font.setKerning(True)
+        self._shm_tab.setFont(font)
+        self._shm_tab.setLayoutDirection(QtCore.Qt.LeftToRight)
+        self._shm_tab.setAutoFillBackground(False)
+        self._shm_tab.setStyleSheet('background-color: rgb(243, 255, 242);')
+        self._shm_tab.setObjectName('shmTab')
+        self._data_source_tabs.addTab(self._shm_tab, 'Shared Memory')
         
        
         # Set Visibility
@@ -827,6 +871,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self._data_source_tabs.setTabVisible(0,True)
         self._data_source_tabs.setTabVisible(1,False)
         self._data_source_tabs.setTabVisible(2,False)
+        self._data_source_tabs.setTabVisible(3,False)
 
 
         
@@ -843,6 +888,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self._source_combobox.addItem('Device')
         self._source_combobox.addItem('HDF5')
         self._source_combobox.addItem('Redis')
+        self._source_combobox.addItem('Shared Memory')
 
         # combo box label
         source_label = QtWidgets.QLabel(self._control_frame)
@@ -1,3 +1,4 @@
 from .arg_utils import *
 from .connection_utils import *
 from .remote import *
+from .calibration import *
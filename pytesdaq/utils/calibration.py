@@ -0,0 +1,177 @@
+import numpy as np
+
+__all__ = ['ADCCalibration', 'get_adc_calibration']
+
+
+class ADCCalibration:
+    """
+    ADC calibration: polynomial conversion from ADC to volts
+    (optionally normalized to close loop amps), applied to
+    whole 2D [channels, samples] or 3D [events, channels, samples]
+    arrays in a single vectorized pass (Horner's rule).
+
+    The coefficients are stored as a [channels, order] matrix
+    (increasing powers, same as "adc_conversion_factor").
+    If close loop normalization is provided, it is fused
+    into the coefficients.
+    """
+
+    def __init__(self, adc_conversion_factor, close_loop_norm=None):
+        """
+        Initialize calibration
+
+        Parameters
+        ----------
+        adc_conversion_factor : 2D array-like
+          ADC to volts polynomial coefficients [channels, order],
+          increasing powers (c0 + c1*x + c2*x^2 ...)
+
+        close_loop_norm : 1D array-like, optional
+          volts to close loop amps normalization for each channel
+          (amps = volts / close_loop_norm)
+          default: None (volts)
+
+        Return
+        ------
+        None
+        """
+
+        coefficients = np.array(adc_conversion_factor, dtype=np.float64,
+                                ndmin=2)
+        if coefficients.ndim!=2:
+            raise ValueError('ERROR: ADC conversion factor should be '
+                             + '2D array [channels, order]!')
+
+        # fuse normalization
+        if close_loop_norm is not None:
+            close_loop_norm = np.asarray(close_loop_norm, dtype=np.float64)
+            if close_loop_norm.shape!=(coefficients.shape[0],):
+                raise ValueError('ERROR: Close loop normalization should '
+                                 + 'have one value per channel!')
+            coefficients = coefficients/close_loop_norm[:, np.newaxis]
+
+        # remove highest order coefficients equal to zero
+        # for all channels
+        nb_orders = coefficients.shape[1]
+        while nb_orders>1 and not np.any(coefficients[:, nb_orders-1]):
+            nb_orders -= 1
+
+        # read-only (calibrations are cached and shared)
+        self._coefficients = np.ascontiguousarray(coefficients[:, :nb_orders])
+        self._coefficients.flags.writeable = False
+
+
+    @property
+    def coefficients(self):
+        """
+        Coefficient matrix [channels, order] (increasing powers),
+        read-only
+        """
+        return self._coefficients
+
+    @property
+    def nb_channels(self):
+        """
+        Number of channels
+        """
+        return self._coefficients.shape[0]
+
+
+    def apply(self, traces, out=None, dtype=np.float64):
+        """
+        Convert ADC traces
+
+        Parameters
+        ----------
+        traces : numpy array
+          ADC traces [channels, samples] or [events, channels, samples]
+
+        out : numpy float array, optional
+          output array, same shape as traces. Can be "traces" itself
+          (in place conversion of float traces).
+          default: None (new array)
+
+        dtype : numpy dtype, optional
+          output dtype if "out" not provided (np.float64 or np.float32)
+          default: np.float64
+
+        Return
+        ------
+        out : numpy array
+          converted traces
+        """
+
+        if traces.ndim not in [2, 3] or traces.shape[-2]!=self.nb_channels:
+            raise ValueError('ERROR: Traces should be [channels, samples] '
+                             + 'or [events, channels, samples] with '
+                             + str(self.nb_channels) + ' channels!')
+
+        # output
+        if out is None:
+            out = np.empty(traces.shape, dtype=dtype)
+        elif out.shape!=traces.shape:
+            raise ValueError('ERROR: Output array shape should be '
+                             + str(traces.shape) + '!')
+
+        # in place: copy input event by event
+        if np.shares_memory(out, traces):
+            if traces.ndim==2:
+                self._horner(traces.copy(), out)
+            else:
+                for ievent in range(traces.shape[0]):
+                    self._horner(traces[ievent].copy(), out[ievent])
+        else:
+            self._horner(traces, out)
+
+        return out
+
+
+    def _horner(self, traces, out):
+        """
+        Evaluate polynomial (Horner's rule) in output array
+        precision. "traces" and "out" should not overlap.
+        """
+
+        coefficients = self._coefficients.astype(out.dtype, copy=False)
+        nb_orders = coefficients.shape[1]
+
+        out[...] = coefficients[:, nb_orders-1, np.newaxis]
+        for iorder in range(nb_orders-2, -1, -1):
+            out *= traces
+            out += coefficients[:, iorder, np.newaxis]
+
+
+# cache {configuration key: ADCCalibration}
+_calibration_cache = dict()
+_calibration_cache_size = 32
+
+
+def get_adc_calibration(adc_conversion_factor, close_loop_norm=None):
+    """
+    Get (cached) ADC calibration for an ADC/channel configuration
+
+    Parameters
+    ----------
+    adc_conversion_factor : 2D array-like
+      ADC to volts polynomial coefficients [channels, order]
+
+    close_loop_norm : 1D array-like, optional
+      volts to close loop amps normalization for each channel
+
+    Return
+    ------
+    calibration : ADCCalibration
+    """
+
+    coefficients = np.array(adc_conversion_factor, dtype=np.float64, ndmin=2)
+    key = (coefficients.shape, coefficients.tobytes())
+    if close_loop_norm is not None:
+        key += (np.asarray(close_loop_norm, dtype=np.float64).tobytes(),)
+
+    if key not in _calibration_cache:
+        if len(_calibration_cache)>=_calibration_cache_size:
+            _calibration_cache.pop(next(iter(_calibration_cache)))
+        _calibration_cache[key] = ADCCalibration(coefficients,
+                                                 close_loop_norm=close_loop_norm)
+
+    return _calibration_cache[key]
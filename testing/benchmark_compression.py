@@ -0,0 +1,147 @@
+"""
+Benchmark: raw data compression filters (H5Writer "compression")
+on synthetic TES noise (int16 ADC: baseline + white noise + 1/f
+noise + a few pulses). Write MB/s, read MB/s (H5Reader, file
+most likely in page cache) and compression ratio for each filter.
+Plugin codecs (lz4, zstd, blosc, bitshuffle) skipped if
+"hdf5plugin" is not installed.
+
+Usage: python benchmark_compression.py [nb_events] [format_version]
+"""
+
+import sys
+import os
+import time
+import shutil
+import tempfile
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+
+
+def make_noise(nb_events, nb_channels, nb_samples, seed=1):
+    """
+    Synthetic TES noise ADC traces [events, channels, samples]
+    """
+
+    rng = np.random.default_rng(seed)
+    shape = (nb_events, nb_channels, nb_samples)
+
+    # white noise
+    traces = rng.normal(0, 8, size=shape)
+
+    # 1/f noise (filtered white noise)
+    freqs = np.fft.rfftfreq(nb_samples)
+    freqs[0] = freqs[1]
+    spectrum = np.fft.rfft(rng.normal(0, 1, size=shape), axis=-1)
+    traces += 0.5*np.fft.irfft(spectrum/np.sqrt(freqs/freqs[-1]),
+                               n=nb_samples, axis=-1)
+
+    # pulses (10% of events)
+    time_array = np.arange(nb_samples)
+    for ievent in rng.choice(nb_events, nb_events//10, replace=False):
+        t0 = rng.integers(nb_samples//4, 3*nb_samples//4)
+        dt = np.clip(time_array-t0, 0, None)
+        pulse = (np.exp(-dt/400)-np.exp(-dt/50))*(time_array>=t0)
+        traces[ievent] += rng.uniform(50, 2000)*pulse
+
+    # baseline
+    traces += rng.integers(-3000, 3000, size=(1, nb_channels, 1))
+    return np.round(traces).astype(np.int16)
+
+
+if __name__ == "__main__":
+
+    # parameters
+    nb_events = 200
+    format_version = 1
+    if len(sys.argv)>1:
+        nb_events = int(sys.argv[1])
+    if len(sys.argv)>2:
+        format_version = int(sys.argv[2])
+    nb_channels = 4
+    nb_samples = 62500
+
+    data = make_noise(nb_events, nb_channels, nb_samples)
+    data_mb = data.nbytes/1e6
+    adc_config = {'adc1': {
+        'nb_channels': nb_channels,
+        'nb_samples': nb_samples,
+        'sample_rate': 1250000,
+        'nb_samples_pretrigger': nb_samples//2,
+        'adc_channel_indices': np.arange(nb_channels, dtype=np.int32),
+        'adc_conversion_factor': np.tile(np.array([0., 3.05e-4, 0., 0.]),
+                                         (nb_channels, 1)),
+        'voltage_range': np.tile(np.array([-5., 5.]), (nb_channels, 1))}}
+    for ichan in range(nb_channels):
+        adc_config['adc1']['connection' + str(ichan)] = np.array(
+            ['tes:T' + str(ichan), 'detector:D' + str(ichan),
+             'controller:C' + str(ichan)])
+
+    detector_config = {'detconfig1': {
+        'channel_list': np.arange(nb_channels),
+        'close_loop_norm': np.ones(nb_channels)}}
+
+    # filters: (name, compression, level, shuffle)
+    filters = [('none', None, None, False),
+               ('gzip-1', 'gzip', 1, False),
+               ('shuffle+gzip-1', 'gzip', 1, True),
+               ('shuffle+gzip-4', 'gzip', 4, True),
+               ('shuffle+lzf', 'lzf', None, True),
+               ('shuffle+lz4', 'lz4', None, True),
+               ('shuffle+zstd-3', 'zstd', 3, True),
+               ('blosc:lz4', 'blosc:lz4', 5, True),
+               ('blosc:zstd', 'blosc:zstd', 5, True),
+               ('bitshuffle', 'bitshuffle', None, True)]
+
+    print('Benchmark: ' + str(nb_events) + ' events, '
+          + str(nb_channels) + ' channels, ' + str(nb_samples)
+          + ' samples (%.0f MB), format version ' % data_mb
+          + str(format_version))
+    print('\n' + 'filter'.ljust(18) + 'write MB/s'.rjust(12)
+          + 'read MB/s'.rjust(12) + 'ratio'.rjust(10))
+
+    for name, compression, level, shuffle in filters:
+
+        try:
+            h5io.get_compression_filter(compression, level, shuffle)
+        except ValueError as err:
+            print(name.ljust(18) + '  skipped: ' + str(err))
+            continue
+
+        data_path = tempfile.mkdtemp()
+
+        # write
+        writer = h5io.H5Writer(verbose=False, flush_nb_events=None,
+                               format_version=format_version,
+                               compression=compression,
+                               compression_level=level,
+                               shuffle=shuffle)
+        writer._nb_events_per_dump_max = 100
+        writer.initialize('I1_D20230101_T000000', data_path=data_path)
+        writer.set_metadata(file_metadata={'series_num': 1},
+                            adc_config=adc_config,
+                            detector_config=detector_config)
+        start = time.perf_counter()
+        for ievent in range(nb_events):
+            writer.write_event(data[ievent], prefix='raw',
+                               dataset_metadata={'event_time': ievent})
+        writer.close()
+        write_rate = data_mb/(time.perf_counter()-start)
+
+        # compression ratio
+        file_size = sum(os.path.getsize(os.path.join(data_path, afile))
+                        for afile in os.listdir(data_path))
+
+        # read
+        reader = h5io.H5Reader(verbose=False)
+        start = time.perf_counter()
+        traces = reader.read_many_events(filepath=data_path, output_format=2)
+        read_rate = data_mb/(time.perf_counter()-start)
+        if not np.array_equal(traces, data):
+            print('ERROR: wrong data for filter ' + name)
+
+        print(name.ljust(18) + ('%.0f' % write_rate).rjust(12)
+              + ('%.0f' % read_rate).rjust(12)
+              + ('%.2f' % (data.nbytes/file_size)).rjust(10))
+
+        shutil.rmtree(data_path)
@@ -0,0 +1,114 @@
+"""
+Benchmark: FilterH5IO bulk save/load ("save_bulk"/"load_arrays") 
+compared to per parameter path ("save_fromdict"/"load") for a 
+filter file with many channels (PSD, folded PSD, template, 
+2D CSD and 3D array per channel).
+
+Usage: python benchmark_filter_bulk_io.py [nb_channels] [nb_samples]
+"""
+
+import sys
+import os
+import time
+import shutil
+import tempfile
+import numpy as np
+from pytesdaq.io.filter_hdf5 import FilterH5IO
+
+
+def make_filter_dict(nb_channels, nb_samples, seed=1):
+    """
+    Synthetic filter dictionary
+    """
+
+    rng = np.random.default_rng(seed)
+    sample_rate = 1.25e6
+    freqs = np.fft.fftfreq(nb_samples, d=1/sample_rate)
+    freqs_fold = np.fft.rfftfreq(nb_samples, d=1/sample_rate)
+    time_array = np.arange(nb_samples)/sample_rate
+    
+    filter_dict = dict()
+    for ichan in range(nb_channels):
+        metadata = {'sample_rate': sample_rate,
+                    'nb_samples': nb_samples,
+                    'nb_pretrigger_samples': nb_samples//2}
+        chan_dict = {
+            'psd_default': rng.uniform(1e-22, 1e-21, nb_samples),
+            'psd_fold_default': rng.uniform(1e-22, 1e-21, len(freqs_fold)),
+            'template_default': rng.normal(size=nb_samples),
+            'csd_default': rng.normal(size=(4, nb_samples//8)),
+            'template_nxm': rng.normal(size=(2, 2, nb_samples//8))}
+        for name in list(chan_dict):
+            chan_dict[name + '_metadata'] = dict(metadata)
+        filter_dict['chan' + str(ichan)] = chan_dict
+
+    return filter_dict
+
+
+if __name__ == "__main__":
+
+    # parameters
+    nb_channels = 20
+    nb_samples = 32768
+    if len(sys.argv)>1:
+        nb_channels = int(sys.argv[1])
+    if len(sys.argv)>2:
+        nb_samples = int(sys.argv[2])
+
+    filter_dict = make_filter_dict(nb_channels, nb_samples)
+    nb_params = sum(len(chan_dict)//2 for chan_dict in filter_dict.values())
+    
+    print('Benchmark: ' + str(nb_channels) + ' channels, '
+          + str(nb_params) + ' parameters, '
+          + str(nb_samples) + ' samples')
+    print('\n' + 'method'.ljust(28) + 'time [s]'.rjust(12))
+
+    data_path = tempfile.mkdtemp()
+    file_current = os.path.join(data_path, 'filter_current.hdf5')
+    file_bulk = os.path.join(data_path, 'filter_bulk.hdf5')
+
+    # save
+    filter_io = FilterH5IO(file_current, verbose=False, use_cache=False)
+    start = time.perf_counter()
+    filter_io.save_fromdict(filter_dict, overwrite=True)
+    print('save_fromdict'.ljust(28)
+          + ('%.3f' % (time.perf_counter()-start)).rjust(12))
+
+    filter_io = FilterH5IO(file_bulk, verbose=False, use_cache=False)
+    start = time.perf_counter()
+    filter_io.save_bulk(filter_dict, overwrite=True)
+    print('save_bulk (new file)'.ljust(28)
+          + ('%.3f' % (time.perf_counter()-start)).rjust(12))
+
+    start = time.perf_counter()
+    filter_io.save_bulk(filter_dict, overwrite=True)
+    print('save_bulk (update file)'.ljust(28)
+          + ('%.3f' % (time.perf_counter()-start)).rjust(12))
+
+    # load
+    filter_io = FilterH5IO(file_current, verbose=False, use_cache=False)
+    start = time.perf_counter()
+    data_current = filter_io.load()
+    print('load'.ljust(28)
+          + ('%.3f' % (time.perf_counter()-start)).rjust(12))
+    
+    filter_io = FilterH5IO(file_bulk, verbose=False, use_cache=False)
+    start = time.perf_counter()
+    data_bulk = filter_io.load_arrays()
+    print('load_arrays'.ljust(28)
+          + ('%.3f' % (time.perf_counter()-start)).rjust(12))
+    
+    start = time.perf_counter()
+    filter_io.load_arrays(channels='chan0', param_names='psd_default')
+    print('load_arrays (single param)'.ljust(28)
+          + ('%.3f' % (time.perf_counter()-start)).rjust(12))
+
+    # check
+    for chan, chan_dict in filter_dict.items():
+        for name, val in chan_dict.items():
+            if (not name.endswith('_metadata')
+                and not (np.array_equal(np.asarray(data_current[chan][name]), val)
+                         and np.array_equal(data_bulk[chan][name], val))):
+                print('ERROR: wrong data for ' + chan + '/' + name)
+    
+    shutil.rmtree(data_path)
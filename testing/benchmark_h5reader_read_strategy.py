@@ -0,0 +1,93 @@
+"""
+Micro-benchmark: H5Reader channel read strategies
+('rows', 'full', 'hyperslab', 'auto') as a function of the
+number of selected channels. Shows the crossover between
+single hyperslab reads (sparse selection) and full dataset
+read + fancy indexing (dense selection).
+
+Usage: python benchmark_h5reader_read_strategy.py [nb_channels] [nb_samples]
+"""
+
+import sys
+import os
+import time
+import tempfile
+import numpy as np
+import h5py
+import pytesdaq.io.hdf5 as h5io
+
+
+if __name__ == "__main__":
+
+    # parameters
+    nb_channels = 32
+    nb_samples = 8192
+    if len(sys.argv)>1:
+        nb_channels = int(sys.argv[1])
+    if len(sys.argv)>2:
+        nb_samples = int(sys.argv[2])
+    nb_events = 200
+    strategies = ['rows', 'full', 'hyperslab', 'auto']
+
+
+    # ---------------------
+    # create test file
+    # (raw int16 datasets, contiguous layout)
+    # ---------------------
+    file_name = os.path.join(tempfile.mkdtemp(), 'benchmark_read_strategy.hdf5')
+    rng = np.random.default_rng(1)
+    with h5py.File(file_name, 'w') as h5:
+        adc_group = h5.create_group('adc1')
+        for ievent in range(nb_events):
+            adc_group.create_dataset(
+                'event_' + str(ievent+1),
+                data=rng.integers(-2**15, 2**15, size=(nb_channels, nb_samples),
+                                  dtype=np.int16))
+
+    print('Test file: ' + str(nb_events) + ' events, '
+          + str(nb_channels) + ' channels, '
+          + str(nb_samples) + ' samples')
+
+
+    # ---------------------
+    # benchmark
+    # ---------------------
+
+    # selections from sparse to dense, evenly spaced channels,
+    # first two swapped (unsorted selection)
+    nb_selected_list = sorted(set([1, 2, 4, nb_channels//4, nb_channels//2,
+                                   3*nb_channels//4, nb_channels-1]))
+
+    print('\n' + 'nb chans'.rjust(8)
+          + ''.join([(strategy + ' [ms]').rjust(16) for strategy in strategies]))
+
+    with h5py.File(file_name, 'r') as h5:
+
+        datasets = [h5['adc1']['event_' + str(ievent+1)]
+                    for ievent in range(nb_events)]
+
+        for nb_selected in nb_selected_list:
+
+            # non-contiguous selection (skip "block" path)
+            array_indices = np.linspace(0, nb_channels-1, nb_selected+1)
+            array_indices = np.unique(array_indices.astype(np.int64))[:nb_selected]
+            if len(array_indices)>1:
+                array_indices[[0, 1]] = array_indices[[1, 0]]
+            dest = np.empty((len(array_indices), nb_samples), dtype=np.int16)
+
+            line = str(len(array_indices)).rjust(8)
+            for strategy in strategies:
+                reader = h5io.H5Reader(verbose=False, read_strategy=strategy)
+                start = time.perf_counter()
+                for dataset in datasets:
+                    reader._read_traces(dataset, dest, array_indices)
+                msec = (time.perf_counter()-start)*1000/nb_events
+
+                # check
+                if not np.array_equal(dest, datasets[-1][()][array_indices]):
+                    print('ERROR: wrong data for strategy ' + strategy)
+
+                line += ('%.3f' % msec).rjust(16)
+            print(line)
+
+    os.remove(file_name)
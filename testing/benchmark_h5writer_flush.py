@@ -0,0 +1,78 @@
+"""
+Throughput benchmark: H5Writer events/s as a function of the
+flush policy ("flush_nb_events"), with and without SWMR mode.
+Short traces make the per-event flush overhead visible.
+
+Usage: python benchmark_h5writer_flush.py [nb_channels] [nb_samples] [nb_events]
+"""
+
+import sys
+import os
+import time
+import shutil
+import tempfile
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+
+
+def write_series(data_path, data, flush_nb_events, swmr):
+    """
+    write events, return events/s
+    """
+
+    nb_channels = data.shape[1]
+    adc_config = {'adc1': {
+        'nb_channels': nb_channels,
+        'nb_samples': data.shape[2],
+        'sample_rate': 1250000,
+        'adc_channel_indices': np.arange(nb_channels, dtype=np.int32),
+        'adc_conversion_factor': np.tile(np.array([0., 3.05e-4, 0., 0.]),
+                                         (nb_channels, 1))}}
+
+    writer = h5io.H5Writer(verbose=False, flush_nb_events=flush_nb_events,
+                           swmr=swmr)
+    writer._nb_events_per_dump_max = 500
+    writer.initialize('I1_D20230101_T000000', data_path=data_path)
+    writer.set_metadata(file_metadata={'series_num': 1},
+                        adc_config=adc_config)
+
+    start = time.perf_counter()
+    for ievent in range(data.shape[0]):
+        writer.write_event(data[ievent], prefix='raw',
+                           dataset_metadata={'event_time': ievent,
+                                             'trigger_type': 3})
+    writer.close()
+    return data.shape[0]/(time.perf_counter()-start)
+
+
+if __name__ == "__main__":
+
+    # parameters
+    nb_channels = 4
+    nb_samples = 1000
+    nb_events = 2000
+    if len(sys.argv)>1:
+        nb_channels = int(sys.argv[1])
+    if len(sys.argv)>2:
+        nb_samples = int(sys.argv[2])
+    if len(sys.argv)>3:
+        nb_events = int(sys.argv[3])
+
+    rng = np.random.default_rng(1)
+    data = rng.integers(-2**15, 2**15, size=(nb_events, nb_channels, nb_samples),
+                        dtype=np.int16)
+
+    print('Benchmark: ' + str(nb_events) + ' events, '
+          + str(nb_channels) + ' channels, '
+          + str(nb_samples) + ' samples')
+    print('\n' + 'flush every'.rjust(12)
+          + 'events/s'.rjust(14) + 'events/s (SWMR)'.rjust(18))
+
+    for flush_nb_events in [1, 10, 100, 1000, None]:
+        line = str(flush_nb_events if flush_nb_events else 'close').rjust(12)
+        for swmr in [False, True]:
+            data_path = tempfile.mkdtemp()
+            rate = write_series(data_path, data, flush_nb_events, swmr)
+            shutil.rmtree(data_path)
+            line += ('%.0f' % rate).rjust(14 if not swmr else 18)
+        print(line)
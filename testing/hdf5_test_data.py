@@ -0,0 +1,105 @@
+"""
+Helpers for hdf5 io test scripts (testing/test_h5*.py):
+write a raw data series with known traces and the metadata
+required by H5Reader (connections, detector config).
+"""
+
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+
+
+SERIES_NAME = 'I1_D20230101_T000000'
+SAMPLE_RATE = 1250000
+
+
+def make_adc_config(nb_channels, nb_samples, nb_samples_pretrigger=None):
+    """
+    ADC/detector configuration: channel i connected to
+    detector channel "D[i]", ADC conversion factor
+    (0, 1e-4)
+    """
+
+    if nb_samples_pretrigger is None:
+        nb_samples_pretrigger = nb_samples//2
+
+    adc_config = {'adc1': {
+        'nb_channels': nb_channels,
+        'nb_samples': nb_samples,
+        'nb_samples_pretrigger': nb_samples_pretrigger,
+        'sample_rate': SAMPLE_RATE,
+        'adc_channel_indices': np.arange(nb_channels, dtype=np.int32),
+        'adc_conversion_factor': np.tile(np.array([0., 1e-4]),
+                                         (nb_channels, 1)),
+        'voltage_range': np.tile(np.array([-5., 5.]), (nb_channels, 1))}}
+    for ichan in range(nb_channels):
+        adc_config['adc1']['connection' + str(ichan)] = np.array(
+            ['tes:T' + str(ichan), 'detector:D' + str(ichan),
+             'controller:feb1_' + str(ichan)])
+
+    detector_config = {'detconfig1': {
+        'channel_list': np.arange(nb_channels),
+        'close_loop_norm': np.full(nb_channels, 2.)}}
+
+    return adc_config, detector_config
+
+
+def write_series(data_path, data, nb_events_per_dump, format_version=1,
+                 prefix='raw', file_metadata=None, start_time=0,
+                 series_name=SERIES_NAME, **kwargs):
+    """
+    Write events [events, channels, samples] (int16) in dumps of
+    "nb_events_per_dump" events, "event_time" metadata =
+    "start_time" + event number in series (from 0). Optional
+    file metadata added to "series_num". Other arguments: 
+    H5Writer arguments.
+
+    Return list of event numbers written (dump_num*100000 +
+    event index in dump)
+    """
+
+    adc_config, detector_config = make_adc_config(data.shape[1],
+                                                  data.shape[2])
+
+    writer = h5io.H5Writer(verbose=False, format_version=format_version,
+                           **kwargs)
+    writer._nb_events_per_dump_max = nb_events_per_dump
+    writer.initialize(series_name, data_path=data_path)
+    metadata = {'series_num': 1}
+    if file_metadata is not None:
+        metadata.update(file_metadata)
+    writer.set_metadata(file_metadata=metadata,
+                        adc_config=adc_config,
+                        detector_config=detector_config)
+    for ievent in range(data.shape[0]):
+        writer.write_event(data[ievent], prefix=prefix,
+                           dataset_metadata={'event_time': start_time+ievent,
+                                             'trigger_type': 3})
+    writer.close()
+
+    return [(ievent//nb_events_per_dump+1)*100000
+            + ievent%nb_events_per_dump + 1
+            for ievent in range(data.shape[0])]
+
+
+def make_data(nb_events, nb_channels, nb_samples, seed=1):
+    """
+    Random int16 traces [events, channels, samples]
+    """
+
+    rng = np.random.default_rng(seed)
+    return rng.integers(-2**14, 2**14,
+                        size=(nb_events, nb_channels, nb_samples),
+                        dtype=np.int16)
+
+
+def make_continuous_data(nb_events, nb_channels, nb_samples):
+    """
+    Continuous data split in events: sample value = (global
+    sample index + 1000*channel) % 2**15
+    """
+
+    samples = np.arange(nb_events*nb_samples, dtype=np.int64)
+    data = np.stack([(samples + 1000*ichan) % 2**15
+                     for ichan in range(nb_channels)])
+    data = data.reshape(nb_channels, nb_events, nb_samples)
+    return np.ascontiguousarray(np.moveaxis(data, 1, 0)).astype(np.int16)
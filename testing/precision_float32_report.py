@@ -0,0 +1,122 @@
+"""
+Precision report: float32 vs float64 calibrated traces.
+
+Compare ADC->amps conversion, PSD and optimal filter (OF)
+amplitudes computed from float32 traces against float64.
+Synthetic data (noise + pulses) are used by default. Raw data
+can be used instead (H5Reader "read_many_events" with dtype
+argument).
+
+Usage: python precision_float32_report.py [raw data path] [detector channel]
+"""
+
+import sys
+import numpy as np
+import qetpy as qp
+from pytesdaq.utils import calibration
+import pytesdaq.io.hdf5 as h5io
+
+
+def rel_diff(x32, x64):
+    """
+    max relative difference (normalized to max value)
+    """
+    return np.max(np.abs(x32.astype(np.float64)-x64))/np.max(np.abs(x64))
+
+
+if __name__ == "__main__":
+
+    fs = 1.25e6
+    nb_samples = 12500
+    nb_pretrigger_samples = 6250
+
+    # ---------------------
+    # traces
+    # ---------------------
+
+    if len(sys.argv)>1:
+
+        # raw data
+        detector_chans = None
+        if len(sys.argv)>2:
+            detector_chans = sys.argv[2]
+        reader = h5io.H5Reader()
+        traces = dict()
+        for dtype in [np.float64, np.float32]:
+            traces[dtype] = reader.read_many_events(
+                filepath=sys.argv[1], nevents=500,
+                output_format=2, detector_chans=detector_chans,
+                adctoamp=True, baselinesub=True, dtype=dtype)[:, 0, :]
+        nb_samples = traces[np.float64].shape[-1]
+        nb_pretrigger_samples = nb_samples//2
+
+    else:
+
+        # synthetic ADC data: noise + pulses
+        rng = np.random.default_rng(1)
+        nb_events = 500
+        time_array = np.arange(nb_samples)/fs
+        template = np.zeros(nb_samples)
+        dt = time_array[nb_pretrigger_samples:]-time_array[nb_pretrigger_samples]
+        template[nb_pretrigger_samples:] = (np.exp(-dt/100e-6)-np.exp(-dt/20e-6))
+        template /= np.max(template)
+        amplitudes = rng.uniform(0, 2000, size=nb_events)
+        adc = (rng.normal(0, 20, size=(nb_events, 1, nb_samples))
+               + 300 + amplitudes[:, np.newaxis, np.newaxis]*template)
+        adc = np.round(adc).astype(np.int16)
+
+        # calibration (NI-like coefficients) + close loop norm
+        cal = calibration.ADCCalibration([[2e-5, 3.05e-4, 1e-12, -2e-16]],
+                                         close_loop_norm=[124000])
+        traces = dict()
+        for dtype in [np.float64, np.float32]:
+            traces[dtype] = cal.apply(adc, dtype=dtype)[:, 0, :]
+            traces[dtype] -= np.mean(traces[dtype][:, :int(0.8*nb_pretrigger_samples)],
+                                     axis=-1, keepdims=True)
+
+    print('Traces: ' + str(traces[np.float64].shape[0]) + ' events, '
+          + str(nb_samples) + ' samples')
+    print('Memory float64: %.1f MB, float32: %.1f MB'
+          % (traces[np.float64].nbytes/1e6, traces[np.float32].nbytes/1e6))
+
+
+    # ---------------------
+    # comparison
+    # ---------------------
+
+    # traces
+    print('\nTraces max relative difference: %.2e'
+          % rel_diff(traces[np.float32], traces[np.float64]))
+
+    # PSD (noise: pretrigger part)
+    psd = dict()
+    for dtype in [np.float64, np.float32]:
+        f, psd[dtype] = qp.calc_psd(traces[dtype][:, :nb_pretrigger_samples],
+                                    fs=fs, folded_over=False)
+    psd_rel = np.abs(psd[np.float32]-psd[np.float64])/psd[np.float64]
+    print('PSD relative difference: median %.2e, max %.2e'
+          % (np.median(psd_rel[1:]), np.max(psd_rel[1:])))
+
+    # OF amplitudes (template from average pulse)
+    avg = np.mean(traces[np.float64], axis=0)
+    avg -= np.mean(avg[:int(0.8*nb_pretrigger_samples)])
+    template_of = avg/np.max(np.abs(avg))
+    f, psd_full = qp.calc_psd(traces[np.float64], fs=fs, folded_over=False)
+
+    amps = dict()
+    chi2 = dict()
+    for dtype in [np.float64, np.float32]:
+        amps[dtype] = np.zeros(traces[dtype].shape[0])
+        chi2[dtype] = np.zeros(traces[dtype].shape[0])
+        for ievent, trace in enumerate(traces[dtype]):
+            of = qp.OptimumFilter(trace, template_of, psd_full, fs)
+            amps[dtype][ievent], chi2[dtype][ievent] = of.ofamp_nodelay()
+
+    amp_diff = np.abs(amps[np.float32]-amps[np.float64])
+    resolution = of.energy_resolution()
+    print('OF amplitude: max abs difference %.2e, max relative difference %.2e'
+          % (np.max(amp_diff), rel_diff(amps[np.float32], amps[np.float64])))
+    print('OF amplitude max difference / OF resolution: %.2e'
+          % (np.max(amp_diff)/resolution))
+    print('OF chi2 max relative difference: %.2e'
+          % np.max(np.abs(chi2[np.float32]-chi2[np.float64])/chi2[np.float64]))
@@ -0,0 +1,171 @@
+"""
+Test of ADC calibration (pytesdaq.utils.calibration):
+"ADCCalibration.apply" compared with per channel polynomial
+evaluation (numpy polyval) for 2D/3D traces, close loop
+normalization, float32 output and in-place conversion, cached
+calibrations ("get_adc_calibration") shared and not modifiable,
+H5Reader conversion using the calibration of each file (dumps
+with different ADC conversion factors/normalization).
+
+Usage: python test_adc_calibration.py
+"""
+
+import glob
+import shutil
+import tempfile
+import h5py
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from pytesdaq.utils import ADCCalibration, get_adc_calibration
+from hdf5_test_data import write_series, make_data
+
+
+NB_EVENTS = 6
+NB_EVENTS_PER_DUMP = 3
+NB_CHANNELS = 3
+NB_SAMPLES = 200
+
+
+def convert_polyval(traces, conversion_factor, close_loop_norm=None):
+    """
+    Reference conversion: polynomial evaluated channel by channel
+    """
+
+    output = np.empty(traces.shape, dtype=np.float64)
+    for ichan in range(traces.shape[-2]):
+        output[..., ichan, :] = np.polyval(conversion_factor[ichan][::-1],
+                                           traces[..., ichan, :].astype(np.float64))
+        if close_loop_norm is not None:
+            output[..., ichan, :] /= close_loop_norm[ichan]
+    return output
+
+
+def check_calibration(traces):
+    """
+    ADCCalibration vs polyval
+    """
+
+    # cubic, second channel linear, trailing zero order
+    conversion_factor = np.array([[0.1, 1e-4, 1e-9, 1e-13, 0],
+                                  [-0.2, 2e-4, 0, 0, 0],
+                                  [0, 3e-4, -1e-9, 0, 0]])
+    close_loop_norm = np.array([2., 0.5, 10.])
+
+    calibration = ADCCalibration(conversion_factor)
+    assert calibration.coefficients.shape==(NB_CHANNELS, 4)
+    expected = convert_polyval(traces, conversion_factor)
+    assert np.allclose(calibration.apply(traces), expected,
+                       rtol=1e-12, atol=0)
+    assert np.allclose(calibration.apply(traces[0]), expected[0],
+                       rtol=1e-12, atol=0)
+
+    # close loop normalization
+    calibration = ADCCalibration(conversion_factor,
+                                 close_loop_norm=close_loop_norm)
+    expected = convert_polyval(traces, conversion_factor, close_loop_norm)
+    assert np.allclose(calibration.apply(traces), expected,
+                       rtol=1e-12, atol=0)
+
+    # float32
+    traces_float32 = calibration.apply(traces, dtype=np.float32)
+    assert traces_float32.dtype==np.float32
+    assert np.allclose(traces_float32, expected, rtol=1e-5, atol=1e-7)
+
+    # in place (float traces), output array
+    traces_float = traces.astype(np.float64)
+    calibration.apply(traces_float, out=traces_float)
+    assert np.allclose(traces_float, expected, rtol=1e-12, atol=0)
+    out = np.empty(traces.shape)
+    assert calibration.apply(traces, out=out) is out
+
+    # wrong number of channels
+    try:
+        calibration.apply(traces[:, :2])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Wrong number of channels not detected')
+
+
+def check_cache():
+    """
+    Cached calibrations: same configuration = same object,
+    coefficients can't be modified
+    """
+
+    conversion_factor = [[0, 1e-4], [0, 2e-4]]
+    calibration = get_adc_calibration(conversion_factor)
+    assert get_adc_calibration(np.array(conversion_factor)) is calibration
+    calibration_norm = get_adc_calibration(conversion_factor,
+                                           close_loop_norm=[2, 2])
+    assert calibration_norm is not calibration
+    assert np.allclose(calibration_norm.coefficients,
+                       calibration.coefficients/2)
+
+    try:
+        calibration.coefficients[0, 1] = 0
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Cached coefficients modified')
+    assert get_adc_calibration(conversion_factor).coefficients[0, 1]==1e-4
+
+
+def check_reader(data_path, data):
+    """
+    H5Reader conversion: calibration of each file
+    """
+
+    # second dump: different conversion factor/normalization
+    conversion_factors = [np.tile([0., 1e-4], (NB_CHANNELS, 1)),
+                          np.array([[0.1, 1e-4, 1e-10],
+                                    [0., 2e-4, 0.],
+                                    [-0.1, 1e-4, 0.]])]
+    close_loop_norms = [np.full(NB_CHANNELS, 2.), np.array([2., 4., 1.])]
+    file_list = sorted(glob.glob(data_path + '/*.hdf5'))
+    with h5py.File(file_list[1], 'r+') as h5_file:
+        del h5_file['adc1'].attrs['adc_conversion_factor']
+        h5_file['adc1'].attrs['adc_conversion_factor'] = conversion_factors[1]
+        h5_file['detconfig1'].attrs['close_loop_norm'] = close_loop_norms[1]
+
+    expected_volt = np.concatenate(
+        [convert_polyval(data[ifile*NB_EVENTS_PER_DUMP:
+                              (ifile+1)*NB_EVENTS_PER_DUMP],
+                         conversion_factors[ifile])
+         for ifile in range(2)])
+    expected_amp = np.concatenate(
+        [convert_polyval(data[ifile*NB_EVENTS_PER_DUMP:
+                              (ifile+1)*NB_EVENTS_PER_DUMP],
+                         conversion_factors[ifile], close_loop_norms[ifile])
+         for ifile in range(2)])
+
+    reader = h5io.H5Reader(verbose=False)
+    for nb_cores in [1, 2]:
+        traces = reader.read_many_events(filepath=data_path, adctovolt=True,
+                                         output_format=2, nb_cores=nb_cores)
+        assert np.allclose(traces, expected_volt, rtol=1e-12, atol=0)
+        traces = reader.read_many_events(filepath=data_path, adctoamp=True,
+                                         output_format=2, nb_cores=nb_cores)
+        assert np.allclose(traces, expected_amp, rtol=1e-12, atol=0)
+
+    reader.set_files(data_path)
+    for ievent in range(NB_EVENTS):
+        trace = reader.read_next_event(adctoamp=True)
+        assert np.allclose(trace, expected_amp[ievent], rtol=1e-12, atol=0)
+    reader.close()
+
+
+if __name__ == "__main__":
+
+    data = make_data(NB_EVENTS, NB_CHANNELS, NB_SAMPLES)
+    check_calibration(data)
+    check_cache()
+
+    data_path = tempfile.mkdtemp()
+    try:
+        write_series(data_path, data, NB_EVENTS_PER_DUMP)
+        check_reader(data_path, data)
+    finally:
+        shutil.rmtree(data_path)
+
+    print('All tests passed')
@@ -0,0 +1,205 @@
+"""
+Test of asynchronous writer (AsyncH5Writer): events written
+identical and in same order as synchronous H5Writer (across dump
+files), back-pressure when all buffers are used ("drop" and
+"block" overflow modes, stats), writer thread error raised to
+caller on "close" (file closed, thread stopped).
+
+Usage: python test_async_h5writer.py
+"""
+
+import time
+import shutil
+import tempfile
+import threading
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from hdf5_test_data import (write_series, make_data, make_adc_config,
+                            SERIES_NAME)
+
+
+NB_EVENTS = 25
+NB_EVENTS_PER_DUMP = 10
+NB_CHANNELS = 2
+NB_SAMPLES = 200
+
+
+def read_all(data_path):
+    """
+    Read all events: traces and "event_time" metadata
+    """
+
+    reader = h5io.H5Reader(verbose=False)
+    traces, info_list = reader.read_many_events(
+        filepath=data_path, output_format=2, include_metadata=True)
+    event_times = [int(info['event_time']) for info in info_list]
+    return traces, event_times
+
+
+def make_async_writer(data_path, nb_buffers, **kwargs):
+    """
+    Async writer initialized with test data metadata
+    """
+
+    adc_config, detector_config = make_adc_config(NB_CHANNELS, NB_SAMPLES)
+    writer = h5io.AsyncH5Writer(nb_buffers=nb_buffers, verbose=False,
+                                **kwargs)
+    writer._writer._nb_events_per_dump_max = NB_EVENTS_PER_DUMP
+    writer.initialize(SERIES_NAME, data_path=data_path)
+    writer.set_metadata(file_metadata={'series_num': 1},
+                        adc_config=adc_config,
+                        detector_config=detector_config)
+    return writer
+
+
+def gate_writes(writer, gate, error_event=None):
+    """
+    Make writer thread wait for "gate" before each event write,
+    raise error at event "error_event" (index from 0)
+    """
+
+    write_event = writer._writer.write_event
+    nb_calls = [0]
+
+    def gated_write_event(*args, **kwargs):
+        gate.wait()
+        nb_calls[0] += 1
+        if error_event is not None and nb_calls[0]==error_event+1:
+            raise RuntimeError('Write error event ' + str(error_event))
+        return write_event(*args, **kwargs)
+
+    writer._writer.write_event = gated_write_event
+
+
+def write(writer, data, ievent):
+    """
+    Queue event "ievent"
+    """
+
+    return writer.write_event(data[ievent], prefix='raw',
+                              dataset_metadata={'event_time': ievent,
+                                                'trigger_type': 3})
+
+
+def check_order(data):
+    """
+    Async vs sync writer: same events, same order
+    """
+
+    sync_path = tempfile.mkdtemp()
+    async_path = tempfile.mkdtemp()
+    try:
+        write_series(sync_path, data, NB_EVENTS_PER_DUMP)
+        traces_sync, times_sync = read_all(sync_path)
+
+        # small ring: writer blocked often
+        writer = make_async_writer(async_path, nb_buffers=3)
+        for ievent in range(NB_EVENTS):
+            assert write(writer, data, ievent)
+        writer.close()
+        traces_async, times_async = read_all(async_path)
+
+        assert times_async==times_sync==list(range(NB_EVENTS))
+        assert np.array_equal(traces_async, traces_sync)
+        assert np.array_equal(traces_async, data)
+        stats = writer.get_stats()
+        assert stats['nb_events_queued']==stats['nb_events_written']==NB_EVENTS
+        assert stats['nb_dropped']==0
+        assert stats['queue_depth']==0
+    finally:
+        shutil.rmtree(sync_path)
+        shutil.rmtree(async_path)
+
+
+def check_back_pressure(data):
+    """
+    Ring full: events dropped ("drop" or "block" with timeout),
+    or caller blocked until buffer freed
+    """
+
+    nb_buffers = 2
+
+    for overflow in ['drop', 'block']:
+        data_path = tempfile.mkdtemp()
+        try:
+            writer = make_async_writer(data_path, nb_buffers=nb_buffers,
+                                       overflow=overflow, block_timeout=0.05)
+            gate = threading.Event()
+            gate_writes(writer, gate)
+
+            # fill ring (writer thread waiting for gate)
+            for ievent in range(nb_buffers):
+                assert write(writer, data, ievent)
+            assert not write(writer, data, nb_buffers)
+            stats = writer.get_stats()
+            assert stats['nb_dropped']==1
+            if overflow=='block':
+                assert stats['nb_blocked']==1
+                assert stats['blocked_msec_sum']>=40
+            else:
+                assert stats['nb_blocked']==0
+
+            # block without timeout: caller waits until gate open
+            if overflow=='block':
+                writer._block_timeout = None
+                timer = threading.Timer(0.2, gate.set)
+                time_start = time.time()
+                timer.start()
+                assert write(writer, data, nb_buffers)
+                assert time.time()-time_start>=0.15
+                assert writer.get_stats()['nb_blocked']==2
+            gate.set()
+            writer.close()
+
+            # written: queued events only, in order
+            event_times = read_all(data_path)[1]
+            nb_written = nb_buffers + (1 if overflow=='block' else 0)
+            assert event_times==list(range(nb_written))
+            assert writer.get_stats()['nb_events_written']==nb_written
+        finally:
+            shutil.rmtree(data_path)
+
+
+def check_error(data):
+    """
+    Writer thread error raised on close, file closed,
+    other events written
+    """
+
+    data_path = tempfile.mkdtemp()
+    try:
+        writer = make_async_writer(data_path, nb_buffers=4)
+        gate = threading.Event()
+        gate.set()
+        gate_writes(writer, gate, error_event=3)
+        for ievent in range(6):
+            write(writer, data, ievent)
+        try:
+            writer.close()
+        except RuntimeError as err:
+            assert str(err)=='Write error event 3'
+        else:
+            raise AssertionError('Writer thread error not raised')
+        assert writer._thread is None
+
+        # file closed and readable
+        event_times = read_all(data_path)[1]
+        assert event_times==[0, 1, 2, 4, 5]
+
+        # error raised only once
+        writer.close()
+    finally:
+        shutil.rmtree(data_path)
+
+
+if __name__ == "__main__":
+
+    data = make_data(NB_EVENTS, NB_CHANNELS, NB_SAMPLES)
+    check_order(data)
+    print('Order/completeness: OK')
+    check_back_pressure(data)
+    print('Back-pressure: OK')
+    check_error(data)
+    print('Writer thread error: OK')
+
+    print('All tests passed')
@@ -0,0 +1,159 @@
+"""
+Test of FilterH5IO bulk save/load ("save_bulk"/"load_arrays"):
+1D (array and pandas Series), 2D and 3D parameters and metadata
+round trip, new parameters added to existing file (file not
+copied), parameters overwritten, filter file unmodified if an
+error occurs (key already stored, error while writing).
+
+Usage: python test_filter_h5_bulk_io.py
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from pytesdaq.io.filter_hdf5 import FilterH5IO
+
+
+NB_SAMPLES = 128
+
+
+def make_filter_dict(channels, seed=1):
+    """
+    Filter dictionary: 1D array, pandas Series (frequency
+    index), 2D and 3D arrays, with metadata
+    """
+
+    rng = np.random.default_rng(seed)
+    filter_dict = dict()
+    for chan in channels:
+        freqs = np.fft.rfftfreq(NB_SAMPLES, d=1/1.25e6)
+        filter_dict[chan] = {
+            'template_default': rng.normal(size=NB_SAMPLES),
+            'psd_fold_default': pd.Series(rng.random(len(freqs)),
+                                          index=freqs),
+            'csd_default': rng.normal(size=(4, NB_SAMPLES)),
+            'template_nxm': rng.normal(size=(3, 2, NB_SAMPLES))}
+        for name in list(filter_dict[chan]):
+            filter_dict[chan][name + '_metadata'] = {
+                'sample_rate': 1.25e6, 'name': name,
+                'channels': [chan, 'other']}
+    return filter_dict
+
+
+def check_round_trip(filter_file, filter_dict):
+    """
+    Parameters in file equal to dictionary
+    """
+
+    filter_io = FilterH5IO(filter_file, verbose=False, use_cache=False)
+    arrays = filter_io.load_arrays(channels=list(filter_dict), add_index=True)
+    for chan, chan_dict in filter_dict.items():
+        for name, val in chan_dict.items():
+            if name.endswith('_metadata'):
+                metadata = arrays[chan][name]
+                assert all(metadata[key]==meta_val
+                           for key, meta_val in val.items())
+                continue
+            assert arrays[chan][name].shape==np.shape(val)
+            assert np.array_equal(arrays[chan][name], np.asarray(val))
+            if isinstance(val, pd.Series):
+                assert np.array_equal(arrays[chan][name + '_index'],
+                                      val.index.to_numpy())
+
+        # same as per parameter read
+        val = filter_io.get_param(chan, 'template_nxm')
+        assert np.array_equal(val, chan_dict['template_nxm'])
+
+
+def get_content(filter_file):
+    """
+    Filter file content (load_arrays output)
+    """
+    return FilterH5IO(filter_file, verbose=False,
+                      use_cache=False).load_arrays(add_index=True)
+
+
+def check_unmodified(filter_file, content, data_path):
+    """
+    Filter file content unmodified, no temporary file left
+    """
+
+    content_after = get_content(filter_file)
+    assert sorted(content_after)==sorted(content)
+    for chan in content:
+        assert sorted(content_after[chan])==sorted(content[chan])
+        for name, val in content[chan].items():
+            if name.endswith('_metadata'):
+                assert content_after[chan][name]==val
+            else:
+                assert np.array_equal(content_after[chan][name], val)
+    assert os.listdir(data_path)==[os.path.basename(filter_file)]
+
+
+if __name__ == "__main__":
+
+    data_path = tempfile.mkdtemp()
+    filter_file = os.path.join(data_path, 'filter.hdf5')
+
+    try:
+
+        # new file
+        filter_dict = make_filter_dict(['chan0', 'chan1'])
+        filter_io = FilterH5IO(filter_file, verbose=False)
+        filter_io.save_bulk(filter_dict)
+        check_round_trip(filter_file, filter_dict)
+
+        # new parameters (other channel): file not copied
+        inode = os.stat(filter_file).st_ino
+        filter_dict_new = make_filter_dict(['chan2'], seed=2)
+        filter_io.save_bulk(filter_dict_new)
+        assert os.stat(filter_file).st_ino==inode
+        check_round_trip(filter_file, filter_dict)
+        check_round_trip(filter_file, filter_dict_new)
+
+        # overwrite parameters: other parameters unmodified
+        filter_dict_over = make_filter_dict(['chan1'], seed=3)
+        filter_io.save_bulk(filter_dict_over, overwrite=True)
+        check_round_trip(filter_file, {'chan0': filter_dict['chan0']})
+        check_round_trip(filter_file, filter_dict_over)
+        check_round_trip(filter_file, filter_dict_new)
+        content = get_content(filter_file)
+
+        # error: parameters already stored (file not opened for
+        # writing)
+        mtime = os.stat(filter_file).st_mtime_ns
+        try:
+            filter_io.save_bulk(make_filter_dict(['chan3', 'chan1'], seed=4))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('Error not raised (key already stored)')
+        assert os.stat(filter_file).st_mtime_ns==mtime
+        check_unmodified(filter_file, content, data_path)
+
+        # error while writing (metadata can't be stored), new
+        # parameters and overwritten parameters
+        for channels, overwrite in [(['chan3', 'chan4'], False),
+                                    (['chan0', 'chan3'], True)]:
+            filter_dict_error = make_filter_dict(channels, seed=5)
+            filter_dict_error[channels[1]]['csd_default_metadata'] = {
+                'function': lambda x: x}
+            try:
+                filter_io.save_bulk(filter_dict_error, overwrite=overwrite)
+            except Exception:
+                pass
+            else:
+                raise AssertionError('Error not raised (write error)')
+            check_unmodified(filter_file, content, data_path)
+
+        # replace file
+        filter_io.save_bulk(filter_dict_new, replace_file=True)
+        check_round_trip(filter_file, filter_dict_new)
+        assert sorted(get_content(filter_file))==['chan2']
+
+    finally:
+        shutil.rmtree(data_path)
+
+    print('All tests passed')
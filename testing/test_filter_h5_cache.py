@@ -0,0 +1,97 @@
+"""
+Test of FilterH5IO parameter cache: cached parameters returned
+as copies (values and metadata modified in place by caller not
+leaking into cache or other instances), cache invalidated when
+file modified, cache size bounded (least recently used parameter
+removed first).
+
+Usage: python test_filter_h5_cache.py
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from pytesdaq.io.filter_hdf5 import FilterH5IO
+
+
+NB_SAMPLES = 64
+
+
+if __name__ == "__main__":
+
+    data_path = tempfile.mkdtemp()
+    filter_file = os.path.join(data_path, 'filter.hdf5')
+    max_size = FilterH5IO._param_cache_max_size
+
+    try:
+
+        rng = np.random.default_rng(1)
+        psd = rng.random(NB_SAMPLES)
+        template = rng.random((2, NB_SAMPLES))
+        filter_io = FilterH5IO(filter_file, verbose=False)
+        filter_io.save_param('Melange1pc1ch', 'psd_default',
+                             pd.Series(psd),
+                             attributes={'sample_rate': 1.25e6,
+                                         'channels': [1, 2]})
+        filter_io.save_param('Melange1pc1ch', 'template_default', template,
+                             attributes={'sample_rate': 1.25e6})
+        filter_io.clear_cache()
+
+        # in-place modification (series, 2D array, metadata):
+        # not leaking into cache (first read and cached read)
+        for _ in range(2):
+            val, metadata = filter_io.get_param(
+                'Melange1pc1ch', 'psd_default', add_metadata=True)
+            assert np.array_equal(val.values, psd)
+            assert metadata['channels']==[1, 2]
+            val.iloc[0] = -1
+            metadata['sample_rate'] = 0
+            metadata['channels'].append(3)
+
+            val = filter_io.get_param('Melange1pc1ch', 'template_default')
+            assert np.array_equal(val, template)
+            val *= 0
+
+        # other instance (shared cache)
+        other_io = FilterH5IO(filter_file, verbose=False)
+        val, metadata = other_io.get_param('Melange1pc1ch', 'psd_default',
+                                           add_metadata=True)
+        assert np.array_equal(val.values, psd)
+        assert metadata['sample_rate']==1.25e6
+        assert metadata['channels']==[1, 2]
+        key = (os.path.abspath(filter_file), '/Melange1pc1ch/psd_default')
+        assert key in FilterH5IO._param_cache
+
+        # file modified: cached value not used
+        filter_io.save_param('Melange1pc1ch', 'psd_default',
+                             pd.Series(2*psd), overwrite=True)
+        val = other_io.get_param('Melange1pc1ch', 'psd_default')
+        assert np.array_equal(val.values, 2*psd)
+
+        # cache size bounded: least recently used removed first
+        FilterH5IO._param_cache_max_size = 3
+        filter_io.clear_cache()
+        for iparam in range(4):
+            filter_io.save_param('Melange1pc1ch', 'param_' + str(iparam),
+                                 np.full(NB_SAMPLES, iparam))
+        for iparam in [0, 1, 2, 0, 3]:
+            val = filter_io.get_param('Melange1pc1ch', 'param_' + str(iparam))
+            assert np.all(val==iparam)
+        cached_params = [cache_key[1] for cache_key in FilterH5IO._param_cache
+                         if cache_key[0]==os.path.abspath(filter_file)]
+        assert cached_params==['/Melange1pc1ch/param_2',
+                               '/Melange1pc1ch/param_0',
+                               '/Melange1pc1ch/param_3']
+
+        # clear cache
+        filter_io.clear_cache()
+        assert not [cache_key for cache_key in FilterH5IO._param_cache
+                    if cache_key[0]==os.path.abspath(filter_file)]
+
+    finally:
+        FilterH5IO._param_cache_max_size = max_size
+        shutil.rmtree(data_path)
+
+    print('All tests passed')
@@ -0,0 +1,148 @@
+"""
+Test of FilterH5IO optimal filter artifacts ("calc_of_artifacts",
+"get_of_artifacts"): OF amplitude (kernel) and normalization
+compared with qetpy OptimumFilter "ofamp_nodelay" on a synthetic
+pulse (template cropped to trace length/pretrigger), artifacts
+returned as copies (cache not modified), artifacts re-calculated
+when PSD changes ("check_source" fingerprint).
+
+Usage: python test_filter_h5_of_artifacts.py
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import qetpy as qp
+from pytesdaq.io.filter_hdf5 import FilterH5IO
+
+
+CHANNEL = 'Melange1pc1ch'
+SAMPLE_RATE = 1.25e6
+NB_SAMPLES = 1024
+NB_PRETRIGGER_SAMPLES = 400
+
+# stored template: longer, different pretrigger
+TEMPLATE_LENGTH = 1200
+TEMPLATE_PRETRIGGER = 500
+
+
+def make_template():
+    """
+    Pulse template (rise/fall times 20/100 us), max 1
+    """
+
+    time = (np.arange(TEMPLATE_LENGTH)-TEMPLATE_PRETRIGGER)/SAMPLE_RATE
+    template = np.zeros(TEMPLATE_LENGTH)
+    after = time>=0
+    template[after] = (np.exp(-time[after]/100e-6)
+                       - np.exp(-time[after]/20e-6))
+    return template/template.max()
+
+
+def make_psd(knee):
+    """
+    Two-sided PSD (white + 1/f), pandas Series (frequency index)
+    """
+
+    freqs = np.fft.fftfreq(NB_SAMPLES, d=1/SAMPLE_RATE)
+    abs_freqs = np.abs(freqs)
+    abs_freqs[0] = freqs[1]
+    return pd.Series(1e-22*(1 + knee/abs_freqs), index=freqs)
+
+
+def check_qetpy(artifacts, signal, template, psd):
+    """
+    OF amplitude/normalization vs qetpy (no delay)
+    """
+
+    optimum_filter = qp.OptimumFilter(signal, template, psd,
+                                      SAMPLE_RATE, coupling='AC')
+    amp_qetpy, _ = optimum_filter.ofamp_nodelay()
+    amp = np.sum(artifacts['kernel']*signal)
+    assert np.isclose(amp, amp_qetpy, rtol=1e-9, atol=0)
+    assert np.isclose(artifacts['norm'], optimum_filter.norm,
+                      rtol=1e-9, atol=0)
+    assert np.allclose(artifacts['template_fft'], optimum_filter.s,
+                       rtol=1e-9, atol=0)
+    return amp
+
+
+if __name__ == "__main__":
+
+    data_path = tempfile.mkdtemp()
+    filter_file = os.path.join(data_path, 'filter.hdf5')
+
+    try:
+
+        # filter file
+        template_stored = make_template()
+        psd = make_psd(knee=1e3)
+        filter_io = FilterH5IO(filter_file, verbose=False)
+        filter_io.save_param(CHANNEL, 'psd_default', psd,
+                             attributes={'sample_rate': SAMPLE_RATE})
+        filter_io.save_param(
+            CHANNEL, 'template_default', template_stored,
+            attributes={'sample_rate': SAMPLE_RATE,
+                        'nb_pretrigger_samples': TEMPLATE_PRETRIGGER})
+
+        # synthetic pulse (template cropped to trace)
+        start = TEMPLATE_PRETRIGGER-NB_PRETRIGGER_SAMPLES
+        template = template_stored[start:start+NB_SAMPLES]
+        rng = np.random.default_rng(1)
+        signal = 3.5e-7*template + 1e-9*rng.standard_normal(NB_SAMPLES)
+
+        # calculated vs stored artifacts vs qetpy
+        artifacts_calc = filter_io.calc_of_artifacts(
+            CHANNEL, nb_pretrigger_samples=NB_PRETRIGGER_SAMPLES)
+        artifacts = filter_io.get_of_artifacts(CHANNEL)
+        for name in ['template_fft', 'psd_inv', 'kernel']:
+            assert np.allclose(artifacts[name], artifacts_calc[name],
+                               rtol=1e-12, atol=0)
+        assert all(artifacts['metadata'][key]==val
+                   for key, val in artifacts_calc['metadata'].items())
+        amp = check_qetpy(artifacts, signal, template, psd.values)
+        assert np.isclose(amp, 3.5e-7, rtol=1e-2)
+
+        # copies: in-place modification not leaking into cache
+        kernel = artifacts['kernel'].copy()
+        artifacts['kernel'] *= 0
+        artifacts['metadata']['norm'] = 0
+        artifacts = filter_io.get_of_artifacts(
+            CHANNEL, nb_samples=NB_SAMPLES,
+            nb_pretrigger_samples=NB_PRETRIGGER_SAMPLES)
+        assert np.array_equal(artifacts['kernel'], kernel)
+        assert artifacts['metadata']['norm']==artifacts['norm']
+
+        # fingerprint: PSD unchanged, artifacts not re-calculated
+        file_stat = os.stat(filter_file)
+        artifacts = filter_io.get_of_artifacts(CHANNEL, check_source=True)
+        assert os.stat(filter_file).st_mtime_ns==file_stat.st_mtime_ns
+        assert np.array_equal(artifacts['kernel'], kernel)
+        source_id = artifacts['metadata']['source_id']
+
+        # PSD changed: stored artifacts outdated, re-calculated
+        # and saved with "check_source"
+        psd_new = make_psd(knee=5e4)
+        filter_io.save_param(CHANNEL, 'psd_default', psd_new,
+                             attributes={'sample_rate': SAMPLE_RATE},
+                             overwrite=True)
+        artifacts = filter_io.get_of_artifacts(CHANNEL)
+        assert artifacts['metadata']['source_id']==source_id
+
+        artifacts = filter_io.get_of_artifacts(CHANNEL, check_source=True)
+        assert artifacts['metadata']['source_id']!=source_id
+        assert not np.allclose(artifacts['kernel'], kernel)
+        check_qetpy(artifacts, signal, template, psd_new.values)
+
+        artifacts_saved = FilterH5IO(filter_file,
+                                     verbose=False).get_of_artifacts(CHANNEL)
+        assert (artifacts_saved['metadata']['source_id']
+                ==artifacts['metadata']['source_id'])
+        assert np.array_equal(artifacts_saved['kernel'], artifacts['kernel'])
+
+    finally:
+        shutil.rmtree(data_path)
+
+    print('All tests passed')
@@ -0,0 +1,149 @@
+"""
+Test of float32 output ("dtype" argument): H5Reader single
+event, batched (serial/parallel), trigger window, prefetch and
+"iter_batches" reads, Analyzer normalization and PSD. Output
+dtype checked, float32 traces equal to float64 traces within
+float32 precision, raw ADC traces (no conversion) unchanged,
+wrong dtype rejected.
+
+Usage: python test_float32_output.py
+"""
+
+import shutil
+import tempfile
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from pytesdaq.analyzer import Analyzer
+from hdf5_test_data import (write_series, make_data, make_adc_config,
+                            SERIES_NAME, SAMPLE_RATE)
+
+
+NB_EVENTS = 7
+NB_EVENTS_PER_DUMP = 3
+NB_CHANNELS = 2
+NB_SAMPLES = 500
+
+# float32 vs float64 tolerance (relative to trace amplitude)
+RTOL = 1e-6
+
+
+def check_close(traces32, traces64):
+    """
+    float32 vs float64 traces
+    """
+
+    assert traces32.dtype==np.float32
+    assert traces64.dtype==np.float64
+    assert traces32.shape==traces64.shape
+    scale = np.max(np.abs(traces64))
+    assert np.max(np.abs(traces32-traces64))<=RTOL*scale
+
+
+def check_reader(data_path, data, event_nums):
+    """
+    H5Reader read paths
+    """
+
+    reader = h5io.H5Reader(verbose=False)
+    conversions = [dict(adctoamp=True),
+                   dict(adctovolt=True, baselinesub=True),
+                   dict(baselinesub=True)]
+
+    for conversion in conversions:
+
+        # batched, serial/parallel
+        for nb_cores in [1, 2]:
+            traces = [reader.read_many_events(filepath=data_path,
+                                              output_format=2,
+                                              nb_cores=nb_cores,
+                                              dtype=dtype, **conversion)
+                      for dtype in [np.float32, np.float64]]
+            check_close(*traces)
+
+        # trigger windows
+        series_num = int(h5io.extract_series_num(SERIES_NAME))
+        traces = [reader.read_many_events(
+            filepath=data_path, output_format=2, event_nums=event_nums,
+            series_nums=[series_num]*NB_EVENTS,
+            trigger_indices=[250]*NB_EVENTS, trace_length_samples=200,
+            pretrigger_length_samples=50, dtype=dtype, **conversion)
+                  for dtype in [np.float32, np.float64]]
+        check_close(*traces)
+
+        # single events (with/without prefetch)
+        for prefetch in [False, True]:
+            readers = [h5io.H5Reader(verbose=False) for _ in range(2)]
+            for single_reader in readers:
+                single_reader.set_files(data_path)
+                if prefetch:
+                    single_reader.enable_prefetch(nb_events=2)
+            for ievent in range(NB_EVENTS):
+                traces = [single_reader.read_next_event(dtype=dtype,
+                                                        **conversion)
+                          for single_reader, dtype
+                          in zip(readers, [np.float32, np.float64])]
+                check_close(*traces)
+            for single_reader in readers:
+                single_reader.close()
+
+        # iter_batches
+        traces = list()
+        for dtype in [np.float32, np.float64]:
+            batches = [batch.copy() for batch, _ in reader.iter_batches(
+                batch_size=4, filepath=data_path, dtype=dtype,
+                **conversion)]
+            traces.append(np.concatenate(batches))
+        check_close(*traces)
+
+    # raw ADC: dtype not used
+    traces = reader.read_many_events(filepath=data_path, output_format=2,
+                                     dtype=np.float32)
+    assert np.array_equal(traces, data)
+
+    # wrong dtype
+    try:
+        reader.read_many_events(filepath=data_path, adctoamp=True,
+                                dtype=np.int32)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Wrong dtype not detected')
+
+
+def check_analyzer(data):
+    """
+    Analyzer normalization and PSD
+    """
+
+    adc_config = make_adc_config(NB_CHANNELS, NB_SAMPLES)[0]['adc1']
+    adc_config['selected_channel_index'] = np.arange(NB_CHANNELS)
+    analyzer = Analyzer()
+    for unit in ['mVolts', 'pAmps']:
+        traces = [analyzer.normalize(data[0], adc_config, unit,
+                                     norm_list=[2., 4.], dtype=dtype)
+                  for dtype in [np.float32, np.float64]]
+        check_close(*traces)
+
+        psds = [analyzer.calc_psd(traces[1], SAMPLE_RATE, dtype=dtype)
+                for dtype in [np.float32, np.float64]]
+        assert psds[0].dtype==np.float32
+        assert np.allclose(psds[0], psds[1], rtol=1e-6, atol=0)
+
+
+if __name__ == "__main__":
+
+    data = make_data(NB_EVENTS, NB_CHANNELS, NB_SAMPLES)
+    for format_version in [1, 2]:
+        data_path = tempfile.mkdtemp()
+        try:
+            event_nums = write_series(data_path, data, NB_EVENTS_PER_DUMP,
+                                      format_version=format_version)
+            check_reader(data_path, data, event_nums)
+            print('Format version ' + str(format_version) + ': OK')
+        finally:
+            shutil.rmtree(data_path)
+
+    check_analyzer(data)
+    print('Analyzer: OK')
+
+    print('All tests passed')
@@ -0,0 +1,237 @@
+"""
+Test of compression filters: "get_compression_filter" arguments
+(gzip, lzf, shuffle, hdf5plugin filters if available, unknown
+filter rejected), H5Writer compressed raw data (both format
+versions) and "convert_file_format" to compressed files: traces
+and metadata identical to uncompressed data, dataset filters
+and chunks checked. FilterH5IO compressed parameters round trip.
+
+Usage: python test_h5_compression.py
+"""
+
+import glob
+import shutil
+import tempfile
+import h5py
+import tables
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from pytesdaq.io.filter_hdf5 import FilterH5IO
+from hdf5_test_data import write_series, make_data
+
+
+NB_EVENTS = 7
+NB_EVENTS_PER_DUMP = 3
+NB_CHANNELS = 3
+NB_SAMPLES = 400
+
+# (compression, compression level, shuffle)
+FILTERS = [('gzip', None, True), ('gzip', 9, False), ('lzf', None, True)]
+if h5io.hdf5plugin is not None:
+    FILTERS += [('lz4', None, True), ('zstd', 5, True),
+                ('blosc', None, True), ('bitshuffle', None, True)]
+
+
+def check_filter_kwargs():
+    """
+    h5py dataset creation arguments
+    """
+
+    for compression in [None, 'none', '']:
+        assert h5io.get_compression_filter(compression)==dict()
+
+    kwargs = h5io.get_compression_filter('gzip')
+    assert kwargs['compression']=='gzip'
+    assert kwargs['compression_opts']==4
+    assert kwargs['shuffle']
+    kwargs = h5io.get_compression_filter('GZIP', compression_level=7,
+                                         shuffle=False)
+    assert kwargs['compression_opts']==7 and not kwargs['shuffle']
+    assert h5io.get_compression_filter('lzf')['compression']=='lzf'
+
+    # unknown filter, plugin filter without hdf5plugin
+    compressions = ['unknown']
+    if h5io.hdf5plugin is None:
+        compressions += ['lz4', 'zstd', 'blosc', 'bitshuffle']
+    for compression in compressions:
+        try:
+            h5io.get_compression_filter(compression)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('Filter "' + compression
+                                 + '" not rejected')
+
+
+def check_datasets(data_path, format_version, compression):
+    """
+    Raw data datasets: filter and chunks
+    """
+
+    file_list = sorted(glob.glob(data_path + '/*.hdf5'))
+    assert file_list
+    for file_name in file_list:
+        with h5py.File(file_name, 'r') as h5:
+            adc_group = h5['adc1']
+            if format_version==2:
+                datasets = [adc_group['events']]
+                chunks = (1, NB_CHANNELS, NB_SAMPLES)
+            else:
+                datasets = [adc_group[name] for name in adc_group]
+                chunks = (NB_CHANNELS, NB_SAMPLES)
+            for dataset in datasets:
+                if compression is None:
+                    assert dataset.compression is None
+                    continue
+                assert dataset.chunks==chunks
+                if compression[0] in ['gzip', 'lzf']:
+                    assert dataset.compression==compression[0]
+                    assert dataset.shuffle==compression[2]
+                    if compression[0]=='gzip':
+                        level = compression[1]
+                        if level is None:
+                            level = 4
+                        assert dataset.compression_opts==level
+                else:
+                    # plugin filter
+                    assert dataset.id.get_create_plist().get_nfilters()>0
+
+
+def read_all(data_path):
+    """
+    Traces and event metadata
+    """
+
+    reader = h5io.H5Reader(verbose=False)
+    traces, info_list = reader.read_many_events(
+        filepath=data_path, output_format=2, include_metadata=True)
+    metadata = [(int(info['event_num']), int(info['event_time']))
+                for info in info_list]
+
+    reader.set_files(data_path)
+    for ievent in range(NB_EVENTS):
+        trace = reader.read_next_event(detector_chans=['D2', 'D0'])
+        assert np.array_equal(trace, traces[ievent][[2, 0]])
+    reader.close()
+    return traces, metadata
+
+
+def check_raw_data(data):
+    """
+    H5Writer and "convert_file_format" compressed files
+    """
+
+    data_paths = list()
+    try:
+
+        # reference (uncompressed)
+        data_path_ref = tempfile.mkdtemp()
+        data_paths.append(data_path_ref)
+        write_series(data_path_ref, data, NB_EVENTS_PER_DUMP)
+        check_datasets(data_path_ref, 1, None)
+        traces_ref, metadata_ref = read_all(data_path_ref)
+        assert np.array_equal(traces_ref, data)
+
+        for compression in FILTERS:
+            filter_args = dict(compression=compression[0],
+                               compression_level=compression[1],
+                               shuffle=compression[2])
+            for format_version in [1, 2]:
+
+                # written compressed
+                data_path = tempfile.mkdtemp()
+                data_paths.append(data_path)
+                write_series(data_path, data, NB_EVENTS_PER_DUMP,
+                             format_version=format_version, **filter_args)
+                check_datasets(data_path, format_version, compression)
+                traces, metadata = read_all(data_path)
+                assert np.array_equal(traces, traces_ref)
+                assert metadata==metadata_ref
+
+                # converted from uncompressed
+                output_path = tempfile.mkdtemp()
+                data_paths.append(output_path)
+                h5io.convert_file_format(data_path_ref, output_path,
+                                         format_version=format_version,
+                                         verbose=False, **filter_args)
+                check_datasets(output_path, format_version, compression)
+                traces, metadata = read_all(output_path)
+                assert np.array_equal(traces, traces_ref)
+                assert metadata==metadata_ref
+
+            print('Raw data, compression ' + str(compression) + ': OK')
+
+    finally:
+        for data_path in data_paths:
+            shutil.rmtree(data_path)
+
+
+def check_filter_file():
+    """
+    FilterH5IO compressed parameters
+    """
+
+    rng = np.random.default_rng(2)
+    params = {'psd_default': rng.random(NB_SAMPLES),
+              'csd_default': rng.normal(size=(2, NB_SAMPLES)),
+              'template_nxm': rng.normal(size=(2, 3, NB_SAMPLES))}
+    metadata = {'sample_rate': 1.25e6}
+
+    # unknown compression
+    try:
+        FilterH5IO('unused.hdf5', compression='unknown')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Unknown filter file compression not detected')
+
+    filter_dir = tempfile.mkdtemp()
+    try:
+        for compression, complib in [(None, None), ('gzip', 'zlib'),
+                                     ('zstd', 'blosc:zstd'),
+                                     ('lz4', 'blosc:lz4')]:
+            filter_file = filter_dir + '/filter_' + str(compression) + '.hdf5'
+            filter_io = FilterH5IO(filter_file, verbose=False,
+                                   compression=compression,
+                                   compression_level=7)
+            for name, val in params.items():
+                filter_io.save_param('Melange1', name, val,
+                                     attributes=metadata)
+            filter_io.save_bulk({'Melange2': dict(params)})
+
+            # round trip
+            filter_io = FilterH5IO(filter_file, verbose=False,
+                                   use_cache=False)
+            for chan in ['Melange1', 'Melange2']:
+                for name, val in params.items():
+                    param = filter_io.get_param(chan, name)
+                    assert np.array_equal(np.asarray(param), val)
+
+            # filters of stored arrays
+            with tables.open_file(filter_file, 'r') as h5:
+                leaves = [node for node in h5.walk_nodes('/', 'Array')]
+                assert leaves
+                for leaf in leaves:
+                    if complib is None:
+                        assert leaf.filters.complevel==0
+                    else:
+                        assert leaf.filters.complib==complib
+                        assert leaf.filters.complevel==7
+                        assert leaf.filters.shuffle
+
+    finally:
+        shutil.rmtree(filter_dir)
+
+
+if __name__ == "__main__":
+
+    check_filter_kwargs()
+    print('Compression filter arguments: OK')
+
+    data = make_data(NB_EVENTS, NB_CHANNELS, NB_SAMPLES)
+    check_raw_data(data)
+
+    check_filter_file()
+    print('Filter file: OK')
+
+    print('All tests passed')
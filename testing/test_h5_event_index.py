@@ -0,0 +1,177 @@
+"""
+Test of event index tables ("/event_index/[adc_name]") and
+H5Reader "get_event_index"/"find_events": index fields equal to
+written event metadata, index table not counted as event, events
+found by time range, event numbers and series (both raw data
+format versions, two series in same directory), found events
+read with "read_many_events"/"set_files" ("event_list"), index
+built from event metadata if table not available (older files).
+
+Usage: python test_h5_event_index.py
+"""
+
+import glob
+import shutil
+import tempfile
+import h5py
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from hdf5_test_data import write_series, make_data
+
+
+NB_EVENTS = 8
+NB_EVENTS_PER_DUMP = 3
+NB_CHANNELS = 2
+NB_SAMPLES = 150
+
+# series: (name, first event time)
+SERIES = [('I1_D20230101_T000000', 100), ('I1_D20230102_T000000', 200)]
+
+
+def get_series_files(data_path, series_name):
+    return sorted(glob.glob(data_path + '/*' + series_name + '*.hdf5'))
+
+
+def check_index(data_path, event_nums):
+    """
+    Index tables vs written metadata
+    """
+
+    reader = h5io.H5Reader(verbose=False)
+    for series_name, start_time in SERIES:
+        file_list = get_series_files(data_path, series_name)
+        assert len(file_list)==(NB_EVENTS-1)//NB_EVENTS_PER_DUMP+1
+        for ifile, file_name in enumerate(file_list):
+            first_event = ifile*NB_EVENTS_PER_DUMP
+            nb_events = min(NB_EVENTS_PER_DUMP, NB_EVENTS-first_event)
+
+            # table written, not in adc group
+            with h5py.File(file_name, 'r') as h5:
+                assert 'adc1' in h5['event_index']
+                assert 'event_index' not in h5['adc1']
+            metadata = reader.get_metadata(file_name=file_name)
+            assert int(metadata['groups']['adc1']['nb_events'])==nb_events
+
+            index = reader.get_event_index(file_name)
+            assert index['event_index'].tolist()==list(range(1, nb_events+1))
+            assert index['event_num'].tolist()==event_nums[
+                first_event:first_event+nb_events]
+            assert index['event_time'].tolist()==list(
+                range(start_time+first_event, start_time+first_event+nb_events))
+            assert np.all(index['trigger_type']==3)
+            assert np.all(index['byte_offset']>=0)
+
+            # returned copy
+            index['event_num'] = 0
+            assert reader.get_event_index(file_name)['event_num'][0]>0
+
+    # all events read
+    traces = reader.read_many_events(filepath=data_path, output_format=2)
+    assert len(traces)==len(SERIES)*NB_EVENTS
+
+
+def check_find(data_path, data, event_nums):
+    """
+    find_events, read found events
+    """
+
+    reader = h5io.H5Reader(verbose=False)
+    series_nums = [int(h5io.extract_series_num(name)) for name, _ in SERIES]
+
+    # time range (both series, straddling dumps)
+    event_list = reader.find_events(filepath=data_path, time_range=(102, 106))
+    assert [event['event_time'] for event in event_list]==[102, 103, 104, 105]
+    assert [event['event_number'] for event in event_list]==event_nums[2:6]
+    assert all(event['series_number']==series_nums[0]
+               and event['trigger_type']==3 for event in event_list)
+    traces = reader.read_many_events(filepath=data_path,
+                                     event_list=event_list, output_format=2)
+    assert np.array_equal(traces, data[2:6])
+
+    # open ended time range
+    event_list = reader.find_events(filepath=data_path,
+                                    time_range=(205, None))
+    assert [event['event_time'] for event in event_list]==[205, 206, 207]
+    event_list = reader.find_events(filepath=data_path,
+                                    time_range=(None, 101))
+    assert [event['event_time'] for event in event_list]==[100]
+
+    # event numbers (both series), series filter
+    event_list = reader.find_events(filepath=data_path,
+                                    event_nums=[event_nums[0],
+                                                event_nums[4]])
+    assert len(event_list)==4
+    assert sorted(set(event['series_number'] for event in event_list))==\
+        sorted(series_nums)
+    event_list = reader.find_events(filepath=data_path,
+                                    series=SERIES[1][0],
+                                    event_nums=event_nums[4])
+    assert len(event_list)==1
+    assert event_list[0]['event_time']==204
+    assert event_list[0]['event_index']==2
+    traces = reader.read_many_events(filepath=data_path,
+                                     event_list=event_list, output_format=2)
+    assert np.array_equal(traces, data[4:5])
+
+    # time range and event numbers
+    event_list = reader.find_events(filepath=data_path, time_range=(100, 200),
+                                    event_nums=event_nums[1:4])
+    assert [event['event_time'] for event in event_list]==[101, 102, 103]
+
+    # no events
+    assert reader.find_events(filepath=data_path,
+                              time_range=(150, 160))==list()
+
+    # "set_files" with found events
+    event_list = reader.find_events(filepath=data_path, series=SERIES[0][0],
+                                    time_range=(105, None))
+    reader.set_files(data_path, event_list=event_list)
+    for ievent in range(5, NB_EVENTS):
+        assert np.array_equal(reader.read_next_event(), data[ievent])
+    reader.close()
+
+
+def check_fallback(data_path, event_nums):
+    """
+    Index table removed: built from event metadata
+    """
+
+    file_list = get_series_files(data_path, SERIES[0][0])
+    reader = h5io.H5Reader(verbose=False)
+    indices = [reader.get_event_index(file_name) for file_name in file_list]
+    for file_name in file_list:
+        with h5py.File(file_name, 'r+') as h5:
+            del h5['event_index']
+
+    reader_fallback = h5io.H5Reader(verbose=False)
+    for file_name, index in zip(file_list, indices):
+        index_fallback = reader_fallback.get_event_index(file_name)
+        assert np.array_equal(index_fallback, index)
+
+        # cached table updated (file modified)
+        assert np.array_equal(reader.get_event_index(file_name), index)
+
+    event_list = reader_fallback.find_events(filepath=data_path,
+                                             time_range=(103, 105))
+    assert [event['event_number'] for event in event_list]==event_nums[3:5]
+
+
+if __name__ == "__main__":
+
+    data = make_data(NB_EVENTS, NB_CHANNELS, NB_SAMPLES)
+    for format_version in [1, 2]:
+        data_path = tempfile.mkdtemp()
+        try:
+            for series_name, start_time in SERIES:
+                event_nums = write_series(data_path, data, NB_EVENTS_PER_DUMP,
+                                          format_version=format_version,
+                                          series_name=series_name,
+                                          start_time=start_time)
+            check_index(data_path, event_nums)
+            check_find(data_path, data, event_nums)
+            check_fallback(data_path, event_nums)
+            print('Format version ' + str(format_version) + ': OK')
+        finally:
+            shutil.rmtree(data_path)
+
+    print('All tests passed')
@@ -0,0 +1,143 @@
+"""
+Test of raw data format version 2 (single [events, channels,
+samples] "events" dataset and "event_metadata" columns): file
+layout, traces and event metadata identical to format version 1
+(single event, batched and SWMR writes), file/group metadata,
+metadata columns, conversion between format versions
+("convert_file_format", same file names and content).
+
+Usage: python test_h5_format_v2.py
+"""
+
+import os
+import glob
+import shutil
+import tempfile
+import h5py
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from hdf5_test_data import write_series, make_data
+
+
+NB_EVENTS = 8
+NB_EVENTS_PER_DUMP = 3
+NB_CHANNELS = 3
+NB_SAMPLES = 250
+
+
+def read_all(data_path):
+    """
+    Read all events: traces, event metadata
+    """
+
+    reader = h5io.H5Reader(verbose=False)
+    traces, info_list = reader.read_many_events(
+        filepath=data_path, output_format=2, include_metadata=True)
+    metadata = [(int(info['event_num']), int(info['event_index']),
+                 int(info['event_time']), int(info['trigger_type']))
+                for info in info_list]
+
+    # single events
+    reader.set_files(data_path)
+    for ievent in range(NB_EVENTS):
+        trace, info = reader.read_next_event(include_metadata=True,
+                                             adctoamp=True)
+        assert np.allclose(trace, traces[ievent]*1e-4/2)
+        assert int(info['event_num'])==metadata[ievent][0]
+    reader.close()
+    return traces, metadata
+
+
+def check_layout(data_path, format_version):
+    """
+    File layout and metadata
+    """
+
+    reader = h5io.H5Reader(verbose=False)
+    file_list = sorted(glob.glob(data_path + '/*.hdf5'))
+    assert len(file_list)==(NB_EVENTS-1)//NB_EVENTS_PER_DUMP+1
+    for ifile, file_name in enumerate(file_list):
+        nb_events = min(NB_EVENTS_PER_DUMP,
+                        NB_EVENTS-ifile*NB_EVENTS_PER_DUMP)
+        with h5py.File(file_name, 'r') as h5:
+            assert int(h5.attrs.get('format_version', 1))==format_version
+            adc_group = h5['adc1']
+            assert int(adc_group.attrs['nb_events'])==nb_events
+            if format_version==2:
+                assert adc_group['events'].shape==(nb_events, NB_CHANNELS,
+                                                   NB_SAMPLES)
+                assert adc_group['events'].chunks==(1, NB_CHANNELS,
+                                                    NB_SAMPLES)
+                assert 'event_metadata' in adc_group
+                assert not [name for name in adc_group
+                            if name.startswith('event_')
+                            and name!='event_metadata']
+            else:
+                assert sorted(adc_group.keys())==sorted(
+                    'event_' + str(ievent+1) for ievent in range(nb_events))
+
+        # metadata columns (same for both formats)
+        columns = reader.get_event_metadata_columns(file_name)
+        assert columns['event_index'].tolist()==list(range(1, nb_events+1))
+        assert columns['event_time'].tolist()==list(
+            range(ifile*NB_EVENTS_PER_DUMP, ifile*NB_EVENTS_PER_DUMP+nb_events))
+
+        # file/group metadata
+        metadata = reader.get_metadata(file_name=file_name)
+        assert int(metadata['groups']['adc1']['nb_events'])==nb_events
+        assert int(metadata['dump_num'])==ifile+1
+
+
+if __name__ == "__main__":
+
+    data = make_data(NB_EVENTS, NB_CHANNELS, NB_SAMPLES)
+    data_paths = dict()
+    results = dict()
+
+    try:
+
+        # write format version 1 and 2 (SWMR)
+        for format_version in [1, 2]:
+            for swmr in [False, True]:
+                data_path = tempfile.mkdtemp()
+                data_paths[(format_version, swmr)] = data_path
+                write_series(data_path, data, NB_EVENTS_PER_DUMP,
+                             format_version=format_version, swmr=swmr)
+                check_layout(data_path, format_version)
+                results[(format_version, swmr)] = read_all(data_path)
+
+        # same traces and metadata
+        traces_ref, metadata_ref = results[(1, False)]
+        assert np.array_equal(traces_ref, data)
+        for traces, metadata in results.values():
+            assert np.array_equal(traces, traces_ref)
+            assert metadata==metadata_ref
+        print('Write/read: OK')
+
+        # conversion v1 -> v2 -> v1
+        path_v1 = data_paths[(1, False)]
+        path_v2 = tempfile.mkdtemp()
+        path_v1_back = tempfile.mkdtemp()
+        data_paths['convert_v2'] = path_v2
+        data_paths['convert_v1'] = path_v1_back
+        output_files = h5io.convert_file_format(path_v1, path_v2,
+                                                format_version=2,
+                                                verbose=False)
+        assert (sorted(os.path.basename(name) for name in output_files)
+                ==sorted(os.listdir(path_v1)))
+        check_layout(path_v2, 2)
+        traces, metadata = read_all(path_v2)
+        assert np.array_equal(traces, data) and metadata==metadata_ref
+
+        h5io.convert_file_format(path_v2, path_v1_back, format_version=1,
+                                 verbose=False)
+        check_layout(path_v1_back, 1)
+        traces, metadata = read_all(path_v1_back)
+        assert np.array_equal(traces, data) and metadata==metadata_ref
+        print('Conversion: OK')
+
+    finally:
+        for data_path in data_paths.values():
+            shutil.rmtree(data_path)
+
+    print('All tests passed')
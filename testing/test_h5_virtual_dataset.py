@@ -0,0 +1,187 @@
+"""
+Test of virtual dataset (VDS) files ("build_virtual_dataset")
+and H5Reader "read_virtual_events": VDS built over format
+version 1 and 2 dumps, traces identical to dumps read with
+"read_many_events" (all events, slices, negative step, position
+lists with repeated events, channel selection, serial and
+parallel reads), event metadata and index (series/dump numbers),
+float32 vs float64 conversion within tolerance, VDS moved with
+dumps (relative paths), errors (VDS in raw data directory,
+format version 1 file, position out of range).
+
+Usage: python test_h5_virtual_dataset.py
+"""
+
+import os
+import shutil
+import tempfile
+import h5py
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from hdf5_test_data import write_series, make_data, SERIES_NAME
+
+
+NB_EVENTS = 11
+NB_EVENTS_PER_DUMP = 4
+NB_CHANNELS = 3
+NB_SAMPLES = 300
+
+# float32 vs float64 tolerance (relative to trace amplitude)
+RTOL = 1e-6
+
+# event selections: (read_virtual_events "events", positions)
+SELECTIONS = [(None, np.arange(NB_EVENTS)),
+              (slice(1, None, 3), np.arange(1, NB_EVENTS, 3)),
+              (slice(None, None, -2), np.arange(NB_EVENTS)[::-2]),
+              (4, [4]),
+              ([5, 0, 5, -1, 2], [5, 0, 5, NB_EVENTS-1, 2]),
+              ([], [])]
+
+
+def check_vds(vds_file, data, info_ref):
+    """
+    VDS reads vs written data/metadata
+    """
+
+    reader = h5io.H5Reader(verbose=False)
+    series_num = int(h5io.extract_series_num(SERIES_NAME))
+
+    # read_many_events (VDS read like a single dump)
+    for nb_cores in [1, 2]:
+        traces = reader.read_many_events(filepath=vds_file, output_format=2,
+                                         nb_cores=nb_cores)
+        assert np.array_equal(traces, data)
+
+    # positions, channel selection
+    for events, positions in SELECTIONS:
+        traces, info_list = reader.read_virtual_events(
+            vds_file, events=events, include_metadata=True)
+        assert np.array_equal(traces, data[positions])
+        assert ([(int(info['event_num']), int(info['event_time']))
+                 for info in info_list]
+                ==[info_ref[position] for position in positions])
+        traces = reader.read_virtual_events(vds_file, events=events,
+                                            detector_chans=['D2', 'D0'])
+        assert np.array_equal(traces, data[positions][:, [2, 0]])
+
+    # conversion, float32 vs float64
+    for conversion in [dict(adctoamp=True), dict(adctovolt=True),
+                       dict(adctoamp=True, baselinesub=True)]:
+        traces = [reader.read_virtual_events(vds_file,
+                                             events=slice(None, None, 2),
+                                             dtype=dtype, **conversion)
+                  for dtype in [np.float32, np.float64]]
+        assert traces[0].dtype==np.float32 and traces[1].dtype==np.float64
+        scale = np.max(np.abs(traces[1]))
+        assert np.max(np.abs(traces[0]-traces[1]))<=RTOL*scale
+        if not conversion.get('baselinesub', False):
+            factor = 1e-4/2 if 'adctoamp' in conversion else 1e-4
+            assert np.allclose(traces[1], data[::2]*factor)
+
+    # metadata columns, event index
+    columns = reader.get_event_metadata_columns(vds_file)
+    dump_nums = np.arange(NB_EVENTS)//NB_EVENTS_PER_DUMP + 1
+    assert np.array_equal(columns['dump_num'], dump_nums)
+    assert np.all(columns['series_num']==series_num)
+    assert np.array_equal(columns['event_index'], np.arange(1, NB_EVENTS+1))
+    with h5py.File(vds_file, 'r') as h5:
+        # stored column: index in dump
+        assert np.array_equal(h5['adc1/event_metadata/event_index'][()],
+                              np.arange(NB_EVENTS)%NB_EVENTS_PER_DUMP + 1)
+        assert len(h5['adc1/source_files'])==len(np.unique(dump_nums))
+    index = reader.get_event_index(vds_file)
+    assert index['event_index'].tolist()==list(range(1, NB_EVENTS+1))
+    assert ([(int(row['event_num']), int(row['event_time']))
+             for row in index]==info_ref)
+    assert np.all(index['byte_offset']==-1)
+
+    # find events in VDS
+    event_list = reader.find_events(filepath=vds_file, time_range=(3, 6))
+    assert [event['event_index'] for event in event_list]==[4, 5, 6]
+
+    # position out of range
+    try:
+        reader.read_virtual_events(vds_file, events=[NB_EVENTS])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Position out of range not detected')
+
+
+if __name__ == "__main__":
+
+    data = make_data(NB_EVENTS, NB_CHANNELS, NB_SAMPLES)
+    base_dir = tempfile.mkdtemp()
+    try:
+
+        # dumps (format version 1 and 2) and VDS files
+        vds_files = dict()
+        os.makedirs(base_dir + '/vds')
+        for format_version in [1, 2]:
+            data_path = base_dir + '/raw_v' + str(format_version)
+            write_series(data_path, data, NB_EVENTS_PER_DUMP,
+                         format_version=format_version)
+            vds_file = base_dir + '/vds/vds_v' + str(format_version) + '.hdf5'
+            nb_events = h5io.build_virtual_dataset(data_path, vds_file,
+                                                   verbose=False)
+            assert nb_events==NB_EVENTS
+            vds_files[format_version] = vds_file
+
+        # reference: dumps read with read_many_events
+        reader = h5io.H5Reader(verbose=False)
+        results = dict()
+        for format_version in [1, 2]:
+            traces, info_list = reader.read_many_events(
+                filepath=base_dir + '/raw_v' + str(format_version),
+                output_format=2, include_metadata=True)
+            results[format_version] = (
+                traces, [(int(info['event_num']), int(info['event_time']))
+                         for info in info_list])
+        assert np.array_equal(results[1][0], data)
+        assert np.array_equal(results[2][0], data)
+        assert results[1][1]==results[2][1]
+        info_ref = results[1][1]
+
+        for format_version, vds_file in vds_files.items():
+            check_vds(vds_file, data, info_ref)
+            print('VDS (format version ' + str(format_version)
+                  + ' dumps): OK')
+
+        # format version 2 dump read by position
+        file_name = sorted(os.listdir(base_dir + '/raw_v2'))[1]
+        traces = reader.read_virtual_events(
+            base_dir + '/raw_v2/' + file_name, events=[3, 0])
+        assert np.array_equal(traces, data[[NB_EVENTS_PER_DUMP+3,
+                                            NB_EVENTS_PER_DUMP]])
+
+        # VDS and dumps moved together
+        moved_dir = base_dir + '/moved'
+        shutil.copytree(base_dir + '/raw_v1', moved_dir + '/raw_v1')
+        shutil.copytree(base_dir + '/vds', moved_dir + '/vds')
+        shutil.rmtree(base_dir + '/raw_v1')
+        traces = reader.read_virtual_events(moved_dir + '/vds/vds_v1.hdf5')
+        assert np.array_equal(traces, data)
+        print('VDS moved: OK')
+
+        # errors: VDS in raw data directory, format version 1 file
+        try:
+            h5io.build_virtual_dataset(base_dir + '/raw_v2',
+                                       base_dir + '/raw_v2/vds.hdf5',
+                                       verbose=False)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('VDS in raw data directory not detected')
+
+        file_name = sorted(os.listdir(moved_dir + '/raw_v1'))[0]
+        try:
+            reader.read_virtual_events(moved_dir + '/raw_v1/' + file_name)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('Format version 1 file not detected')
+
+    finally:
+        shutil.rmtree(base_dir)
+
+    print('All tests passed')
@@ -0,0 +1,115 @@
+"""
+Test of H5Reader (series, dump) file index used with event
+lists: index built from file names, events of several series
+and dumps requested in any order (numpy integer series numbers)
+read from the right file and returned in requested order,
+series filter with numpy integers, error if file not found.
+
+Usage: python test_h5reader_file_index.py
+"""
+
+import glob
+import shutil
+import tempfile
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from hdf5_test_data import write_series, make_data
+
+
+NB_EVENTS = 9
+NB_EVENTS_PER_DUMP = 3
+NB_CHANNELS = 2
+NB_SAMPLES = 200
+SERIES_NAMES = ['I1_D20230101_T000000', 'I1_D20230101_T010000']
+
+
+if __name__ == "__main__":
+
+    data_path = tempfile.mkdtemp()
+    try:
+
+        # two series, 3 dumps each
+        data = dict()
+        event_nums = dict()
+        series_nums = dict()
+        for iseries, series_name in enumerate(SERIES_NAMES):
+            series_nums[series_name] = int(h5io.extract_series_num(series_name))
+            data[series_name] = make_data(NB_EVENTS, NB_CHANNELS, NB_SAMPLES,
+                                          seed=iseries+1)
+            event_nums[series_name] = write_series(
+                data_path, data[series_name], NB_EVENTS_PER_DUMP,
+                series_name=series_name)
+
+        # file index
+        reader = h5io.H5Reader(verbose=False)
+        file_list = sorted(glob.glob(data_path + '/*.hdf5'))
+        file_index = reader._get_file_index(file_list)
+        assert len(file_index)==len(file_list)
+        for (series_num, dump_num), file_name in file_index.items():
+            series_name = h5io.extract_series_name(series_num)
+            assert file_name.endswith(series_name + '_F000'
+                                      + str(dump_num) + '.hdf5')
+
+        # events in any order (numpy integer series number)
+        rng = np.random.default_rng(1)
+        requested = list()
+        for series_name in SERIES_NAMES:
+            requested += [(series_name, ievent) for ievent in range(NB_EVENTS)]
+        requested = [requested[i] for i in rng.permutation(len(requested))]
+        requested += requested[:3]
+        event_list = [
+            {'series_number': np.uint64(series_nums[series_name]),
+             'event_number': np.int64(event_nums[series_name][ievent])}
+            for series_name, ievent in requested]
+
+        for nb_cores in [1, 2]:
+            traces, info_list = reader.read_many_events(
+                filepath=data_path, event_list=event_list, output_format=2,
+                include_metadata=True, nb_cores=nb_cores)
+            assert traces.shape[0]==len(requested)
+            for irow, (series_name, ievent) in enumerate(requested):
+                assert np.array_equal(traces[irow], data[series_name][ievent])
+                assert (int(info_list[irow]['event_num'])
+                        ==event_nums[series_name][ievent])
+                assert (int(info_list[irow]['series_num'])
+                        ==series_nums[series_name])
+
+        # event list: file dictionary grouped by (series, dump) in
+        # order of first appearance
+        file_dict = reader._get_file_dict(data_path, event_list=event_list)
+        first_files = list()
+        for event_dict in event_list:
+            file_name = file_index[(int(event_dict['series_number']),
+                                    int(event_dict['event_number'])//100000)]
+            assert event_dict in file_dict[file_name]
+            if file_name not in first_files:
+                first_files.append(file_name)
+        assert list(file_dict)==first_files
+        assert sum(len(events) for events in file_dict.values())==len(event_list)
+
+        # series filter (numpy integer)
+        series_name = SERIES_NAMES[1]
+        reader.set_files(data_path,
+                         series=np.int64(series_nums[series_name]))
+        for ievent in range(NB_EVENTS):
+            trace, info = reader.read_next_event(include_metadata=True)
+            assert np.array_equal(trace, data[series_name][ievent])
+        assert reader.read_next_event(include_metadata=True)[1][
+            'read_status']>0
+        reader.close()
+
+        # file not found
+        try:
+            reader.read_many_events(
+                filepath=data_path, output_format=2,
+                event_list=[{'series_number': series_nums[series_name],
+                             'event_number': 900001}])
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('Missing file not detected')
+
+    finally:
+        shutil.rmtree(data_path)
+
+    print('All tests passed')
@@ -0,0 +1,136 @@
+"""
+Test of H5Reader "follow" (tail mode) with a SWMR writer: writer
+in a separate process writing events (with a delay) in dumps of a
+few events, reader following the group directory while the dumps
+are being written. Event numbers and traces yielded by "follow" are
+compared with what was written (no empty/preallocated event, no
+missing or duplicated event), for both raw data format versions.
+
+Usage: python test_h5reader_follow.py [nb_events] [nb_events_per_dump] [delay]
+"""
+
+import sys
+import time
+import shutil
+import tempfile
+import multiprocessing
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+
+
+NB_CHANNELS = 2
+NB_SAMPLES = 1000
+
+
+def make_event(event_num):
+    """
+    Event trace: unique for each event number (never zero)
+    """
+
+    trace = (event_num*7 + np.arange(NB_CHANNELS*NB_SAMPLES)) % 2**15 + 1
+    return trace.reshape(NB_CHANNELS, NB_SAMPLES).astype(np.int16)
+
+
+def write_series(data_path, nb_events, nb_events_per_dump, delay,
+                 format_version):
+    """
+    Writer: SWMR mode, "delay" seconds between events
+    """
+
+    adc_config = {'adc1': {
+        'nb_channels': NB_CHANNELS,
+        'nb_samples': NB_SAMPLES,
+        'nb_samples_pretrigger': NB_SAMPLES//2,
+        'sample_rate': 1250000,
+        'adc_channel_indices': np.arange(NB_CHANNELS, dtype=np.int32),
+        'adc_conversion_factor': np.tile(np.array([0., 1.]),
+                                         (NB_CHANNELS, 1)),
+        'voltage_range': np.tile(np.array([-5., 5.]), (NB_CHANNELS, 1))}}
+    for ichan in range(NB_CHANNELS):
+        adc_config['adc1']['connection' + str(ichan)] = np.array(
+            ['tes:T' + str(ichan), 'detector:D' + str(ichan),
+             'controller:f' + str(ichan)])
+    detector_config = {'detconfig1': {
+        'channel_list': np.arange(NB_CHANNELS),
+        'close_loop_norm': np.ones(NB_CHANNELS)}}
+
+    writer = h5io.H5Writer(verbose=False, swmr=True,
+                           format_version=format_version)
+    writer._nb_events_per_dump_max = nb_events_per_dump
+    writer.initialize('I1_D20230101_T000000', data_path=data_path)
+    writer.set_metadata(file_metadata={'series_num': 1},
+                        adc_config=adc_config,
+                        detector_config=detector_config)
+
+    # event number: (dump number)*100000 + event index in dump
+    for ievent in range(nb_events):
+        event_num = ((ievent//nb_events_per_dump+1)*100000
+                     + ievent%nb_events_per_dump + 1)
+        writer.write_event(make_event(event_num), prefix='raw',
+                           dataset_metadata={'event_time': ievent})
+        time.sleep(delay)
+    writer.close()
+
+
+def follow_series(nb_events, nb_events_per_dump, delay, format_version):
+    """
+    Follow series while being written, check events
+    """
+
+    data_path = tempfile.mkdtemp()
+
+    writer = multiprocessing.Process(
+        target=write_series,
+        args=(data_path, nb_events, nb_events_per_dump, delay,
+              format_version))
+    writer.start()
+
+    reader = h5io.H5Reader(verbose=False)
+    event_nums = list()
+    nb_bad_traces = 0
+    for data_array, info in reader.follow(data_path, poll_interval=0.05,
+                                          settle_time=2.0,
+                                          idle_timeout=5.0):
+        event_num = int(info['event_num'])
+        event_nums.append(event_num)
+        if not np.array_equal(data_array, make_event(event_num)):
+            nb_bad_traces += 1
+
+    writer.join()
+    shutil.rmtree(data_path)
+
+    # expected event numbers
+    expected = [(ievent//nb_events_per_dump+1)*100000
+                + ievent%nb_events_per_dump + 1
+                for ievent in range(nb_events)]
+
+    print('Format version ' + str(format_version) + ': '
+          + str(len(event_nums)) + '/' + str(nb_events)
+          + ' events yielded, '
+          + str(len(event_nums)-len(set(event_nums))) + ' duplicated, '
+          + str(len(set(expected)-set(event_nums))) + ' missing, '
+          + str(nb_bad_traces) + ' wrong traces')
+
+    assert writer.exitcode==0
+    assert nb_bad_traces==0
+    assert event_nums==expected
+
+
+if __name__ == "__main__":
+
+    # parameters
+    nb_events = 50
+    nb_events_per_dump = 10
+    delay = 0.02
+    if len(sys.argv)>1:
+        nb_events = int(sys.argv[1])
+    if len(sys.argv)>2:
+        nb_events_per_dump = int(sys.argv[2])
+    if len(sys.argv)>3:
+        delay = float(sys.argv[3])
+
+    for format_version in [1, 2]:
+        follow_series(nb_events, nb_events_per_dump, delay,
+                      format_version)
+
+    print('All tests passed')
@@ -0,0 +1,124 @@
+"""
+Test of H5Reader "iter_batches" streaming reads and resume
+cursor ("get_cursor"): batches identical to written events
+(batches straddling dump files), iteration stopped and resumed
+from cursor in a new reader (file name or file index cursor),
+resume after "read_next_event", end of data cursor, invalid
+cursor rejected.
+
+Usage: python test_h5reader_iter_batches.py
+"""
+
+import glob
+import shutil
+import tempfile
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from hdf5_test_data import write_series, make_data
+
+
+NB_EVENTS = 10
+NB_EVENTS_PER_DUMP = 3
+NB_CHANNELS = 2
+NB_SAMPLES = 200
+BATCH_SIZE = 4
+
+
+def read_batches(reader, nb_batches=None, **kwargs):
+    """
+    Read batches (copies), event times
+    """
+
+    traces = list()
+    event_times = list()
+    for batch, info_batch in reader.iter_batches(batch_size=BATCH_SIZE,
+                                                 **kwargs):
+        assert len(info_batch)==len(batch)
+        traces.append(batch.copy())
+        event_times += [int(info['event_time']) for info in info_batch]
+        if nb_batches is not None and len(traces)==nb_batches:
+            break
+    return traces, event_times
+
+
+def check_iter(data_path, data):
+    """
+    Batches, stop and resume
+    """
+
+    # all events
+    reader = h5io.H5Reader(verbose=False)
+    traces, event_times = read_batches(reader, filepath=data_path)
+    assert [len(batch) for batch in traces]==[4, 4, 2]
+    assert np.array_equal(np.concatenate(traces), data)
+    assert event_times==list(range(NB_EVENTS))
+    assert reader.get_cursor() is None
+    reader.close()
+
+    # converted
+    reader = h5io.H5Reader(verbose=False)
+    traces, _ = read_batches(reader, filepath=data_path, adctoamp=True,
+                             detector_chans='D1')
+    assert np.allclose(np.concatenate(traces), data[:, [1]]*1e-4/2)
+    reader.close()
+
+    # stop after 2 batches (mid-file), resume in new reader
+    file_list = sorted(glob.glob(data_path + '/*.hdf5'))
+    reader = h5io.H5Reader(verbose=False)
+    traces, _ = read_batches(reader, nb_batches=2, filepath=data_path)
+    cursor = reader.get_cursor()
+    assert cursor==(file_list[8//NB_EVENTS_PER_DUMP], 8%NB_EVENTS_PER_DUMP)
+    reader.close()
+
+    for file_key in [cursor[0], file_list.index(cursor[0])]:
+        reader = h5io.H5Reader(verbose=False)
+        traces_resume, event_times = read_batches(
+            reader, filepath=data_path, cursor=(file_key, cursor[1]))
+        assert event_times==list(range(8, NB_EVENTS))
+        assert np.array_equal(np.concatenate(traces + traces_resume), data)
+        reader.close()
+
+    # cursor at file boundary
+    reader = h5io.H5Reader(verbose=False)
+    _, event_times = read_batches(reader, filepath=data_path,
+                                  cursor=(file_list[2], 0))
+    assert event_times==list(range(6, NB_EVENTS))
+    reader.close()
+
+    # resume after single event reads
+    reader = h5io.H5Reader(verbose=False)
+    reader.set_files(data_path)
+    for ievent in range(5):
+        reader.read_next_event()
+    assert reader.get_cursor()==(file_list[1], 2)
+    traces, event_times = read_batches(reader)
+    assert event_times==list(range(5, NB_EVENTS))
+    assert np.array_equal(np.concatenate(traces), data[5:])
+    reader.close()
+
+    # invalid cursor
+    for cursor in [('unknown.hdf5', 0), (len(file_list), 0)]:
+        reader = h5io.H5Reader(verbose=False)
+        try:
+            read_batches(reader, filepath=data_path, cursor=cursor)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('Invalid cursor not detected')
+        reader.close()
+
+
+if __name__ == "__main__":
+
+    data = make_data(NB_EVENTS, NB_CHANNELS, NB_SAMPLES)
+    for format_version in [1, 2]:
+        data_path = tempfile.mkdtemp()
+        try:
+            write_series(data_path, data, NB_EVENTS_PER_DUMP,
+                         format_version=format_version)
+            check_iter(data_path, data)
+            print('Format version ' + str(format_version) + ': OK')
+        finally:
+            shutil.rmtree(data_path)
+
+    print('All tests passed')
@@ -0,0 +1,126 @@
+"""
+Test of H5Reader memory mapped access ("use_memmap",
+"read_event_view"): event views identical to written traces,
+read-only and valid after file closed, reads with memory map
+(single events, batched reads, channel selection, trigger
+windows, conversion) identical to HDF5 reads, fallback for
+chunked (format version 2) and compressed files.
+
+Usage: python test_h5reader_memmap.py
+"""
+
+import glob
+import shutil
+import tempfile
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from hdf5_test_data import write_series, make_data, SERIES_NAME
+
+
+NB_EVENTS = 8
+NB_EVENTS_PER_DUMP = 3
+NB_CHANNELS = 3
+NB_SAMPLES = 400
+
+# written files: (format version, compression, contiguous)
+FILE_TYPES = [(1, None, True),
+              (2, None, False),
+              (1, 'gzip', False)]
+
+
+def check_views(data_path, data, is_contiguous):
+    """
+    Event views vs written traces
+    """
+
+    file_list = sorted(glob.glob(data_path + '/*.hdf5'))
+    reader = h5io.H5Reader(verbose=False, use_memmap=True)
+    views = list()
+    for ievent in range(NB_EVENTS):
+        file_name = file_list[ievent//NB_EVENTS_PER_DUMP]
+        view, info = reader.read_event_view(
+            ievent%NB_EVENTS_PER_DUMP+1, file_name=file_name,
+            include_metadata=True)
+        assert isinstance(view, np.memmap)==is_contiguous
+        assert not view.flags.writeable
+        assert int(info['event_time'])==ievent
+        assert np.array_equal(view, data[ievent])
+        views.append(view)
+    reader.close()
+
+    # valid after file closed
+    assert np.array_equal(np.stack(views), data)
+
+
+def check_reads(data_path, data, event_nums):
+    """
+    Reads with memory map vs HDF5 reads
+    """
+
+    read_args_list = [
+        dict(),
+        dict(adctoamp=True, baselinesub=True),
+        dict(detector_chans=['D2', 'D0'], adctovolt=True)]
+
+    # trigger windows (batched reads only)
+    series_num = int(h5io.extract_series_num(SERIES_NAME))
+    window_args = dict(
+        event_nums=event_nums, series_nums=[series_num]*NB_EVENTS,
+        trigger_indices=[100 + 20*ievent for ievent in range(NB_EVENTS)],
+        trace_length_samples=100, pretrigger_length_samples=40,
+        detector_chans='D1')
+
+    readers = [h5io.H5Reader(verbose=False, use_memmap=use_memmap)
+               for use_memmap in [False, True]]
+    traces_ref, traces_memmap = [
+        reader.read_many_events(filepath=data_path, output_format=2,
+                                **window_args)
+        for reader in readers]
+    assert np.array_equal(traces_memmap, traces_ref)
+    for ievent in range(NB_EVENTS):
+        start = 100 + 20*ievent - 40
+        assert np.array_equal(traces_memmap[ievent, 0],
+                              data[ievent, 1, start:start+100])
+
+    for read_args in read_args_list:
+
+        # batched reads
+        traces_ref, traces_memmap = [
+            reader.read_many_events(filepath=data_path, output_format=2,
+                                    **read_args)
+            for reader in readers]
+        assert np.array_equal(traces_memmap, traces_ref)
+        if not read_args:
+            assert np.array_equal(traces_memmap, data)
+
+        # single events
+        for reader in readers:
+            reader.set_files(data_path)
+        for ievent in range(NB_EVENTS):
+            trace_ref, trace_memmap = [reader.read_next_event(**read_args)
+                                       for reader in readers]
+            assert np.array_equal(trace_memmap, trace_ref)
+            assert np.array_equal(trace_memmap, traces_ref[ievent])
+            assert trace_memmap.flags.writeable
+        for reader in readers:
+            reader.close()
+
+
+if __name__ == "__main__":
+
+    data = make_data(NB_EVENTS, NB_CHANNELS, NB_SAMPLES)
+
+    for format_version, compression, is_contiguous in FILE_TYPES:
+        data_path = tempfile.mkdtemp()
+        try:
+            event_nums = write_series(data_path, data, NB_EVENTS_PER_DUMP,
+                                      format_version=format_version,
+                                      compression=compression)
+            check_views(data_path, data, is_contiguous)
+            check_reads(data_path, data, event_nums)
+            print('Format version ' + str(format_version)
+                  + ', compression=' + str(compression) + ': OK')
+        finally:
+            shutil.rmtree(data_path)
+
+    print('All tests passed')
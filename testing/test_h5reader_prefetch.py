@@ -0,0 +1,93 @@
+"""
+Test of H5Reader read-ahead mode ("enable_prefetch"): events
+read with "read_next_event" identical to events read without
+prefetch (across dump files), position kept when prefetch is
+disabled/enabled while reading, "get_prefetch_stats" counting
+only events (not end of data).
+
+Usage: python test_h5reader_prefetch.py
+"""
+
+import shutil
+import tempfile
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from hdf5_test_data import write_series, make_data
+
+
+NB_EVENTS = 25
+NB_EVENTS_PER_DUMP = 10
+NB_CHANNELS = 2
+NB_SAMPLES = 500
+
+
+def read_all(reader, **kwargs):
+    """
+    Read events until end of data
+    """
+
+    traces = list()
+    event_nums = list()
+    while True:
+        trace, info = reader.read_next_event(include_metadata=True,
+                                             **kwargs)
+        if info['read_status']>0:
+            break
+        traces.append(trace)
+        event_nums.append(int(info['event_num']))
+    return traces, event_nums
+
+
+if __name__ == "__main__":
+
+    data = make_data(NB_EVENTS, NB_CHANNELS, NB_SAMPLES)
+    data_path = tempfile.mkdtemp()
+    try:
+        event_nums = write_series(data_path, data, NB_EVENTS_PER_DUMP)
+
+        # reference: no prefetch
+        reader = h5io.H5Reader(verbose=False)
+        reader.set_files(data_path)
+        traces_ref, _ = read_all(reader, adctoamp=True)
+        reader.close()
+
+        # prefetch
+        reader = h5io.H5Reader(verbose=False)
+        reader.set_files(data_path)
+        reader.enable_prefetch(nb_events=4)
+        traces, event_nums_read = read_all(reader, adctoamp=True)
+        assert event_nums_read==event_nums
+        assert all(np.array_equal(trace, trace_ref)
+                   for trace, trace_ref in zip(traces, traces_ref))
+
+        # stats: end of data not counted
+        stats = reader.get_prefetch_stats()
+        assert stats['queue_size']==4
+        assert stats['nb_events']==NB_EVENTS
+        assert stats['nb_stalls']<=stats['nb_events']
+        print('Prefetch stats: ' + str(stats))
+        reader.close()
+
+        # disable/enable while reading: position kept
+        reader = h5io.H5Reader(verbose=False)
+        reader.set_files(data_path)
+        reader.enable_prefetch(nb_events=4)
+        traces = list()
+        for ievent in range(NB_EVENTS):
+            if ievent==7:
+                reader.disable_prefetch()
+            elif ievent==15:
+                reader.enable_prefetch(nb_events=2)
+            trace, info = reader.read_next_event(include_metadata=True)
+            assert info['read_status']==0
+            traces.append(trace)
+        assert np.array_equal(np.stack(traces), data)
+        _, info = reader.read_next_event(include_metadata=True)
+        assert info['read_status']>0
+        assert reader.get_prefetch_stats()['nb_events']==NB_EVENTS-15
+        reader.close()
+
+    finally:
+        shutil.rmtree(data_path)
+
+    print('All tests passed')
@@ -0,0 +1,142 @@
+"""
+Test of H5Reader "read_many_events" batched read path: traces
+and metadata compared with the per-event reader
+("read_next_event"), output rows in same order as requested
+events ("event_nums" in any order, repeated events), serial
+and parallel (nb_cores=2) reads, parallel read shared memory
+released.
+
+Usage: python test_h5reader_read_many_events.py
+"""
+
+import os
+import gc
+import shutil
+import tempfile
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from hdf5_test_data import write_series, make_data, SERIES_NAME
+
+
+NB_EVENTS = 12
+NB_EVENTS_PER_DUMP = 4
+NB_CHANNELS = 3
+NB_SAMPLES = 500
+
+
+def read_per_event(data_path, **kwargs):
+    """
+    Reference: read events one by one
+    """
+
+    reader = h5io.H5Reader(verbose=False)
+    reader.set_files(data_path)
+    traces = list()
+    info_list = list()
+    while True:
+        trace, info = reader.read_next_event(include_metadata=True,
+                                             **kwargs)
+        if info['read_status']>0:
+            break
+        traces.append(trace)
+        info_list.append(info)
+    reader.close()
+    return np.stack(traces), info_list
+
+
+def check_read_all(data_path, data, event_nums, nb_cores):
+    """
+    All events: batched read vs per-event read
+    """
+
+    reader = h5io.H5Reader(verbose=False)
+
+    # raw ADC
+    traces, info_list = reader.read_many_events(
+        filepath=data_path, output_format=2, include_metadata=True,
+        nb_cores=nb_cores)
+    assert np.array_equal(traces, data)
+    assert [int(info['event_num']) for info in info_list]==event_nums
+
+    traces_list = reader.read_many_events(filepath=data_path,
+                                          output_format=1,
+                                          nb_cores=nb_cores)
+    assert len(traces_list)==NB_EVENTS
+    assert all(np.array_equal(trace, data[ievent])
+               for ievent, trace in enumerate(traces_list))
+
+    # converted + baseline subtracted
+    read_args = dict(adctoamp=True, baselinesub=True)
+    traces_ref, _ = read_per_event(data_path, **read_args)
+    traces = reader.read_many_events(filepath=data_path, output_format=2,
+                                     nb_cores=nb_cores, **read_args)
+    assert np.allclose(traces, traces_ref)
+
+    # number of events
+    traces = reader.read_many_events(filepath=data_path, nevents=5,
+                                     output_format=2, nb_cores=nb_cores)
+    assert np.array_equal(traces, data[:5])
+
+    # parallel read: output is the shared memory block (no
+    # shared memory name left, array valid after workers done)
+    if os.path.isdir('/dev/shm'):
+        shm_files = set(os.listdir('/dev/shm'))
+        traces = reader.read_many_events(filepath=data_path,
+                                         output_format=2,
+                                         nb_cores=nb_cores)
+        gc.collect()
+        assert set(os.listdir('/dev/shm'))==shm_files
+        assert np.array_equal(traces, data)
+        del traces
+        gc.collect()
+
+
+def check_event_order(data_path, data, event_nums, nb_cores):
+    """
+    Events requested in any order (with repeated events):
+    one output row per requested event, same order
+    """
+
+    series_num = int(h5io.extract_series_num(SERIES_NAME))
+    requested = [event_nums[i] for i in [9, 0, 7, 2, 9, 5, 11]]
+
+    reader = h5io.H5Reader(verbose=False)
+    traces, info_list = reader.read_many_events(
+        filepath=data_path, output_format=2, include_metadata=True,
+        event_nums=requested, series_nums=series_num,
+        nb_cores=nb_cores)
+    assert traces.shape[0]==len(requested)
+    assert [int(info['event_num']) for info in info_list]==requested
+    for irow, event_num in enumerate(requested):
+        assert np.array_equal(traces[irow],
+                              data[event_nums.index(event_num)])
+
+    # event list, list output
+    event_list = [{'event_number': event_num, 'series_number': series_num}
+                  for event_num in requested]
+    traces_list = reader.read_many_events(
+        filepath=data_path, output_format=1, event_list=event_list,
+        nb_cores=nb_cores)
+    assert len(traces_list)==len(requested)
+    assert all(np.array_equal(trace, traces[irow])
+               for irow, trace in enumerate(traces_list))
+
+
+if __name__ == "__main__":
+
+    data = make_data(NB_EVENTS, NB_CHANNELS, NB_SAMPLES)
+
+    for format_version in [1, 2]:
+        data_path = tempfile.mkdtemp()
+        try:
+            event_nums = write_series(data_path, data, NB_EVENTS_PER_DUMP,
+                                      format_version=format_version)
+            for nb_cores in [1, 2]:
+                check_read_all(data_path, data, event_nums, nb_cores)
+                check_event_order(data_path, data, event_nums, nb_cores)
+                print('Format version ' + str(format_version)
+                      + ', nb_cores=' + str(nb_cores) + ': OK')
+        finally:
+            shutil.rmtree(data_path)
+
+    print('All tests passed')
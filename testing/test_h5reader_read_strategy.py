@@ -0,0 +1,104 @@
+"""
+Test of H5Reader channel read strategies ("read_strategy"):
+for each strategy ('auto', 'full', 'hyperslab', 'rows') and
+channel selection (all, contiguous, unsorted, sparse, single),
+traces identical to written data, with single event, batched,
+parallel and prefetch reads, both raw data format versions and
+compressed files.
+
+Usage: python test_h5reader_read_strategy.py
+"""
+
+import shutil
+import tempfile
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from hdf5_test_data import write_series, make_data
+
+
+NB_EVENTS = 7
+NB_EVENTS_PER_DUMP = 3
+NB_CHANNELS = 8
+NB_SAMPLES = 300
+
+STRATEGIES = ['auto', 'full', 'hyperslab', 'rows']
+
+# channel selections (channel indices, None = all)
+SELECTIONS = [None, [2, 3, 4], [5, 1, 6], [0, 7], [4]]
+
+# written files: (format version, compression)
+FILE_TYPES = [(1, None), (2, None), (2, 'gzip')]
+
+
+def get_chans(selection):
+    """
+    Detector channel names
+    """
+    if selection is None:
+        return None
+    return ['D' + str(ichan) for ichan in selection]
+
+
+def check_strategy(data_path, data, read_strategy):
+    """
+    All channel selections: reads vs written data
+    """
+
+    for selection in SELECTIONS:
+        expected = data
+        if selection is not None:
+            expected = data[:, selection]
+        detector_chans = get_chans(selection)
+        reader = h5io.H5Reader(verbose=False, read_strategy=read_strategy)
+
+        # batched/parallel reads
+        for nb_cores in [1, 2]:
+            traces = reader.read_many_events(
+                filepath=data_path, detector_chans=detector_chans,
+                output_format=2, nb_cores=nb_cores)
+            assert np.array_equal(traces, expected)
+
+        # single events (repeated reads: reused read buffer),
+        # prefetch
+        for prefetch in [False, True]:
+            reader.set_files(data_path)
+            if prefetch:
+                reader.enable_prefetch(nb_events=2)
+            for ievent in range(NB_EVENTS):
+                trace = reader.read_next_event(detector_chans=detector_chans)
+                assert np.array_equal(trace, expected[ievent])
+            reader.close()
+
+        # converted
+        traces = reader.read_many_events(
+            filepath=data_path, detector_chans=detector_chans,
+            adctoamp=True, output_format=2)
+        assert np.allclose(traces, expected*1e-4/2)
+
+
+if __name__ == "__main__":
+
+    data = make_data(NB_EVENTS, NB_CHANNELS, NB_SAMPLES)
+
+    # unknown strategy
+    try:
+        h5io.H5Reader(read_strategy='unknown')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Unknown read strategy not detected')
+
+    for format_version, compression in FILE_TYPES:
+        data_path = tempfile.mkdtemp()
+        try:
+            write_series(data_path, data, NB_EVENTS_PER_DUMP,
+                         format_version=format_version,
+                         compression=compression)
+            for read_strategy in STRATEGIES:
+                check_strategy(data_path, data, read_strategy)
+            print('Format version ' + str(format_version)
+                  + ', compression=' + str(compression) + ': OK')
+        finally:
+            shutil.rmtree(data_path)
+
+    print('All tests passed')
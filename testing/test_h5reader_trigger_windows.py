@@ -0,0 +1,120 @@
+"""
+Test of trigger window extraction from continuous data
+(H5Reader "read_many_events" with "trigger_indices"): one output
+trace per requested window, in request order, windows that can't
+be extracted (start/end of series) returned as NaN/None with
+"read_status"=1, windows straddling two events or two dumps
+stitched. Both raw data format versions, serial and parallel
+(nb_cores=2) reads.
+
+Usage: python test_h5reader_trigger_windows.py
+"""
+
+import shutil
+import tempfile
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from hdf5_test_data import (write_series, make_continuous_data,
+                            SERIES_NAME)
+
+
+NB_EVENTS = 9
+NB_EVENTS_PER_DUMP = 3
+NB_CHANNELS = 2
+NB_SAMPLES = 1000
+WINDOW_LENGTH = 200
+PRETRIGGER_LENGTH = 40
+
+# requested windows (event number, trigger index, valid)
+WINDOWS = [(100001, 10, False),      # start of series
+           (100001, 500, True),
+           (100002, 980, True),      # event boundary
+           (100003, 950, True),      # dump boundary (next dump)
+           (200001, 20, True),       # dump boundary (previous dump)
+           (300003, 900, False),     # end of series
+           (200002, 500, True)]
+
+
+def expected_window(data, event_num, trigger_index):
+    """
+    Expected window from continuous data
+    """
+
+    ievent = ((event_num//100000-1)*NB_EVENTS_PER_DUMP
+              + event_num%100000-1)
+    continuous = np.concatenate(list(data), axis=-1)
+    start = ievent*NB_SAMPLES + trigger_index - PRETRIGGER_LENGTH
+    return continuous[:, start:start+WINDOW_LENGTH]
+
+
+def check_windows(data_path, data, nb_cores):
+    """
+    Read windows, check length/alignment
+    """
+
+    series_num = int(h5io.extract_series_num(SERIES_NAME))
+    event_nums = [window[0] for window in WINDOWS]
+    trigger_indices = [window[1] for window in WINDOWS]
+    is_valid = np.array([window[2] for window in WINDOWS])
+    read_args = dict(event_nums=event_nums,
+                     series_nums=[series_num]*len(WINDOWS),
+                     trigger_indices=trigger_indices,
+                     trace_length_samples=WINDOW_LENGTH,
+                     pretrigger_length_samples=PRETRIGGER_LENGTH,
+                     nb_cores=nb_cores)
+    reader = h5io.H5Reader(verbose=False)
+
+    # raw ADC, 3D array: invalid windows = 0
+    traces, info_list = reader.read_many_events(
+        filepath=data_path, output_format=2, include_metadata=True,
+        **read_args)
+    assert traces.shape==(len(WINDOWS), NB_CHANNELS, WINDOW_LENGTH)
+    assert len(info_list)==len(WINDOWS)
+    for iwindow, (event_num, trigger_index, valid) in enumerate(WINDOWS):
+        assert info_list[iwindow]['read_status']==(0 if valid else 1)
+        if valid:
+            assert int(info_list[iwindow]['event_num'])==event_num
+            assert np.array_equal(traces[iwindow],
+                                  expected_window(data, event_num,
+                                                  trigger_index))
+        else:
+            assert np.all(traces[iwindow]==0)
+
+    # converted: invalid windows = NaN
+    traces_amp = reader.read_many_events(
+        filepath=data_path, output_format=2, adctoamp=True,
+        **read_args)
+    assert traces_amp.shape==traces.shape
+    assert np.all(np.isnan(traces_amp[~is_valid]))
+    assert np.all(np.isfinite(traces_amp[is_valid]))
+    assert np.allclose(traces_amp[is_valid],
+                       traces[is_valid]*traces_amp[1, 0, 0]/traces[1, 0, 0])
+
+    # list output: None if invalid
+    traces_list = reader.read_many_events(
+        filepath=data_path, output_format=1, **read_args)
+    assert len(traces_list)==len(WINDOWS)
+    for iwindow in range(len(WINDOWS)):
+        if is_valid[iwindow]:
+            assert np.array_equal(traces_list[iwindow], traces[iwindow])
+        else:
+            assert traces_list[iwindow] is None
+
+
+if __name__ == "__main__":
+
+    data = make_continuous_data(NB_EVENTS, NB_CHANNELS, NB_SAMPLES)
+
+    for format_version in [1, 2]:
+        data_path = tempfile.mkdtemp()
+        try:
+            write_series(data_path, data, NB_EVENTS_PER_DUMP,
+                         format_version=format_version)
+            for nb_cores in [1, 2]:
+                check_windows(data_path, data, nb_cores)
+                print('Format version ' + str(format_version)
+                      + ', nb_cores=' + str(nb_cores) + ': OK')
+        finally:
+            shutil.rmtree(data_path)
+
+    print('All tests passed')
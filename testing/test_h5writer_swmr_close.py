@@ -0,0 +1,242 @@
+"""
+Test of H5Writer SWMR dump finalization with readers holding the
+dump (readers in separate processes), both raw data format
+versions:
+
+  - SWMR reader (swmr=True) opened while dump written, still
+    open when writer closes dump
+  - reader opening dump after SWMR handle closed and before
+    dump finalized (file locked): writer waits until reader
+    releases file
+  - reader never releasing file: ValueError raised after
+    "swmr_close_timeout", dump readable afterwards
+
+Finalized "nb_events", event datasets and event index equal
+to number of events written, traces identical. HDF5 file locking
+enabled (disabled when pytesdaq.io.hdf5 imported) so that readers
+lock files.
+
+Usage: python test_h5writer_swmr_close.py
+"""
+
+import os
+import glob
+import time
+import shutil
+import tempfile
+import threading
+import multiprocessing
+import h5py
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from hdf5_test_data import make_adc_config, make_data, SERIES_NAME
+
+
+# readers lock files (processes started with "spawn"
+# import this module)
+os.environ['HDF5_USE_FILE_LOCKING'] = 'TRUE'
+
+NB_EVENTS = 5
+NB_CHANNELS = 2
+NB_SAMPLES = 200
+
+
+class HookedWriter(h5io.H5Writer):
+    """
+    H5Writer calling "on_swmr_close(file_name)" once, after
+    SWMR file handle closed, before dump finalized
+    """
+
+    on_swmr_close = None
+
+    def _reset_file(self):
+        file_name = self._current_file_name
+        super()._reset_file()
+        if self.on_swmr_close is not None and file_name is not None:
+            callback, self.on_swmr_close = self.on_swmr_close, None
+            callback(file_name)
+
+
+def hold_file(file_name, swmr, opened, release, nb_events):
+    """
+    Reader process: open dump, wait for release
+    """
+
+    with h5py.File(file_name, 'r', swmr=swmr) as h5:
+        nb_events.value = int(h5['adc1'].attrs['nb_events'])
+        opened.set()
+        release.wait(30)
+
+
+class ReaderProcess:
+    """
+    Reader holding dump (spawned process: forked process
+    would share writer HDF5 library state)
+    """
+
+    def __init__(self, file_name, swmr=False):
+        context = multiprocessing.get_context('spawn')
+        self.opened = context.Event()
+        self._release = context.Event()
+        self._nb_events = context.Value('i', -1)
+        self._process = context.Process(
+            target=hold_file, args=(file_name, swmr, self.opened,
+                                    self._release, self._nb_events))
+        self._process.start()
+        assert self.opened.wait(60)
+
+    def release(self):
+        self._release.set()
+        self._process.join(30)
+        return self._nb_events.value
+
+
+def start_writer(data_path, data, format_version, swmr_close_timeout):
+    """
+    SWMR writer, all events in first dump (dump not closed)
+    """
+
+    adc_config, detector_config = make_adc_config(NB_CHANNELS, NB_SAMPLES)
+    writer = HookedWriter(verbose=False, swmr=True,
+                          format_version=format_version,
+                          swmr_close_timeout=swmr_close_timeout)
+    writer._nb_events_per_dump_max = 100
+    writer.initialize(SERIES_NAME, data_path=data_path)
+    writer.set_metadata(file_metadata={'series_num': 1},
+                        adc_config=adc_config,
+                        detector_config=detector_config)
+    for ievent in range(len(data)):
+        writer.write_event(data[ievent], prefix='raw',
+                           dataset_metadata={'event_time': ievent})
+    file_name = glob.glob(data_path + '/*.hdf5')[0]
+    return writer, file_name
+
+
+def check_dump(data_path, data, format_version):
+    """
+    Finalized dump
+    """
+
+    file_list = glob.glob(data_path + '/*.hdf5')
+    assert len(file_list)==1
+    with h5py.File(file_list[0], 'r') as h5:
+        adc_group = h5['adc1']
+        assert int(adc_group.attrs['nb_events'])==NB_EVENTS
+        if format_version==2:
+            assert adc_group['events'].shape[0]==NB_EVENTS
+        else:
+            assert len(adc_group.keys())==NB_EVENTS
+        assert len(h5['event_index/adc1'])==NB_EVENTS
+
+    reader = h5io.H5Reader(verbose=False)
+    traces = reader.read_many_events(filepath=data_path, output_format=2)
+    assert np.array_equal(traces, data)
+
+
+def check_swmr_reader(data, format_version):
+    """
+    SWMR reader opened during writing
+    """
+
+    data_path = tempfile.mkdtemp()
+    try:
+        writer, file_name = start_writer(data_path, data, format_version, 30)
+        reader = ReaderProcess(file_name, swmr=True)
+        writer.close()
+        assert reader.release()==NB_EVENTS
+        check_dump(data_path, data, format_version)
+    finally:
+        shutil.rmtree(data_path)
+
+
+def check_close_wait(data, format_version):
+    """
+    Reader opening dump during finalization: writer waits
+    """
+
+    data_path = tempfile.mkdtemp()
+    try:
+        writer, file_name = start_writer(data_path, data, format_version, 60)
+        readers = list()
+        writer.on_swmr_close = lambda name: readers.append(
+            ReaderProcess(name))
+
+        # close in thread: blocked while reader holds file
+        errors = list()
+        def close_writer():
+            try:
+                writer.close()
+            except Exception as err:
+                errors.append(err)
+        thread = threading.Thread(target=close_writer)
+        thread.start()
+        start_time = time.time()
+        while not readers and time.time()-start_time<60:
+            time.sleep(0.05)
+        assert readers
+        time.sleep(1)
+        assert thread.is_alive()
+
+        assert readers[0].release()==NB_EVENTS
+        thread.join(30)
+        assert not thread.is_alive()
+        assert not errors, errors
+        check_dump(data_path, data, format_version)
+
+    finally:
+        shutil.rmtree(data_path)
+
+
+def check_close_timeout(data, format_version):
+    """
+    Reader never releasing dump: error after timeout
+    """
+
+    data_path = tempfile.mkdtemp()
+    try:
+        writer, file_name = start_writer(data_path, data, format_version, 0.5)
+        readers = list()
+        writer.on_swmr_close = lambda name: readers.append(
+            ReaderProcess(name))
+
+        try:
+            writer.close()
+        except ValueError as err:
+            assert 'readers still open' in str(err)
+            assert isinstance(err.__cause__, BlockingIOError)
+        else:
+            raise AssertionError('SWMR close timeout not detected')
+
+        # writer state reset, dump readable (events and
+        # "nb_events" written before finalization)
+        writer.close()
+        assert readers[0].release()==NB_EVENTS
+        with h5py.File(file_name, 'r') as h5:
+            assert int(h5['adc1'].attrs['nb_events'])==NB_EVENTS
+        reader = h5io.H5Reader(verbose=False)
+        traces = reader.read_many_events(filepath=data_path, output_format=2)
+        assert np.array_equal(traces, data)
+
+    finally:
+        shutil.rmtree(data_path)
+
+
+if __name__ == "__main__":
+
+    data = make_data(NB_EVENTS, NB_CHANNELS, NB_SAMPLES)
+
+    # wrong timeout
+    try:
+        h5io.H5Writer(swmr=True, swmr_close_timeout=-1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Negative timeout not detected')
+
+    for format_version in [1, 2]:
+        check_swmr_reader(data, format_version)
+        check_close_wait(data, format_version)
+        check_close_timeout(data, format_version)
+        print('Format version ' + str(format_version) + ': OK')
+
+    print('All tests passed')
@@ -0,0 +1,126 @@
+"""
+Test and throughput of redis trace streaming (RedisStreamWriter /
+RedisStreamReader). Runs against local redis-server if available,
+otherwise in-process fake server ("fakeredis" package).
+
+Usage: python test_redis_stream.py [nb_events] [nb_channels] [nb_samples]
+"""
+
+import sys
+import time
+import numpy as np
+import redis as redispy
+import pytesdaq.io.redis as redis
+
+
+def get_connection():
+    """
+    Local redis-server or fakeredis
+    """
+
+    cnx = redispy.Redis(host='127.0.0.1', port=6379)
+    try:
+        cnx.ping()
+        print('INFO: Using local redis-server')
+        return cnx
+    except redispy.exceptions.ConnectionError:
+        pass
+
+    try:
+        import fakeredis
+    except ImportError:
+        print('ERROR: No redis-server running and "fakeredis" not installed!')
+        exit(0)
+    print('INFO: Using fakeredis (in-process)')
+    return fakeredis.FakeRedis()
+
+
+if __name__ == "__main__":
+
+    # parameters
+    nb_events = 2000
+    nb_channels = 4
+    nb_samples = 10000
+    if len(sys.argv)>1:
+        nb_events = int(sys.argv[1])
+    if len(sys.argv)>2:
+        nb_channels = int(sys.argv[2])
+    if len(sys.argv)>3:
+        nb_samples = int(sys.argv[3])
+
+    rng = np.random.default_rng(1)
+    data = rng.integers(-2**15, 2**15, size=(nb_events, nb_channels, nb_samples),
+                        dtype=np.int16)
+    channel_list = list(range(nb_channels))
+    data_mb = data.nbytes/1e6
+
+    db = redis.RedisCore()
+    db.connect(connection=get_connection())
+    stream_name = 'test_trace_stream'
+    db.connection.delete(stream_name)
+
+    # single event
+    db.add_stream(stream_name, data[0], metadata={'series': 'I1'},
+                  event_num=7, channel_list=channel_list)
+    data_array, metadata = db.get_stream(stream_name)
+    assert np.array_equal(data_array, data[0])
+    assert metadata['event_num']==7 and metadata['series']=='I1'
+    assert metadata['channel_list']==channel_list
+    db.connection.delete(stream_name)
+
+    # pipelined writes
+    reader = redis.RedisStreamReader(db, stream_name)
+    writer = redis.RedisStreamWriter(db, stream_name, maxlen=None,
+                                     batch_size=100)
+    start = time.perf_counter()
+    writer.write_events(data, event_nums=np.arange(nb_events),
+                        channel_list=channel_list)
+    writer.flush()
+    write_time = time.perf_counter()-start
+
+    # reads (multiple entries per call)
+    start = time.perf_counter()
+    nb_read = 0
+    while True:
+        events = reader.read_events(count=100)
+        if not events:
+            break
+        for data_array, header in events:
+            assert header['event_num']==nb_read
+            assert np.array_equal(data_array, data[nb_read])
+            nb_read += 1
+    read_time = time.perf_counter()-start
+    assert nb_read==nb_events
+
+    # latest events
+    events = reader.read_latest(nb_events=2)
+    assert not events
+    writer.write_events(data[:3], event_nums=[10, 11, 12])
+    writer.flush()
+    events = reader.read_latest(nb_events=2)
+    assert [header['event_num'] for _, header in events]==[11, 12]
+
+    # maxlen
+    writer = redis.RedisStreamWriter(db, stream_name, maxlen=50,
+                                     approximate=False)
+    writer.write_events(data[:200])
+    writer.flush()
+    assert db.connection.xlen(stream_name)==50
+
+    db.connection.delete(stream_name)
+
+    print('Write: %.0f events/s (%.0f MB/s)'
+          % (nb_events/write_time, data_mb/write_time))
+    print('Read:  %.0f events/s (%.0f MB/s)'
+          % (nb_events/read_time, data_mb/read_time))
+
+    # one event per round trip (previous implementation)
+    start = time.perf_counter()
+    for ievent in range(min(nb_events, 500)):
+        db.connection.xadd(stream_name, {'data': data[ievent].tobytes(),
+                                         'num_channels': nb_channels,
+                                         'num_samples': nb_samples})
+    rate = min(nb_events, 500)/(time.perf_counter()-start)
+    print('Write (no pipeline): %.0f events/s' % rate)
+    db.connection.delete(stream_name)
+    print('All tests passed')
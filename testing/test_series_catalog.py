@@ -0,0 +1,144 @@
+"""
+Test of series catalog (pytesdaq.io.SeriesCatalog): catalog
+content compared with raw data, existing catalog updated when
+stale (dump added, modified, removed), corrupted catalog file
+re-created, no catalog written in raw data directory unless
+requested (SeriesGroup "use_catalog", "catalog_dir").
+
+Usage: python test_series_catalog.py
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import pytesdaq.io.hdf5 as h5io
+from pytesdaq.io import SeriesCatalog
+from pytesdaq.display import SeriesGroup
+from hdf5_test_data import write_series, make_data, SERIES_NAME
+
+
+NB_EVENTS = 10
+NB_EVENTS_PER_DUMP = 4
+NB_CHANNELS = 2
+NB_SAMPLES = 100
+GROUP_NAME = 'group'
+START_TIME = 1672531200
+
+
+def check_catalog(catalog, group_path, event_nums):
+    """
+    Catalog content vs raw data on disk
+    """
+
+    file_list = sorted(os.path.join(group_path, name)
+                       for name in os.listdir(group_path)
+                       if name.endswith('.hdf5'))
+    assert catalog.get_file_list()==file_list
+    series_num = int(h5io.extract_series_num(SERIES_NAME))
+    assert catalog.get_series_nums()==[series_num]
+
+    events = catalog.get_events()
+    assert events['event_num'].tolist()==event_nums
+    assert np.array_equal(events['event_time'],
+                          START_TIME + np.arange(len(event_nums)))
+
+    nb_events = [dump['nb_events'] for dump in catalog.get_dump_list()]
+    assert sum(nb_events)==len(event_nums)
+
+
+def write_group(group_path, nb_events):
+    """
+    Write series in (empty) group directory
+    """
+
+    for name in os.listdir(group_path):
+        if name.endswith('.hdf5'):
+            os.remove(os.path.join(group_path, name))
+    data = make_data(nb_events, NB_CHANNELS, NB_SAMPLES)
+    return write_series(group_path, data, NB_EVENTS_PER_DUMP,
+                        file_metadata={'timestamp': START_TIME,
+                                       'group_name': GROUP_NAME},
+                        start_time=START_TIME)
+
+
+if __name__ == "__main__":
+
+    raw_path = tempfile.mkdtemp()
+    catalog_dir = tempfile.mkdtemp()
+    group_path = os.path.join(raw_path, GROUP_NAME)
+    os.makedirs(group_path)
+    catalog_file = os.path.join(catalog_dir, 'catalog.sqlite')
+
+    try:
+
+        # new catalog
+        event_nums = write_group(group_path, NB_EVENTS)
+        catalog = SeriesCatalog(group_path, catalog_file=catalog_file,
+                                verbose=False)
+        check_catalog(catalog, group_path, event_nums)
+        catalog.close()
+
+        # up to date catalog: no file scanned
+        catalog = SeriesCatalog(group_path, catalog_file=catalog_file,
+                                update=False, verbose=False)
+        assert catalog.update()==0
+        catalog.close()
+
+        # stale catalog: dumps re-written (more events: last dump
+        # modified, dump added), then dump removed
+        event_nums = write_group(group_path, NB_EVENTS+4)
+        catalog = SeriesCatalog(group_path, catalog_file=catalog_file,
+                                verbose=False)
+        check_catalog(catalog, group_path, event_nums)
+        catalog.close()
+
+        last_file = sorted(os.listdir(group_path))[-1]
+        os.remove(os.path.join(group_path, last_file))
+        catalog = SeriesCatalog(group_path, catalog_file=catalog_file,
+                                verbose=False)
+        check_catalog(catalog, group_path,
+                      event_nums[:len(event_nums)//NB_EVENTS_PER_DUMP
+                                 *NB_EVENTS_PER_DUMP])
+        catalog.close()
+
+        # corrupted catalog file (not a sqlite file, truncated file)
+        with open(catalog_file, 'wb') as catalog_fh:
+            catalog_fh.write(b'not a catalog' * 100)
+        event_nums = write_group(group_path, NB_EVENTS)
+        catalog = SeriesCatalog(group_path, catalog_file=catalog_file,
+                                verbose=False)
+        assert catalog.catalog_file==catalog_file
+        check_catalog(catalog, group_path, event_nums)
+        catalog.close()
+
+        catalog_size = os.path.getsize(catalog_file)
+        with open(catalog_file, 'r+b') as catalog_fh:
+            catalog_fh.truncate(catalog_size//2)
+        catalog = SeriesCatalog(group_path, catalog_file=catalog_file,
+                                verbose=False)
+        check_catalog(catalog, group_path, event_nums)
+        catalog.close()
+
+        # SeriesGroup: no catalog by default
+        group = SeriesGroup(GROUP_NAME, raw_path)
+        group.fill_info_from_disk()
+        assert group.nb_events==NB_EVENTS
+        assert not [name for name in os.listdir(group_path)
+                    if not name.endswith('.hdf5')]
+
+        # SeriesGroup: catalog in catalog directory
+        group_catalog_dir = os.path.join(catalog_dir, 'groups')
+        group = SeriesGroup(GROUP_NAME, raw_path, use_catalog=True,
+                            catalog_dir=group_catalog_dir)
+        group.fill_info_from_disk()
+        assert group.nb_events==NB_EVENTS
+        assert os.listdir(group_catalog_dir)==[GROUP_NAME + '.sqlite']
+        assert not [name for name in os.listdir(group_path)
+                    if not name.endswith('.hdf5')]
+
+    finally:
+        shutil.rmtree(raw_path)
+        shutil.rmtree(catalog_dir)
+
+    print('All tests passed')
@@ -0,0 +1,104 @@
+"""
+Test and throughput of shared memory ring buffer transport
+(pytesdaq.io.shm): producer in a separate process writing events
+as fast as possible, consumer reading all events ("read_events") and
+checking that no torn event is returned, then latest events
+("read_latest").
+
+Usage: python test_shm_ring_buffer.py [nb_events] [nb_channels] [nb_samples] [nb_slots]
+"""
+
+import sys
+import time
+import multiprocessing
+import numpy as np
+from pytesdaq.io.shm import SharedMemoryWriter, SharedMemoryReader
+
+
+BUFFER_NAME = 'pytesdaq_test_ring'
+
+
+def produce(nb_events, nb_channels, nb_samples, nb_slots):
+    """
+    Producer: event filled with event number
+    """
+
+    writer = SharedMemoryWriter(BUFFER_NAME, nb_channels=nb_channels,
+                                nb_samples=nb_samples, nb_slots=nb_slots)
+    data_array = np.zeros((nb_channels, nb_samples), dtype=np.int16)
+
+    # wait for consumer
+    time.sleep(0.5)
+
+    start = time.perf_counter()
+    for ievent in range(1, nb_events+1):
+        data_array[...] = ievent % 2**15
+        writer.write_event(data_array, event_num=ievent)
+    rate = nb_events/(time.perf_counter()-start)
+    print('Write: %.0f events/s (%.0f MB/s)'
+          % (rate, rate*data_array.nbytes/1e6))
+
+    # keep buffer until consumer done
+    time.sleep(1)
+    writer.close()
+
+
+if __name__ == "__main__":
+
+    # parameters
+    nb_events = 20000
+    nb_channels = 4
+    nb_samples = 10000
+    nb_slots = 100
+    if len(sys.argv)>1:
+        nb_events = int(sys.argv[1])
+    if len(sys.argv)>2:
+        nb_channels = int(sys.argv[2])
+    if len(sys.argv)>3:
+        nb_samples = int(sys.argv[3])
+    if len(sys.argv)>4:
+        nb_slots = int(sys.argv[4])
+
+    producer = multiprocessing.Process(
+        target=produce, args=(nb_events, nb_channels, nb_samples, nb_slots))
+    producer.start()
+    time.sleep(0.2)
+
+    reader = SharedMemoryReader(BUFFER_NAME)
+    assert reader.shape==(nb_channels, nb_samples)
+    assert reader.channel_list==list(range(nb_channels))
+
+    # read all events
+    nb_read = 0
+    nb_torn = 0
+    last_seq = 0
+    start = None
+    while reader.last_seq<nb_events:
+        events = reader.read_events(count=10, block=500)
+        if start is None:
+            start = time.perf_counter()
+        for data_array, header in events:
+            assert header['seq']>last_seq
+            last_seq = header['seq']
+            if not np.all(data_array==header['event_num'] % 2**15):
+                nb_torn += 1
+            nb_read += 1
+    read_time = time.perf_counter()-start
+
+    print('Read:  %.0f events/s (%d events read, %d overwritten before read)'
+          % (nb_read/read_time, nb_read, reader.nb_lost_events))
+    assert nb_torn==0
+    assert nb_read+reader.nb_lost_events==nb_events
+
+    # latest events
+    assert not reader.read_latest(nb_events=5)
+    reader = SharedMemoryReader(BUFFER_NAME, start='oldest')
+    events = reader.read_latest(nb_events=5, copy=False)
+    assert ([header['event_num'] for _, header in events]
+            ==list(range(nb_events-4, nb_events+1)))
+    assert all(reader.is_valid(header['seq']) for _, header in events)
+    del events
+    reader.close()
+
+    producer.join()
+    print('All tests passed')